@@ -1,2 +1,2 @@
-from .run import run_model, evaluate_model, load_model, score_dataset, score_dataset_with_ensemble
-from .run import compute_accuracy
+from .run import run_model, resume_model, evaluate_model, load_model, score_dataset, score_dataset_with_ensemble
+from .run import score_dataset_to_files, compute_accuracy
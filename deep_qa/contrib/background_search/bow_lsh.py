@@ -15,6 +15,10 @@ import numpy
 import spacy
 from sklearn.neighbors import LSHForest
 
+# pylint: disable=wrong-import-position
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../.."))
+from deep_qa.data.embeddings import PretrainedEmbeddings
+
 
 class BowLsh:
     def __init__(self, serialization_prefix='lsh', use_idf=True):
@@ -33,19 +37,13 @@ class BowLsh:
             self.idf_values = {}  # word -> idf_value
 
     def read_embeddings_file(self, embeddings_file: str):
-        with gzip.open(embeddings_file, 'rb') as embeddings_file:
-            for line in embeddings_file:
-                fields = line.decode('utf-8').strip().split(' ')
-                self.embedding_dim = len(fields) - 1
-                word = fields[0]
-                vector = numpy.asarray(fields[1:], dtype='float32')
-                vector_min = min(vector)
-                vector_max = max(vector)
-                if vector_min < self.vector_min:
-                    self.vector_min = vector_min
-                if vector_max > self.vector_max:
-                    self.vector_max = vector_max
-                self.embeddings[word] = vector
+        words, vectors = PretrainedEmbeddings.read_embeddings(embeddings_file)
+        self.embedding_dim = vectors.shape[1]
+        self.vector_min = min(self.vector_min, float(vectors.min()))
+        self.vector_max = max(self.vector_max, float(vectors.max()))
+        # For a binary embeddings file, these are rows of a memory-mapped matrix, so they only get
+        # read from disk when we use them.
+        self.embeddings.update(zip(words, vectors))
 
     def load_model(self):
         pickled_embeddings_file = open("%s/embeddings.pkl" % self.serialization_prefix, 'rb')
@@ -208,8 +206,8 @@ class BowLsh:
 
 def main():
     argparser = argparse.ArgumentParser(description="Build a Locality Sensitive Hash and use it for retrieval.")
-    argparser.add_argument("--embeddings_file", type=str, help="Gzipped file containing pretrained embeddings \
-                           (required for fitting)")
+    argparser.add_argument("--embeddings_file", type=str, help="Gzipped file containing pretrained embeddings, \
+                           or a binary .npy embeddings file (required for fitting)")
     argparser.add_argument("--background_corpus", type=str, help="Gzipped sentences file (required for fitting)")
     argparser.add_argument("--questions_file", type=str, help="TSV file with indices in the first column \
                            and question in the second (required for retrieval)")
@@ -0,0 +1,370 @@
+from array import array
+from collections import Counter, OrderedDict
+from copy import deepcopy
+import gzip
+import json
+import logging
+import os
+from typing import Iterable, List, Tuple
+
+import numpy
+import tqdm
+
+from ...common.checks import ConfigurationError
+from ...common.params import Params
+from ...data.tokenizers.word_processor import WordProcessor
+from .vector_based_retrieval import MappedSentences
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+class InvertedIndex:
+    """
+    A term-level inverted index over a collection of tokenized documents, which answers top-k
+    queries scored with BM25, TF-IDF, or plain word overlap.
+
+    For each term, we store its postings - the ids of the documents it occurs in, sorted, and how
+    many times it occurs in each of them - contiguously, in term id order, so the postings of term
+    ``t`` are entries ``postings_offsets[t]`` to ``postings_offsets[t + 1]`` of the posting arrays.
+    We compress the document ids by storing the id of each term's first document separately, and
+    the gaps between consecutive document ids in the smallest unsigned integer type that holds
+    them all (and the same for the term frequencies).  The gaps of common terms are small, and
+    rare terms have few postings, so this is typically a quarter to an eighth of the size of the
+    raw document ids.  Decoding a term's postings is a cumulative sum over its gaps.
+
+    To answer a batch of queries, we gather the postings of all of their terms at once, compute the
+    score contribution of every posting with array arithmetic, and add up the contributions for
+    each (query, document) pair, so there are no Python loops over postings or documents.
+
+    Use :func:`build` to make an index, and :func:`save` and :func:`load` to persist it.  Loaded
+    indices are memory-mapped.
+    """
+    def __init__(self,
+                 terms: List[str],
+                 postings_offsets: numpy.array,
+                 first_doc_ids: numpy.array,
+                 doc_id_gaps: numpy.array,
+                 term_frequencies: numpy.array,
+                 doc_lengths: numpy.array):
+        self.terms = terms
+        self.vocabulary = {term: term_id for term_id, term in enumerate(terms)}
+        self.postings_offsets = postings_offsets
+        self.first_doc_ids = first_doc_ids
+        self.doc_id_gaps = doc_id_gaps
+        self.term_frequencies = term_frequencies
+        self.doc_lengths = doc_lengths
+        self.num_documents = len(doc_lengths)
+        self.average_doc_length = float(numpy.mean(doc_lengths)) if self.num_documents else 0.0
+
+    @classmethod
+    def build(cls, documents: Iterable[List[str]]) -> 'InvertedIndex':
+        """
+        Builds an index over ``documents``, each a list of tokens.  Document ids are positions in
+        ``documents``.
+        """
+        vocabulary = {}
+        token_term_ids = array('q')
+        doc_lengths = array('q')
+        for tokens in documents:
+            for token in tokens:
+                token_term_ids.append(vocabulary.setdefault(token, len(vocabulary)))
+            doc_lengths.append(len(tokens))
+        num_documents = max(len(doc_lengths), 1)
+        token_term_ids = numpy.asarray(token_term_ids, dtype='int64')
+        doc_lengths = numpy.asarray(doc_lengths, dtype='int64')
+        token_doc_ids = numpy.repeat(numpy.arange(len(doc_lengths)), doc_lengths)
+
+        # Sorting (term, document) keys gives us every term's postings together, sorted by
+        # document, and counting repeated keys gives us the term frequencies.
+        keys, term_frequencies = numpy.unique(token_term_ids * num_documents + token_doc_ids,
+                                              return_counts=True)
+        posting_term_ids = keys // num_documents
+        doc_ids = keys % num_documents
+        postings_offsets = numpy.zeros(len(vocabulary) + 1, dtype='int64')
+        numpy.cumsum(numpy.bincount(posting_term_ids, minlength=len(vocabulary)), out=postings_offsets[1:])
+        first_doc_ids = doc_ids[postings_offsets[:-1]]
+        doc_id_gaps = numpy.zeros_like(doc_ids)
+        doc_id_gaps[1:] = numpy.diff(doc_ids)
+        doc_id_gaps[postings_offsets[:-1]] = 0
+        terms = sorted(vocabulary, key=vocabulary.get)
+        return cls(terms,
+                   postings_offsets,
+                   first_doc_ids,
+                   _to_smallest_unsigned_type(doc_id_gaps),
+                   _to_smallest_unsigned_type(term_frequencies),
+                   doc_lengths)
+
+    def get_postings(self, term: str) -> Tuple[numpy.array, numpy.array]:
+        """
+        Returns the ids of the documents that ``term`` occurs in, and the number of times it
+        occurs in each of them.
+        """
+        term_id = self.vocabulary.get(term)
+        if term_id is None:
+            return numpy.zeros(0, dtype='int64'), numpy.zeros(0, dtype='int64')
+        start, end = self.postings_offsets[term_id], self.postings_offsets[term_id + 1]
+        doc_ids = self.first_doc_ids[term_id] + numpy.cumsum(self.doc_id_gaps[start:end], dtype='int64')
+        return doc_ids, numpy.asarray(self.term_frequencies[start:end], dtype='int64')
+
+    def search(self,
+               queries: List[List[str]],
+               num_results: int,
+               scoring: str='bm25',
+               k1: float=1.2,
+               b: float=0.75) -> List[List[Tuple[int, float]]]:
+        """
+        Returns, for each tokenized query, up to ``num_results`` ``(document id, score)`` pairs,
+        highest score first.  Only documents that share a term with the query get a result.
+
+        A query's score for a document is a sum over the query's terms (repeated terms count
+        repeatedly) of:
+
+        - ``"bm25"``: ``idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / average_length))``,
+          with ``idf = log(1 + (N - df + 0.5) / (df + 0.5))``.
+        - ``"tf_idf"``: ``tf / length * log(N / df)``.
+        - ``"word_overlap"``: ``tf``.
+
+        Here ``tf`` is the number of times the term occurs in the document, ``length`` is the
+        number of tokens in the document, ``df`` is the number of documents the term occurs in,
+        and ``N`` is the number of documents.
+        """
+        if scoring not in self.scoring_functions:
+            raise ConfigurationError("Unknown scoring function %s; options are %s"
+                                     % (scoring, list(self.scoring_functions)))
+        query_indices = []
+        term_ids = []
+        query_term_counts = []
+        for query_index, query in enumerate(queries):
+            term_counts = Counter(self.vocabulary[token] for token in query if token in self.vocabulary)
+            for term_id, count in term_counts.items():
+                query_indices.append(query_index)
+                term_ids.append(term_id)
+                query_term_counts.append(count)
+        results = [[] for _ in queries]
+        if not term_ids:
+            return results
+        term_ids = numpy.asarray(term_ids, dtype='int64')
+
+        # We gather the postings of every (query, term) pair into flat arrays.
+        starts = self.postings_offsets[term_ids]
+        document_frequencies = self.postings_offsets[term_ids + 1] - starts
+        segment_starts = numpy.cumsum(document_frequencies) - document_frequencies
+        num_postings = int(document_frequencies.sum())
+        posting_indices = numpy.repeat(starts - segment_starts, document_frequencies) + numpy.arange(num_postings)
+        # The gap of the first posting of each term is zero, so a segmented cumulative sum of the
+        # gaps is the cumulative sum, minus its value at the start of each segment.
+        gap_sums = numpy.cumsum(self.doc_id_gaps[posting_indices], dtype='int64')
+        doc_ids = (numpy.repeat(self.first_doc_ids[term_ids] - gap_sums[segment_starts], document_frequencies)
+                   + gap_sums)
+        term_frequencies = numpy.asarray(self.term_frequencies[posting_indices], dtype='float64')
+
+        scoring_function = self.scoring_functions[scoring]
+        scores = scoring_function(self,
+                                  term_frequencies,
+                                  numpy.repeat(document_frequencies, document_frequencies).astype('float64'),
+                                  numpy.asarray(self.doc_lengths[doc_ids], dtype='float64'),
+                                  k1,
+                                  b)
+        scores *= numpy.repeat(numpy.asarray(query_term_counts, dtype='float64'), document_frequencies)
+
+        # Adding up the scores for each (query, document) pair.
+        keys = numpy.repeat(numpy.asarray(query_indices, dtype='int64'), document_frequencies)
+        keys = keys * self.num_documents + doc_ids
+        keys, inverse = numpy.unique(keys, return_inverse=True)
+        total_scores = numpy.bincount(inverse.ravel(), weights=scores)
+        result_queries = keys // self.num_documents
+        result_doc_ids = keys % self.num_documents
+
+        # ``keys`` are sorted by query, so each query's results are contiguous.
+        query_boundaries = numpy.searchsorted(result_queries, numpy.arange(len(queries) + 1))
+        for query_index in range(len(queries)):
+            start, end = query_boundaries[query_index], query_boundaries[query_index + 1]
+            query_scores = total_scores[start:end]
+            if end - start > num_results:
+                top = numpy.argpartition(-query_scores, num_results - 1)[:num_results]
+            else:
+                top = numpy.arange(end - start)
+            top = top[numpy.argsort(-query_scores[top], kind='mergesort')]
+            results[query_index] = [(int(doc_id), float(score))
+                                    for doc_id, score in zip(result_doc_ids[start:end][top], query_scores[top])]
+        return results
+
+    def _bm25_scores(self, term_frequencies, document_frequencies, doc_lengths, k1, b):
+        idf = numpy.log(1 + (self.num_documents - document_frequencies + 0.5) / (document_frequencies + 0.5))
+        length_norm = k1 * (1 - b + b * doc_lengths / max(self.average_doc_length, 1e-8))
+        return idf * term_frequencies * (k1 + 1) / (term_frequencies + length_norm)
+
+    # pylint: disable=unused-argument
+    def _tf_idf_scores(self, term_frequencies, document_frequencies, doc_lengths, k1, b):
+        return term_frequencies / doc_lengths * numpy.log(self.num_documents / document_frequencies)
+
+    def _word_overlap_scores(self, term_frequencies, document_frequencies, doc_lengths, k1, b):
+        return term_frequencies
+    # pylint: enable=unused-argument
+
+    scoring_functions = OrderedDict()
+    scoring_functions['bm25'] = _bm25_scores
+    scoring_functions['tf_idf'] = _tf_idf_scores
+    scoring_functions['word_overlap'] = _word_overlap_scores
+
+    def save(self, prefix: str):
+        """
+        Saves the index to files starting with ``prefix``: ``_terms.txt``, with one term per line
+        in id order, and a ``.npy`` file for each array.
+        """
+        with open(prefix + "_terms.txt", 'w', encoding='utf-8') as terms_file:
+            for term in self.terms:
+                print(term, file=terms_file)
+        numpy.save(prefix + "_postings_offsets.npy", self.postings_offsets)
+        numpy.save(prefix + "_first_doc_ids.npy", self.first_doc_ids)
+        numpy.save(prefix + "_doc_id_gaps.npy", self.doc_id_gaps)
+        numpy.save(prefix + "_term_frequencies.npy", self.term_frequencies)
+        numpy.save(prefix + "_doc_lengths.npy", self.doc_lengths)
+
+    @classmethod
+    def load(cls, prefix: str) -> 'InvertedIndex':
+        """
+        Loads an index saved with :func:`save`, memory-mapping its arrays.
+        """
+        with open(prefix + "_terms.txt", encoding='utf-8') as terms_file:
+            terms = [line.rstrip("\n") for line in terms_file]
+        arrays = [numpy.load(prefix + name, mmap_mode='r')
+                  for name in ["_postings_offsets.npy", "_first_doc_ids.npy", "_doc_id_gaps.npy",
+                               "_term_frequencies.npy", "_doc_lengths.npy"]]
+        return cls(terms, *arrays)
+
+
+def _to_smallest_unsigned_type(values: numpy.array) -> numpy.array:
+    max_value = int(values.max()) if len(values) else 0
+    for dtype in ['uint8', 'uint16', 'uint32']:
+        if max_value <= numpy.iinfo(dtype).max:
+            return values.astype(dtype)
+    return values.astype('uint64')
+
+
+class LexicalRetrieval:
+    """
+    Retrieves passages from a background corpus by the words they share with the query, using an
+    :class:`InvertedIndex` - the sparse, lexical counterpart of
+    :class:`~deep_qa.contrib.background_search.vector_based_retrieval.VectorBasedRetrieval`, with
+    the same interface (``read_background``, ``fit``, ``save_model``, ``load_model`` and
+    ``get_nearest_neighbors``), so ``retrieve_background.py`` can use either.
+
+    Parameters
+    ----------
+    serialization_prefix: str, optional (default='retrieval')
+        When we save and load the index, we do so by appending things to this path.
+    word_processor: Dict[str, Any], optional
+        Parameters for the :class:`~deep_qa.data.tokenizers.word_processor.WordProcessor` that we
+        tokenize (lower-cased) passages and queries with.  The default is the simple word
+        splitter, with stopword filtering and Porter stemming.
+    scoring: str, optional (default='bm25')
+        One of ``"bm25"``, ``"tf_idf"`` or ``"word_overlap"``; see :func:`InvertedIndex.search`.
+    k1: float, optional (default=1.2)
+        The BM25 term frequency saturation parameter.
+    b: float, optional (default=0.75)
+        The BM25 document length normalization parameter.
+    query_batch_size: int, optional (default=1000)
+        The number of queries we score at once.
+
+    Notes
+    -----
+    ``get_nearest_neighbors`` returns the negated score of each passage, so that, like the
+    distances ``VectorBasedRetrieval`` returns, lower is better.
+    """
+    def __init__(self, params: Params):
+        self.serialization_prefix = params.pop('serialization_prefix', 'retrieval')
+        word_processor_params = params.pop('word_processor', {'word_splitter': 'simple',
+                                                              'word_filter': 'stopwords',
+                                                              'word_stemmer': 'porter'})
+        # We keep a copy of these, to check that a saved index was tokenized the same way.
+        self.word_processor_params = deepcopy(word_processor_params.as_dict())
+        self.word_processor = WordProcessor(word_processor_params)
+        self.scoring = params.pop_choice('scoring', list(InvertedIndex.scoring_functions.keys()),
+                                         default_to_first_choice=True)
+        self.k1 = params.pop('k1', 1.2)
+        self.b = params.pop('b', 0.75)
+        self.query_batch_size = params.pop('query_batch_size', 1000)
+        params.assert_empty("LexicalRetrieval")
+
+        self.background_sentences = []
+        self.index = None
+
+    def read_background(self, background_file):
+        """
+        Reads the given background file, which is assumed to be gzipped, with one retrievable
+        passage per line.  All non-empty lines in the file are added to the retrieval index.
+        """
+        for sentence in gzip.open(background_file, mode="r"):
+            sentence = sentence.decode('utf-8').strip()
+            if sentence != '':
+                self.background_sentences.append(sentence)
+
+    def fit(self):
+        """
+        Tokenizes all of the read background passages and builds the inverted index.
+        """
+        logger.info("Building inverted index")
+        self.index = InvertedIndex.build(self._tokenize(sentence)
+                                         for sentence in tqdm.tqdm(self.background_sentences))
+        logger.info("Indexed %d passages: %d terms, %d postings in %d bytes",
+                    self.index.num_documents, len(self.index.terms), len(self.index.doc_id_gaps),
+                    self.index.doc_id_gaps.nbytes + self.index.term_frequencies.nbytes)
+
+    def save_model(self):
+        """
+        Saves the background sentences (see :class:`MappedSentences`), the inverted index (see
+        :func:`InvertedIndex.save`) and the word processor parameters, in files starting with
+        ``serialization_prefix``.
+        """
+        logger.info("Saving retrieval model to %s", self.serialization_prefix)
+        directory = os.path.dirname(self.serialization_prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        MappedSentences.write(self.background_sentences,
+                              self._get_filename("sentences.txt"),
+                              self._get_filename("sentence_offsets.npy"))
+        self.index.save(self._get_filename("index"))
+        with open(self._get_filename("config.json"), 'w') as config_file:
+            json.dump({'word_processor': self.word_processor_params}, config_file, indent=2)
+
+    def load_model(self):
+        """
+        Loads what :func:`save_model` saved, memory-mapped.  The saved index must have been built
+        with the same word processor parameters as this one; the scoring parameters are only used
+        at query time, so they can differ.
+        """
+        logger.info("Loading retrieval model from %s", self.serialization_prefix)
+        with open(self._get_filename("config.json")) as config_file:
+            config = json.load(config_file)
+        if config['word_processor'] != self.word_processor_params:
+            raise ConfigurationError("The saved retrieval model used word processor parameters %s, "
+                                     "but we were given %s"
+                                     % (config['word_processor'], self.word_processor_params))
+        self.background_sentences = MappedSentences(self._get_filename("sentences.txt"),
+                                                    self._get_filename("sentence_offsets.npy"))
+        self.index = InvertedIndex.load(self._get_filename("index"))
+
+    def get_nearest_neighbors(self, text_query: str, num_neighbors: int) -> List[Tuple[str, float]]:
+        """
+        Returns the ``num_neighbors`` highest-scoring passages for ``text_query`` in the background
+        corpus, along with their negated scores.  ``text_query`` can be either a single string, or
+        a list of strings.
+        """
+        if not isinstance(text_query, list):
+            text_query = [text_query]
+        results = []
+        for start in range(0, len(text_query), self.query_batch_size):
+            queries = [self._tokenize(query) for query in text_query[start:start + self.query_batch_size]]
+            results.extend(self.index.search(queries, num_neighbors, self.scoring, self.k1, self.b))
+        results = [[(self.background_sentences[i], -score) for (i, score) in result] for result in results]
+        if len(results) == 1:
+            results = results[0]
+        return results
+
+    def _tokenize(self, sentence: str) -> List[str]:
+        return self.word_processor.get_tokens(sentence.lower())
+
+    def _get_filename(self, name: str) -> str:
+        return "%s_%s" % (self.serialization_prefix, name)
+
@@ -1,9 +1,10 @@
 from collections import OrderedDict
 import logging
+import pickle
 from typing import List, Tuple
 
 import numpy
-from sklearn.neighbors import LSHForest
+
 from ...common.params import Params
 
 logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
@@ -36,6 +37,19 @@ class NearestNeighborAlgorithm:
         """
         raise NotImplementedError
 
+    def save(self, prefix: str):
+        """
+        Saves whatever ``fit()`` computed to files starting with ``prefix``.
+        """
+        raise NotImplementedError
+
+    def load(self, prefix: str):
+        """
+        Loads what :func:`save` saved, instead of calling ``fit()``.  Large arrays are memory-mapped
+        (read-only), so that several processes searching the same index share its pages.
+        """
+        raise NotImplementedError
+
 
 class ScikitLearnLsh(NearestNeighborAlgorithm):
     """
@@ -48,6 +62,9 @@ class ScikitLearnLsh(NearestNeighborAlgorithm):
         Used to initialize the LSHForest, so that runs are consistent.
     """
     def __init__(self, params: Params):
+        # LSHForest is deprecated, and gone from recent versions of scikit-learn, so we only import
+        # it if it's actually used.
+        from sklearn.neighbors import LSHForest
         random_state = params.pop('random_state', 12345)
         self.lsh = LSHForest(random_state=random_state)
 
@@ -66,6 +83,396 @@ class ScikitLearnLsh(NearestNeighborAlgorithm):
             result = result[0]
         return result
 
+    def save(self, prefix: str):
+        with open(prefix + "_lsh.pkl", 'wb') as lsh_file:
+            pickle.dump(self.lsh, lsh_file)
+
+    def load(self, prefix: str):
+        with open(prefix + "_lsh.pkl", 'rb') as lsh_file:
+            self.lsh = pickle.load(lsh_file)
+
+
+class BruteForceSearch(NearestNeighborAlgorithm):
+    """
+    This ``NearestNeighborAlgorithm`` finds the exact nearest neighbors, by scoring every query
+    against every vector.  We do this with matrix multiplications over tiles of at most
+    ``query_block_size`` queries by ``corpus_block_size`` vectors, keeping the best
+    ``num_neighbors`` for each query as we go (with ``numpy.argpartition``), so memory use doesn't
+    grow with the size of the corpus.
+
+    The ``type`` of this algorithm to use in a parameter file is ``"brute_force"``.
+
+    As with :class:`ScikitLearnLsh`, the score for each neighbor is a distance, so lower is closer.
+
+    Parameters
+    ----------
+    metric: str, optional (default="cosine")
+        Either ``"cosine"``, where the score is the cosine distance (one minus the cosine
+        similarity), or ``"dot"``, where the score is the negative dot product.
+    query_block_size: int, optional (default=256)
+        The number of queries we score at once.
+    corpus_block_size: int, optional (default=16384)
+        The number of vectors we score each block of queries against at once.
+    """
+    def __init__(self, params: Params):
+        self.metric = params.pop_choice('metric', ['cosine', 'dot'], default_to_first_choice=True)
+        self.query_block_size = params.pop('query_block_size', 256)
+        self.corpus_block_size = params.pop('corpus_block_size', 16384)
+        params.assert_empty("BruteForceSearch")
+        self.vectors = None
+
+    def fit(self, vectors: List[numpy.array]):
+        logger.info("Fitting brute force search with %d vectors", len(vectors))
+        self.vectors = _prepare_vectors(vectors, self.metric)
+
+    def get_neighbors(self, query_vector: numpy.array, num_neighbors: int) -> List[Tuple[int, float]]:
+        queries, single_query = _prepare_queries(query_vector, self.metric)
+        num_neighbors = min(num_neighbors, len(self.vectors))
+        logger.info("Getting neighbors for %d vectors", len(queries))
+        all_scores = []
+        all_indices = []
+        for query_start in range(0, len(queries), self.query_block_size):
+            query_block = queries[query_start:query_start + self.query_block_size]
+            scores, indices = _empty_top_k(len(query_block), num_neighbors)
+            for corpus_start in range(0, len(self.vectors), self.corpus_block_size):
+                corpus_block = self.vectors[corpus_start:corpus_start + self.corpus_block_size]
+                block_indices = numpy.arange(corpus_start, corpus_start + len(corpus_block))
+                scores, indices = _merge_top_k(scores, indices, query_block.dot(corpus_block.T),
+                                               block_indices, num_neighbors)
+            all_scores.append(scores)
+            all_indices.append(indices)
+        return _to_results(numpy.concatenate(all_scores), numpy.concatenate(all_indices),
+                           self.metric, single_query)
+
+    def save(self, prefix: str):
+        numpy.save(prefix + "_vectors.npy", self.vectors)
+
+    def load(self, prefix: str):
+        self.vectors = numpy.load(prefix + "_vectors.npy", mmap_mode='r')
+
+
+class InvertedFileIndex(NearestNeighborAlgorithm):
+    """
+    This ``NearestNeighborAlgorithm`` is an inverted file index: we cluster the vectors with
+    k-means, keep a list of the vectors in each cluster, and for each query, only score the vectors
+    in the ``nprobe`` clusters whose centroids are closest to it.  Larger values of ``nprobe`` are
+    slower, and closer to exact search.  The queries that probe the same cluster are scored against
+    it together, with one matrix multiplication.
+
+    The ``type`` of this algorithm to use in a parameter file is ``"ivf"``.
+
+    As with :class:`ScikitLearnLsh`, the score for each neighbor is a distance, so lower is closer.
+
+    Parameters
+    ----------
+    metric: str, optional (default="cosine")
+        Either ``"cosine"`` or ``"dot"``, as in :class:`BruteForceSearch`.  With ``"cosine"`` we
+        cluster the normalized vectors.
+    num_lists: int, optional (default=None)
+        The number of clusters.  If ``None``, we use the square root of the number of vectors.
+    nprobe: int, optional (default=8)
+        The number of clusters we search for each query.
+    num_iterations: int, optional (default=20)
+        The number of k-means iterations.
+    training_sample_size: int, optional (default=100000)
+        We run k-means on a random sample of at most this many vectors, then assign every vector to
+        its closest centroid.
+    random_state: int, optional (default=12345)
+        Used to sample the vectors and initialize k-means, so that runs are consistent.
+    """
+    def __init__(self, params: Params):
+        self.metric = params.pop_choice('metric', ['cosine', 'dot'], default_to_first_choice=True)
+        self.num_lists = params.pop('num_lists', None)
+        self.nprobe = params.pop('nprobe', 8)
+        self.num_iterations = params.pop('num_iterations', 20)
+        self.training_sample_size = params.pop('training_sample_size', 100000)
+        self.random_state = params.pop('random_state', 12345)
+        params.assert_empty("InvertedFileIndex")
+        self.centroids = None
+        self.vectors = None
+        self.vector_indices = None
+        self.list_offsets = None
+
+    def fit(self, vectors: List[numpy.array]):
+        vectors = _prepare_vectors(vectors, self.metric)
+        random = numpy.random.RandomState(self.random_state)
+        if len(vectors) > self.training_sample_size:
+            sample = vectors[random.choice(len(vectors), self.training_sample_size, replace=False)]
+        else:
+            sample = vectors
+        num_lists = self.num_lists or max(1, int(numpy.sqrt(len(vectors))))
+        num_lists = min(num_lists, len(sample))
+        logger.info("Fitting inverted file index with %d vectors in %d lists", len(vectors), num_lists)
+        centroids = _kmeans(sample, num_lists, self.num_iterations, random)
+        self.centroids = centroids
+        assignments = _closest_centroids(vectors, centroids)
+        order = numpy.argsort(assignments, kind='mergesort')
+        self.vectors = vectors[order]
+        self.vector_indices = order
+        self.list_offsets = numpy.concatenate([[0], numpy.cumsum(numpy.bincount(assignments,
+                                                                                minlength=num_lists))])
+
+    def get_neighbors(self, query_vector: numpy.array, num_neighbors: int) -> List[Tuple[int, float]]:
+        queries, single_query = _prepare_queries(query_vector, self.metric)
+        logger.info("Getting neighbors for %d vectors", len(queries))
+        nprobe = min(self.nprobe, len(self.centroids))
+        num_neighbors = min(num_neighbors, len(self.vectors))
+        centroid_scores = _centroid_scores(queries, self.centroids)
+        probes = numpy.argpartition(-centroid_scores, nprobe - 1, axis=1)[:, :nprobe]
+        # We group the (query, list) pairs by list, so each list is scored once for all of the
+        # queries that probe it.
+        flat_probes = probes.ravel()
+        probe_order = numpy.argsort(flat_probes, kind='mergesort')
+        probed_lists, group_starts = numpy.unique(flat_probes[probe_order], return_index=True)
+        group_ends = numpy.append(group_starts[1:], len(probe_order))
+        scores, indices = _empty_top_k(len(queries), num_neighbors)
+        for list_index, start, end in zip(probed_lists, group_starts, group_ends):
+            list_start, list_end = self.list_offsets[list_index], self.list_offsets[list_index + 1]
+            if list_start == list_end:
+                continue
+            query_indices = probe_order[start:end] // nprobe
+            list_scores = queries[query_indices].dot(self.vectors[list_start:list_end].T)
+            scores[query_indices], indices[query_indices] = \
+                    _merge_top_k(scores[query_indices], indices[query_indices], list_scores,
+                                 self.vector_indices[list_start:list_end], num_neighbors)
+        return _to_results(scores, indices, self.metric, single_query)
+
+    def save(self, prefix: str):
+        numpy.save(prefix + "_centroids.npy", self.centroids)
+        numpy.save(prefix + "_vectors.npy", self.vectors)
+        numpy.save(prefix + "_vector_indices.npy", self.vector_indices)
+        numpy.save(prefix + "_list_offsets.npy", self.list_offsets)
+
+    def load(self, prefix: str):
+        self.centroids = numpy.load(prefix + "_centroids.npy")
+        self.vectors = numpy.load(prefix + "_vectors.npy", mmap_mode='r')
+        self.vector_indices = numpy.load(prefix + "_vector_indices.npy", mmap_mode='r')
+        self.list_offsets = numpy.load(prefix + "_list_offsets.npy")
+
+
+class ProductQuantizer(NearestNeighborAlgorithm):
+    """
+    This ``NearestNeighborAlgorithm`` compresses the vectors with product quantization: we split
+    each vector into ``num_subvectors`` pieces, learn 256 centroids for each piece with k-means
+    (the codebooks), and store each vector as the one-byte index of the closest centroid for each
+    of its pieces.  With the default of one piece per 8 dimensions, that's 32 times smaller than
+    float32 vectors.
+
+    To search, we compute a lookup table of the dot product between each piece of the query and
+    every centroid for that piece, so that the approximate score of a stored vector is just a sum
+    of ``num_subvectors`` table lookups (asymmetric distance computation: the query itself isn't
+    quantized).  If ``rerank`` is given, we take that many candidates from the approximate scores
+    and re-score them exactly with the full vectors, which we keep for this purpose only.  After
+    :func:`load`, those are memory-mapped, so only the pages holding candidates are ever read.
+
+    The ``type`` of this algorithm to use in a parameter file is ``"pq"``.
+
+    As with :class:`ScikitLearnLsh`, the score for each neighbor is a distance, so lower is closer.
+
+    Parameters
+    ----------
+    metric: str, optional (default="cosine")
+        Either ``"cosine"`` or ``"dot"``, as in :class:`BruteForceSearch`.  With ``"cosine"`` we
+        quantize the normalized vectors.
+    num_subvectors: int, optional (default=None)
+        The number of pieces to split each vector into, which is the number of bytes we store per
+        vector.  If ``None``, we use one piece per 8 dimensions.
+    rerank: int, optional (default=0)
+        The number of candidates per query to re-score with the full vectors.  Zero means we don't
+        re-rank, and don't keep the full vectors at all.
+    num_iterations: int, optional (default=20)
+        The number of k-means iterations for each codebook.
+    training_sample_size: int, optional (default=100000)
+        We learn the codebooks from a random sample of at most this many vectors.
+    random_state: int, optional (default=12345)
+        Used to sample the vectors and initialize k-means, so that runs are consistent.
+    query_block_size: int, optional (default=256)
+        The number of queries we score at once.
+    corpus_block_size: int, optional (default=16384)
+        The number of codes we score each block of queries against at once.
+    """
+    def __init__(self, params: Params):
+        self.metric = params.pop_choice('metric', ['cosine', 'dot'], default_to_first_choice=True)
+        self.num_subvectors = params.pop('num_subvectors', None)
+        self.rerank = params.pop('rerank', 0)
+        self.num_iterations = params.pop('num_iterations', 20)
+        self.training_sample_size = params.pop('training_sample_size', 100000)
+        self.random_state = params.pop('random_state', 12345)
+        self.query_block_size = params.pop('query_block_size', 256)
+        self.corpus_block_size = params.pop('corpus_block_size', 16384)
+        params.assert_empty("ProductQuantizer")
+        self.subvector_bounds = None
+        self.codebooks = None
+        self.codes = None
+        self.vectors = None
+
+    def fit(self, vectors: List[numpy.array]):
+        vectors = _prepare_vectors(vectors, self.metric)
+        dimension = vectors.shape[1]
+        num_subvectors = min(self.num_subvectors or int(numpy.ceil(dimension / 8)), dimension)
+        logger.info("Fitting product quantizer with %d vectors, %d bytes per vector",
+                    len(vectors), num_subvectors)
+        boundaries = numpy.linspace(0, dimension, num_subvectors + 1).astype('int64')
+        self.subvector_bounds = list(zip(boundaries[:-1], boundaries[1:]))
+        random = numpy.random.RandomState(self.random_state)
+        if len(vectors) > self.training_sample_size:
+            sample = vectors[random.choice(len(vectors), self.training_sample_size, replace=False)]
+        else:
+            sample = vectors
+        num_centroids = min(256, len(sample))
+        self.codebooks = [_kmeans(sample[:, start:end], num_centroids, self.num_iterations, random)
+                          for start, end in self.subvector_bounds]
+        self.codes = numpy.stack([_closest_centroids(vectors[:, start:end], codebook).astype('uint8')
+                                  for (start, end), codebook in zip(self.subvector_bounds, self.codebooks)],
+                                 axis=1)
+        self.vectors = vectors if self.rerank else None
+
+    def get_neighbors(self, query_vector: numpy.array, num_neighbors: int) -> List[Tuple[int, float]]:
+        queries, single_query = _prepare_queries(query_vector, self.metric)
+        logger.info("Getting neighbors for %d vectors", len(queries))
+        num_neighbors = min(num_neighbors, len(self.codes))
+        num_candidates = min(max(num_neighbors, self.rerank), len(self.codes))
+        all_scores = []
+        all_indices = []
+        for query_start in range(0, len(queries), self.query_block_size):
+            query_block = queries[query_start:query_start + self.query_block_size]
+            lookup_tables = [query_block[:, start:end].dot(codebook.T)
+                             for (start, end), codebook in zip(self.subvector_bounds, self.codebooks)]
+            scores, indices = _empty_top_k(len(query_block), num_candidates)
+            for corpus_start in range(0, len(self.codes), self.corpus_block_size):
+                code_block = self.codes[corpus_start:corpus_start + self.corpus_block_size]
+                block_scores = numpy.zeros((len(query_block), len(code_block)), dtype='float32')
+                for subvector, lookup_table in enumerate(lookup_tables):
+                    block_scores += lookup_table[:, code_block[:, subvector]]
+                block_indices = numpy.arange(corpus_start, corpus_start + len(code_block))
+                scores, indices = _merge_top_k(scores, indices, block_scores, block_indices, num_candidates)
+            if self.rerank:
+                scores, indices = self._rerank(query_block, indices, num_neighbors)
+            all_scores.append(scores)
+            all_indices.append(indices)
+        return _to_results(numpy.concatenate(all_scores), numpy.concatenate(all_indices),
+                           self.metric, single_query)
+
+    def _rerank(self, queries: numpy.array, candidates: numpy.array, num_neighbors: int):
+        # Reading the candidates in sorted order is kinder to a memory-mapped file.
+        unique_candidates, positions = numpy.unique(candidates, return_inverse=True)
+        candidate_vectors = numpy.asarray(self.vectors[unique_candidates])[positions.reshape(candidates.shape)]
+        exact_scores = numpy.einsum('qd,qcd->qc', queries, candidate_vectors)
+        scores, indices = _empty_top_k(len(queries), num_neighbors)
+        return _merge_top_k(scores, indices, exact_scores, candidates, num_neighbors)
+
+    def save(self, prefix: str):
+        # The pieces can have different sizes, so we pad the codebooks to the largest one.
+        max_size = max(end - start for start, end in self.subvector_bounds)
+        codebooks = numpy.zeros((len(self.codebooks), len(self.codebooks[0]), max_size), dtype='float32')
+        for codebook_index, codebook in enumerate(self.codebooks):
+            codebooks[codebook_index, :, :codebook.shape[1]] = codebook
+        numpy.save(prefix + "_subvector_bounds.npy", numpy.asarray(self.subvector_bounds, dtype='int64'))
+        numpy.save(prefix + "_codebooks.npy", codebooks)
+        numpy.save(prefix + "_codes.npy", self.codes)
+        if self.vectors is not None:
+            numpy.save(prefix + "_vectors.npy", self.vectors)
+
+    def load(self, prefix: str):
+        self.subvector_bounds = [tuple(bounds) for bounds in numpy.load(prefix + "_subvector_bounds.npy")]
+        codebooks = numpy.load(prefix + "_codebooks.npy")
+        self.codebooks = [codebook[:, :end - start]
+                          for codebook, (start, end) in zip(codebooks, self.subvector_bounds)]
+        self.codes = numpy.load(prefix + "_codes.npy", mmap_mode='r')
+        if self.rerank:
+            self.vectors = numpy.load(prefix + "_vectors.npy", mmap_mode='r')
+
+
+def _kmeans(vectors: numpy.array,
+            num_centroids: int,
+            num_iterations: int,
+            random: numpy.random.RandomState) -> numpy.array:
+    """
+    Runs Lloyd's algorithm on ``vectors``, starting from ``num_centroids`` of them chosen at random,
+    and returns the centroids.
+    """
+    centroids = numpy.array(vectors[random.choice(len(vectors), num_centroids, replace=False)])
+    for _ in range(num_iterations):
+        assignments = _closest_centroids(vectors, centroids)
+        counts = numpy.bincount(assignments, minlength=num_centroids)
+        # Empty clusters keep their old centroid.
+        non_empty = counts > 0
+        cluster_starts = (numpy.cumsum(counts) - counts)[non_empty]
+        sorted_vectors = vectors[numpy.argsort(assignments, kind='mergesort')]
+        sums = numpy.add.reduceat(sorted_vectors, cluster_starts, axis=0)
+        centroids[non_empty] = sums / counts[non_empty, numpy.newaxis]
+    return centroids
+
+
+def _prepare_vectors(vectors: List[numpy.array], metric: str) -> numpy.array:
+    vectors = numpy.asarray(vectors, dtype='float32')
+    if metric == 'cosine':
+        norms = numpy.linalg.norm(vectors, axis=-1, keepdims=True)
+        vectors = vectors / numpy.maximum(norms, 1e-12)
+    return vectors
+
+
+def _prepare_queries(query_vector: numpy.array, metric: str) -> Tuple[numpy.array, bool]:
+    queries = numpy.asarray(query_vector)
+    single_query = queries.ndim == 1
+    if single_query:
+        queries = queries[numpy.newaxis]
+    return _prepare_vectors(queries, metric), single_query
+
+
+def _centroid_scores(vectors: numpy.array, centroids: numpy.array) -> numpy.array:
+    # Higher is closer: ``-|v - c|^2 / 2``, leaving out the ``|v|^2`` term, which is the same for
+    # every centroid.
+    return vectors.dot(centroids.T) - 0.5 * numpy.sum(centroids ** 2, axis=-1)
+
+
+def _closest_centroids(vectors: numpy.array, centroids: numpy.array, block_size: int=16384) -> numpy.array:
+    return numpy.concatenate([numpy.argmax(_centroid_scores(vectors[start:start + block_size], centroids), axis=1)
+                              for start in range(0, len(vectors), block_size)])
+
+
+def _empty_top_k(num_queries: int, num_neighbors: int) -> Tuple[numpy.array, numpy.array]:
+    scores = numpy.full((num_queries, num_neighbors), -numpy.inf, dtype='float32')
+    indices = numpy.full((num_queries, num_neighbors), -1, dtype='int64')
+    return scores, indices
+
+
+def _merge_top_k(best_scores: numpy.array,
+                 best_indices: numpy.array,
+                 new_scores: numpy.array,
+                 new_indices: numpy.array,
+                 num_neighbors: int) -> Tuple[numpy.array, numpy.array]:
+    """
+    Given the best ``num_neighbors`` scores (higher is better) and indices so far for each query,
+    and a new block of scores for each query against the vectors in ``new_indices``, returns the
+    best ``num_neighbors`` of both, unsorted.
+    """
+    new_indices = numpy.broadcast_to(new_indices, new_scores.shape)
+    scores = numpy.concatenate([best_scores, new_scores], axis=1)
+    indices = numpy.concatenate([best_indices, new_indices], axis=1)
+    top = numpy.argpartition(-scores, num_neighbors - 1, axis=1)[:, :num_neighbors]
+    rows = numpy.arange(len(scores))[:, numpy.newaxis]
+    return scores[rows, top], indices[rows, top]
+
+
+def _to_results(scores: numpy.array, indices: numpy.array, metric: str, single_query: bool):
+    """
+    Sorts each query's neighbors, converts similarities to distances, and drops empty slots (from
+    queries that saw fewer than ``num_neighbors`` vectors).
+    """
+    order = numpy.argsort(-scores, axis=1, kind='mergesort')
+    rows = numpy.arange(len(scores))[:, numpy.newaxis]
+    scores = scores[rows, order]
+    indices = indices[rows, order]
+    distances = 1 - scores if metric == 'cosine' else -scores
+    results = [[(int(index), float(distance)) for index, distance in zip(query_indices, query_distances)
+                if index >= 0]
+               for query_indices, query_distances in zip(indices, distances)]
+    return results[0] if single_query else results
+
 
 nearest_neighbor_algorithms = OrderedDict()  # pylint: disable=invalid-name
 nearest_neighbor_algorithms['lsh'] = ScikitLearnLsh
+nearest_neighbor_algorithms['brute_force'] = BruteForceSearch
+nearest_neighbor_algorithms['ivf'] = InvertedFileIndex
+nearest_neighbor_algorithms['pq'] = ProductQuantizer
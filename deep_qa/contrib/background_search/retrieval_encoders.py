@@ -1,17 +1,19 @@
+from array import array
 from collections import OrderedDict
-import gzip
 import logging
-from typing import List
+from typing import List, Tuple
 
 import numpy
 from overrides import overrides
 import pyhocon
+import scipy.sparse
 import spacy
 import tqdm
 
 from ...common.models import get_submodel
 from ...common.params import replace_none, Params
 from ...common import util
+from ...data.embeddings import PretrainedEmbeddings
 from ...data.instances.sentence_selection.sentence_selection_instance import SentenceSelectionInstance
 from ...models import concrete_models
 
@@ -54,78 +56,197 @@ class RetrievalEncoder:
         """
         return [self.encode_passage(passage) for passage in tqdm.tqdm(passages)]
 
+    def save(self, prefix: str):
+        """
+        Saves any state that encoding passages created (and that queries need), to files starting
+        with ``prefix``.  Most encoders don't have any.
+        """
+        pass
+
+    def load(self, prefix: str):
+        """
+        Loads what :func:`save` saved.
+        """
+        pass
+
 
 class BagOfWordsRetrievalEncoder(RetrievalEncoder):
     """
     A ``RetrievalEncoder`` that encodes both queries and passages as a bag of pre-trained word
-    embeddings.
+    embeddings: the average of the vectors for their words, optionally weighted by each word's IDF
+    in the passages.
 
-    We use spacy to tokenize the sentence.
+    We use spacy to tokenize the sentence.  We encode sentences in batches: each sentence becomes a
+    row of a sparse matrix over the vocabulary, whose values are the word weights (one over the
+    sentence length, times the IDF), and a whole batch of sentence vectors is then one sparse-dense
+    matrix multiplication with the embeddings of the words in the batch.
+
+    Passage words that have no pre-trained embedding get a random vector (sampled uniformly from
+    the range of values in the embeddings), which we remember, so that queries with those words
+    can match them.  Query words we haven't seen anywhere get a zero vector.
 
     The ``type`` of this model to use in a parameter file is ``"bow"``.
 
     Parameters
     ----------
     embeddings_file: str
-        A GloVe-formatted gzipped file containing pre-trained word embeddings.
-
-    TODO(matt): I wrote this from an earlier version of ``bow_lsh.py``, before Pradeep implemented
-    his IDF feature.  We should update this class to also have an option for IDF encoding, and then
-    we can officially retire ``bow_lsh.py``.
+        A GloVe-formatted gzipped file containing pre-trained word embeddings, or a binary ``.npy``
+        embeddings file (see :class:`~deep_qa.data.embeddings.PretrainedEmbeddings`), which is much
+        faster to load.
+    use_idf: bool, optional (default=False)
+        If ``True``, we weight each word by its inverse document frequency in the passages given to
+        the last call to :func:`encode_passages`, treating words we didn't see there as if they
+        occurred in exactly one passage.
+    batch_size: int, optional (default=100000)
+        The number of sentences we encode with each matrix multiplication.
     """
     def __init__(self, params: Params):
         embeddings_file = params.pop('embeddings_file')
+        self.use_idf = params.pop('use_idf', False)
+        self.batch_size = params.pop('batch_size', 100000)
         self.en_nlp = spacy.load('en')
 
         # These fields will get set in the call to `read_embeddings_file`.
         self.vector_max = -float("inf")
         self.vector_min = float("inf")
-        self.embeddings = {}
         self.embedding_dim = None
+        self.word_ids = {}
+        self.embeddings = None
+        # Words that were in the passages, but not in the embeddings file, and their random
+        # vectors.  Their ids come after the pre-trained words.
+        self.unknown_words = []
+        self.unknown_vectors = None
+        # The IDF of each word id, if ``use_idf`` is set and we've encoded passages, and the IDF of
+        # words we hadn't seen when we computed it.
+        self.idf = None
+        self.unseen_idf = None
         self.read_embeddings_file(embeddings_file)
 
     def read_embeddings_file(self, embeddings_file: str):
         logger.info("Reading embeddings file: %s", embeddings_file)
-        with gzip.open(embeddings_file, 'rb') as embeddings_file:
-            for line in embeddings_file:
-                fields = line.decode('utf-8').strip().split(' ')
-                self.embedding_dim = len(fields) - 1
-                word = fields[0]
-                vector = numpy.asarray(fields[1:], dtype='float32')
-                vector_min = min(vector)
-                vector_max = max(vector)
-                if vector_min < self.vector_min:
-                    self.vector_min = vector_min
-                if vector_max > self.vector_max:
-                    self.vector_max = vector_max
-                self.embeddings[word] = vector
+        words, vectors = PretrainedEmbeddings.read_embeddings(embeddings_file)
+        self.embedding_dim = vectors.shape[1]
+        self.vector_min = min(self.vector_min, float(vectors.min()))
+        self.vector_max = max(self.vector_max, float(vectors.max()))
+        # For a binary embeddings file, this is a memory-mapped matrix, and we only ever read the
+        # rows for the words we see.
+        self.embeddings = vectors
+        self.word_ids = {word: word_id for word_id, word in enumerate(words)}
+        self.unknown_words = []
+        self.unknown_vectors = numpy.zeros((0, self.embedding_dim), dtype='float32')
 
     @overrides
     def encode_query(self, query: str) -> numpy.array:
-        return self._encode_sentence(query, for_background=False)
+        return self.encode_queries([query])[0]
 
     @overrides
     def encode_passage(self, passage: str) -> numpy.array:
-        return self._encode_sentence(passage, for_background=True)
-
-    def _encode_sentence(self, sentence: str, for_background=False):
-        words = [str(w.lower_) for w in self.en_nlp.tokenizer(sentence)]
-        return numpy.mean(numpy.asarray([self._get_word_vector(word, for_background) for word in words]), axis=0)
-
-    def _get_word_vector(self, word, random_for_unk=False):
-        if word in self.embeddings:
-            return self.embeddings[word]
-        else:
-            # If this is for the background data, we'd want to make new vectors (uniformly sampling
-            # from the range (vector_min, vector_max)). If this is for the queries, we'll return a zero vector
-            # for UNK because this word doesn't exist in the background data either.
-            if random_for_unk:
-                vector = numpy.random.uniform(low=self.vector_min, high=self.vector_max,
-                                              size=(self.embedding_dim,))
-                self.embeddings[word] = vector
-            else:
-                vector = numpy.zeros((self.embedding_dim,))
-            return vector
+        return self._encode(*self._get_token_ids([passage], for_background=True))[0]
+
+    @overrides
+    def encode_queries(self, queries: List[str]) -> numpy.array:
+        return self._encode(*self._get_token_ids(queries, for_background=False))
+
+    @overrides
+    def encode_passages(self, passages: List[str]) -> numpy.array:
+        token_ids, offsets = self._get_token_ids(passages, for_background=True)
+        if self.use_idf:
+            self._compute_idf(token_ids, offsets)
+        return self._encode(token_ids, offsets)
+
+    def save(self, prefix: str):
+        with open(prefix + "_unknown_words.txt", 'w') as words_file:
+            for word in self.unknown_words:
+                print(word, file=words_file)
+        numpy.save(prefix + "_unknown_vectors.npy", self.unknown_vectors)
+        if self.idf is not None:
+            # The last entry is the IDF of unseen words.
+            numpy.save(prefix + "_idf.npy", numpy.append(self.idf, self.unseen_idf))
+
+    def load(self, prefix: str):
+        with open(prefix + "_unknown_words.txt") as words_file:
+            unknown_words = [line.rstrip("\n") for line in words_file]
+        for word in unknown_words:
+            self.word_ids[word] = len(self.word_ids)
+        self.unknown_words = unknown_words
+        self.unknown_vectors = numpy.load(prefix + "_unknown_vectors.npy")
+        if self.use_idf:
+            idf = numpy.load(prefix + "_idf.npy")
+            self.idf, self.unseen_idf = idf[:-1], idf[-1]
+
+    def _get_token_ids(self, sentences: List[str], for_background: bool) -> Tuple[numpy.array, numpy.array]:
+        """
+        Tokenizes ``sentences`` and returns the word id of every token, concatenated, along with
+        the offset in that array where each sentence starts (plus one for the end) - the column
+        indices and row pointers of a CSR matrix.  Passage words we haven't seen get new ids (and
+        random vectors); query words we haven't seen get ``-1``.
+        """
+        token_ids = array('q')
+        offsets = array('q', [0])
+        new_words = []
+        for tokens in self.en_nlp.tokenizer.pipe(sentences, batch_size=10000):
+            for token in tokens:
+                word = str(token.lower_)
+                word_id = self.word_ids.get(word)
+                if word_id is None:
+                    if for_background:
+                        word_id = len(self.word_ids)
+                        self.word_ids[word] = word_id
+                        new_words.append(word)
+                    else:
+                        word_id = -1
+                token_ids.append(word_id)
+            offsets.append(len(token_ids))
+        if new_words:
+            new_vectors = numpy.random.uniform(low=self.vector_min, high=self.vector_max,
+                                               size=(len(new_words), self.embedding_dim))
+            self.unknown_words.extend(new_words)
+            self.unknown_vectors = numpy.concatenate([self.unknown_vectors, new_vectors.astype('float32')])
+        if not token_ids:
+            return numpy.zeros(0, dtype='int64'), numpy.frombuffer(offsets, dtype='int64')
+        return numpy.frombuffer(token_ids, dtype='int64'), numpy.frombuffer(offsets, dtype='int64')
+
+    def _compute_idf(self, token_ids: numpy.array, offsets: numpy.array):
+        num_sentences = len(offsets) - 1
+        num_words = len(self.word_ids)
+        sentence_indices = numpy.repeat(numpy.arange(num_sentences), numpy.diff(offsets))
+        # Each (sentence, word) pair counts once towards the word's document frequency.
+        sentence_words = numpy.unique(sentence_indices * num_words + token_ids)
+        document_frequencies = numpy.bincount(sentence_words % num_words, minlength=num_words)
+        self.idf = numpy.log(num_sentences / numpy.maximum(document_frequencies, 1)).astype('float32')
+        self.unseen_idf = numpy.float32(numpy.log(num_sentences))
+
+    def _encode(self, token_ids: numpy.array, offsets: numpy.array) -> numpy.array:
+        num_sentences = len(offsets) - 1
+        lengths = numpy.diff(offsets)
+        vectors = numpy.zeros((num_sentences, self.embedding_dim), dtype='float32')
+        for start in tqdm.tqdm(range(0, num_sentences, self.batch_size)):
+            end = min(start + self.batch_size, num_sentences)
+            batch_ids = token_ids[offsets[start]:offsets[end]]
+            batch_lengths = lengths[start:end]
+            weights = numpy.repeat(1.0 / numpy.maximum(batch_lengths, 1), batch_lengths)
+            if self.idf is not None:
+                # Words added since we computed the IDF weren't in those passages.
+                known_ids = numpy.minimum(numpy.maximum(batch_ids, 0), len(self.idf) - 1)
+                weights *= numpy.where(batch_ids < len(self.idf), self.idf[known_ids], self.unseen_idf)
+            # Unknown query words have zero vectors, so they only count towards the length.
+            weights[batch_ids < 0] = 0
+            batch_word_ids, columns = numpy.unique(numpy.maximum(batch_ids, 0), return_inverse=True)
+            indptr = offsets[start:end + 1] - offsets[start]
+            weight_matrix = scipy.sparse.csr_matrix((weights, columns.ravel(), indptr),
+                                                    shape=(end - start, len(batch_word_ids)))
+            vectors[start:end] = weight_matrix.dot(self._get_word_vectors(batch_word_ids))
+        return vectors
+
+    def _get_word_vectors(self, word_ids: numpy.array) -> numpy.array:
+        """
+        Returns the vectors for ``word_ids``, which must be sorted.
+        """
+        num_pretrained = len(self.embeddings)
+        pretrained_ids = word_ids[word_ids < num_pretrained]
+        unknown_ids = word_ids[word_ids >= num_pretrained] - num_pretrained
+        return numpy.concatenate([numpy.asarray(self.embeddings[pretrained_ids], dtype='float32'),
+                                  self.unknown_vectors[unknown_ids]])
 
 
 class SentenceSelectionRetrievalEncoder(RetrievalEncoder):
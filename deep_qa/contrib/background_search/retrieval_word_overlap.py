@@ -11,19 +11,32 @@
 """
 
 import argparse
-import json
 import csv
-from collections import defaultdict
-import operator
-import math
+from functools import lru_cache
+import json
+import os
+import sys
 import numpy as np
 from nltk import word_tokenize
 from nltk.corpus import stopwords
 from nltk.stem import PorterStemmer as NltkPorterStemmer
 
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../.."))
+# pylint: disable=wrong-import-position
+from deep_qa.contrib.background_search.lexical_retrieval import InvertedIndex
+
 np.random.seed(seed=20)
 stemmer = NltkPorterStemmer()  # pylint: disable=invalid-name
 # stemmer for lematizing the words
+
+@lru_cache(maxsize=None)
+def get_stopwords():
+    """
+    Returns the set of English stopwords; NLTK reads them from disk each time we ask, so we only
+    ask once.
+    """
+    return set(stopwords.words('english'))
+
 def pre_process(row):
     """
     gets a row, makes a complete sentence string, lower cases it,
@@ -34,39 +47,41 @@ def pre_process(row):
     """
     sentence = ' '.join(word.lower() for word in row)
     sentence_tokenized = [w for w in word_tokenize(sentence)]
-    clean_row = [w for w in sentence_tokenized if w not in stopwords.words('english')]
+    english_stopwords = get_stopwords()
+    clean_row = [w for w in sentence_tokenized if w not in english_stopwords]
     clean_words = [stemmer.stem(w) for w in clean_row]
     return clean_words
 
-def get_inverse_index_dict(tables_dataset):
+def read_table_rows(tables_dataset):
     """
 
     Parameters
     ----------
     tables_dataset
 
-    Returns  given the table dataset this function makes table vocabulary
-    and inv_index for word in table vocabulary
-    note that stop words are removed and we consider stemmed version of the word
+    Returns all of the table rows in the table dataset, each a list of cells,
+    in order (table by table).  We read the file once, and keep the rows.
     -------
 
     """
-    inv_index = defaultdict(set)
-    tables_vocab = set()
-    num_all_rows = 0
     with open(tables_dataset) as data_file:
         data = json.load(data_file)
-    # make the inv_index dictionaries for all non-stop words
-    for j in range(len(data["tables"])):
-        table_rows = data["tables"][j]["data"] # each table row is a list, not an array
-        num_all_rows = num_all_rows + len(table_rows)
-        for i, table_row in enumerate(table_rows):
-            words = pre_process(table_row)
-            for word in words:
-                tables_vocab.add(word)
-                index = (j, i)
-                inv_index[word].add(index)
-    return inv_index, tables_vocab, num_all_rows
+    return [table_row for table in data["tables"] for table_row in table["data"]]
+
+def get_inverse_index(table_rows):
+    """
+
+    Parameters
+    ----------
+    table_rows
+
+    Returns an InvertedIndex over the table rows, with the position of each
+    row in table_rows as its id.
+    note that stop words are removed and we consider stemmed version of the word
+    -------
+
+    """
+    return InvertedIndex.build(pre_process(table_row) for table_row in table_rows)
 
 def get_question_answer_pairs(filename, number):
     """
@@ -93,104 +108,30 @@ def get_question_answer_pairs(filename, number):
     picked_answers = [answers[i] for i in samples_num]
     return picked_questions, picked_answers
 
-
-def score_table_row_tfidf(question, tables_dataset, table_rows_to_score,
-                          inv_index, tables_vocab, num_all_rows):
-    """
-    Parameters
-    ----------
-    question
-    tables_dataset
-    table_rows_to_score
-    inv_index
-    tables_vocab
-    num_all_rows
-
-    Returns the table rows that have word overlap with question along with a tf-idf score
-    -------
-
-    """
-    scored_rows = dict()
-    with open(tables_dataset) as data_file:
-        data = json.load(data_file)
-    for (j, i) in table_rows_to_score:
-        table_row = data["tables"][j]["data"][i]
-        score = 0
-        words_to_consider = pre_process(table_row)
-        question_words = pre_process(question)
-        for word in words_to_consider:
-            for question_word in question_words:
-                if question_word in tables_vocab and question_word == word:    # similarity measure
-                    score = score +  words_to_consider.count(word) / \
-                            len(words_to_consider)*math.log(num_all_rows/len(inv_index[word]))
-        index = (j, i)
-        scored_rows[index] = score
-    return scored_rows
-
-def score_table_row_plain(question, tables_dataset, table_rows_to_score, tables_vocab):
-    """
-
-    Parameters
-    ----------
-    question
-    tables_dataset
-    table_rows_to_score
-    tables_vocab
-
-    Returns the table rows that have word overlap with question along with a tf-idf score
-    -------
-
-    """
-    scored_rows = dict()
-    with open(tables_dataset) as data_file:
-        data = json.load(data_file)
-    for (j, i) in table_rows_to_score:
-        table_row = data["tables"][j]["data"][i]
-        score = 0
-        words_to_consider = pre_process(table_row)
-        question_words = pre_process(question)
-        for word in words_to_consider:
-            for question_word in question_words:
-                if question_word == word and question_word in tables_vocab: # similarity measure
-                    score = score + 1
-        index = (j, i)
-        scored_rows[index] = score
-    return scored_rows
-
-def write_top_queries(question, answer, tables_dataset, scored_rows, top_n, output_file):
+def write_top_queries(question, answer, table_rows, scored_rows, output_file):
     """
 
     Parameters
     ----------
     question
     answer
-    tables_dataset
-    scored_rows
-    top_n
+    table_rows
+    scored_rows: (row index, score) pairs, highest score first
     output_file
 
-    Returns: given the question and scored rows, it writes top scored rows in a file
+    Returns: given the question and scored rows, it writes the scored rows in a file
     along with a label which says if the answer exists in that row.
     -------
 
     """
-    question_score = 0
-    with open(tables_dataset) as data_file:
-        data = json.load(data_file)
-    # sort the scored rows, this is how you sort a dictionary based on values,
-    # change 1 to 0 to sort by keys
-    sorted_scored_rows = sorted(scored_rows.items(), key=operator.itemgetter(1), reverse=True)
-    # get top_n from the sorted dictionary
+    answer = ' '.join([stemmer.stem(w.lower()) for w in word_tokenize(answer)])
     output_list = []
-    for index in range(min(top_n, len(sorted_scored_rows))):  # for rare words
+    for row_index, score in scored_rows:
         label = 0
-        ((j, i), score) = sorted_scored_rows[index]
-        row = ' '.join(data["tables"][j]["data"][i])
+        row = ' '.join(table_rows[row_index])
         row = ' '.join([stemmer.stem(w.lower()) for w in word_tokenize(row)])
-        answer = ' '.join([stemmer.stem(w.lower()) for w in word_tokenize(answer)])
         if answer in row:
             label = 1
-            question_score = question_score + 1
         retrieved_pair = (question, row, answer, score, label)
         output_list.append(retrieved_pair)
     with open(output_file, 'a') as f_file:
@@ -198,45 +139,30 @@ def write_top_queries(question, answer, tables_dataset, scored_rows, top_n, outp
         for pair in output_list:
             writer.writerow(pair)
 
-def get_top_queries(question, answer, tables_dataset,
-                    inv_index, tables_vocab, top_n, output_file, num_all_rows, tf_idf_flag):
+def get_top_queries(questions, answers, table_rows, inv_index, top_n, output_file, tf_idf_flag):
     """
 
     Parameters
     ----------
-    question
-    answer
-    tables_dataset
+    questions
+    answers
+    table_rows
     inv_index
-    tables_vocab
     top_n
     output_file
-    num_all_rows
     tf_idf_flag
 
-    Returns: get a subset of table rows that includes at least one of the words in the question,
-    then send it to the appropriate scoring fn to find the topk and write it in the output
+    Returns: scores the table rows that include at least one of the words in each question,
+    with tf-idf or plain word overlap, all questions at once, and writes the top_n rows
+    for each question in the output
     -------
 
     """
-    #### Do this for each question, answer pair ####
-
-    # get a subset of table rows that includes at least one of the words in the question
-    table_rows_to_score = set()
-    question_words = pre_process(question)
-    for question_word in question_words:
-        if question_word in tables_vocab:
-            table_rows_to_score = table_rows_to_score.union(inv_index[question_word])
-    # given the (table_id, row_number), score the table row against the question
-    if tf_idf_flag:
-        scored_rows = score_table_row_tfidf(question, tables_dataset,
-                                            table_rows_to_score, inv_index, tables_vocab,
-                                            num_all_rows)
-    else:
-        scored_rows = score_table_row_plain(question, tables_dataset,
-                                            table_rows_to_score, tables_vocab)
-    # get top_n queries and write them to output_file
-    write_top_queries(question, answer, tables_dataset, scored_rows, top_n, output_file)
+    scoring = 'tf_idf' if tf_idf_flag else 'word_overlap'
+    all_scored_rows = inv_index.search([pre_process([question]) for question in questions],
+                                       top_n, scoring=scoring)
+    for question, answer, scored_rows in zip(questions, answers, all_scored_rows):
+        write_top_queries(question, answer, table_rows, scored_rows, output_file)
 
 
 
@@ -262,22 +188,21 @@ def main():
                            help="output file with question, top k retrieved table rows "
                                 "one at a line,answer and score",
                            default='data/output.csv')
-    argparser.add_argument("--topk", type=str, help="number of top k retrieved rows",
+    argparser.add_argument("--topk", type=int, help="number of top k retrieved rows",
                            default=100)
-    argparser.add_argument("--num_qa_pairs", type=str, help="number of random samples "
+    argparser.add_argument("--num_qa_pairs", type=int, help="number of random samples "
                                                             "taken from QA_dataset for evaluation",
                            default=1000)
-    argparser.add_argument("--tf_idf_flag", type=str, help="TFIdf flag, 0 = plain word overlap, "
+    argparser.add_argument("--tf_idf_flag", type=int, help="TFIdf flag, 0 = plain word overlap, "
                                                            "1: Tf-IDF scoring of word overlap",
                            default=1)
     args = argparser.parse_args()
 
-    inv_index, tables_vocab, num_all_rows = get_inverse_index_dict(args.tables_dataset)
+    table_rows = read_table_rows(args.tables_dataset)
+    inv_index = get_inverse_index(table_rows)
     questions, answers = get_question_answer_pairs(args.QA_dataset, args.num_qa_pairs)
-    for question_index in range(args.num_qa_pairs):
-        get_top_queries(questions[question_index], answers[question_index], args.tables_dataset,
-                        inv_index, tables_vocab, args.topk,
-                        args.output_file, num_all_rows, args.tf_idf_flag)
+    get_top_queries(questions, answers, table_rows, inv_index, args.topk,
+                    args.output_file, args.tf_idf_flag)
 
 
 if __name__ == '__main__':
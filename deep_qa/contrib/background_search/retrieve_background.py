@@ -1,3 +1,4 @@
+from collections import OrderedDict
 import logging
 import itertools
 import os
@@ -16,10 +17,17 @@ import pyhocon
 
 sys.path.append(os.path.join(os.path.dirname(__file__), "../../.."))
 from deep_qa.common.checks import ensure_pythonhashseed_set
-from deep_qa.common.params import replace_none
+from deep_qa.common.params import replace_none, Params
 from deep_qa.common import util
+from deep_qa.contrib.background_search.lexical_retrieval import LexicalRetrieval
 from deep_qa.contrib.background_search.vector_based_retrieval import VectorBasedRetrieval
 
+# The ``type`` of the ``retrieval`` parameters picks one of these; the rest of the parameters get
+# passed to it.
+retrieval_models = OrderedDict()  # pylint: disable=invalid-name
+retrieval_models['vector'] = VectorBasedRetrieval
+retrieval_models['lexical'] = LexicalRetrieval
+
 
 def get_background_for_questions(retrieval: VectorBasedRetrieval,
                                  question_file: str,
@@ -98,7 +106,7 @@ def main():
     params = pyhocon.ConfigFactory.parse_file(param_file)
     params = replace_none(params)
 
-    retrieval_params = params.pop('retrieval')
+    retrieval_params = Params(params.pop('retrieval'))
     corpus_file = params.pop('corpus', None)
     question_params = params.pop('questions')
     question_file = question_params.pop('file')
@@ -108,7 +116,9 @@ def main():
     if output_file is None:
         output_file = question_file.rsplit('.', 1)[0] + ".retrieved_background.tsv"
 
-    retrieval = VectorBasedRetrieval(retrieval_params)
+    retrieval_type = retrieval_params.pop_choice('type', list(retrieval_models.keys()),
+                                                 default_to_first_choice=True)
+    retrieval = retrieval_models[retrieval_type](retrieval_params)
     if corpus_file is not None:
         retrieval.read_background(corpus_file)
         retrieval.fit()
@@ -1,9 +1,15 @@
+from collections.abc import Sequence
+from copy import deepcopy
 import gzip
+import json
 import logging
+import mmap
+import os
 from typing import List, Tuple
 
 import numpy
 
+from ...common.checks import ConfigurationError
 from ...common.params import Params
 from .nearest_neighbor_algorithms import nearest_neighbor_algorithms
 from .retrieval_encoders import retrieval_encoders
@@ -22,7 +28,7 @@ class VectorBasedRetrieval:
     ----------
     serialization_prefix: str, optional (default='retrieval')
         When we save and load models (both encoders and nearest neighbor indices), we will do so by
-        appending things to this path.
+        appending things to this path.  See :func:`save_model` for what we save.
     encoder: Dict[str, Any], optional (default={})
         These parameters get passed to the encoder model.  See the specific encoder model for
         options here.  The one parameter looked at in this class is ``type``, which determines the
@@ -39,17 +45,22 @@ class VectorBasedRetrieval:
     ``retrieval.read_background``.  Once you've read all background files, you call
     ``retrieval.fit()``, to encode all of the sentences and load them into some approximate nearest
     neighbor algorithm.  Then you can retrieve background sentences given a query string with
-    ``retrieval.get_nearest_neighbors``.
+    ``retrieval.get_nearest_neighbors``.  Call ``retrieval.save_model()`` after fitting, and later
+    runs can call ``retrieval.load_model()`` instead of reading and encoding the background again.
     """
     def __init__(self, params: Params):
         self.serialization_prefix = params.pop('serialization_prefix', 'retrieval')
 
         encoder_params = params.pop('encoder', {})
+        # We keep copies of these, to save with the model, and to check that a saved model was
+        # built the same way.
+        self.encoder_params = deepcopy(encoder_params.as_dict())
         encoder_choice = encoder_params.pop_choice('type', list(retrieval_encoders.keys()),
                                                    default_to_first_choice=True)
         self.encoder = retrieval_encoders[encoder_choice](encoder_params)
 
         nearest_neighbors_params = params.pop('nearest_neighbors', {})
+        self.nearest_neighbors_params = deepcopy(nearest_neighbors_params.as_dict())
         nearest_neighbors_choice = \
             nearest_neighbors_params.pop_choice('type', list(nearest_neighbor_algorithms.keys()),
                                                 default_to_first_choice=True)
@@ -58,14 +69,63 @@ class VectorBasedRetrieval:
         params.assert_empty("VectorBasedRetrieval")
 
         self.background_sentences = []
+        self.passage_vectors = None
 
-    def load_model(self):  # pylint: disable=no-self-use
-        # TODO(matt): not sure what this should look like yet
-        logger.warning("LOADING MODELS NOT IMPLEMENTED YET")
-
-    def save_model(self):  # pylint: disable=no-self-use
-        # TODO(matt): not sure what this should look like yet
-        logger.warning("SAVING MODELS NOT IMPLEMENTED YET")
+    def load_model(self):
+        """
+        Loads what :func:`save_model` saved, instead of reading the background corpus and calling
+        ``fit()``.  The passage vectors, the background sentences and the nearest neighbor index's
+        arrays are all memory-mapped, read-only, so loading is quick, and several processes
+        querying the same saved model share one copy of them in memory.
+
+        The saved model must have been built with the same encoder parameters as this one.  If the
+        nearest neighbor parameters are different, we fit a new index from the saved passage
+        vectors, which is still much faster than encoding the corpus again.
+        """
+        logger.info("Loading retrieval model from %s", self.serialization_prefix)
+        with open(self._get_filename("config.json")) as config_file:
+            config = json.load(config_file)
+        if config['encoder'] != self.encoder_params:
+            raise ConfigurationError("The saved retrieval model used encoder parameters %s, but we "
+                                     "were given %s" % (config['encoder'], self.encoder_params))
+        self.encoder.load(self._get_filename("encoder"))
+        self.passage_vectors = numpy.load(self._get_filename("passage_vectors.npy"), mmap_mode='r')
+        self.background_sentences = MappedSentences(self._get_filename("sentences.txt"),
+                                                    self._get_filename("sentence_offsets.npy"))
+        if config['nearest_neighbors'] == self.nearest_neighbors_params:
+            self.nearest_neighbors.load(self._get_filename("nearest_neighbors"))
+        else:
+            logger.info("Nearest neighbor parameters changed from %s; fitting a new index",
+                        config['nearest_neighbors'])
+            self.nearest_neighbors.fit(self.passage_vectors)
+
+    def save_model(self):
+        """
+        Saves everything we need to answer queries without encoding the background corpus again,
+        in files starting with ``serialization_prefix``:
+
+        - ``_passage_vectors.npy``: the encoded passages, as a float32 matrix.
+        - ``_sentences.txt`` and ``_sentence_offsets.npy``: the background sentences, one per line,
+          and the byte offset of each line (see :class:`MappedSentences`).
+        - ``_nearest_neighbors*``: the fitted nearest neighbor index (see
+          :func:`NearestNeighborAlgorithm.save`).
+        - ``_encoder*``: whatever state the encoder needs for encoding queries (see
+          :func:`RetrievalEncoder.save`).
+        - ``_config.json``: the encoder and nearest neighbor parameters.
+        """
+        logger.info("Saving retrieval model to %s", self.serialization_prefix)
+        directory = os.path.dirname(self.serialization_prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        numpy.save(self._get_filename("passage_vectors.npy"), self.passage_vectors)
+        MappedSentences.write(self.background_sentences,
+                              self._get_filename("sentences.txt"),
+                              self._get_filename("sentence_offsets.npy"))
+        self.nearest_neighbors.save(self._get_filename("nearest_neighbors"))
+        self.encoder.save(self._get_filename("encoder"))
+        with open(self._get_filename("config.json"), 'w') as config_file:
+            json.dump({'encoder': self.encoder_params, 'nearest_neighbors': self.nearest_neighbors_params},
+                      config_file, indent=2)
 
     def read_background(self, background_file):
         """
@@ -73,6 +133,9 @@ class VectorBasedRetrieval:
         passage per line.  All non-empty lines in the file are added to the retrieval index.
         """
         logger.info("Reading background file: %s", background_file)
+        if not isinstance(self.background_sentences, list):
+            # We loaded a saved model; we'll have to encode everything again in ``fit()`` anyway.
+            self.background_sentences = list(self.background_sentences)
         # Read background file and add to `background_sentences`.
         for sentence in gzip.open(background_file, mode="r"):
             sentence = sentence.decode('utf-8').strip()
@@ -85,8 +148,9 @@ class VectorBasedRetrieval:
         them into some approximate nearest neighbor algorithm, such as an LSH.
         """
         logger.info("Fitting nearest neighbor algorithm")
-        encoded_passages = self.encoder.encode_passages(self.background_sentences)
-        self.nearest_neighbors.fit(encoded_passages)
+        self.passage_vectors = numpy.asarray(self.encoder.encode_passages(self.background_sentences),
+                                             dtype='float32')
+        self.nearest_neighbors.fit(self.passage_vectors)
 
     def get_nearest_neighbors(self, text_query: str, num_neighbors: int) -> List[Tuple[str, float]]:
         """
@@ -109,3 +173,48 @@ class VectorBasedRetrieval:
         ``self.background_sentences``.
         """
         return [(self.background_sentences[i], score) for (i, score) in results]
+
+    def _get_filename(self, name: str) -> str:
+        return "%s_%s" % (self.serialization_prefix, name)
+
+
+class MappedSentences(Sequence):
+    """
+    A read-only list of sentences, stored in a UTF-8 text file with one sentence per line, which we
+    memory-map, and a ``.npy`` array with the byte offset where each line starts (plus one more for
+    the end of the file), so that we can get any sentence without reading the file into memory.
+    """
+    def __init__(self, text_file: str, offsets_file: str):
+        self._offsets = numpy.load(offsets_file, mmap_mode='r')
+        with open(text_file, 'rb') as sentence_file:
+            if os.fstat(sentence_file.fileno()).st_size == 0:
+                self._text = b''
+            else:
+                self._text = mmap.mmap(sentence_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("sentence index out of range")
+        # We leave out the newline at the end of each line.
+        start, end = int(self._offsets[index]), int(self._offsets[index + 1]) - 1
+        return self._text[start:end].decode('utf-8')
+
+    @staticmethod
+    def write(sentences: List[str], text_file: str, offsets_file: str):
+        """
+        Writes ``sentences``, which must not contain newlines, in the format we read.
+        """
+        offsets = [0]
+        with open(text_file, 'wb') as sentence_file:
+            for sentence in sentences:
+                encoded_sentence = sentence.encode('utf-8') + b"\n"
+                sentence_file.write(encoded_sentence)
+                offsets.append(offsets[-1] + len(encoded_sentence))
+        numpy.save(offsets_file, numpy.asarray(offsets, dtype='int64'))
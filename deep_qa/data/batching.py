@@ -0,0 +1,97 @@
+"""
+Vectorized grouping of sorted instances into batches with a fixed budget.
+
+The ``DataGenerator`` sorts instances by their padding lengths, then cuts the sorted list into
+batches so that no batch costs more than some budget, where the cost of a batch is its size times
+a function of its padding lengths (the maximum length of each key over the instances in the batch).
+Growing one batch at a time, instance by instance, means recomputing those maxima with Python
+dictionaries for every instance.  Here we keep one array of lengths per padding key, in sorted
+order, and for each batch compute the running maxima over a window of instances with
+``numpy.maximum.accumulate``.  That gives the cost of every candidate batch size at once, and the
+batch ends right before the first candidate that goes over budget.
+
+Padding lengths can also be rounded up to a set of bucket boundaries (e.g., powers of two), so
+that the model only ever sees a handful of distinct input shapes.
+"""
+from typing import Callable, Dict, List, Union
+
+import numpy
+
+
+def bucket_lengths(lengths: numpy.ndarray, buckets: Union[str, List[int]]) -> numpy.ndarray:
+    """
+    Rounds each length up to the nearest bucket boundary.
+
+    Parameters
+    ----------
+    lengths: numpy.ndarray
+        An array of non-negative integer lengths.
+    buckets: str or List[int]
+        Either ``"powers_of_two"``, or a list of bucket boundaries.  Lengths longer than the largest
+        boundary in the list are left as they are.  If ``None``, we return ``lengths`` unchanged.
+    """
+    lengths = numpy.asarray(lengths, dtype='int64')
+    if buckets is None:
+        return lengths
+    if buckets == 'powers_of_two':
+        exponents = numpy.ceil(numpy.log2(numpy.maximum(lengths, 1)))
+        return numpy.where(lengths > 0, numpy.power(2, exponents).astype('int64'), lengths)
+    if isinstance(buckets, str):
+        raise ValueError("Unknown padding buckets: %s" % buckets)
+    boundaries = numpy.sort(numpy.asarray(buckets, dtype='int64'))
+    bucket_indices = numpy.searchsorted(boundaries, lengths, side='left')
+    in_a_bucket = bucket_indices < len(boundaries)
+    return numpy.where(in_a_bucket, boundaries[numpy.minimum(bucket_indices, len(boundaries) - 1)], lengths)
+
+
+def cut_batches(lengths: Dict[str, numpy.ndarray],
+                cost_function: Callable[[Dict[str, numpy.ndarray]], numpy.ndarray],
+                budget: float,
+                maximum_batch_size: int) -> List[int]:
+    """
+    Cuts a sorted list of instances into consecutive batches, returning the size of each batch.
+    Each batch is as large as it can be (up to ``maximum_batch_size``) without its cost going over
+    ``budget``, where the cost of a batch is its size times
+    ``cost_function(maximum lengths in the batch)``.  A batch always has at least one instance,
+    even if that instance alone is over budget.
+
+    Parameters
+    ----------
+    lengths: Dict[str, numpy.ndarray]
+        The (already bucketed, if you want buckets) padding lengths of every instance, in sorted
+        order, as one array per padding key.
+    cost_function: Callable
+        Given a dictionary of padding lengths, returns the per-instance cost of a batch padded to
+        those lengths.  We call this with arrays of lengths instead of ints, so it needs to work
+        elementwise, as simple arithmetic like
+        :func:`~deep_qa.training.TextTrainer.get_padding_memory_scaling` does.
+    budget: float
+        The maximum cost of a batch.
+    maximum_batch_size: int
+        The maximum number of instances in a batch.
+    """
+    num_instances = len(next(iter(lengths.values()))) if lengths else 0
+    batch_sizes = []
+    start = 0
+    window = 1
+    while start < num_instances:
+        largest_window = min(num_instances - start, maximum_batch_size)
+        window = max(1, min(window, largest_window))
+        while True:
+            prefix_maxima = {key: numpy.maximum.accumulate(values[start:start + window])
+                             for key, values in lengths.items()}
+            costs = numpy.arange(1, window + 1) * cost_function(prefix_maxima)
+            over_budget = numpy.flatnonzero(costs > budget)
+            if len(over_budget) > 0:
+                batch_size = max(1, int(over_budget[0]))
+                break
+            if window == largest_window:
+                batch_size = window
+                break
+            window = min(window * 2, largest_window)
+        batch_sizes.append(batch_size)
+        start += batch_size
+        # Neighbouring batches in sorted order tend to have similar sizes, so this is usually a
+        # big enough window to find the next cut on the first try.
+        window = batch_size * 2
+    return batch_sizes
@@ -1,12 +1,20 @@
-from typing import List
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Tuple, Union
+import itertools
 import logging
+import math
 import random
-from copy import deepcopy
+import threading
 
+import numpy
+
+from ..common.checks import ConfigurationError
 from ..common.params import Params
 from ..common.util import group_by_count
 from . import IndexedDataset
-from .instances import IndexedInstance
+from .batching import bucket_lengths, cut_batches
+from .datasets.lazy_dataset import LazyIndexedDataset
 
 logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
@@ -30,6 +38,11 @@ class DataGenerator:
        larger batch sizes for small instances.  We've seen speedups up to 10-12x (on top of the
        4-5x speed up above) from doing this.
 
+    If the dataset is a :class:`~deep_qa.data.datasets.lazy_dataset.LazyIndexedDataset`, we never
+    hold the whole dataset in memory.  Instead, each epoch we read it one chunk of ``chunk_size``
+    instances at a time, and all of the sorting, grouping and shuffling above happens `within` each
+    chunk.
+
     Parameters
     ----------
     text_trainer: TextTrainer
@@ -66,7 +79,7 @@ class DataGenerator:
         usage given padding lengths, and (2) tune the `adaptive_memory_usage_constant` parameter
         for your particular model and GPU.  See the documentation for
         :func:`~TextTrainer._get_padding_memory_scaling` for more information.
-    adaptive_memory_usage_constant: int, optional (default=None)
+    adaptive_memory_usage_constant: int or str, optional (default=None)
         Only relevant if ``adaptive_batch_sizes`` is ``True``.  This is a manually-tuned parameter,
         specific to a particular model architecture and amount of GPU memory (e.g., if you change
         the number of hidden layers in your model, this number will need to change).  See
@@ -77,6 +90,32 @@ class DataGenerator:
         parameter so that you get the right batch size for your biggest instances.  If you set the
         log level to ``DEBUG`` in ``scripts/run_model.py``, you can see the batch sizes that are
         computed.
+
+        If you're training on the CPU, you can instead set this to ``"calibrate"``, and the
+        ``TextTrainer`` will measure it before training, by probing increasing batch sizes of your
+        largest instance under ``calibration_memory_limit`` (see
+        :mod:`~deep_qa.training.memory_calibration`).  The result is saved next to the model
+        config, and later runs of the same model reuse it.
+    calibration_memory_limit: int, optional (default=None)
+        Only relevant if ``adaptive_memory_usage_constant`` is ``"calibrate"``.  The most memory,
+        in megabytes, that the training process should use (this is the whole process, so it
+        includes the data you've loaded, not just the model).  If ``None``, we use 80% of the
+        machine's physical memory.
+    token_budget: int, optional (default=None)
+        Only relevant if ``dynamic_padding`` is ``True``.  If given, we vary the batch size so that
+        each batch holds at most this many tokens, counting padding: the batch size times the sum
+        of the batch's padding lengths for the keys in
+        :func:`~deep_qa.training.TextTrainer.get_instance_sorting_keys`.  This is like
+        ``adaptive_batch_sizes``, but doesn't need a model-specific memory function, and the budget
+        is easy to reason about.  If you set both, ``adaptive_batch_sizes`` wins.
+    padding_buckets: str or List[int], optional (default=None)
+        Only relevant if ``dynamic_padding`` is ``True``.  If given, every padding length that we
+        compute from the data (i.e., that the model leaves as ``None`` in
+        :func:`~deep_qa.training.TextTrainer.get_padding_lengths`) gets rounded up to a bucket
+        boundary, so the model sees far fewer distinct input shapes.  This is either
+        ``"powers_of_two"`` or a list of boundaries, like ``[16, 32, 64, 128, 256]``; lengths
+        longer than the largest boundary are not rounded.  Adaptive and token-budget batch sizes
+        account for the bucketed lengths.
     maximum_batch_size: int, optional (default=1000000)
         If we're using adaptive batch sizes, you can use this to be sure you do not create batches
         larger than this, even if you have enough memory to handle it on your GPU.  You might
@@ -88,6 +127,21 @@ class DataGenerator:
         largest batch that you have in the data `first`, so that if you're going to run out of
         memory, you know it early, instead of waiting through the whole batch to find out at the
         end that you're going to crash.
+    prefetch_batches: int, optional (default=0)
+        If greater than zero, we will pad and convert up to this many batches ahead of the one that
+        is currently being consumed, using a pool of background workers, so that the model doesn't
+        have to wait on Python padding code between training steps.  Note that Keras'
+        ``fit_generator`` already pulls from our generator on a separate thread, but it only calls
+        ``next()`` on one batch at a time; this lets several batches be padded in parallel.  Zero
+        means we build each batch synchronously when it is requested.
+    prefetch_workers: int, optional (default=1)
+        Only relevant if ``prefetch_batches`` is greater than zero.  The number of workers used to
+        pad and convert batches.
+    prefetch_with_processes: bool, optional (default=False)
+        Only relevant if ``prefetch_batches`` is greater than zero.  If ``True``, we use a process
+        pool instead of a thread pool for the prefetching workers.  Padding is pure Python code, so
+        threads are limited by the GIL; processes avoid that, at the cost of pickling each batch of
+        instances to send it to a worker.
     """
     def __init__(self, text_trainer, params: Params):
         self.text_trainer = text_trainer
@@ -96,47 +150,247 @@ class DataGenerator:
         self.sort_every_epoch = params.pop('sort_every_epoch', True)
         self.adaptive_batch_sizes = params.pop('adaptive_batch_sizes', False)
         self.adaptive_memory_usage_constant = params.pop('adaptive_memory_usage_constant', False)
+        self.calibration_memory_limit = params.pop('calibration_memory_limit', None)
+        self.token_budget = params.pop('token_budget', None)
+        self.padding_buckets = params.pop('padding_buckets', None)
         self.maximum_batch_size = params.pop('maximum_batch_size', 1000000)
         self.biggest_batch_first = params.pop('biggest_batch_first', False)
+        self.prefetch_batches = params.pop('prefetch_batches', 0)
+        self.prefetch_workers = params.pop('prefetch_workers', 1)
+        self.prefetch_with_processes = params.pop('prefetch_with_processes', False)
+        if isinstance(self.adaptive_memory_usage_constant, str) and \
+                self.adaptive_memory_usage_constant != 'calibrate':
+            raise ConfigurationError("adaptive_memory_usage_constant must be a number or 'calibrate', "
+                                     "not %s" % self.adaptive_memory_usage_constant)
+        if isinstance(self.padding_buckets, str) and self.padding_buckets != 'powers_of_two':
+            raise ConfigurationError("padding_buckets must be 'powers_of_two' or a list of lengths, "
+                                     "not %s" % self.padding_buckets)
 
         #: This field can be read after calling ``create_generator`` to get the number of steps you
         #: should take per epoch in ``model.fit_generator`` or ``model.evaluate_generator`` for
         #: this data.
         self.last_num_batches = None
 
-    def create_generator(self, dataset: IndexedDataset, batch_size: int=None):
+        #: Similarly, after calling ``create_generator`` with a dataset that isn't lazy, this holds
+        #: a :class:`BatchRecord` of the batches that the generator makes, which is what training
+        #: checkpoints use to remember where they were in the data.
+        self.last_batch_record = None
+
+    def create_generator(self,
+                         dataset: IndexedDataset,
+                         batch_size: int=None,
+                         resume_from: Tuple[List[List[int]], Any]=None):
         """
         Main external API call: converts an ``IndexedDataset`` into a data generator suitable for
         use with Keras' ``fit_generator`` and related methods.
+
+        If ``resume_from`` is given, it must be a pass over this dataset from a
+        :class:`BatchRecord`, as returned by :func:`BatchRecord.get_pass`.  The generator then
+        continues as the generator that made that pass would have after it: it sets the random
+        state (python's and numpy's) to what it was after making the pass, and (if we don't re-sort
+        every epoch) keeps using the same batches.
         """
         if batch_size is None:
             batch_size = self.text_trainer.batch_size
 
-        grouped_instances = self.__create_batches(dataset, batch_size)
-        self.last_num_batches = len(grouped_instances)
-        def generator():
+        if isinstance(dataset, LazyIndexedDataset):
+            if resume_from is not None:
+                raise ValueError("Can't resume a generator over a lazy dataset")
+            self.last_batch_record = None
+            self.last_num_batches = self.__count_lazy_batches(dataset, batch_size)
+            def lazy_group_generator():
+                while True:
+                    for chunk in dataset.iter_chunks():
+                        yield from self.__create_chunk_groups(chunk, batch_size)
+            return self.__convert_groups(lazy_group_generator())
+
+        # Padding never modifies the instances in ``dataset`` (see
+        # :func:`IndexedDataset.as_padded_training_data`), so their padding lengths never change,
+        # and re-sorting the data every epoch only needs a new permutation of the same instances.
+        if self.dynamic_padding or self.__uses_batch_budget():
+            instance_padding_lengths = dataset.get_instance_padding_lengths()
+        else:
+            instance_padding_lengths = None
+        if resume_from is not None:
+            grouped_indices, random_state = resume_from
+        else:
+            grouped_indices = self.__create_batches(dataset, instance_padding_lengths, batch_size)
+        self.last_num_batches = len(grouped_indices)
+        record = BatchRecord()
+        self.last_batch_record = record
+        def group_generator():
+            # The first pass uses the batches we just made (unless we're resuming, in which case
+            # those were the last pass we made), so that it has exactly ``last_num_batches``
+            # batches, and a caller that takes that many (like ``evaluate_generator``) sees every
+            # instance exactly once.
+            groups = grouped_indices
+            regroup = resume_from is not None
+            if resume_from is not None:
+                python_random_state, numpy_random_state = random_state
+                random.setstate(python_random_state)
+                numpy.random.set_state(numpy_random_state)
             while True:
-                if self.sort_every_epoch:
-                    unpadded_dataset = deepcopy(dataset)
-                    groups = self.__create_batches(unpadded_dataset, batch_size)
-                else:
-                    groups = grouped_instances
+                if regroup and self.sort_every_epoch:
+                    groups = self.__create_batches(dataset, instance_padding_lengths, batch_size)
+                regroup = True
+                record.add_pass(groups)
                 for group in groups:
-                    batch = IndexedDataset(group)
-                    batch.pad_instances(self.text_trainer.get_padding_lengths(), verbose=False)
-                    yield batch.as_training_data()
+                    yield dataset.select(group)
+        return self.__convert_groups(group_generator())
+
+    def create_generator_from_groups(self, dataset: IndexedDataset, groups: List[List[int]]):
+        """
+        Returns a generator over the given batches of ``dataset`` (lists of instance indices, like
+        the passes in a :class:`BatchRecord`), in order, repeating them if it's asked for more.  We
+        use this to finish an epoch that was interrupted.
+        """
+        self.last_num_batches = len(groups)
+        return self.__convert_groups(dataset.select(group) for group in itertools.cycle(groups))
+
+    def needs_calibration(self) -> bool:
+        """
+        Returns ``True`` if ``adaptive_memory_usage_constant`` still has to be calibrated, which
+        the ``TextTrainer`` does before making any batches.
+        """
+        return self.adaptive_batch_sizes and self.adaptive_memory_usage_constant == 'calibrate'
+
+    def get_padding_lengths(self, batch: IndexedDataset) -> Dict[str, int]:
+        """
+        Returns the padding lengths that ``batch`` would be padded to, as a batch from this
+        generator.
+        """
+        return _get_batch_padding_lengths(batch, self.text_trainer.get_padding_lengths(), self.padding_buckets)
+
+    def pad_batch(self, batch: IndexedDataset):
+        """
+        Pads ``batch`` the way this generator pads its batches, returning ``(inputs, labels)``.
+        """
+        return _pad_and_convert(batch, self.text_trainer.get_padding_lengths(), self.padding_buckets)
+
+    def create_scoring_batches(self, dataset: IndexedDataset, batch_size: int=None) -> List[List[int]]:
+        """
+        Groups the instances in ``dataset`` into batches (lists of instance indices) the same way
+        we do for training - sorted by padding length, with adaptive or token-budget batch sizes
+        if you've asked for them - but without padding noise or shuffling, so the batches are the
+        same every time.  Pass these to :func:`create_generator_from_groups` to get the padded
+        batches, and use the indices to put the model's outputs back in dataset order, as
+        :func:`~deep_qa.training.TextTrainer.score_dataset` does.
+        """
+        if batch_size is None:
+            batch_size = self.text_trainer.batch_size
+        if self.dynamic_padding or self.__uses_batch_budget():
+            instance_padding_lengths = dataset.get_instance_padding_lengths()
+        else:
+            instance_padding_lengths = None
+        return self.__create_batches(dataset, instance_padding_lengths, batch_size,
+                                     padding_noise=0.0, shuffle=False)
+
+    def create_scoring_generator(self, dataset: IndexedDataset, batch_size: int=None):
+        """
+        Like :func:`create_generator`, but over the batches from :func:`create_scoring_batches`,
+        which are the same every pass, so that ``last_num_batches`` is exactly one pass over the
+        data.  A lazy dataset is batched one chunk at a time, as in :func:`create_generator`.  This
+        is what we use for evaluation.
+        """
+        if batch_size is None:
+            batch_size = self.text_trainer.batch_size
+        if not isinstance(dataset, LazyIndexedDataset):
+            return self.create_generator_from_groups(dataset, self.create_scoring_batches(dataset, batch_size))
+        self.last_batch_record = None
+        self.last_num_batches = self.__count_lazy_batches(dataset, batch_size)
+        def lazy_group_generator():
+            while True:
+                for chunk in dataset.iter_chunks():
+                    for group in self.create_scoring_batches(chunk, batch_size):
+                        yield chunk.select(group)
+        return self.__convert_groups(lazy_group_generator())
+
+    def __convert_groups(self, groups: Iterator[IndexedDataset]):
+        """
+        Turns an (infinite) iterator over batches of instances into a generator over padded
+        ``(inputs, labels)`` batches, prefetching them if we were asked to.
+        """
+        if self.prefetch_batches > 0:
+            return self.__prefetching_generator(groups)
+        def generator():
+            for group in groups:
+                yield _pad_and_convert(group, self.text_trainer.get_padding_lengths(), self.padding_buckets)
         return generator()
 
-    def __create_batches(self, dataset: IndexedDataset, batch_size: int) -> List[List[IndexedInstance]]:
+    def __create_chunk_groups(self, chunk: IndexedDataset, batch_size: int) -> List[IndexedDataset]:
+        if self.dynamic_padding or self.__uses_batch_budget():
+            instance_padding_lengths = chunk.get_instance_padding_lengths()
+        else:
+            instance_padding_lengths = None
+        groups = self.__create_batches(chunk, instance_padding_lengths, batch_size)
+        return [chunk.select(group) for group in groups]
+
+    def __count_lazy_batches(self, dataset: LazyIndexedDataset, batch_size: int) -> int:
+        """
+        Returns the number of batches in one pass over a lazy dataset.  With a fixed batch size we
+        can compute this from the number of instances (which only means reading the text); with
+        adaptive batch sizes we have to index every chunk and group it, once, up front.
+        """
+        if self.__uses_batch_budget():
+            return sum(len(self.create_scoring_batches(chunk, batch_size)) for chunk in dataset.iter_chunks())
+        num_full_chunks, remainder = divmod(len(dataset), dataset.chunk_size)
+        return num_full_chunks * math.ceil(dataset.chunk_size / batch_size) + math.ceil(remainder / batch_size)
+
+    def __prefetching_generator(self, groups: Iterator[IndexedDataset]):
+        """
+        Wraps an (infinite) iterator over batches of instances, submitting the next
+        ``self.prefetch_batches`` groups to a worker pool for padding, and yielding the converted
+        batches in the same order that the groups came in.
+        """
+        if self.prefetch_with_processes:
+            executor = ProcessPoolExecutor(max_workers=self.prefetch_workers)
+        else:
+            executor = ThreadPoolExecutor(max_workers=self.prefetch_workers)
+        logger.info("Prefetching %d batches with %d %s", self.prefetch_batches, self.prefetch_workers,
+                    "processes" if self.prefetch_with_processes else "threads")
+        pending = deque()
+        try:
+            while True:
+                while len(pending) < self.prefetch_batches:
+                    # We get the padding lengths here, on the main thread, so the workers never
+                    # need to touch the ``TextTrainer`` (which isn't picklable).
+                    padding_lengths = self.text_trainer.get_padding_lengths()
+                    pending.append(executor.submit(_pad_and_convert, next(groups), padding_lengths,
+                                                   self.padding_buckets))
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def __uses_batch_budget(self) -> bool:
+        return self.adaptive_batch_sizes or self.token_budget is not None
+
+    def __create_batches(self,
+                         dataset: IndexedDataset,
+                         instance_padding_lengths: List[Dict[str, int]],
+                         batch_size: int,
+                         padding_noise: float=None,
+                         shuffle: bool=True) -> List[List[int]]:
+        """
+        Groups the instances in ``dataset`` into batches, returning a list of batches of instance
+        indices.  ``dataset`` itself is not modified, so we can call this again every epoch.
+        """
+        if padding_noise is None:
+            padding_noise = self.padding_noise
+        instance_order = list(range(len(dataset)))
         if self.dynamic_padding:
-            dataset.sort_by_padding(self.text_trainer.get_instance_sorting_keys(), self.padding_noise)
-        instances = dataset.instances
-        if self.adaptive_batch_sizes:
-            grouped_instances = self.__adaptive_grouping(instances)
+            instance_order = dataset.get_padding_sort_order(self.text_trainer.get_instance_sorting_keys(),
+                                                            padding_noise,
+                                                            instance_padding_lengths)
+        if self.__uses_batch_budget():
+            grouped_instances = self.__budgeted_grouping(dataset, instance_order, instance_padding_lengths)
         else:
-            grouped_instances = group_by_count(instances, batch_size, None)
-            grouped_instances[-1] = [instance for instance in grouped_instances[-1] if instance is not None]
-        if self.biggest_batch_first:
+            grouped_instances = group_by_count(instance_order, batch_size, None)
+            grouped_instances[-1] = [index for index in grouped_instances[-1] if index is not None]
+        if not shuffle:
+            return grouped_instances
+        if self.biggest_batch_first and len(grouped_instances) > 1:
             # We'll actually pop the last _two_ batches, because the last one might not
             # be full.
             last_batch = grouped_instances.pop()
@@ -148,28 +402,117 @@ class DataGenerator:
             random.shuffle(grouped_instances)
         return grouped_instances
 
-    def __adaptive_grouping(self, instances: List[IndexedInstance]):
+    def __budgeted_grouping(self,
+                            dataset: IndexedDataset,
+                            instance_order: List[int],
+                            instance_padding_lengths: List[Dict[str, int]]) -> List[List[int]]:
+        """
+        Cuts the sorted instances into batches whose cost stays within our budget: either
+        ``adaptive_memory_usage_constant``, with costs from
+        :func:`~deep_qa.training.TextTrainer.get_padding_memory_scaling`, or ``token_budget``,
+        counting tokens in the sorting keys.  See :mod:`~deep_qa.data.batching`.
+        """
+        if not instance_order:
+            return [[]]
+        logger.debug("Creating adaptive groups")
+        if self.needs_calibration():
+            raise ConfigurationError("adaptive_memory_usage_constant has not been calibrated yet; "
+                                     "train the model once to calibrate it")
+        if self.adaptive_batch_sizes:
+            cost_function = self.text_trainer.get_padding_memory_scaling
+            budget = self.adaptive_memory_usage_constant
+        else:
+            sorting_keys = self.text_trainer.get_instance_sorting_keys()
+            def cost_function(lengths):
+                return sum(lengths[key] for key in sorting_keys)
+            budget = self.token_budget
+        lengths = self.__get_batched_lengths(instance_order, instance_padding_lengths)
+        batch_sizes = cut_batches(lengths, cost_function, budget, self.maximum_batch_size)
         batches = []
-        current_batch = []
-        current_lengths = {}
-        logger.debug("Creating adatpive groups")
-        for instance in instances:
-            current_batch.append(instance)
-            instance_lengths = instance.get_padding_lengths()
-            for key in instance_lengths:
-                current_lengths[key] = max(instance_lengths[key], current_lengths.get(key, -1))
-            big_o_memory_constant = self.text_trainer.get_padding_memory_scaling(current_lengths)
-            if (len(current_batch) * big_o_memory_constant > self.adaptive_memory_usage_constant
-                        or len(current_batch) > self.maximum_batch_size):
-                current_batch.pop()
-                if logger.getEffectiveLevel() <= logging.DEBUG:
-                    padding_lengths = IndexedDataset(current_batch).padding_lengths()
-                    logger.debug("Batch size: %d; padding: %s", len(current_batch), padding_lengths)
-                batches.append(current_batch)
-                current_batch = [instance]
-                current_lengths = instance_lengths
+        start = 0
+        for batch_size in batch_sizes:
+            batches.append(instance_order[start:start + batch_size])
+            start += batch_size
         if logger.getEffectiveLevel() <= logging.DEBUG:
-            padding_lengths = IndexedDataset(current_batch).padding_lengths()
-            logger.debug("Batch size: %d; padding: %s", len(current_batch), padding_lengths)
-        batches.append(current_batch)
+            for batch in batches:
+                padding_lengths = dataset.select(batch).padding_lengths()
+                logger.debug("Batch size: %d; padding: %s", len(batch), padding_lengths)
         return batches
+
+    def __get_batched_lengths(self,
+                              instance_order: List[int],
+                              instance_padding_lengths: List[Dict[str, int]]) -> Dict[str, numpy.ndarray]:
+        """
+        Returns one array per padding key with the length that each instance (in
+        ``instance_order``) will actually be padded to on its own: the model's padding length for
+        that key, if it sets one, or else the instance's length, rounded up to our
+        ``padding_buckets``.
+        """
+        model_padding_lengths = self.text_trainer.get_padding_lengths()
+        lengths = {}
+        for key in instance_padding_lengths[instance_order[0]]:
+            if model_padding_lengths.get(key) is not None:
+                lengths[key] = numpy.full(len(instance_order), model_padding_lengths[key], dtype='int64')
+            else:
+                key_lengths = [instance_padding_lengths[index].get(key, 0) for index in instance_order]
+                lengths[key] = bucket_lengths(key_lengths, self.padding_buckets)
+        return lengths
+
+
+class BatchRecord:
+    """
+    Remembers the batches (as lists of instance indices) that a generator made for its last few
+    passes over a dataset, along with the random state (python's and numpy's, as the padding noise
+    can come from either) right after making each pass.  That's
+    enough to reproduce the rest of a pass, and every pass after it.  Passes are added by the
+    generator, which Keras runs on a separate thread, so we use a lock.
+    """
+    def __init__(self, num_passes_to_keep: int=3):
+        self.num_passes = 0
+        self.passes = deque(maxlen=num_passes_to_keep)
+        self.lock = threading.Lock()
+
+    def add_pass(self, groups: List[List[int]]):
+        with self.lock:
+            random_state = (random.getstate(), numpy.random.get_state())
+            self.passes.append((self.num_passes, groups, random_state))
+            self.num_passes += 1
+
+    def get_pass(self, pass_index: int) -> Tuple[List[List[int]], Any]:
+        """
+        Returns the batches of the given pass (counting from zero), and the random state right after
+        they were made.
+        """
+        with self.lock:
+            for index, groups, random_state in self.passes:
+                if index == pass_index:
+                    return groups, random_state
+        raise ValueError("Pass %d over the data is not in the record" % pass_index)
+
+
+def _pad_and_convert(batch: IndexedDataset,
+                     padding_lengths: Dict[str, int],
+                     padding_buckets: Union[str, List[int]]=None):
+    """
+    Pads a single batch of instances and converts it into ``(inputs, labels)`` arrays, without
+    modifying the instances.  If ``padding_buckets`` is given, the lengths that the model leaves to
+    the data are rounded up to a bucket boundary.  This is a module-level function so that it can
+    be sent to a process pool when prefetching batches.
+    """
+    if padding_buckets is not None:
+        padding_lengths = _get_batch_padding_lengths(batch, padding_lengths, padding_buckets)
+    return batch.as_padded_training_data(padding_lengths)
+
+
+def _get_batch_padding_lengths(batch: IndexedDataset,
+                               padding_lengths: Dict[str, int],
+                               padding_buckets: Union[str, List[int]]=None) -> Dict[str, int]:
+    """
+    Fills in the padding lengths that the model leaves as ``None`` with the batch's maximum
+    lengths, rounded up to ``padding_buckets`` if given.
+    """
+    lengths_to_use = dict(padding_lengths)
+    for key, length in batch.padding_lengths().items():
+        if lengths_to_use.get(key) is None:
+            lengths_to_use[key] = int(bucket_lengths([length], padding_buckets)[0])
+    return lengths_to_use
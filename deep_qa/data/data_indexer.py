@@ -1,7 +1,10 @@
 from collections import defaultdict
 import codecs
+import json
 import logging
+from typing import List
 
+import numpy
 import tqdm
 
 logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
@@ -19,32 +22,50 @@ class DataIndexer:
     for 'a' as a word, and 'a' as a character, for instance.  Most of the methods on this class
     allow you to pass in a namespace; by default we use the 'words' namespace, and you can omit the
     namespace argument everywhere and just use the default.
+
+    For each namespace we keep a single ``dict`` from words to indices (``word_indices``), and a
+    ``list`` of words, where the word at position ``i`` has index ``i`` (``reverse_word_indices``).
+    Use :func:`get_word_indices` to look up a whole sequence of tokens at once, and :func:`save` and
+    :func:`load` to write a ``DataIndexer`` to disk and read it back.
     """
+    # Bump this if the format written by ``save`` changes.
+    SERIALIZATION_VERSION = 1
+
     def __init__(self):
         # Typically all input words to this code are lower-cased, so we could simply use "PADDING"
         # for this.  But doing it this way, with special characters, future-proofs the code in case
         # it is used later in a setting where not all input is lowercase.
         self._padding_token = "@@PADDING@@"
         self._oov_token = "@@UNKOWN@@"
-        self.word_indices = defaultdict(lambda: {self._padding_token: 0, self._oov_token: 1})
-        self.reverse_word_indices = defaultdict(lambda: {0: self._padding_token, 1: self._oov_token})
+        self.word_indices = {}
+        self.reverse_word_indices = {}
         self._finalized = False
 
+    def _get_namespace(self, namespace: str):
+        """
+        Returns the ``(word_indices, reverse_word_indices)`` pair for ``namespace``, creating the
+        namespace (with just the padding and OOV tokens) if we haven't seen it before.
+        """
+        if namespace not in self.word_indices:
+            self.word_indices[namespace] = {self._padding_token: 0, self._oov_token: 1}
+            self.reverse_word_indices[namespace] = [self._padding_token, self._oov_token]
+        return self.word_indices[namespace], self.reverse_word_indices[namespace]
+
     def set_from_file(self, filename: str, oov_token: str="@@UNKNOWN@@", namespace: str="words"):
         self._oov_token = oov_token
         self.word_indices[namespace] = {self._padding_token: 0}
-        self.reverse_word_indices[namespace] = {0: self._padding_token}
+        self.reverse_word_indices[namespace] = [self._padding_token]
         with codecs.open(filename, 'r', 'utf-8') as input_file:
             for i, line in enumerate(input_file.readlines()):
                 token = line[:-1]  # remove the newline
                 self.word_indices[namespace][token] = i + 1
-                self.reverse_word_indices[namespace][i + 1] = token
+                self.reverse_word_indices[namespace].append(token)
 
     def finalize(self):
         logger.info("Finalizing data indexer")
         self._finalized = True
 
-    def fit_word_dictionary(self, dataset, min_count: int=1):
+    def fit_word_dictionary(self, dataset, min_count: int=1, num_workers: int=1):
         """
         Given a ``Dataset``, this method decides which words are given an index, and which ones are
         mapped to an OOV token (in this case "UNK").  This method must be called before any dataset
@@ -62,6 +83,11 @@ class DataIndexer:
         min_count: int, optional (default=1)
             The minimum number of occurences a word must have in the dataset
             in order to be assigned an index.
+
+        num_workers: int, optional (default=1)
+            If greater than one, we tokenize the instances and count words in this many processes
+            (see :mod:`deep_qa.data.parallel_indexing`).  The resulting indices are identical to
+            the ones we get with a single process.
         """
         logger.info("Fitting word dictionary with min count of %d, finalized is %s",
                     min_count, self._finalized)
@@ -69,12 +95,20 @@ class DataIndexer:
             logger.warning("Trying to fit a finalized DataIndexer.  This is a no-op.  Did you "
                            "really want to do this?")
             return
-        namespace_word_counts = defaultdict(lambda: defaultdict(int))
-        for instance in tqdm.tqdm(dataset.instances):
-            namespace_dict = instance.words()
-            for namespace in namespace_dict:
-                for word in namespace_dict[namespace]:
-                    namespace_word_counts[namespace][word] += 1
+        if num_workers > 1:
+            # This import is here to avoid a circular import; instances import this module.
+            from .parallel_indexing import count_words_in_parallel
+            logger.info("Counting words with %d processes", num_workers)
+            namespace_word_counts = count_words_in_parallel(dataset, num_workers)
+        else:
+            namespace_word_counts = defaultdict(lambda: defaultdict(int))
+            # We iterate over the dataset instead of using ``dataset.instances``, so that lazy
+            # datasets are read one instance at a time.
+            for instance in tqdm.tqdm(dataset):
+                namespace_dict = instance.words()
+                for namespace in namespace_dict:
+                    for word in namespace_dict[namespace]:
+                        namespace_word_counts[namespace][word] += 1
         for namespace in tqdm.tqdm(namespace_word_counts):
             for word, count in namespace_word_counts[namespace].items():
                 if count >= min_count:
@@ -85,29 +119,90 @@ class DataIndexer:
         Adds `word` to the index, if it is not already present.  Either way, we return the index of
         the word.
         """
+        word_indices, reverse_word_indices = self._get_namespace(namespace)
         if self._finalized:
             logger.warning("Trying to add a word to a finalized DataIndexer.  This is a no-op.  "
                            "Did you really want to do this?")
-            return self.word_indices[namespace].get(word, -1)
-        if word not in self.word_indices[namespace]:
-            index = len(self.word_indices[namespace])
-            self.word_indices[namespace][word] = index
-            self.reverse_word_indices[namespace][index] = word
-            return index
-        else:
-            return self.word_indices[namespace][word]
+            return word_indices.get(word, -1)
+        index = word_indices.get(word)
+        if index is None:
+            index = len(reverse_word_indices)
+            word_indices[word] = index
+            reverse_word_indices.append(word)
+        return index
 
     def words_in_index(self, namespace: str='words'):
-        return self.word_indices[namespace].keys()
+        return self._get_namespace(namespace)[0].keys()
 
     def get_word_index(self, word: str, namespace: str='words'):
-        if word in self.word_indices[namespace]:
-            return self.word_indices[namespace][word]
-        else:
-            return self.word_indices[namespace][self._oov_token]
+        word_indices = self._get_namespace(namespace)[0]
+        index = word_indices.get(word)
+        if index is None:
+            return word_indices[self._oov_token]
+        return index
+
+    def get_word_indices(self, words: List[str], namespace: str='words') -> numpy.ndarray:
+        """
+        Returns the indices of all of ``words`` as an int32 array, mapping unknown words to the OOV
+        index.  This is equivalent to calling :func:`get_word_index` on each word, but much faster
+        for long sequences.
+        """
+        word_indices = self._get_namespace(namespace)[0]
+        oov_index = word_indices.get(self._oov_token)
+        if oov_index is None:
+            # We only look up the OOV index when we need it, as with ``get_word_index``.
+            return numpy.asarray([self.get_word_index(word, namespace) for word in words], dtype='int32')
+        get_index = word_indices.get
+        return numpy.fromiter((get_index(word, oov_index) for word in words), dtype='int32', count=len(words))
 
     def get_word_from_index(self, index: int, namespace: str='words'):
-        return self.reverse_word_indices[namespace][index]
+        return self._get_namespace(namespace)[1][index]
 
     def get_vocab_size(self, namespace: str='words'):
-        return len(self.word_indices[namespace])
+        return len(self._get_namespace(namespace)[1])
+
+    def save(self, filename: str):
+        """
+        Writes this ``DataIndexer`` to ``filename`` as JSON, storing just the list of words in each
+        namespace.  Unlike a pickle, this doesn't depend on the class's attributes or on the python
+        version, and reading it back with :func:`load` is fast.
+        """
+        serialized = {
+                'version': self.SERIALIZATION_VERSION,
+                'padding_token': self._padding_token,
+                'oov_token': self._oov_token,
+                'finalized': self._finalized,
+                'namespaces': self.reverse_word_indices,
+                }
+        with open(filename, 'w', encoding='utf-8') as output_file:
+            json.dump(serialized, output_file, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, filename: str) -> 'DataIndexer':
+        """
+        Reads a ``DataIndexer`` written by :func:`save`.
+        """
+        with open(filename, 'r', encoding='utf-8') as input_file:
+            serialized = json.load(input_file)
+        if serialized['version'] != cls.SERIALIZATION_VERSION:
+            raise ValueError("Can't read DataIndexer format version %s from %s"
+                             % (serialized['version'], filename))
+        data_indexer = cls()
+        data_indexer._padding_token = serialized['padding_token']  # pylint: disable=protected-access
+        data_indexer._oov_token = serialized['oov_token']  # pylint: disable=protected-access
+        data_indexer._finalized = serialized['finalized']  # pylint: disable=protected-access
+        for namespace, words in serialized['namespaces'].items():
+            data_indexer.reverse_word_indices[namespace] = words
+            data_indexer.word_indices[namespace] = {word: index for index, word in enumerate(words)}
+        return data_indexer
+
+    def __setstate__(self, state):
+        # DataIndexers pickled by older versions of this code used defaultdicts, and stored the
+        # reverse indices as dicts from index to word.  We convert those to the current format.
+        reverse_word_indices = state['reverse_word_indices']
+        if isinstance(reverse_word_indices, defaultdict) or \
+                any(isinstance(words, dict) for words in reverse_word_indices.values()):
+            state['word_indices'] = dict(state['word_indices'])
+            state['reverse_word_indices'] = {namespace: [words[index] for index in range(len(words))]
+                                             for namespace, words in reverse_word_indices.items()}
+        self.__dict__.update(state)
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+from typing import Any, List
+
+from .data_indexer import DataIndexer
+from .datasets.dataset import IndexedDataset
+from .datasets.columnar_dataset import ColumnarIndexedDataset
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+class DatasetCache:
+    """
+    A persistent, on-disk cache of indexed datasets (and of the ``DataIndexers`` fit on them), so
+    that repeated training and evaluation runs on the same data don't have to re-read, re-tokenize
+    and re-index it every time.
+
+    Everything in the cache is stored under a key computed by :func:`get_key`, which hashes the
+    `contents` of the data files together with anything else that affects the result (tokenizer
+    parameters, dataset parameters, a fingerprint of the ``DataIndexer``, ...).  If any of those
+    change, the key changes, and the stale entry is simply never read again, so invalidation is
+    automatic.  Entries are written to a temporary directory and then renamed into place, so an
+    interrupted run never leaves a half-written entry behind.
+
+    Indexed datasets whose instance type supports it are stored as a
+    :class:`~deep_qa.data.datasets.columnar_dataset.ColumnarIndexedDataset` (flat ``.npy`` arrays,
+    memory-mapped on load); other datasets are pickled.
+
+    Parameters
+    ----------
+    cache_directory: str
+        The directory to keep cache entries in.  It is created if it doesn't exist, and can be
+        shared between runs (and between models) that use the same data.
+    """
+    # Bump this if the format of what we store changes, to invalidate old entries.
+    CACHE_VERSION = 2
+
+    def __init__(self, cache_directory: str):
+        self.cache_directory = cache_directory
+        os.makedirs(cache_directory, exist_ok=True)
+        self._file_hashes_path = os.path.join(cache_directory, "file_hashes.json")
+
+    def get_key(self, files: List[str], **components: Any) -> str:
+        """
+        Returns a cache key for data read from ``files``, which depends on the contents of each
+        file, and on every keyword argument given here (which must be JSON-serializable, after
+        converting unknown objects with ``str``).
+        """
+        key_components = {
+                'version': self.CACHE_VERSION,
+                'files': [self.hash_file(filename) for filename in files],
+                'components': components,
+                }
+        serialized = json.dumps(key_components, sort_keys=True, default=str)
+        return hashlib.sha1(serialized.encode('utf-8')).hexdigest()
+
+    def hash_file(self, filename: str) -> str:
+        """
+        Returns a SHA-1 hash of the contents of ``filename``.  Hashing a large file still means
+        reading it, so we remember each file's hash along with its size and modification time,
+        and only re-hash the file when one of those changes.
+        """
+        stat = os.stat(filename)
+        file_hashes = self._read_file_hashes()
+        path = os.path.abspath(filename)
+        cached = file_hashes.get(path)
+        if cached is not None and cached['size'] == stat.st_size and cached['mtime'] == stat.st_mtime:
+            return cached['sha1']
+        sha1 = hashlib.sha1()
+        with open(filename, 'rb') as data_file:
+            for chunk in iter(lambda: data_file.read(1 << 20), b''):
+                sha1.update(chunk)
+        file_hashes[path] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha1': sha1.hexdigest()}
+        self._write_atomically(self._file_hashes_path, json.dumps(file_hashes).encode('utf-8'))
+        return sha1.hexdigest()
+
+    def load_indexed_dataset(self, key: str, columnar: bool=False) -> IndexedDataset:
+        """
+        Returns the indexed dataset stored under ``key``, or ``None`` if there isn't one.  If
+        ``columnar`` is ``False``, we return a regular ``IndexedDataset``, even if the data was
+        stored in columnar form.
+        """
+        entry_directory = self._entry_directory("dataset", key)
+        if not os.path.exists(entry_directory):
+            return None
+        logger.info("Loading cached indexed dataset from %s", entry_directory)
+        pickled_instances = os.path.join(entry_directory, "instances.pkl")
+        if os.path.exists(pickled_instances):
+            with open(pickled_instances, "rb") as instances_file:
+                return IndexedDataset(pickle.load(instances_file))
+        dataset = ColumnarIndexedDataset.load(entry_directory)
+        if columnar:
+            return dataset
+        return IndexedDataset(dataset.instances)
+
+    def save_indexed_dataset(self, key: str, dataset: IndexedDataset):
+        entry_directory = self._entry_directory("dataset", key)
+        if os.path.exists(entry_directory):
+            return
+        logger.info("Caching indexed dataset in %s", entry_directory)
+        temp_directory = tempfile.mkdtemp(dir=self.cache_directory)
+        if isinstance(dataset, ColumnarIndexedDataset):
+            dataset.save(temp_directory)
+        elif dataset.instances and type(dataset.instances[0]).columnar_fields is not None:
+            ColumnarIndexedDataset.from_instances(dataset.instances).save(temp_directory)
+        else:
+            with open(os.path.join(temp_directory, "instances.pkl"), "wb") as instances_file:
+                pickle.dump(dataset.instances, instances_file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._move_into_place(temp_directory, entry_directory)
+
+    def load_data_indexer(self, key: str) -> DataIndexer:
+        """
+        Returns the ``DataIndexer`` stored under ``key``, or ``None`` if there isn't one.
+        """
+        entry_directory = self._entry_directory("data_indexer", key)
+        if not os.path.exists(entry_directory):
+            return None
+        logger.info("Loading cached data indexer from %s", entry_directory)
+        return DataIndexer.load(os.path.join(entry_directory, "data_indexer.json"))
+
+    def save_data_indexer(self, key: str, data_indexer: DataIndexer):
+        entry_directory = self._entry_directory("data_indexer", key)
+        if os.path.exists(entry_directory):
+            return
+        temp_directory = tempfile.mkdtemp(dir=self.cache_directory)
+        data_indexer.save(os.path.join(temp_directory, "data_indexer.json"))
+        self._move_into_place(temp_directory, entry_directory)
+
+    @staticmethod
+    def data_indexer_fingerprint(data_indexer: DataIndexer) -> str:
+        """
+        Returns a hash of the vocabulary in ``data_indexer``, so that indexed datasets are keyed
+        on the exact mapping from words to indices that produced them.
+        """
+        sha1 = hashlib.sha1()
+        for namespace in sorted(data_indexer.word_indices.keys()):
+            sha1.update(namespace.encode('utf-8'))
+            for word in data_indexer.reverse_word_indices[namespace]:
+                sha1.update(b'\0' + word.encode('utf-8'))
+        sha1.update(data_indexer._oov_token.encode('utf-8'))  # pylint: disable=protected-access
+        return sha1.hexdigest()
+
+    def _entry_directory(self, kind: str, key: str) -> str:
+        return os.path.join(self.cache_directory, "%s_%s" % (kind, key))
+
+    def _read_file_hashes(self):
+        if not os.path.exists(self._file_hashes_path):
+            return {}
+        with open(self._file_hashes_path) as hashes_file:
+            return json.load(hashes_file)
+
+    def _write_atomically(self, path: str, contents: bytes):
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.cache_directory)
+        with os.fdopen(file_descriptor, 'wb') as temp_file:
+            temp_file.write(contents)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def _move_into_place(temp_directory: str, entry_directory: str):
+        try:
+            os.rename(temp_directory, entry_directory)
+        except OSError:
+            # Another process wrote the same entry first; theirs is just as good as ours.
+            shutil.rmtree(temp_directory, ignore_errors=True)
@@ -3,6 +3,7 @@ from collections import OrderedDict
 from .entailment.snli_dataset import SnliDataset
 from .language_modeling.language_modeling_dataset import LanguageModelingDataset
 from .dataset import Dataset, TextDataset, IndexedDataset
+from .lazy_dataset import LazyTextDataset, LazyIndexedDataset
 
 
 concrete_datasets = OrderedDict()  # pylint: disable=invalid-name
@@ -0,0 +1,377 @@
+import logging
+import json
+import os
+import pickle
+from array import array
+from copy import copy
+from typing import Dict, Iterable, List
+
+import numpy
+from overrides import overrides
+
+from ...common.checks import ConfigurationError
+from ..instances.instance import IndexedInstance
+from ..padding import lengths_to_offsets, pad_ragged_word_indices, ragged_ranges
+from .dataset import IndexedDataset
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+class RaggedIndices:
+    """
+    The word indices for one field (e.g., ``passage_indices``) of every instance in a
+    :class:`ColumnarIndexedDataset`, stored the way a CSR matrix stores its rows: one flat
+    ``int32`` array with all of the values, and an ``offsets`` array saying where each instance's
+    values start and end.
+
+    If the field was indexed with a tokenizer that includes characters, each word is itself a list
+    (``[word_index] + character_indices``), and we add a second level of offsets: ``offsets`` then
+    points into ``word_offsets``, which in turn points into ``values``.
+
+    Parameters
+    ----------
+    values: numpy.ndarray
+        A flat ``int32`` array with all word indices (or, with characters, all word and character
+        indices) for this field, concatenated across instances.
+    offsets: numpy.ndarray
+        An array of length ``num_instances + 1``; instance ``i`` has words ``offsets[i]`` through
+        ``offsets[i + 1]``.
+    word_offsets: numpy.ndarray, optional (default=None)
+        If given, an array of length ``num_words + 1``; word ``j`` is
+        ``values[word_offsets[j]:word_offsets[j + 1]]``.
+    """
+    def __init__(self, values: numpy.ndarray, offsets: numpy.ndarray, word_offsets: numpy.ndarray=None):
+        self.values = values
+        self.offsets = offsets
+        self.word_offsets = word_offsets
+
+    @property
+    def has_characters(self) -> bool:
+        return self.word_offsets is not None
+
+    def num_words(self) -> numpy.ndarray:
+        """
+        Returns the number of words in each instance.
+        """
+        return numpy.diff(self.offsets)
+
+    def max_word_length(self) -> numpy.ndarray:
+        """
+        Returns the length (in word and character indices) of the longest word in each instance,
+        or zero for instances with no words.  Only valid if :func:`has_characters` is ``True``.
+        """
+        num_words = self.num_words()
+        max_lengths = numpy.zeros(len(num_words), dtype='int64')
+        non_empty = num_words > 0
+        if numpy.any(non_empty):
+            word_lengths = numpy.diff(self.word_offsets)
+            max_lengths[non_empty] = numpy.maximum.reduceat(word_lengths, self.offsets[:-1][non_empty])
+        return max_lengths
+
+    def select(self, indices: numpy.ndarray) -> 'RaggedIndices':
+        """
+        Returns a new ``RaggedIndices`` with only the instances in ``indices``, in that order.
+        """
+        word_starts = self.offsets[indices]
+        num_words = self.offsets[indices + 1] - word_starts
+        new_offsets = lengths_to_offsets(num_words)
+        word_ids = ragged_ranges(word_starts, num_words)
+        if not self.has_characters:
+            return RaggedIndices(self.values[word_ids], new_offsets)
+        value_starts = self.word_offsets[word_ids]
+        word_lengths = self.word_offsets[word_ids + 1] - value_starts
+        new_values = self.values[ragged_ranges(value_starts, word_lengths)]
+        return RaggedIndices(new_values, new_offsets, lengths_to_offsets(word_lengths))
+
+    def pad(self,
+            indices: numpy.ndarray,
+            num_words: int,
+            num_word_characters: int=None,
+            truncate_from_right: bool=True) -> numpy.ndarray:
+        """
+        Builds a zero-padded ``int32`` array for the instances in ``indices``, of shape
+        ``(len(indices), num_words)``, or ``(len(indices), num_words, num_word_characters)`` if we
+        have characters.  This gives the same result as calling
+        :func:`IndexedInstance.pad_word_sequence` on each instance; see
+        :func:`~deep_qa.data.padding.pad_ragged_word_indices`.
+        """
+        return pad_ragged_word_indices(self.values, self.offsets, self.word_offsets, indices,
+                                       num_words, num_word_characters, truncate_from_right)
+
+    def to_lists(self, index: int) -> List:
+        """
+        Returns the indices for a single instance as (possibly nested) Python lists, in the format
+        that the ``Tokenizer`` originally produced them.
+        """
+        word_start, word_end = self.offsets[index], self.offsets[index + 1]
+        if not self.has_characters:
+            return self.values[word_start:word_end].tolist()
+        return [self.values[self.word_offsets[j]:self.word_offsets[j + 1]].tolist()
+                for j in range(word_start, word_end)]
+
+
+class ColumnarIndexedDataset(IndexedDataset):
+    """
+    An :class:`IndexedDataset` that stores its word indices column-wise in flat NumPy arrays (see
+    :class:`RaggedIndices`), instead of as a list of ``IndexedInstances`` holding nested Python
+    lists of ints.  For large datasets this takes a small fraction of the memory, and the
+    operations that the ``DataGenerator`` and :func:`TextTrainer.create_data_arrays` need
+    (computing padding lengths, sorting by padding, and building padded batches) are done with
+    NumPy operations over the offsets, instead of with Python calls on every instance.
+
+    Only instance classes that declare their word-index attributes in
+    :attr:`IndexedInstance.columnar_fields` can be stored this way.  Everything about an instance
+    other than those attributes (the label, the instance index, etc.) is kept on a "skeleton" copy
+    of the instance.  To get training data out, we fill a copy of the skeleton with padded rows
+    and call its ``as_training_data()``, so the arrays you get are exactly what an
+    ``IndexedDataset`` would give you.
+
+    The ``instances`` property still works, rebuilding the full ``IndexedInstances`` on each
+    access, but it is slow and uses a lot of memory; avoid it for large datasets.
+    """
+    def __init__(self,
+                 instance_class,
+                 fields: Dict[str, RaggedIndices],
+                 skeletons: List[IndexedInstance]):
+        # pylint: disable=super-init-not-called
+        self.instance_class = instance_class
+        self.fields = fields
+        self.skeletons = skeletons
+
+    @classmethod
+    def from_instances(cls, instances: Iterable[IndexedInstance]) -> 'ColumnarIndexedDataset':
+        """
+        Builds a ``ColumnarIndexedDataset`` from an iterable of ``IndexedInstances``.  The
+        instances are consumed one at a time, so passing a generator means the whole dataset never
+        has to exist as Python lists at once.
+        """
+        instance_class = None
+        columnar_fields = None
+        # For each field, we collect the values, the number of words per instance, and (with
+        # characters) the length of each word, in compact ``array`` buffers.
+        values = {}
+        num_words = {}
+        word_lengths = {}
+        skeletons = []
+        for instance in instances:
+            if instance_class is None:
+                instance_class = type(instance)
+                columnar_fields = instance_class.columnar_fields
+                if columnar_fields is None:
+                    raise ConfigurationError("%s does not support columnar storage; see "
+                                             "IndexedInstance.columnar_fields" % instance_class.__name__)
+                for field in columnar_fields:
+                    values[field] = array('i')
+                    num_words[field] = array('l')
+                    word_lengths[field] = array('l')
+            elif type(instance) is not instance_class:  # pylint: disable=unidiomatic-typecheck
+                raise ConfigurationError("All instances in a ColumnarIndexedDataset must have the same "
+                                         "type; got %s and %s" % (instance_class.__name__,
+                                                                  type(instance).__name__))
+            skeleton = copy(instance)
+            for field in columnar_fields:
+                word_indices = getattr(instance, field)
+                num_words[field].append(len(word_indices))
+                for word in word_indices:
+                    if isinstance(word, list):
+                        values[field].extend(word)
+                        word_lengths[field].append(len(word))
+                    else:
+                        values[field].append(word)
+                setattr(skeleton, field, None)
+            skeletons.append(skeleton)
+        if instance_class is None:
+            raise ConfigurationError("Cannot build a ColumnarIndexedDataset with no instances")
+        fields = {}
+        for field in columnar_fields:
+            field_word_lengths = numpy.frombuffer(word_lengths[field], dtype=word_lengths[field].typecode)
+            field_num_words = numpy.frombuffer(num_words[field], dtype=num_words[field].typecode)
+            field_values = numpy.frombuffer(values[field], dtype=values[field].typecode).astype('int32')
+            if len(field_word_lengths) > 0:
+                if len(field_word_lengths) != numpy.sum(field_num_words):
+                    raise ConfigurationError("Field %s mixes words with and without characters" % field)
+                word_offsets = lengths_to_offsets(field_word_lengths)
+            else:
+                word_offsets = None
+            fields[field] = RaggedIndices(field_values, lengths_to_offsets(field_num_words), word_offsets)
+        return cls(instance_class, fields, skeletons)
+
+    def save(self, directory: str):
+        """
+        Writes this dataset to ``directory`` (which must not already contain a saved dataset): one
+        ``.npy`` file per array in each field, plus a pickle of the instance skeletons.  Use
+        :func:`load` to read it back.
+        """
+        os.makedirs(directory, exist_ok=True)
+        metadata = {'fields': {}}
+        for field_name, field in self.fields.items():
+            numpy.save(os.path.join(directory, field_name + ".values.npy"), field.values)
+            numpy.save(os.path.join(directory, field_name + ".offsets.npy"), field.offsets)
+            if field.has_characters:
+                numpy.save(os.path.join(directory, field_name + ".word_offsets.npy"), field.word_offsets)
+            metadata['fields'][field_name] = {'has_characters': field.has_characters}
+        with open(os.path.join(directory, "skeletons.pkl"), "wb") as skeletons_file:
+            pickle.dump((self.instance_class, self.skeletons), skeletons_file, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(os.path.join(directory, "metadata.json"), "w") as metadata_file:
+            json.dump(metadata, metadata_file)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool=True) -> 'ColumnarIndexedDataset':
+        """
+        Reads a dataset written by :func:`save`.  If ``mmap`` is ``True`` (the default), the
+        arrays are memory-mapped instead of read into memory, so loading is nearly instant, and
+        only the parts of the data that are actually used get paged in.
+        """
+        mmap_mode = 'r' if mmap else None
+        with open(os.path.join(directory, "metadata.json")) as metadata_file:
+            metadata = json.load(metadata_file)
+        with open(os.path.join(directory, "skeletons.pkl"), "rb") as skeletons_file:
+            instance_class, skeletons = pickle.load(skeletons_file)
+        fields = {}
+        for field_name, field_metadata in metadata['fields'].items():
+            values = numpy.load(os.path.join(directory, field_name + ".values.npy"), mmap_mode=mmap_mode)
+            offsets = numpy.load(os.path.join(directory, field_name + ".offsets.npy"), mmap_mode=mmap_mode)
+            word_offsets = None
+            if field_metadata['has_characters']:
+                word_offsets = numpy.load(os.path.join(directory, field_name + ".word_offsets.npy"),
+                                          mmap_mode=mmap_mode)
+            fields[field_name] = RaggedIndices(values, offsets, word_offsets)
+        return cls(instance_class, fields, skeletons)
+
+    @property
+    def instances(self) -> List[IndexedInstance]:
+        return [self._get_instance(i) for i in range(len(self))]
+
+    @instances.setter
+    def instances(self, instances: List[IndexedInstance]):
+        other = self.from_instances(instances)
+        self.instance_class = other.instance_class
+        self.fields = other.fields
+        self.skeletons = other.skeletons
+
+    def __len__(self):
+        return len(self.skeletons)
+
+    @property
+    def has_characters(self) -> bool:
+        return any(field.has_characters for field in self.fields.values())
+
+    def _get_instance(self, index: int) -> IndexedInstance:
+        instance = copy(self.skeletons[index])
+        for field_name, field in self.fields.items():
+            setattr(instance, field_name, field.to_lists(index))
+        return instance
+
+    @overrides
+    def merge(self, other: IndexedDataset) -> 'ColumnarIndexedDataset':
+        if type(self) is not type(other):  # pylint: disable=unidiomatic-typecheck
+            raise RuntimeError("Cannot merge datasets with different types")
+        return self.from_instances(self.instances + other.instances)
+
+    @overrides
+    def truncate(self, max_instances: int):
+        if len(self) <= max_instances:
+            return self
+        return self.select(list(range(max_instances)))
+
+    @overrides
+    def select(self, indices: List[int]) -> 'ColumnarIndexedDataset':
+        indices = numpy.asarray(indices, dtype='int64')
+        fields = {name: field.select(indices) for name, field in self.fields.items()}
+        return ColumnarIndexedDataset(self.instance_class, fields, [self.skeletons[i] for i in indices])
+
+    def _get_length_arrays(self) -> Dict[str, numpy.ndarray]:
+        """
+        Returns a dictionary from padding key to an array with that padding length for every
+        instance, matching what each instance's ``get_padding_lengths()`` would return.
+        """
+        lengths = {}
+        for field_name, (padding_key, _) in self.instance_class.columnar_fields.items():
+            field = self.fields[field_name]
+            num_words = field.num_words()
+            lengths[padding_key] = numpy.maximum(lengths[padding_key], num_words) \
+                    if padding_key in lengths else num_words
+            if field.has_characters:
+                max_word_length = field.max_word_length()
+                lengths['num_word_characters'] = numpy.maximum(lengths['num_word_characters'], max_word_length) \
+                        if 'num_word_characters' in lengths else max_word_length
+        return lengths
+
+    @overrides
+    def get_instance_padding_lengths(self) -> List[Dict[str, int]]:
+        lengths = self._get_length_arrays()
+        keys = list(lengths.keys())
+        return [dict(zip(keys, values)) for values in zip(*[lengths[key].tolist() for key in keys])]
+
+    @overrides
+    def sort_by_padding(self, sorting_keys: List[str], padding_noise: float=0.0):
+        sorted_dataset = self.select(self.get_padding_sort_order(sorting_keys, padding_noise))
+        self.fields = sorted_dataset.fields
+        self.skeletons = sorted_dataset.skeletons
+
+    @overrides
+    def get_padding_sort_order(self,
+                               sorting_keys: List[str],
+                               padding_noise: float=0.0,
+                               instance_padding_lengths: List[Dict[str, int]]=None) -> List[int]:
+        """
+        We compute the sort order from our offset arrays, so ``instance_padding_lengths`` is
+        ignored here.
+        """
+        # pylint: disable=unused-argument
+        lengths = self._get_length_arrays()
+        sort_columns = []
+        for key in sorting_keys:
+            column = lengths[key].astype('float64')
+            if padding_noise > 0.0:
+                column = column + column * padding_noise * numpy.random.uniform(-1, 1, len(column))
+            sort_columns.append(column)
+        # ``numpy.lexsort`` uses its `last` key as the primary sort key, and is stable, so ties
+        # keep their original order, just like the list-based sort.
+        return numpy.lexsort(sort_columns[::-1]).tolist()
+
+    @overrides
+    def padding_lengths(self):
+        if len(self) == 0:
+            return {}
+        return {key: int(numpy.max(values)) for key, values in self._get_length_arrays().items()}
+
+    @overrides
+    def pad_instances(self, padding_lengths: Dict[str, int]=None, verbose: bool=True):
+        """
+        Like :func:`IndexedDataset.pad_instances`, this modifies the current object: every field
+        gets replaced with its padded version (which, in CSR form, just means that every instance
+        has the same number of words, and every word the same number of characters).
+        """
+        lengths_to_use = self._get_lengths_to_use(padding_lengths, verbose)
+        if verbose:
+            logger.info("Now actually padding instances to length: %s", str(lengths_to_use))
+        for field_name, padded in self._pad_fields(numpy.arange(len(self)), lengths_to_use).items():
+            if padded.ndim == 3:
+                num_instances, num_words, num_word_characters = padded.shape
+                word_offsets = numpy.arange(num_instances * num_words + 1, dtype='int64') * num_word_characters
+            else:
+                num_instances, num_words = padded.shape
+                word_offsets = None
+            offsets = numpy.arange(num_instances + 1, dtype='int64') * num_words
+            self.fields[field_name] = RaggedIndices(padded.reshape(-1), offsets, word_offsets)
+
+    @overrides
+    def as_training_data(self):
+        return self.as_padded_training_data()
+
+    @overrides
+    def as_padded_training_data(self, padding_lengths: Dict[str, int]=None):
+        lengths_to_use = self._get_lengths_to_use(padding_lengths, verbose=False)
+        padded_fields = self._pad_fields(numpy.arange(len(self)), lengths_to_use)
+        return self._training_data_from_padded_fields(self.skeletons, padded_fields)
+
+    def _pad_fields(self, indices: numpy.ndarray, lengths_to_use: Dict[str, int]) -> Dict[str, numpy.ndarray]:
+        padded_fields = {}
+        for field_name, (padding_key, truncate_from_right) in self.instance_class.columnar_fields.items():
+            padded_fields[field_name] = self.fields[field_name].pad(indices,
+                                                                    lengths_to_use[padding_key],
+                                                                    lengths_to_use.get('num_word_characters'),
+                                                                    truncate_from_right)
+        return padded_fields
+
@@ -1,7 +1,8 @@
 import codecs
 import itertools
 import logging
-from typing import Dict, List
+from copy import copy
+from typing import Dict, Iterable, Iterator, List
 
 import numpy
 import tqdm
@@ -10,6 +11,7 @@ from ...common.util import add_noise_to_dict_values
 from ...common.params import Params
 from ..data_indexer import DataIndexer
 from ..instances.instance import Instance, TextInstance, IndexedInstance
+from ..padding import pad_word_sequences
 
 logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
@@ -40,6 +42,12 @@ class Dataset:
         """
         self.instances = instances
 
+    def __len__(self):
+        return len(self.instances)
+
+    def __iter__(self) -> Iterator[Instance]:
+        return iter(self.instances)
+
     def merge(self, other: 'Dataset') -> 'Dataset':
         """
         Combine two datasets.  If you call try to merge two Datasets of the same subtype, you will
@@ -77,12 +85,36 @@ class TextDataset(Dataset):
             params.assert_empty("TextDataset")
         super(TextDataset, self).__init__(instances)
 
-    def to_indexed_dataset(self, data_indexer: DataIndexer) -> 'IndexedDataset':
+    def to_indexed_dataset(self,
+                           data_indexer: DataIndexer,
+                           columnar: bool=False,
+                           num_workers: int=1) -> 'IndexedDataset':
         '''
-        Converts the Dataset into an IndexedDataset, given a DataIndexer.
+        Converts the Dataset into an IndexedDataset, given a DataIndexer.  If ``columnar`` is
+        ``True``, we return a
+        :class:`~deep_qa.data.datasets.columnar_dataset.ColumnarIndexedDataset` instead, which
+        stores the word indices in flat NumPy arrays; the indexed instances are then never all
+        held in memory as Python lists at the same time.  If ``num_workers`` is greater than one,
+        we tokenize and index the instances in that many processes (see
+        :mod:`deep_qa.data.parallel_indexing`), getting exactly the same result.
         '''
-        indexed_instances = [instance.to_indexed_instance(data_indexer) for instance in tqdm.tqdm(self.instances)]
-        return IndexedDataset(indexed_instances)
+        indexed_instances = self._index_instances(self, data_indexer, num_workers)
+        if columnar:
+            # This import is here to avoid a circular import; columnar_dataset imports this module.
+            from .columnar_dataset import ColumnarIndexedDataset
+            return ColumnarIndexedDataset.from_instances(indexed_instances)
+        return IndexedDataset(list(indexed_instances))
+
+    @staticmethod
+    def _index_instances(instances: Iterable[TextInstance],
+                         data_indexer: DataIndexer,
+                         num_workers: int) -> Iterator[IndexedInstance]:
+        if num_workers > 1:
+            # This import is here to avoid a circular import; parallel_indexing imports instances.
+            from ..parallel_indexing import index_in_parallel
+            logger.info("Indexing instances with %d processes", num_workers)
+            return index_in_parallel(instances, data_indexer, num_workers)
+        return (instance.to_indexed_instance(data_indexer) for instance in tqdm.tqdm(instances))
 
     @staticmethod
     def read_from_file(filename: str, instance_class, params: Params=None):
@@ -90,6 +122,19 @@ class TextDataset(Dataset):
             lines = [x.strip() for x in tqdm.tqdm(input_file.readlines())]
             return TextDataset.read_from_lines(lines, instance_class, params)
 
+    @staticmethod
+    def iter_instances_from_file(filename: str, instance_class, params: Params=None) -> Iterator[TextInstance]:
+        """
+        Yields the same instances that ``read_from_file`` would read, one at a time, reading the
+        file line by line instead of all at once.  This is what
+        :class:`~deep_qa.data.datasets.lazy_dataset.LazyTextDataset` uses to read data, so
+        subclasses that override ``read_from_file`` should override this too.  ``params`` may be
+        read here, but not consumed.
+        """
+        with codecs.open(filename, 'r', 'utf-8') as input_file:
+            for line in input_file:
+                yield instance_class.read_from_line(line.strip())
+
     @staticmethod
     def read_from_lines(lines: List[str], instance_class, params: Params=None):
         instances = [instance_class.read_from_line(x) for x in lines]
@@ -107,24 +152,61 @@ class IndexedDataset(Dataset):
     def __init__(self, instances: List[IndexedInstance]):
         super(IndexedDataset, self).__init__(instances)
 
+    def select(self, indices: List[int]) -> 'IndexedDataset':
+        """
+        Returns a new ``IndexedDataset`` containing the instances at ``indices``, in that order.
+        The instances themselves are not copied.
+        """
+        return IndexedDataset([self.instances[i] for i in indices])
+
+    def get_instance_padding_lengths(self) -> List[Dict[str, int]]:
+        """
+        Returns the result of calling ``get_padding_lengths()`` on each instance in this dataset.
+        """
+        return [instance.get_padding_lengths() for instance in self.instances]
+
     def sort_by_padding(self, sorting_keys: List[str], padding_noise: float=0.0):
         """
         Sorts the ``Instances`` in this ``Dataset`` by their padding lengths, using the keys in
         ``sorting_keys`` (in the order in which they are provided).
         """
-        instances_with_lengths = []
-        for instance in self.instances:
-            padding_lengths = instance.get_padding_lengths()
+        sort_order = self.get_padding_sort_order(sorting_keys, padding_noise)
+        self.instances = [self.instances[i] for i in sort_order]
+
+    def get_padding_sort_order(self,
+                               sorting_keys: List[str],
+                               padding_noise: float=0.0,
+                               instance_padding_lengths: List[Dict[str, int]]=None) -> List[int]:
+        """
+        Returns the permutation of instance indices that :func:`sort_by_padding` would apply,
+        without modifying this ``Dataset``.
+
+        Parameters
+        ----------
+        sorting_keys: List[str]
+            The padding keys to sort by, in order of precedence.
+        padding_noise: float, optional (default=0.0)
+            If positive, we add this much relative noise to each padding length before sorting.
+        instance_padding_lengths: List[Dict[str, int]], optional (default=None)
+            The result of calling ``get_padding_lengths()`` on each instance, if you've already
+            computed it.  Computing this is the expensive part of sorting, so callers that sort
+            the same data many times (like the ``DataGenerator``) can compute it once and pass it
+            in here.
+        """
+        if instance_padding_lengths is None:
+            instance_padding_lengths = self.get_instance_padding_lengths()
+        indices_with_lengths = []
+        for index, padding_lengths in enumerate(instance_padding_lengths):
             if padding_noise > 0.0:
                 padding_lengths = add_noise_to_dict_values(padding_lengths, padding_noise)
-            instance_with_lengths = [padding_lengths[key] for key in sorting_keys] + [instance]
-            instances_with_lengths.append(instance_with_lengths)
-        instances_with_lengths.sort(key=lambda x: x[:-1])
-        self.instances = [instance_with_lengths[-1] for instance_with_lengths in instances_with_lengths]
+            index_with_lengths = [padding_lengths[key] for key in sorting_keys] + [index]
+            indices_with_lengths.append(index_with_lengths)
+        indices_with_lengths.sort(key=lambda x: x[:-1])
+        return [index_with_lengths[-1] for index_with_lengths in indices_with_lengths]
 
     def padding_lengths(self):
         padding_lengths = {}
-        lengths = [instance.get_padding_lengths() for instance in self.instances]
+        lengths = self.get_instance_padding_lengths()
         if not lengths:
             return padding_lengths
         for key in lengths[0]:
@@ -163,6 +245,76 @@ class IndexedDataset(Dataset):
             But if you're doing this inside of a data generator, having all of this output per
             batch is a bit obnoxious.
         """
+        lengths_to_use = self._get_lengths_to_use(padding_lengths, verbose)
+        if verbose:
+            logger.info("Now actually padding instances to length: %s", str(lengths_to_use))
+            for instance in tqdm.tqdm(self.instances):
+                instance.pad(lengths_to_use)
+        else:
+            for instance in self.instances:
+                instance.pad(lengths_to_use)
+
+    def as_padded_training_data(self, padding_lengths: Dict[str, int]=None):
+        """
+        Returns what calling :func:`pad_instances` followed by :func:`as_training_data` would
+        return, but without modifying any of the ``IndexedInstances`` in this dataset (see
+        :func:`IndexedInstance.as_padded_training_data()`).  This is what the ``DataGenerator``
+        uses, so that the same instances can be re-padded to different lengths every epoch.
+
+        If every instance has the same type, and that type declares
+        :attr:`IndexedInstance.columnar_fields`, we pad each of those fields for the whole batch at
+        once with :func:`~deep_qa.data.padding.pad_word_sequences`, which is much faster than
+        padding the instances one at a time.
+
+        Parameters
+        ----------
+        padding_lengths: Dict[str, int]
+            Has the same meaning as in :func:`pad_instances`.
+        """
+        lengths_to_use = self._get_lengths_to_use(padding_lengths, verbose=False)
+        instance_class = type(self.instances[0])
+        use_columns = instance_class.columnar_fields is not None
+        if use_columns:
+            use_columns = all(type(instance) is instance_class  # pylint: disable=unidiomatic-typecheck
+                              for instance in self.instances)
+        if use_columns:
+            padded_fields = {}
+            for field_name, (padding_key, truncate_from_right) in instance_class.columnar_fields.items():
+                field_lengths = {'num_sentence_words': lengths_to_use[padding_key]}
+                if 'num_word_characters' in lengths_to_use:
+                    field_lengths['num_word_characters'] = lengths_to_use['num_word_characters']
+                word_sequences = [getattr(instance, field_name) for instance in self.instances]
+                padded_fields[field_name] = pad_word_sequences(word_sequences, field_lengths, truncate_from_right)
+            return self._training_data_from_padded_fields(self.instances, padded_fields)
+        inputs = []
+        labels = []
+        for instance in self.instances:
+            instance_inputs, label = instance.as_padded_training_data(lengths_to_use)
+            inputs.append(instance_inputs)
+            labels.append(label)
+        return self._stack_training_data(inputs, labels)
+
+    def _training_data_from_padded_fields(self,
+                                          instances: List[IndexedInstance],
+                                          padded_fields: Dict[str, numpy.ndarray]):
+        """
+        Given already-padded arrays for each of the ``columnar_fields`` of ``instances`` (with one
+        row per instance), calls ``as_training_data()`` on a shallow copy of each instance whose
+        fields have been replaced with its padded rows, so that we get exactly what the instance
+        class would have given us, without any per-instance padding.
+        """
+        inputs = []
+        labels = []
+        for i, instance in enumerate(instances):
+            padded_instance = copy(instance)
+            for field_name, padded in padded_fields.items():
+                setattr(padded_instance, field_name, padded[i])
+            instance_inputs, label = padded_instance.as_training_data()
+            inputs.append(instance_inputs)
+            labels.append(label)
+        return self._stack_training_data(inputs, labels)
+
+    def _get_lengths_to_use(self, padding_lengths: Dict[str, int], verbose: bool) -> Dict[str, int]:
         # First we need to decide _how much_ to pad.  To do that, we find the max length for all
         # relevant padding decisions from the instances themselves.  Then we check whether we were
         # given a max length for a particular dimension.  If we were, we use that instead of the
@@ -179,13 +331,7 @@ class IndexedDataset(Dataset):
                 lengths_to_use[key] = padding_lengths[key]
             else:
                 lengths_to_use[key] = instance_padding_lengths[key]
-        if verbose:
-            logger.info("Now actually padding instances to length: %s", str(lengths_to_use))
-            for instance in tqdm.tqdm(self.instances):
-                instance.pad(lengths_to_use)
-        else:
-            for instance in self.instances:
-                instance.pad(lengths_to_use)
+        return lengths_to_use
 
     def as_training_data(self):
         """
@@ -201,6 +347,15 @@ class IndexedDataset(Dataset):
             instance_inputs, label = instance.as_training_data()
             inputs.append(instance_inputs)
             labels.append(label)
+        return self._stack_training_data(inputs, labels)
+
+    @staticmethod
+    def _stack_training_data(inputs: List, labels: List):
+        """
+        Converts lists of per-instance inputs and labels into numpy arrays.  If the ``Instances``
+        return tuples for their inputs (or labels), we convert the list of tuples into a list of
+        arrays, one per tuple element.
+        """
         if isinstance(inputs[0], tuple):
             inputs = [numpy.asarray(x) for x in zip(*inputs)]
         else:
@@ -1,4 +1,4 @@
-from typing import List
+from typing import Iterator, List
 import json
 
 from overrides import overrides
@@ -16,20 +16,24 @@ class SnliDataset(TextDataset):
     @staticmethod
     @overrides
     def read_from_file(filename: str, instance_class, params: Params=None):
-
-        instances = []
-        for line in open(filename, 'r'):
-            example = json.loads(line)
-
-            # TODO(mark) why does this not match snli? Fix.
-            label = example["gold_label"]
-            if label == "entailment":
-                label = "entails"
-            elif label == "contradiction":
-                label = "contradicts"
-
-            text = example["sentence1"]
-            hypothesis = example["sentence2"]
-            instances.append(instance_class(text, hypothesis, label))
+        instances = list(SnliDataset.iter_instances_from_file(filename, instance_class, params))
         log_label_counts(instances)
         return SnliDataset(instances, params)
+
+    @staticmethod
+    @overrides
+    def iter_instances_from_file(filename: str, instance_class, params: Params=None) -> Iterator[TextInstance]:
+        with open(filename, 'r') as snli_file:
+            for line in snli_file:
+                example = json.loads(line)
+
+                # TODO(mark) why does this not match snli? Fix.
+                label = example["gold_label"]
+                if label == "entailment":
+                    label = "entails"
+                elif label == "contradiction":
+                    label = "contradicts"
+
+                text = example["sentence1"]
+                hypothesis = example["sentence2"]
+                yield instance_class(text, hypothesis, label)
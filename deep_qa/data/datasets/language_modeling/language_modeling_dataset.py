@@ -1,4 +1,4 @@
-from typing import List
+from typing import Iterator, List
 
 from overrides import overrides
 
@@ -20,16 +20,28 @@ class LanguageModelingDataset(TextDataset):
     @staticmethod
     @overrides
     def read_from_file(filename: str, instance_class, params: Params=None):
+        instances = list(LanguageModelingDataset.iter_instances_from_file(filename, instance_class, params))
+        log_label_counts(instances)
+        return LanguageModelingDataset(instances, params)
 
+    @staticmethod
+    @overrides
+    def iter_instances_from_file(filename: str, instance_class, params: Params=None) -> Iterator[TextInstance]:
+        """
+        Splits the text in ``filename`` (all lines joined with spaces) into sequences of
+        ``sequence_length`` words, keeping only a buffer of the current line's words in memory.
+        """
         sequence_length = params.get("sequence_length", 20)
+        words = []
         with open(filename, "r") as text_file:
-            text = text_file.readlines()
-            text = " ".join([x.replace("\n", " ").strip() for x in text]).split(" ")
-
-        instances = []
-        for index in range(0, len(text) - sequence_length, sequence_length):
-            word_sequence = " ".join(text[index: index + sequence_length])
-            instances.append(SentenceInstance(word_sequence))
-
-        log_label_counts(instances)
-        return LanguageModelingDataset(instances, params)
+            for line in text_file:
+                words.extend(line.replace("\n", " ").strip().split(" "))
+                # We only yield a sequence once at least one more word follows it, so the final
+                # (full or partial) sequence in the file is dropped.  Deleting each sequence from
+                # the front of ``words`` as we go would be quadratic in the length of a line, so we
+                # keep our place in it, and drop the words we've used once per line.
+                start = 0
+                while len(words) - start > sequence_length:
+                    yield SentenceInstance(" ".join(words[start:start + sequence_length]))
+                    start += sequence_length
+                del words[:start]
@@ -0,0 +1,220 @@
+import itertools
+import logging
+from copy import deepcopy
+from typing import Dict, Iterator, List
+
+from overrides import overrides
+
+from ...common.params import Params
+from ..data_indexer import DataIndexer
+from ..instances.instance import IndexedInstance, TextInstance
+from .dataset import IndexedDataset, TextDataset
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+class LazyTextDataset(TextDataset):
+    """
+    A ``TextDataset`` that never holds all of its instances in memory.  Instead of reading a file
+    up front, we remember the files, the ``TextDataset`` subclass that knows how to read them, and
+    the instance type, and every time the dataset is iterated over we re-read the files line by
+    line (using :func:`TextDataset.iter_instances_from_file`).  This lets us fit a
+    ``DataIndexer`` and train on corpora that don't fit in RAM.
+
+    Anything that needs the whole list of instances at once can still use ``self.instances``, but
+    that reads the entire dataset into memory (and logs a warning), so it defeats the purpose of
+    this class.
+
+    Parameters
+    ----------
+    filenames: List[str]
+        The files to read, in order.  All of them are read with ``dataset_class``.
+    dataset_class: type
+        The ``TextDataset`` subclass whose ``iter_instances_from_file`` reads these files (e.g.,
+        :class:`~deep_qa.data.datasets.LanguageModelingDataset`).
+    instance_class: type
+        The ``TextInstance`` subclass to read.
+    params: Params, optional (default=None)
+        Parameters for ``dataset_class``, exactly as you would pass them to its
+        ``read_from_file`` method.  We check them once here, by constructing an empty
+        ``dataset_class`` with them.
+    chunk_size: int, optional (default=10000)
+        How many instances :func:`iter_chunks` (and so :class:`LazyIndexedDataset` and the
+        ``DataGenerator``) keep in memory at a time.
+    max_instances: int, optional (default=None)
+        If given, we stop after this many instances.  You typically get this by calling
+        :func:`truncate`.
+    """
+    def __init__(self,
+                 filenames: List[str],
+                 dataset_class,
+                 instance_class,
+                 params: Params=None,
+                 chunk_size: int=10000,
+                 max_instances: int=None):
+        # pylint: disable=super-init-not-called
+        self.filenames = filenames
+        self.dataset_class = dataset_class
+        self.instance_class = instance_class
+        self.params = params if params is not None else Params({})
+        self.chunk_size = chunk_size
+        self.max_instances = max_instances
+        dataset_class([], deepcopy(self.params))
+        self._instances = None
+        self._num_instances = None
+
+    def __iter__(self) -> Iterator[TextInstance]:
+        instances = itertools.chain.from_iterable(
+                self.dataset_class.iter_instances_from_file(filename, self.instance_class, deepcopy(self.params))
+                for filename in self.filenames)
+        if self.max_instances is not None:
+            instances = itertools.islice(instances, self.max_instances)
+        return instances
+
+    def __len__(self):
+        # This means a pass over the data, so we only do it once.
+        if self._num_instances is None:
+            self._num_instances = sum(1 for _ in self)
+        return self._num_instances
+
+    def iter_chunks(self) -> Iterator[List[TextInstance]]:
+        """
+        Yields lists of (at most) ``chunk_size`` consecutive instances.
+        """
+        instances = iter(self)
+        while True:
+            chunk = list(itertools.islice(instances, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    @property
+    def instances(self) -> List[TextInstance]:
+        if self._instances is None:
+            logger.warning("Reading all of %s into memory; this defeats the purpose of a "
+                           "LazyTextDataset", str(self.filenames))
+            self._instances = list(self)
+        return self._instances
+
+    @overrides
+    def merge(self, other: 'LazyTextDataset') -> 'LazyTextDataset':
+        if (not isinstance(other, LazyTextDataset)
+                    or other.dataset_class is not self.dataset_class
+                    or other.instance_class is not self.instance_class
+                    or self.max_instances is not None
+                    or other.max_instances is not None):
+            raise RuntimeError("Can only merge untruncated lazy datasets of the same types")
+        return LazyTextDataset(self.filenames + other.filenames, self.dataset_class, self.instance_class,
+                               self.params, self.chunk_size)
+
+    @overrides
+    def truncate(self, max_instances: int):
+        """
+        Returns a ``LazyTextDataset`` that stops after the first ``max_instances`` instances.
+        Unlike ``Dataset.truncate``, we don't know up front whether there are fewer than
+        ``max_instances`` instances, and we don't read the data to find out.
+        """
+        if self.max_instances is not None:
+            max_instances = min(max_instances, self.max_instances)
+        return LazyTextDataset(self.filenames, self.dataset_class, self.instance_class,
+                               self.params, self.chunk_size, max_instances)
+
+    @overrides
+    def to_indexed_dataset(self,
+                           data_indexer: DataIndexer,
+                           columnar: bool=False,
+                           num_workers: int=1) -> IndexedDataset:
+        """
+        If ``columnar`` is ``True``, we index the instances one at a time (or in ``num_workers``
+        processes) straight into a
+        :class:`~deep_qa.data.datasets.columnar_dataset.ColumnarIndexedDataset`, which does hold
+        the whole indexed dataset in memory, but compactly.  Otherwise we return a
+        :class:`LazyIndexedDataset`, which re-reads and re-indexes the data (in this process) every
+        time it is iterated over.
+        """
+        if columnar:
+            # This import is here to avoid a circular import; columnar_dataset imports dataset.py.
+            from .columnar_dataset import ColumnarIndexedDataset
+            return ColumnarIndexedDataset.from_instances(self._index_instances(self, data_indexer, num_workers))
+        return LazyIndexedDataset(self, data_indexer)
+
+
+class LazyIndexedDataset(IndexedDataset):
+    """
+    The indexed version of a :class:`LazyTextDataset`: iterating over this dataset reads the text
+    instances from disk and indexes them with ``data_indexer`` on the fly.  The
+    :class:`~deep_qa.data.data_generator.DataGenerator` recognizes this class, and builds batches
+    from one chunk of ``text_dataset.chunk_size`` instances at a time, so memory use is bounded by
+    the chunk size, not by the size of the data.
+    """
+    def __init__(self, text_dataset: LazyTextDataset, data_indexer: DataIndexer):
+        # pylint: disable=super-init-not-called
+        self.text_dataset = text_dataset
+        self.data_indexer = data_indexer
+        self._instances = None
+
+    @property
+    def chunk_size(self) -> int:
+        return self.text_dataset.chunk_size
+
+    def __iter__(self) -> Iterator[IndexedInstance]:
+        return (instance.to_indexed_instance(self.data_indexer) for instance in self.text_dataset)
+
+    def __len__(self):
+        return len(self.text_dataset)
+
+    def iter_chunks(self) -> Iterator[IndexedDataset]:
+        """
+        Yields in-memory ``IndexedDatasets`` of (at most) ``chunk_size`` consecutive instances.
+        """
+        for chunk in self.text_dataset.iter_chunks():
+            yield IndexedDataset([instance.to_indexed_instance(self.data_indexer) for instance in chunk])
+
+    @property
+    def instances(self) -> List[IndexedInstance]:
+        if self._instances is None:
+            logger.warning("Indexing all of %s into memory; this defeats the purpose of a "
+                           "LazyIndexedDataset", str(self.text_dataset.filenames))
+            self._instances = list(self)
+        return self._instances
+
+    @instances.setter
+    def instances(self, instances: List[IndexedInstance]):
+        self._instances = instances
+
+    @overrides
+    def truncate(self, max_instances: int):
+        return LazyIndexedDataset(self.text_dataset.truncate(max_instances), self.data_indexer)
+
+    @overrides
+    def padding_lengths(self) -> Dict[str, int]:
+        """
+        Computes the max padding lengths over the whole dataset, one chunk at a time.
+        """
+        padding_lengths = None
+        for chunk in self.iter_chunks():
+            chunk_lengths = chunk.padding_lengths()
+            if padding_lengths is None:
+                padding_lengths = chunk_lengths
+            else:
+                for key in padding_lengths:
+                    padding_lengths[key] = max(padding_lengths[key], chunk_lengths.get(key, 0))
+        return padding_lengths or {}
+
+    def get_largest_instance(self, sorting_keys: List[str]) -> IndexedInstance:
+        """
+        Returns the instance that sorts last by ``sorting_keys`` (the one that
+        :func:`~IndexedDataset.get_padding_sort_order` puts last, if we had the whole dataset in
+        memory), finding it one chunk at a time.
+        """
+        largest_instance = None
+        largest_lengths = None
+        for chunk in self.iter_chunks():
+            instance = chunk.instances[chunk.get_padding_sort_order(sorting_keys)[-1]]
+            padding_lengths = instance.get_padding_lengths()
+            lengths = [padding_lengths[key] for key in sorting_keys]
+            # Later instances win ties, as they do when sorting.
+            if largest_lengths is None or lengths >= largest_lengths:
+                largest_instance = instance
+                largest_lengths = lengths
+        return largest_instance
@@ -1,6 +1,9 @@
 import codecs
 import gzip
 import logging
+import os
+import tempfile
+from typing import Iterable, List, Set, Tuple
 
 import numpy
 from keras.layers import Embedding
@@ -10,6 +13,21 @@ logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
 
 class PretrainedEmbeddings:
+    """
+    Methods for reading pre-trained word embeddings.  We read two formats:
+
+    - A gzipped, GloVe-formatted text file, with one ``[word] [dim 1] [dim 2] ...`` line per word.
+      Parsing this is slow for large files (minutes, for the 840B GloVe vectors), so if you use the
+      same file more than once, you should convert it (once) to the binary format with
+      :func:`convert_to_binary`, or ``scripts/convert_embeddings.py``.
+    - A binary format, given by the path to a float32 ``.npy`` matrix (one row per word), with the
+      words stored one per line in a UTF-8 ``.vocab`` file next to it (see
+      :func:`get_vocab_filename`).  The matrix is memory-mapped on load, so only the rows we
+      actually use are read from disk.
+
+    Anywhere we take an embeddings filename, a filename ending in ``.npy`` means the binary format,
+    and anything else means the text format.
+    """
     @staticmethod
     def initialize_random_matrix(shape, seed=1337):
         # TODO(matt): we now already set the random seed, in run_solver.py.  This should be
@@ -17,6 +35,125 @@ class PretrainedEmbeddings:
         numpy_rng = numpy.random.RandomState(seed)
         return numpy_rng.uniform(size=shape, low=0.05, high=-0.05)
 
+    @staticmethod
+    def is_binary(embeddings_filename: str) -> bool:
+        return embeddings_filename.endswith('.npy')
+
+    @staticmethod
+    def get_vocab_filename(binary_embeddings_filename: str) -> str:
+        """
+        Returns the name of the vocabulary file that goes with a binary (``.npy``) embeddings file.
+        """
+        return binary_embeddings_filename[:-len('.npy')] + '.vocab'
+
+    @staticmethod
+    def read_text_embeddings(embeddings_filename: str,
+                             words_to_keep: Set[str]=None) -> Iterable[Tuple[str, numpy.ndarray]]:
+        """
+        Yields ``(word, vector)`` pairs from a gzipped, GloVe-formatted text file, skipping lines
+        whose dimension doesn't match the first line's.  If ``words_to_keep`` is given, we skip
+        all other words too, without parsing their vectors, which is most of the time it takes to
+        read the file.
+        """
+        embedding_dim = None
+        with gzip.open(embeddings_filename, 'rb') as embeddings_file:
+            for line in embeddings_file:
+                fields = line.decode('utf-8').strip().split(' ')
+                if embedding_dim is None:
+                    embedding_dim = len(fields) - 1
+                    assert embedding_dim > 1, "Found embedding size of 1; do you have a header?"
+                else:
+                    if len(fields) - 1 != embedding_dim:
+                        # Sometimes there are funny unicode parsing problems that lead to different
+                        # fields lengths (e.g., a word with a unicode space character that splits
+                        # into more than one column).  We skip those lines.  Note that if you have
+                        # some kind of long header, this could result in all of your lines getting
+                        # skipped.  It's hard to check for that here; you just have to look in the
+                        # embedding_misses_file and at the model summary to make sure things look
+                        # like they are supposed to.
+                        continue
+                if words_to_keep is not None and fields[0] not in words_to_keep:
+                    continue
+                yield fields[0], numpy.asarray(fields[1:], dtype='float32')
+
+    @staticmethod
+    def read_text_embedding_dim(embeddings_filename: str) -> int:
+        """
+        Returns the dimension of the vectors in a gzipped, GloVe-formatted text file, from its
+        first line.
+        """
+        with gzip.open(embeddings_filename, 'rb') as embeddings_file:
+            return len(embeddings_file.readline().decode('utf-8').strip().split(' ')) - 1
+
+    @staticmethod
+    def read_binary_embeddings(embeddings_filename: str) -> Tuple[List[str], numpy.ndarray]:
+        """
+        Reads a binary embeddings file written by :func:`convert_to_binary`, returning the list of
+        words and a read-only, memory-mapped ``(num_words, embedding_dim)`` float32 matrix, where
+        row ``i`` is the vector for ``words[i]``.
+        """
+        # We only split on "\n", as words can contain other characters that python considers line
+        # breaks.
+        with open(PretrainedEmbeddings.get_vocab_filename(embeddings_filename), 'r',
+                  encoding='utf-8', newline='\n') as vocab_file:
+            words = [line[:-1] if line.endswith('\n') else line for line in vocab_file]
+        vectors = numpy.load(embeddings_filename, mmap_mode='r')
+        if len(words) != vectors.shape[0]:
+            raise ValueError("Vocabulary size (%d) doesn't match the number of vectors (%d) in %s"
+                             % (len(words), vectors.shape[0], embeddings_filename))
+        return words, vectors
+
+    @staticmethod
+    def read_embeddings(embeddings_filename: str) -> Tuple[List[str], numpy.ndarray]:
+        """
+        Reads an embeddings file in either format (see the class docstring), returning a list of
+        words and a matrix whose ``i``-th row is the vector for ``words[i]``.  For a binary file the
+        matrix is memory-mapped; for a text file, the whole thing has to be read into memory.
+        """
+        if PretrainedEmbeddings.is_binary(embeddings_filename):
+            return PretrainedEmbeddings.read_binary_embeddings(embeddings_filename)
+        words = []
+        vectors = []
+        for word, vector in PretrainedEmbeddings.read_text_embeddings(embeddings_filename):
+            words.append(word)
+            vectors.append(vector)
+        return words, numpy.asarray(vectors, dtype='float32')
+
+    @staticmethod
+    def convert_to_binary(embeddings_filename: str, output_filename: str):
+        """
+        Converts a gzipped, GloVe-formatted text file into our binary format, writing the matrix to
+        ``output_filename`` (which must end in ``.npy``) and the words to the matching ``.vocab``
+        file.  We stream the vectors through a temporary file, so this never holds the whole matrix
+        in memory.
+        """
+        if not PretrainedEmbeddings.is_binary(output_filename):
+            raise ValueError("Binary embeddings filename must end in .npy: " + output_filename)
+        output_directory = os.path.dirname(os.path.abspath(output_filename))
+        vocab_filename = PretrainedEmbeddings.get_vocab_filename(output_filename)
+        num_words = 0
+        embedding_dim = None
+        with tempfile.TemporaryFile(dir=output_directory) as raw_vectors_file, \
+                open(vocab_filename, 'w', encoding='utf-8', newline='\n') as vocab_file:
+            for word, vector in PretrainedEmbeddings.read_text_embeddings(embeddings_filename):
+                embedding_dim = len(vector)
+                vocab_file.write(word + '\n')
+                raw_vectors_file.write(vector.tobytes())
+                num_words += 1
+            if num_words == 0:
+                raise ValueError("Found no embeddings in " + embeddings_filename)
+            raw_vectors_file.flush()
+            raw_vectors = numpy.memmap(raw_vectors_file, dtype='float32', mode='r',
+                                       shape=(num_words, embedding_dim))
+            output = numpy.lib.format.open_memmap(output_filename, mode='w+', dtype='float32',
+                                                  shape=(num_words, embedding_dim))
+            chunk_size = 100000
+            for start in range(0, num_words, chunk_size):
+                output[start:start + chunk_size] = raw_vectors[start:start + chunk_size]
+            output.flush()
+            del output, raw_vectors
+        logger.info("Wrote %d %d-dimensional embeddings to %s", num_words, embedding_dim, output_filename)
+
     @staticmethod
     def get_embedding_layer(embeddings_filename: str,
                             data_indexer: DataIndexer,
@@ -33,39 +170,34 @@ class PretrainedEmbeddings:
         come across a word in DataIndexer that does not show up with the embeddings file, we give
         it a zero vector.
 
-        The embeddings file is assumed to be gzipped, formatted as [word] [dim 1] [dim 2] ...
+        The embeddings file can be in either of the formats described in the class docstring.
         """
-        words_to_keep = set(data_indexer.words_in_index())
         vocab_size = data_indexer.get_vocab_size()
-        embeddings = {}
-        embedding_dim = None
 
         # TODO(matt): make this a parameter
         embedding_misses_filename = 'embedding_misses.txt'
 
-        # First we read the embeddings from the file, only keeping vectors for the words we need.
+        # First we read the embeddings from the file.  For the binary format, this just opens the
+        # memory-mapped matrix, and we only read the rows we need below.  For the text format, we
+        # only keep vectors for the words we need.
         logger.info("Reading embeddings from file")
-        with gzip.open(embeddings_filename, 'rb') as embeddings_file:
-            for line in embeddings_file:
-                fields = line.decode('utf-8').strip().split(' ')
-                if embedding_dim is None:
-                    embedding_dim = len(fields) - 1
-                    assert embedding_dim > 1, "Found embedding size of 1; do you have a header?"
-                else:
-                    if len(fields) - 1 != embedding_dim:
-                        # Sometimes there are funny unicode parsing problems that lead to different
-                        # fields lengths (e.g., a word with a unicode space character that splits
-                        # into more than one column).  We skip those lines.  Note that if you have
-                        # some kind of long header, this could result in all of your lines getting
-                        # skipped.  It's hard to check for that here; you just have to look in the
-                        # embedding_misses_file and at the model summary to make sure things look
-                        # like they are supposed to.
-                        continue
-                word = fields[0]
-                if word in words_to_keep:
-                    vector = numpy.asarray(fields[1:], dtype='float32')
-                    embeddings[word] = vector
-
+        if PretrainedEmbeddings.is_binary(embeddings_filename):
+            words, vectors = PretrainedEmbeddings.read_binary_embeddings(embeddings_filename)
+        else:
+            words_to_keep = set(data_indexer.words_in_index())
+            words = []
+            vectors = []
+            for word, vector in PretrainedEmbeddings.read_text_embeddings(embeddings_filename, words_to_keep):
+                words.append(word)
+                vectors.append(vector)
+            if vectors:
+                vectors = numpy.asarray(vectors, dtype='float32')
+            else:
+                embedding_dim = PretrainedEmbeddings.read_text_embedding_dim(embeddings_filename)
+                vectors = numpy.zeros((0, embedding_dim), dtype='float32')
+        embedding_dim = vectors.shape[1]
+        # If a word shows up more than once in the file, the last vector wins.
+        word_rows = {word: row for row, word in enumerate(words)}
 
         # Now we initialize the weight matrix for an embedding layer, starting with random vectors,
         # then filling in the word vectors we just read.
@@ -78,15 +210,24 @@ class PretrainedEmbeddings:
         # The 2 here is because we know too much about the DataIndexer.  Index 0 is the padding
         # index, and the vector for that dimension is going to be 0.  Index 1 is the OOV token, and
         # we can't really set a vector for the OOV token.
+        indices = []
+        rows = []
         for i in range(2, vocab_size):
             word = data_indexer.get_word_from_index(i)
-
             # If we don't have a pre-trained vector for this word, we'll just leave this row alone,
             # so the word has a random initialization.
-            if word in embeddings:
-                embedding_matrix[i] = embeddings[word]
+            row = word_rows.get(word)
+            if row is not None:
+                indices.append(i)
+                rows.append(row)
             elif log_misses:
                 print(word, file=embedding_misses_file)
+        if rows:
+            # Sorting the rows makes the gather read the memory-mapped matrix in order.
+            order = numpy.argsort(rows)
+            indices = numpy.asarray(indices)[order]
+            rows = numpy.asarray(rows)[order]
+            embedding_matrix[indices] = vectors[rows]
 
         if log_misses:
             embedding_misses_file.close()
@@ -1,3 +1,4 @@
+from copy import copy
 from typing import Dict, List
 
 import numpy
@@ -50,6 +51,9 @@ class IndexedSentencePairInstance(IndexedInstance):
     SnliInstances where we have a labeled pair of text and hypothesis, and a sentence2vec instance where the
     objective is to train an encoder to predict whether the sentences are in context or not.
     """
+    columnar_fields = {'first_sentence_indices': ('num_sentence_words', True),
+                       'second_sentence_indices': ('num_sentence_words', True)}
+
     def __init__(self, first_sentence_indices: List[int], second_sentence_indices: List[int], label: List[int],
                  index: int=None):
         super(IndexedSentencePairInstance, self).__init__(label, index)
@@ -75,6 +79,10 @@ class IndexedSentencePairInstance(IndexedInstance):
         self.first_sentence_indices = self.pad_word_sequence(self.first_sentence_indices, padding_lengths)
         self.second_sentence_indices = self.pad_word_sequence(self.second_sentence_indices, padding_lengths)
 
+    @overrides
+    def _copy_for_padding(self):
+        return copy(self)
+
     @overrides
     def as_training_data(self):
         first_sentence_array = numpy.asarray(self.first_sentence_indices, dtype='int32')
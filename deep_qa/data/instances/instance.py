@@ -18,7 +18,8 @@ corresponding ``IndexedInstance``, which you can see in the individual files
 for each ``Instance`` type.
 """
 import itertools
-from typing import Any, Callable, Dict, List
+from copy import deepcopy
+from typing import Any, Callable, Dict, List, Tuple  # pylint: disable=unused-import
 
 from ...common.params import Params
 from ..tokenizers import tokenizers
@@ -160,6 +161,14 @@ class IndexedInstance(Instance):
     This would mean that ``"Jamie"`` and ``"Holly"`` were OOV to the
     ``DataIndexer``, and the other words were given indices.
     """
+    #: Instance classes whose ``pad`` method does nothing except call ``pad_word_sequence`` on some
+    #: of their attributes can list those attributes here, so that they can be stored in a
+    #: :class:`~deep_qa.data.datasets.columnar_dataset.ColumnarIndexedDataset`.  This maps each
+    #: attribute name to a tuple of (the padding key that gives its length, whether it is
+    #: truncated from the right).  ``None`` means columnar storage is not supported.  Note that
+    #: subclasses that pad additional attributes need to set this back to ``None``.
+    columnar_fields = None  # type: Dict[str, Tuple[str, bool]]
+
     @classmethod
     def empty_instance(cls):
         """
@@ -215,6 +224,29 @@ class IndexedInstance(Instance):
         """
         raise NotImplementedError
 
+    def as_padded_training_data(self, padding_lengths: Dict[str, int]):
+        """
+        Returns what :func:`as_training_data` would return after calling
+        ``pad(padding_lengths)``, but without modifying this instance.  This lets a
+        ``DataGenerator`` pad the same instance to different lengths in different epochs without
+        having to keep around an unpadded copy of the whole dataset.
+
+        The padding itself is done on the copy returned by :func:`_copy_for_padding`.
+        """
+        padded_instance = self._copy_for_padding()
+        padded_instance.pad(padding_lengths)
+        return padded_instance.as_training_data()
+
+    def _copy_for_padding(self) -> 'IndexedInstance':
+        """
+        Returns a copy of this instance that :func:`pad` can modify without changing ``self``.  By
+        default this is a deep copy.  ``pad_word_sequence`` and ``pad_sequence_to_length`` always
+        return new lists, so subclasses whose ``pad`` only ever `replaces` attributes with the
+        output of those methods (instead of modifying lists or sub-instances in place) can
+        override this to return a much cheaper shallow copy.
+        """
+        return deepcopy(self)
+
     @staticmethod
     def _get_word_sequence_lengths(word_indices: List) -> Dict[str, int]:
         """
@@ -1,3 +1,4 @@
+from copy import copy
 from typing import Dict, List
 
 import numpy
@@ -85,6 +86,10 @@ class IndexedSentenceInstance(IndexedInstance):
         self.word_indices = self.pad_word_sequence(self.word_indices, padding_lengths)
         self.label = self.pad_sequence_to_length(self.label, padding_lengths['num_sentence_words'])
 
+    @overrides
+    def _copy_for_padding(self):
+        return copy(self)
+
     @overrides
     def as_training_data(self):
         word_array = numpy.asarray(self.word_indices, dtype='int32')
@@ -83,6 +83,9 @@ class McQuestionPassageInstance(QuestionPassageInstance):
 
 
 class IndexedMcQuestionPassageInstance(IndexedQuestionPassageInstance):
+    # We also pad the number of options, which columnar storage can't do.
+    columnar_fields = None
+
     def __init__(self,
                  question_indices: List[int],
                  passage_indices: List[int],
@@ -140,9 +143,10 @@ class IndexedMcQuestionPassageInstance(IndexedQuestionPassageInstance):
 
         # pad the number of options
         num_options = padding_lengths['num_options']
+        # We slice before appending, so that we never modify the list we were given.
+        self.option_indices = self.option_indices[:num_options]
         while len(self.option_indices) < num_options:
             self.option_indices.append([])
-        self.option_indices = self.option_indices[:num_options]
 
         # pad the number of words in the options, number of characters in each word in option
         padded_options = []
@@ -1,3 +1,4 @@
+from copy import copy
 from typing import Dict, List, Any
 
 import numpy as np
@@ -51,6 +52,9 @@ class IndexedQuestionPassageInstance(IndexedInstance):
     """
     This is an indexed instance that is used for (question, passage) pairs.
     """
+    columnar_fields = {'question_indices': ('num_question_words', True),
+                       'passage_indices': ('num_passage_words', False)}
+
     def __init__(self,
                  question_indices: List[int],
                  passage_indices: List[int],
@@ -102,6 +106,10 @@ class IndexedQuestionPassageInstance(IndexedInstance):
         self.passage_indices = self.pad_word_sequence(self.passage_indices, padding_lengths_tmp,
                                                       truncate_from_right=False)
 
+    @overrides
+    def _copy_for_padding(self):
+        return copy(self)
+
     @overrides
     def as_training_data(self):
         question_array = np.asarray(self.question_indices, dtype='int32')
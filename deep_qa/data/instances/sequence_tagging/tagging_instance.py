@@ -1,3 +1,4 @@
+from copy import copy
 from typing import Dict, List, Any
 
 import numpy
@@ -76,6 +77,10 @@ class IndexedTaggingInstance(IndexedInstance):
                                                  default_value=lambda: self.label[0],
                                                  truncate_from_right=False)
 
+    @overrides
+    def _copy_for_padding(self):
+        return copy(self)
+
     @overrides
     def as_training_data(self):
         text_array = numpy.asarray(self.text_indices, dtype='int32')
@@ -89,6 +89,9 @@ class IndexedLogicalFormInstance(IndexedTextClassificationInstance):
 
     Idea taken from the SPINN paper by Sam Bowman and others (http://arxiv.org/pdf/1603.06021.pdf).
     """
+    # We also pad ``transitions``, which isn't a word sequence.
+    columnar_fields = None
+
     def __init__(self, word_indices: List[int], transitions: List[int], label: bool, index: int=None):
         super(IndexedLogicalFormInstance, self).__init__(word_indices, label, index)
         self.transitions = transitions
@@ -1,3 +1,4 @@
+from copy import copy
 from typing import Dict, List
 
 import numpy
@@ -68,6 +69,8 @@ class TextClassificationInstance(TextInstance):
 
 
 class IndexedTextClassificationInstance(IndexedInstance):
+    columnar_fields = {'word_indices': ('num_sentence_words', True)}
+
     def __init__(self, word_indices: List[int], label, index: int=None):
         super(IndexedTextClassificationInstance, self).__init__(label, index)
         self.word_indices = word_indices
@@ -85,6 +88,10 @@ class IndexedTextClassificationInstance(IndexedInstance):
     def pad(self, padding_lengths: Dict[str, int]):
         self.word_indices = self.pad_word_sequence(self.word_indices, padding_lengths)
 
+    @overrides
+    def _copy_for_padding(self):
+        return copy(self)
+
     @overrides
     def as_training_data(self):
         word_array = numpy.asarray(self.word_indices, dtype='int32')
@@ -0,0 +1,128 @@
+"""
+Vectorized padding of whole batches of word index sequences.
+
+:func:`IndexedInstance.pad_word_sequence` pads one sequence at a time, with Python lists, and
+then ``numpy.asarray`` has to walk the nested lists again to build an array.  The functions here
+instead allocate one zero-filled ``int32`` array for the whole batch and scatter every instance's
+(possibly truncated) indices into it with NumPy fancy indexing.  The results are identical to
+calling ``pad_word_sequence`` on each sequence and stacking them.
+
+Internally we represent a batch of sequences the way a CSR matrix represents its rows: one flat
+array of values, and an array of offsets saying where each sequence starts and ends.  If the
+sequences contain characters (each word is ``[word_index] + character_indices``), there is a
+second level of offsets, one per word, pointing into the values.
+"""
+import itertools
+from typing import Dict, List
+
+import numpy
+
+
+def lengths_to_offsets(lengths: numpy.ndarray) -> numpy.ndarray:
+    """
+    Converts an array of segment lengths into an array of ``len(lengths) + 1`` offsets, where
+    segment ``i`` spans ``offsets[i]`` to ``offsets[i + 1]``.
+    """
+    offsets = numpy.zeros(len(lengths) + 1, dtype='int64')
+    numpy.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def ragged_ranges(starts: numpy.ndarray, lengths: numpy.ndarray) -> numpy.ndarray:
+    """
+    Returns the concatenation of ``range(start, start + length)`` for each start and length,
+    without a Python loop.
+    """
+    lengths = numpy.asarray(lengths, dtype='int64')
+    total = int(numpy.sum(lengths))
+    segment_starts = numpy.repeat(numpy.cumsum(lengths) - lengths, lengths)
+    return numpy.repeat(numpy.asarray(starts, dtype='int64'), lengths) + numpy.arange(total) - segment_starts
+
+
+def pad_ragged_word_indices(values: numpy.ndarray,
+                            offsets: numpy.ndarray,
+                            word_offsets: numpy.ndarray,
+                            indices: numpy.ndarray,
+                            num_words: int,
+                            num_word_characters: int=None,
+                            truncate_from_right: bool=True) -> numpy.ndarray:
+    """
+    Builds a zero-padded ``int32`` array for the sequences at ``indices`` in a CSR-style ragged
+    array, of shape ``(len(indices), num_words)``, or ``(len(indices), num_words,
+    num_word_characters)`` if ``word_offsets`` is given.
+
+    Parameters
+    ----------
+    values: numpy.ndarray
+        The flat array of all word indices (or word and character indices) in every sequence.
+    offsets: numpy.ndarray
+        Sequence ``i`` has words ``offsets[i]`` through ``offsets[i + 1]``.
+    word_offsets: numpy.ndarray
+        If not ``None``, word ``j`` is ``values[word_offsets[j]:word_offsets[j + 1]]``; if
+        ``None``, word ``j`` is just ``values[j]``.
+    indices: numpy.ndarray
+        Which sequences to pad, in the order they should appear in the output.
+    num_words: int
+        The number of words to pad (or truncate) each sequence to.
+    num_word_characters: int, optional (default=None)
+        The length to pad (or truncate) each word to, if we have characters.  Like
+        ``pad_word_sequence``, we always keep the `first` ``num_word_characters`` entries of a
+        word.
+    truncate_from_right: bool, optional (default=True)
+        Same as in ``pad_word_sequence``: if ``True``, we keep the last ``num_words`` words and
+        put the padding at the front; if ``False``, we keep the first ``num_words`` words and put
+        the padding at the end.
+    """
+    word_starts = offsets[indices]
+    lengths = offsets[indices + 1] - word_starts
+    kept_lengths = numpy.minimum(lengths, num_words)
+    if truncate_from_right:
+        source_starts = word_starts + lengths - kept_lengths
+        target_starts = num_words - kept_lengths
+    else:
+        source_starts = word_starts
+        target_starts = numpy.zeros_like(kept_lengths)
+    rows = numpy.repeat(numpy.arange(len(indices)), kept_lengths)
+    positions = ragged_ranges(numpy.zeros_like(kept_lengths), kept_lengths)
+    word_ids = numpy.repeat(source_starts, kept_lengths) + positions
+    columns = numpy.repeat(target_starts, kept_lengths) + positions
+    if word_offsets is None:
+        padded = numpy.zeros((len(indices), num_words), dtype='int32')
+        padded[rows, columns] = values[word_ids]
+        return padded
+    padded = numpy.zeros((len(indices), num_words, num_word_characters), dtype='int32')
+    value_starts = word_offsets[word_ids]
+    kept_word_lengths = numpy.minimum(word_offsets[word_ids + 1] - value_starts, num_word_characters)
+    character_positions = ragged_ranges(numpy.zeros_like(kept_word_lengths), kept_word_lengths)
+    value_ids = numpy.repeat(value_starts, kept_word_lengths) + character_positions
+    padded[numpy.repeat(rows, kept_word_lengths),
+           numpy.repeat(columns, kept_word_lengths),
+           character_positions] = values[value_ids]
+    return padded
+
+
+def pad_word_sequences(word_sequences: List[List],
+                       padding_lengths: Dict[str, int],
+                       truncate_from_right: bool=True) -> numpy.ndarray:
+    """
+    The batch version of :func:`IndexedInstance.pad_word_sequence`: pads every sequence in
+    ``word_sequences`` and returns them stacked in a single ``int32`` array, of shape
+    ``(len(word_sequences), padding_lengths['num_sentence_words'])``, with a trailing
+    ``padding_lengths['num_word_characters']`` dimension if that key is present (in which case each
+    word must be a list of ``[word_index] + character_indices``, as produced by the "words and
+    characters" tokenizer).
+    """
+    num_words = padding_lengths['num_sentence_words']
+    sequence_offsets = lengths_to_offsets(numpy.fromiter(map(len, word_sequences), dtype='int64',
+                                                         count=len(word_sequences)))
+    indices = numpy.arange(len(word_sequences))
+    if 'num_word_characters' in padding_lengths:
+        words = list(itertools.chain.from_iterable(word_sequences))
+        word_offsets = lengths_to_offsets(numpy.fromiter(map(len, words), dtype='int64', count=len(words)))
+        values = numpy.fromiter(itertools.chain.from_iterable(words), dtype='int32', count=int(word_offsets[-1]))
+        return pad_ragged_word_indices(values, sequence_offsets, word_offsets, indices, num_words,
+                                       padding_lengths['num_word_characters'], truncate_from_right)
+    values = numpy.fromiter(itertools.chain.from_iterable(word_sequences), dtype='int32',
+                            count=int(sequence_offsets[-1]))
+    return pad_ragged_word_indices(values, sequence_offsets, None, indices, num_words,
+                                   truncate_from_right=truncate_from_right)
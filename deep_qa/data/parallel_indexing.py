@@ -0,0 +1,115 @@
+"""
+Helpers for tokenizing and indexing ``TextInstances`` in a pool of worker processes.
+
+Tokenizing is pure Python, so a single process can only use one core.  The functions here split
+the instances into contiguous chunks, hand the chunks to a ``multiprocessing.Pool``, and put the
+results back together `in the original order`, so that the output is exactly what the sequential
+code in :func:`DataIndexer.fit_word_dictionary` and :func:`TextDataset.to_indexed_dataset` would
+have produced.
+
+The workers get the ``TextInstance`` tokenizer (and the ``DataIndexer``, when indexing) once, when
+the pool starts, instead of with every chunk.  If the tokenizer is caching tokens, the workers that
+count words send back the tokens they computed, and we add them to the tokenizer's cache in this
+process, so that indexing the same data afterwards (with either the sequential or the parallel
+code) doesn't tokenize it again.
+"""
+from collections import deque, OrderedDict
+from multiprocessing import Pool
+import itertools
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from .instances.instance import IndexedInstance, TextInstance
+
+# The state each worker process needs, set once by ``_initialize_worker``.
+_worker_data_indexer = None  # pylint: disable=invalid-name
+
+
+def _initialize_worker(tokenizer, data_indexer):
+    global _worker_data_indexer  # pylint: disable=global-statement,invalid-name
+    TextInstance.tokenizer = tokenizer
+    _worker_data_indexer = data_indexer
+
+
+def _count_words(instances: List[TextInstance]) -> Tuple[Dict[str, Dict[str, int]],
+                                                         Dict[str, Tuple[str, ...]]]:
+    # We use OrderedDicts so that merging these counts adds words to the ``DataIndexer`` in the
+    # same order as the sequential code does.
+    namespace_word_counts = OrderedDict()
+    for instance in instances:
+        namespace_dict = instance.words()
+        for namespace in namespace_dict:
+            word_counts = namespace_word_counts.setdefault(namespace, OrderedDict())
+            for word in namespace_dict[namespace]:
+                word_counts[word] = word_counts.get(word, 0) + 1
+    # This is empty if the tokenizer isn't caching.  We clear the worker's cache after every chunk,
+    # so the tokens only get sent back once, and the worker doesn't hold on to them.
+    cached_tokens = TextInstance.tokenizer.get_cached_tokens()
+    TextInstance.tokenizer.clear_cache()
+    return namespace_word_counts, cached_tokens
+
+
+def _index_instances(instances: List[TextInstance]) -> List[IndexedInstance]:
+    return [instance.to_indexed_instance(_worker_data_indexer) for instance in instances]
+
+
+def _chunk(instances: Iterable[TextInstance], chunk_size: int) -> Iterator[List[TextInstance]]:
+    instances = iter(instances)
+    while True:
+        chunk = list(itertools.islice(instances, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _ordered_map(pool: Pool, function: Callable, chunks: Iterable[List], max_pending: int) -> Iterator[Any]:
+    """
+    Like ``pool.imap(function, chunks)``, except that we never have more than ``max_pending``
+    chunks in flight.  ``Pool.imap`` reads its input as fast as it can, which would pull all of a
+    lazy dataset into memory.
+    """
+    pending = deque()
+    for chunk in chunks:
+        pending.append(pool.apply_async(function, (chunk,)))
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def count_words_in_parallel(instances: Iterable[TextInstance],
+                            num_workers: int,
+                            chunk_size: int=1000) -> Dict[str, Dict[str, int]]:
+    """
+    Returns ``{namespace: {word: count}}`` over all ``instances``, computed by ``num_workers``
+    processes, each counting ``chunk_size`` instances at a time.  Namespaces and words appear in
+    the order in which they first occur in the data.  If ``TextInstance.tokenizer`` is caching
+    tokens, we also fill its cache (up to its ``cache_size``) with the tokens of ``instances``.
+    """
+    chunks = _chunk(instances, chunk_size)
+    namespace_word_counts = OrderedDict()
+    tokenizer = TextInstance.tokenizer
+    with Pool(num_workers, initializer=_initialize_worker, initargs=(tokenizer, None)) as pool:
+        for chunk_counts, cached_tokens in _ordered_map(pool, _count_words, chunks, 2 * num_workers):
+            if cached_tokens:
+                tokenizer.add_cached_tokens(cached_tokens, grow_cache=False)
+            for namespace, word_counts in chunk_counts.items():
+                merged_counts = namespace_word_counts.setdefault(namespace, OrderedDict())
+                for word, count in word_counts.items():
+                    merged_counts[word] = merged_counts.get(word, 0) + count
+    return namespace_word_counts
+
+
+def index_in_parallel(instances: Iterable[TextInstance],
+                      data_indexer,
+                      num_workers: int,
+                      chunk_size: int=1000) -> Iterator[IndexedInstance]:
+    """
+    Yields ``instance.to_indexed_instance(data_indexer)`` for every one of ``instances``, in
+    order, with the indexing done by ``num_workers`` processes, ``chunk_size`` instances at a
+    time.  ``instances`` is consumed lazily, so this also works with a lazy dataset.
+    """
+    chunks = _chunk(instances, chunk_size)
+    with Pool(num_workers, initializer=_initialize_worker,
+              initargs=(TextInstance.tokenizer, data_indexer)) as pool:
+        for indexed_chunk in _ordered_map(pool, _index_instances, chunks, 2 * num_workers):
+            yield from indexed_chunk
@@ -31,7 +31,7 @@ class CharacterTokenizer(Tokenizer):
         super(CharacterTokenizer, self).__init__(params)
 
     @overrides
-    def tokenize(self, text: str) -> List[str]:
+    def _tokenize(self, text: str) -> List[str]:
         return list(text)
 
     @overrides
@@ -42,7 +42,7 @@ class CharacterTokenizer(Tokenizer):
     def index_text(self,
                    text: str,
                    data_indexer: DataIndexer) -> List:
-        return [data_indexer.get_word_index(char) for char in self.tokenize(text)]
+        return data_indexer.get_word_indices(self.tokenize(text)).tolist()
 
     @overrides
     def embed_input(self,
@@ -1,3 +1,4 @@
+from collections import OrderedDict
 from typing import Callable, Dict, List, Tuple
 
 from keras.layers import Layer
@@ -13,10 +14,27 @@ class Tokenizer:
     handle these things because the tokenization you do could affect the shape of word sequence
     tensors in the model (e.g., a sentence could have shape (num_words,), (num_characters,), or
     (num_words, num_characters)).
+
+    Subclasses implement :func:`_tokenize`; :func:`tokenize` wraps it with an optional LRU cache,
+    keyed by the text.  The same text is typically tokenized at least twice in a run: once in
+    ``get_words_for_indexer`` when fitting a ``DataIndexer``, and again in ``index_text`` when
+    indexing the data.  If the cache is large enough to hold every distinct text in your data, the
+    second of these is just a lookup.  Because a cache that is too small to hold all of the data
+    gets no hits at all on a second, in-order pass, it's disabled by default.  ``TextTrainer``
+    turns on an unbounded cache while it fits its ``DataIndexer`` and indexes the training data,
+    and clears it afterwards.
+
+    Parameters
+    ----------
+    cache_size: int, optional (default=0)
+        The maximum number of texts whose tokens we remember.  Each entry holds the text and its
+        tokens, so this trades memory for tokenization time.  Zero means no caching.
     """
     def __init__(self, params: Params):
-        # This class does not take any parameters, but for consistency in the API we take a params
-        # dict as an argument.
+        self.cache_size = params.pop('cache_size', 0)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._token_cache = OrderedDict()
         params.assert_empty("Tokenizer")
 
     def get_custom_objects(self) -> Dict[str, 'Layer']:  # pylint: disable=no-self-use
@@ -28,12 +46,70 @@ class Tokenizer:
 
     def tokenize(self, text: str) -> List[str]:
         """
-        Actually splits the string into a sequence of tokens.  Note that this will only give you
+        Splits the string into a sequence of tokens (with :func:`_tokenize`), or returns the tokens
+        from the cache, if we've seen this text recently.  Note that this will only give you
         top-level tokenization!  If you're using a word-and-character tokenizer, for instance, this
         will only return the word tokenization.
         """
+        if not self.cache_size:
+            return self._tokenize(text)
+        tokens = self._token_cache.get(text)
+        if tokens is not None:
+            self.cache_hits += 1
+            self._token_cache.move_to_end(text)
+        else:
+            self.cache_misses += 1
+            tokens = tuple(self._tokenize(text))
+            self._token_cache[text] = tokens
+            if len(self._token_cache) > self.cache_size:
+                self._token_cache.popitem(last=False)
+        # We store tuples, and hand out new lists, so callers can't modify what's in the cache.
+        return list(tokens)
+
+    def _tokenize(self, text: str) -> List[str]:
+        """
+        Actually splits the string into a sequence of tokens.  This is what subclasses implement;
+        it is only called through :func:`tokenize`.
+        """
         raise NotImplementedError
 
+    def get_cache_info(self) -> Dict[str, int]:
+        """
+        Returns the number of cache hits and misses so far, the maximum size of the cache, and the
+        number of texts currently in it.
+        """
+        return {
+                'hits': self.cache_hits,
+                'misses': self.cache_misses,
+                'cache_size': self.cache_size,
+                'current_size': len(self._token_cache),
+                }
+
+    def clear_cache(self):
+        self._token_cache.clear()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def get_cached_tokens(self) -> Dict[str, Tuple[str, ...]]:
+        """
+        Returns a copy of the cache, mapping each text to its tokens, so that another tokenizer
+        with the same configuration can use it (see :func:`add_cached_tokens`).
+        """
+        return dict(self._token_cache)
+
+    def add_cached_tokens(self, cached_tokens: Dict[str, Tuple[str, ...]], grow_cache: bool=True):
+        """
+        Adds texts and their tokens, as returned by another tokenizer's :func:`get_cached_tokens`,
+        to this tokenizer's cache.  The other tokenizer must split text exactly the same way this
+        one does.  If ``grow_cache`` is ``True``, we grow the cache to hold all of them if we have
+        to; otherwise we keep to our ``cache_size``, evicting the least recently used texts.
+        """
+        self._token_cache.update(cached_tokens)
+        if grow_cache:
+            self.cache_size = max(self.cache_size, len(self._token_cache))
+        while len(self._token_cache) > self.cache_size:
+            self._token_cache.popitem(last=False)
+
     def get_words_for_indexer(self, text: str) -> Dict[str, List[str]]:
         """
         The DataIndexer needs to assign indices to whatever strings we see in the training data
@@ -36,7 +36,7 @@ class WordAndCharacterTokenizer(Tokenizer):
         super(WordAndCharacterTokenizer, self).__init__(params)
 
     @overrides
-    def tokenize(self, text: str) -> List[str]:
+    def _tokenize(self, text: str) -> List[str]:
         return self.word_processor.get_tokens(text)
 
     @overrides
@@ -48,13 +48,17 @@ class WordAndCharacterTokenizer(Tokenizer):
     @overrides
     def index_text(self, text: str, data_indexer: DataIndexer) -> List:
         words = self.tokenize(text)
+        word_indices = data_indexer.get_word_indices(words, namespace='words').tolist()
+        # TODO(matt): I'd be nice to keep the capitalization of the word in the character
+        # representation.  Doing that would require pretty fancy logic here, though.
+        # We look up the characters of all of the words at once, then split them back up by word.
+        char_indices = data_indexer.get_word_indices([char for word in words for char in word],
+                                                     namespace='characters').tolist()
         arrays = []
-        for word in words:
-            word_index = data_indexer.get_word_index(word, namespace='words')
-            # TODO(matt): I'd be nice to keep the capitalization of the word in the character
-            # representation.  Doing that would require pretty fancy logic here, though.
-            char_indices = [data_indexer.get_word_index(char, namespace='characters') for char in word]
-            arrays.append([word_index] + char_indices)
+        start = 0
+        for word, word_index in zip(words, word_indices):
+            arrays.append([word_index] + char_indices[start:start + len(word)])
+            start += len(word)
         return arrays
 
     @overrides
@@ -32,7 +32,7 @@ class WordTokenizer(Tokenizer):
         super(WordTokenizer, self).__init__(params)
 
     @overrides
-    def tokenize(self, text: str) -> List[str]:
+    def _tokenize(self, text: str) -> List[str]:
         return self.word_processor.get_tokens(text)
 
     @overrides
@@ -41,7 +41,7 @@ class WordTokenizer(Tokenizer):
 
     @overrides
     def index_text(self, text: str, data_indexer: DataIndexer) -> List:
-        return [data_indexer.get_word_index(word, namespace='words') for word in self.tokenize(text)]
+        return data_indexer.get_word_indices(self.tokenize(text), namespace='words').tolist()
 
     @overrides
     def embed_input(self,
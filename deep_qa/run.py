@@ -1,6 +1,8 @@
+from collections import OrderedDict
 from typing import List, Tuple, Union
 import sys
 import logging
+import multiprocessing
 import shutil
 import os
 
@@ -65,6 +67,29 @@ def run_model(param_path: str, model_class=None):
         This option is useful if you have implemented a new model class which
         is not one of the ones implemented in this library.
     """
+    _train_model(param_path, model_class, resume=False)
+
+
+def resume_model(param_path: str, model_class=None):
+    """
+    Continues training a model from its latest training checkpoint, which is written when you set
+    ``checkpoint_every_n_steps`` or ``checkpoint_every_n_minutes`` (see
+    :class:`~deep_qa.training.trainer.Trainer`).  Use this after a training run was interrupted,
+    with the same parameter file; training continues exactly where the checkpoint left off, and
+    finishes as :func:`run_model` would have, including test set evaluation.
+
+    Parameters
+    ----------
+    param_path: str, required.
+        The json file that the interrupted training run used.
+    model_class: DeepQaModel, optional (default=None).
+        This option is useful if you have implemented a new model class which
+        is not one of the ones implemented in this library.
+    """
+    _train_model(param_path, model_class, resume=True)
+
+
+def _train_model(param_path: str, model_class, resume: bool):
     param_dict = pyhocon.ConfigFactory.parse_file(param_path)
     params = Params(replace_none(param_dict))
     prepare_environment(params)
@@ -105,8 +130,12 @@ def run_model(param_path: str, model_class=None):
     model = model_class(params)
 
     if model.can_train():
-        logger.info("Training model")
-        model.train()
+        if resume:
+            logger.info("Resuming training")
+            model.resume()
+        else:
+            logger.info("Training model")
+            model.train()
         K.clear_session()
     else:
         raise ConfigurationError("The supplied model does not have enough training inputs.")
@@ -129,6 +158,15 @@ def load_model(param_path: str, model_class=None):
     A ``DeepQaModel`` instance.
     """
     logger.info("Loading model from parameter file: %s", param_path)
+    model = _build_model(param_path, model_class)
+    model.load_model()
+    return model
+
+
+def _build_model(param_path: str, model_class=None):
+    """
+    Constructs the model specified in ``param_path``, without building it or loading any weights.
+    """
     param_dict = pyhocon.ConfigFactory.parse_file(param_path)
     params = Params(replace_none(param_dict))
     prepare_environment(params)
@@ -141,9 +179,7 @@ def load_model(param_path: str, model_class=None):
         if params.pop('model_class', None) is not None:
             raise ConfigurationError("You have specified a local model class and passed a model_class argument"
                                      "in the json specification. These options are mutually exclusive.")
-    model = model_class(params)
-    model.load_model()
-    return model
+    return model_class(params)
 
 
 def score_dataset(param_path: str, dataset_files: List[str], model_class=None):
@@ -176,6 +212,25 @@ def score_dataset(param_path: str, dataset_files: List[str], model_class=None):
     return model.score_dataset(dataset)
 
 
+def score_dataset_to_files(param_path: str, dataset_files: List[str], output_prefix: str, model_class=None):
+    """
+    Like :func:`score_dataset`, but streams the predictions and labels to ``.npy`` files starting
+    with ``output_prefix`` instead of holding them in memory (see
+    :func:`~deep_qa.training.text_trainer.TextTrainer.score_dataset_to_files`).  If the model's
+    parameters have ``lazy_datasets`` set, the dataset is also read one chunk at a time.
+
+    Returns
+    -------
+    predictions: numpy.memmap
+        The predictions, memory-mapped from their file.
+    labels: numpy.memmap
+        The labels, memory-mapped from their file, or ``None`` if the data has no labels.
+    """
+    model = load_model(param_path, model_class=model_class)
+    dataset = model.load_dataset_from_files(dataset_files)
+    return model.score_dataset_to_files(dataset, output_prefix)
+
+
 def evaluate_model(param_path: str, dataset_files: List[str]=None, model_class=None):
     """
     Loads a model and evaluates it on some test set.
@@ -204,12 +259,21 @@ def evaluate_model(param_path: str, dataset_files: List[str]=None, model_class=N
 
 def score_dataset_with_ensemble(param_paths: List[str],
                                 dataset_files: List[str],
-                                model_class=None) -> Tuple[numpy.array, numpy.array]:
+                                model_class=None,
+                                num_workers: int=None) -> Tuple[numpy.array, numpy.array]:
     """
     Loads all of the models specified in ``param_paths``, uses each of them to score the dataset
     specified by ``dataset_files``, and averages their scores, return an array of ensembled model
     predictions.
 
+    Each model is loaded and scored in its own worker process (up to ``num_workers`` at a time),
+    so with enough cores an ensemble takes about as long as its slowest model.  We add each
+    model's predictions to a running sum as soon as it finishes, instead of keeping all of them
+    until the end.  Models whose tokenizers split text the same way (see
+    :func:`~deep_qa.training.text_trainer.TextTrainer.get_tokenizer_key`) share one tokenization of
+    the dataset, which we do here before handing out the models, so that each of them only has to
+    index it with its own vocabulary.
+
     Parameters
     ----------
     param_paths: List[str]
@@ -221,6 +285,10 @@ def score_dataset_with_ensemble(param_paths: List[str],
     model_class: ``DeepQaModel``, optional (default=None)
         This option is useful if you have implemented a new model class which is not one of the
         ones implemented in this library.
+    num_workers: int, optional (default=None)
+        The number of models to score at once, each in its own process.  If ``None``, we use one
+        process per model, up to the number of cores on this machine.  With one worker (or one
+        model), we score the models one after another in this process.
 
     Returns
     -------
@@ -234,22 +302,83 @@ def score_dataset_with_ensemble(param_paths: List[str],
         the labels is consistent across the models, though; if not, the whole idea of ensembling
         them this way is moot, anyway.
     """
-    models = [load_model(param_path, model_class) for param_path in param_paths]
-    predictions = []
-    labels_to_return = None
-    for i, model in enumerate(models):
-        logger.info("Scoring model %d of %d", i + 1, len(models))
-        dataset = model.load_dataset_from_files(dataset_files)
-        model_predictions, labels = model.score_dataset(dataset)
-        predictions.append(model_predictions)
-        if labels_to_return is None:
-            labels_to_return = labels
+    if num_workers is None:
+        num_workers = min(len(param_paths), multiprocessing.cpu_count())
+    cached_tokens = _tokenize_for_ensemble(param_paths, dataset_files, model_class)
+    tasks = [(index, param_path, dataset_files, model_class, cached_tokens[index])
+             for index, param_path in enumerate(param_paths)]
+    if num_workers <= 1 or len(param_paths) == 1:
+        results = map(_score_ensemble_member, tasks)
+        summed_predictions, labels_to_return = _sum_predictions(results, len(param_paths))
+    else:
+        # We use "spawn" so that the workers don't inherit any tensorflow state from this process,
+        # and a fresh worker for each model, so that each model's memory is freed when it's done.
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(num_workers, maxtasksperchild=1) as pool:
+            results = pool.imap_unordered(_score_ensemble_member, tasks)
+            summed_predictions, labels_to_return = _sum_predictions(results, len(param_paths))
     logger.info("Averaging model predictions")
-    all_predictions = numpy.stack(predictions)
-    averaged = numpy.mean(all_predictions, axis=0)
+    if isinstance(summed_predictions, list):
+        averaged = [predictions / len(param_paths) for predictions in summed_predictions]
+    else:
+        averaged = summed_predictions / len(param_paths)
     return averaged, labels_to_return
 
 
+def _tokenize_for_ensemble(param_paths: List[str], dataset_files: List[str], model_class) -> List[dict]:
+    """
+    Groups the models in ``param_paths`` by their tokenizer configuration, and for each group of
+    more than one model, tokenizes the dataset once.  Returns the tokens each model should start
+    with in its tokenizer's cache (empty for a model that doesn't share its tokenizer).
+    """
+    if len(param_paths) == 1:
+        return [{}]
+    models = [_build_model(param_path, model_class) for param_path in param_paths]
+    groups = OrderedDict()
+    for index, model in enumerate(models):
+        if hasattr(model, 'get_tokenizer_key'):
+            groups.setdefault(model.get_tokenizer_key(), []).append(index)
+    cached_tokens = [{} for _ in param_paths]
+    for indices in groups.values():
+        if len(indices) > 1:
+            logger.info("Tokenizing the dataset once for models %s", [index + 1 for index in indices])
+            group_tokens = models[indices[0]].tokenize_dataset_files(dataset_files)
+            for index in indices:
+                cached_tokens[index] = group_tokens
+    return cached_tokens
+
+
+def _score_ensemble_member(task):
+    index, param_path, dataset_files, model_class, cached_tokens = task
+    model = load_model(param_path, model_class)
+    if cached_tokens:
+        model.tokenizer.add_cached_tokens(cached_tokens)
+    dataset = model.load_dataset_from_files(dataset_files)
+    predictions, labels = model.score_dataset(dataset)
+    # Only the first model's labels get returned, so there's no need to send the others back.
+    return index, predictions, labels if index == 0 else None
+
+
+def _sum_predictions(results, num_models: int):
+    summed_predictions = None
+    labels_to_return = None
+    for num_finished, (index, predictions, labels) in enumerate(results, start=1):
+        logger.info("Finished scoring model %d (%d of %d)", index + 1, num_finished, num_models)
+        if index == 0:
+            labels_to_return = labels
+        if summed_predictions is None:
+            if isinstance(predictions, list):
+                summed_predictions = [numpy.array(output) for output in predictions]
+            else:
+                summed_predictions = numpy.array(predictions)
+        elif isinstance(predictions, list):
+            for summed_output, output in zip(summed_predictions, predictions):
+                summed_output += output
+        else:
+            summed_predictions += predictions
+    return summed_predictions, labels_to_return
+
+
 def compute_accuracy(predictions: numpy.array, labels: numpy.array):
     """
     Computes a simple categorical accuracy metric, useful if you used ``score_dataset`` to get
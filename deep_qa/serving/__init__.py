@@ -0,0 +1,2 @@
+from .micro_batcher import LatencyTracker, MicroBatcher
+from .server import make_server
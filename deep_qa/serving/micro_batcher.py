@@ -0,0 +1,237 @@
+"""
+Batches prediction requests from many threads together, for serving a trained model.
+
+Loading a model (its parameters, weights and ``DataIndexer``) takes much longer than running it
+on a few instances, and running it on one instance at a time wastes most of what a batched
+forward pass can do.  A :class:`MicroBatcher` holds one loaded model, and a background thread
+that collects the requests made from any number of other threads: it waits for up to
+``max_wait_ms`` after the first pending request for others to arrive (or until it has
+``max_batch_size`` instances), then sorts all of their instances by padding length, cuts them
+into batches the way the ``DataGenerator`` does for scoring, pads each batch only as much as it
+needs (rounded up to ``padding_buckets``, if given, so the model sees few distinct shapes), and
+hands each request back its own predictions.
+"""
+from collections import deque
+from concurrent.futures import Future
+import logging
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Union
+
+import numpy
+import tensorflow
+
+from ..common.params import Params
+from ..data import DataGenerator, IndexedDataset
+from ..data.instances import IndexedInstance
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+class LatencyTracker:
+    """
+    Keeps the most recent ``window`` latencies (in seconds), and reports percentiles over them.
+    This is safe to use from several threads.
+    """
+    def __init__(self, window: int=10000):
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, latency: float):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def get_percentiles(self, percentiles: List[float]=(50, 90, 99)) -> Dict[str, float]:
+        """
+        Returns ``{"p50": ..., "p90": ..., "p99": ..., "mean": ...}`` (for the default
+        ``percentiles``), in milliseconds, or an empty dictionary if we haven't seen anything yet.
+        """
+        with self._lock:
+            latencies = numpy.asarray(self._latencies) * 1000
+        if len(latencies) == 0:
+            return {}
+        values = numpy.percentile(latencies, percentiles)
+        stats = {'p%g' % percentile: float(value) for percentile, value in zip(percentiles, values)}
+        stats['mean'] = float(numpy.mean(latencies))
+        return stats
+
+
+class MicroBatcher:
+    """
+    Runs a loaded ``TextTrainer`` on requests from several threads, batching concurrent requests
+    together.  Call :func:`predict` from any thread, and :func:`stop` when you're done.
+
+    Parameters
+    ----------
+    trainer: TextTrainer
+        A trained model, already loaded (e.g., with :func:`deep_qa.run.load_model`).
+    max_batch_size: int, optional (default=32)
+        The maximum number of instances that we run the model on at once.  We stop waiting for
+        more requests once we have this many instances.  A single request with more instances than
+        this is split into several batches.
+    max_wait_ms: float, optional (default=5.0)
+        How long to wait for more requests after the first one arrives, in milliseconds.  This is
+        the most latency that batching adds to a request.
+    padding_buckets: str or List[int], optional (default=None)
+        Round padding lengths up to these bucket boundaries (see
+        :func:`~deep_qa.data.batching.bucket_lengths`), so the model only sees a few distinct input
+        shapes.
+    latency_window: int, optional (default=10000)
+        We report latency percentiles over this many of the most recent requests.
+    """
+    def __init__(self,
+                 trainer,
+                 max_batch_size: int=32,
+                 max_wait_ms: float=5.0,
+                 padding_buckets: Union[str, List[int]]=None,
+                 latency_window: int=10000):
+        self.trainer = trainer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        # We always pad per batch, whatever the model was trained with; the model's fixed padding
+        # lengths, if it has any, still take precedence (see ``DataGenerator.pad_batch``).
+        self.data_generator = DataGenerator(trainer, Params({'dynamic_padding': True,
+                                                             'padding_noise': 0.0,
+                                                             'padding_buckets': padding_buckets}))
+        self.latencies = LatencyTracker(latency_window)
+        self.num_requests = 0
+        self.num_instances = 0
+        self.num_batches = 0
+        self._stats_lock = threading.Lock()
+
+        # Keras builds the predict function lazily, and TensorFlow's default graph is per-thread,
+        # so we build it here and run it in this graph from the batching thread.
+        self._graph = tensorflow.get_default_graph()
+        trainer.model._make_predict_function()  # pylint: disable=protected-access
+        self._requests = queue.Queue()
+        # Once we're stopped, we don't take any more requests.  The lock makes sure that no request
+        # is queued after the one that tells the batching thread to stop.
+        self._stopped = False
+        self._stop_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._batch_requests, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def index_line(self, line: str) -> IndexedInstance:
+        """
+        Reads an instance from a line in the model's data format (as in a ``test_files`` file),
+        and indexes it with the model's ``DataIndexer``.
+        """
+        instance = self.trainer._instance_type().read_from_line(line)  # pylint: disable=protected-access
+        return instance.to_indexed_instance(self.trainer.data_indexer)
+
+    def predict(self, lines: List[str]) -> List[Any]:
+        """
+        Returns the model's predictions for each line, as (JSON-serializable) nested lists, in
+        order.  If the model has several outputs, each prediction is a list with one entry per
+        output.  This blocks until the batches containing these lines have been run.
+        """
+        start_time = time.time()
+        return self.predict_indexed([self.index_line(line) for line in lines], start_time)
+
+    def predict_indexed(self, instances: List[IndexedInstance], start_time: float=None) -> List[Any]:
+        """
+        Like :func:`predict`, for instances you've already indexed with :func:`index_line`.  We
+        record the request's latency from ``start_time``, if given, or else from now.  Raises a
+        ``RuntimeError`` if we've been stopped.
+        """
+        if start_time is None:
+            start_time = time.time()
+        if not instances:
+            return []
+        future = Future()
+        with self._stop_lock:
+            if self._stopped:
+                raise RuntimeError("This MicroBatcher has been stopped")
+            self._requests.put((instances, future))
+        predictions = future.result()
+        self.latencies.add(time.time() - start_time)
+        with self._stats_lock:
+            self.num_requests += 1
+        return predictions
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = {
+                    'num_requests': self.num_requests,
+                    'num_instances': self.num_instances,
+                    'num_batches': self.num_batches,
+                    'mean_batch_size': self.num_instances / self.num_batches if self.num_batches else 0.0,
+                    }
+        stats['latency_ms'] = self.latencies.get_percentiles()
+        return stats
+
+    def stop(self):
+        """
+        Stops the batching thread, after it finishes the requests that are already queued.  Any
+        requests that are still in the queue after that (which shouldn't happen) get an exception,
+        so that nobody waits for them forever, as do any later calls to :func:`predict`.
+        """
+        with self._stop_lock:
+            if not self._stopped:
+                self._stopped = True
+                self._requests.put(None)
+        self._thread.join()
+        while True:
+            try:
+                request = self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                request[1].set_exception(RuntimeError("This MicroBatcher was stopped before the "
+                                                      "request was run"))
+
+    def _batch_requests(self):
+        stopping = False
+        while not stopping:
+            request = self._requests.get()
+            if request is None:
+                break
+            pending = [request]
+            num_instances = len(request[0])
+            deadline = time.time() + self.max_wait
+            while num_instances < self.max_batch_size:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self._requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                pending.append(request)
+                num_instances += len(request[0])
+            self._run_requests(pending)
+
+    def _run_requests(self, pending: List):
+        instances = [instance for request_instances, _ in pending for instance in request_instances]
+        try:
+            predictions = self._predict_instances(IndexedDataset(instances))
+        except Exception as error:  # pylint: disable=broad-except
+            logger.exception("Prediction failed")
+            for _, future in pending:
+                future.set_exception(error)
+            return
+        start = 0
+        for request_instances, future in pending:
+            future.set_result(predictions[start:start + len(request_instances)])
+            start += len(request_instances)
+
+    def _predict_instances(self, dataset: IndexedDataset) -> List[Any]:
+        predictions = [None] * len(dataset)
+        for group in self.data_generator.create_scoring_batches(dataset, self.max_batch_size):
+            inputs, _ = self.data_generator.pad_batch(dataset.select(group))
+            with self._graph.as_default():
+                outputs = self.trainer.model.predict_on_batch(inputs)
+            multiple_outputs = isinstance(outputs, list)
+            if not multiple_outputs:
+                outputs = [outputs]
+            for row, index in enumerate(group):
+                row_outputs = [output[row].tolist() for output in outputs]
+                predictions[index] = row_outputs if multiple_outputs else row_outputs[0]
+            with self._stats_lock:
+                self.num_batches += 1
+                self.num_instances += len(group)
+        return predictions
@@ -0,0 +1,106 @@
+"""
+A small HTTP server around a :class:`~deep_qa.serving.micro_batcher.MicroBatcher`, listening on a
+TCP port or a UNIX socket.  It has three endpoints:
+
+- ``POST /predict``, with a JSON body like ``{"instances": ["line one", "line two"]}``, where each
+  line is an instance in the model's data format (as in a ``test_files`` file).  Returns
+  ``{"predictions": [...]}``, one prediction per line.
+- ``GET /stats``, which returns request, instance and batch counts, and latency percentiles in
+  milliseconds.
+- ``GET /health``, which returns ``{"status": "ok"}``.
+
+Each connection is handled in its own thread, so concurrent requests get batched together.
+"""
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+import logging
+import os
+import socketserver
+import time
+
+from .micro_batcher import MicroBatcher
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+class PredictionRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        elif self.path == '/stats':
+            self._send_json(200, self.server.micro_batcher.get_stats())
+        else:
+            self._send_json(404, {'error': 'Unknown path: %s' % self.path})
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        if self.path != '/predict':
+            self._send_json(404, {'error': 'Unknown path: %s' % self.path})
+            return
+        start_time = time.time()
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(content_length).decode('utf-8'))
+            lines = request['instances']
+            if not isinstance(lines, list) or not all(isinstance(line, str) for line in lines):
+                raise ValueError('"instances" must be a list of strings')
+            instances = [self.server.micro_batcher.index_line(line) for line in lines]
+        except Exception as error:  # pylint: disable=broad-except
+            self._send_json(400, {'error': 'Bad request: %r' % error})
+            return
+        try:
+            predictions = self.server.micro_batcher.predict_indexed(instances, start_time)
+        except Exception as error:  # pylint: disable=broad-except
+            self._send_json(500, {'error': 'Prediction failed: %r' % error})
+            return
+        self._send_json(200, {'predictions': predictions})
+
+    def address_string(self):
+        # Clients of a UNIX socket don't have an address.
+        if isinstance(self.client_address, tuple):
+            return super(PredictionRequestHandler, self).address_string()
+        return 'unix-socket'
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send_json(self, status: int, body):
+        encoded_body = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(encoded_body)))
+        self.end_headers()
+        self.wfile.write(encoded_body)
+
+
+class PredictionServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, micro_batcher: MicroBatcher):
+        self.micro_batcher = micro_batcher
+        super(PredictionServer, self).__init__(address, PredictionRequestHandler)
+
+
+class UnixPredictionServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, micro_batcher: MicroBatcher):
+        self.micro_batcher = micro_batcher
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        super(UnixPredictionServer, self).__init__(socket_path, PredictionRequestHandler)
+
+
+def make_server(micro_batcher: MicroBatcher,
+                host: str='localhost',
+                port: int=8000,
+                unix_socket: str=None):
+    """
+    Returns a server for ``micro_batcher``, listening on ``unix_socket`` if it's given, and on
+    ``host:port`` otherwise (port 0 picks a free port; read it from ``server.server_address``).
+    Call ``serve_forever()`` on it to start serving.
+    """
+    if unix_socket is not None:
+        return UnixPredictionServer(unix_socket, micro_batcher)
+    return PredictionServer((host, port), micro_batcher)
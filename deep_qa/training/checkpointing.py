@@ -0,0 +1,478 @@
+"""
+Writes model checkpoints without stopping training to do it.
+
+Saving weights with Keras' ``ModelCheckpoint`` serializes the whole model to HDF5 on the training
+thread, which can take tens of seconds with large embedding matrices.  Here we only copy the weight
+values into host memory on the training thread (a single ``session.run``), and write the file on a
+background thread while training continues.  Files are written to a temporary name and renamed into
+place, so a crash never leaves a half-written checkpoint behind.
+
+Those weight files are enough to use a trained model, but not to continue training one.  For that
+we also write `training checkpoints` (see :class:`TrainingCheckpointer`), which hold every variable
+in the graph (so the optimizer's slots and the global step too), the position in the training
+data, the state of the random number generators, and the state of the callbacks that decide when
+to stop and what to save.  :func:`~deep_qa.training.trainer.Trainer.resume` uses the latest one to
+continue an interrupted training run exactly where it left off.
+"""
+from queue import Queue
+import logging
+import os
+import pickle
+import random
+import shutil
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import h5py
+import numpy
+import tensorflow
+from keras import backend as K
+from keras import __version__ as keras_version
+from keras.callbacks import Callback, EarlyStopping
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+# For each layer: the layer name, the names of its weights, and their values.
+WeightSnapshot = List[Tuple[str, List[str], List[numpy.ndarray]]]  # pylint: disable=invalid-name
+
+
+def snapshot_weights(layers) -> WeightSnapshot:
+    """
+    Copies the current values of all of the weights in ``layers`` into host memory, fetching them
+    all with a single ``session.run``.
+    """
+    weights = [weight for layer in layers for weight in layer.weights]
+    values = K.batch_get_value(weights)
+    snapshot = []
+    start = 0
+    for layer in layers:
+        weight_names = []
+        for i, weight in enumerate(layer.weights):
+            # This matches the naming that Keras uses when it saves weights.
+            if hasattr(weight, 'name') and weight.name:
+                weight_names.append(str(weight.name))
+            else:
+                weight_names.append('param_' + str(i))
+        snapshot.append((layer.name, weight_names, values[start:start + len(weight_names)]))
+        start += len(weight_names)
+    return snapshot
+
+
+def write_weights_file(filename: str, snapshot: WeightSnapshot):
+    """
+    Writes a weight snapshot to ``filename`` in the same HDF5 format as ``Model.save_weights``, so
+    it can be read with ``Model.load_weights``.  We write to a temporary file and rename it, so the
+    file is either completely written or not there at all.
+    """
+    temp_filename = filename + ".tmp"
+    with h5py.File(temp_filename, 'w') as weights_file:
+        weights_file.attrs['layer_names'] = [layer_name.encode('utf8') for layer_name, _, _ in snapshot]
+        weights_file.attrs['backend'] = K.backend().encode('utf8')
+        weights_file.attrs['keras_version'] = str(keras_version).encode('utf8')
+        for layer_name, weight_names, values in snapshot:
+            group = weights_file.create_group(layer_name)
+            encoded_names = [name.encode('utf8') for name in weight_names]
+            group.attrs['weight_names'] = encoded_names
+            for name, value in zip(encoded_names, values):
+                dataset = group.create_dataset(name, value.shape, dtype=value.dtype)
+                if not value.shape:
+                    dataset[()] = value
+                else:
+                    dataset[:] = value
+    os.replace(temp_filename, filename)
+
+
+def link_or_copy(source: str, destination: str):
+    """
+    Makes ``destination`` a hard link to ``source``, replacing ``destination`` atomically if it
+    already exists.  If the filesystem doesn't support hard links, we copy the file instead (still
+    renaming the copy into place).
+    """
+    temp_destination = destination + ".tmp"
+    if os.path.exists(temp_destination):
+        os.remove(temp_destination)
+    try:
+        os.link(source, temp_destination)
+    except OSError:
+        shutil.copyfile(source, temp_destination)
+    os.replace(temp_destination, destination)
+
+
+def remove_files(filenames: List[str]):
+    for filename in filenames:
+        if os.path.exists(filename):
+            os.remove(filename)
+
+
+class CheckpointWriter:
+    """
+    Runs checkpoint-writing functions, one at a time and in order, on a background thread.
+
+    At most ``max_pending`` writes can be waiting; if training produces checkpoints faster than we
+    can write them, :func:`submit` blocks until there's room, so we never hold more than a few
+    snapshots in memory.  Errors from a write are logged and raised again from the next call to
+    :func:`submit` or :func:`wait`.
+    """
+    def __init__(self, max_pending: int=1):
+        self._queue = Queue(maxsize=max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            function, args = self._queue.get()
+            try:
+                function(*args)
+            except Exception as error:  # pylint: disable=broad-except
+                logger.exception("Writing checkpoint failed")
+                self._error = error
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def submit(self, function: Callable, *args):
+        self._raise_error()
+        self._queue.put((function, args))
+
+    def wait(self):
+        """
+        Blocks until everything submitted so far has been written.
+        """
+        self._queue.join()
+        self._raise_error()
+
+
+class AsyncModelCheckpoint(Callback):
+    """
+    A replacement for Keras' ``ModelCheckpoint`` (with ``save_weights_only=True``) that snapshots
+    the weights at the end of an epoch and writes them with a :class:`CheckpointWriter`.  All
+    pending writes are finished at the end of training.
+
+    Parameters
+    ----------
+    filepath: str
+        The weight file to write, which is formatted with the (zero-based) ``epoch`` and the values
+        in ``logs``, as in ``ModelCheckpoint``.
+    monitor: str, optional (default='val_loss')
+        The quantity to monitor, if ``save_best_only`` is ``True``.
+    save_best_only: bool, optional (default=False)
+        If ``True``, we only save a checkpoint when ``monitor`` improves.  Whether that means
+        increasing or decreasing is decided as in ``ModelCheckpoint``'s ``"auto"`` mode.
+    keep_checkpoints: int, optional (default=None)
+        If given, we delete older checkpoint files, keeping only the last this many written by this
+        callback.  The file with the best value of ``monitor`` is always kept.
+    writer: CheckpointWriter, optional (default=None)
+        The writer to use.  If ``None``, we make our own.  Sharing a writer with a
+        :class:`TrainingCheckpointer` makes sure a training checkpoint is never written before the
+        weight files it refers to.
+    """
+    def __init__(self,
+                 filepath: str,
+                 monitor: str='val_loss',
+                 save_best_only: bool=False,
+                 keep_checkpoints: int=None,
+                 writer: CheckpointWriter=None):
+        super(AsyncModelCheckpoint, self).__init__()
+        self.filepath = filepath
+        self.monitor = monitor
+        self.save_best_only = save_best_only
+        self.keep_checkpoints = keep_checkpoints
+        if 'acc' in monitor or monitor.startswith('fmeasure'):
+            self.monitor_op = numpy.greater
+            self.best = -numpy.Inf
+        else:
+            self.monitor_op = numpy.less
+            self.best = numpy.Inf
+        self.best_filename = None
+        self.written_filenames = []
+        self.writer = writer or CheckpointWriter()
+
+    def get_state(self) -> Dict[str, Any]:
+        return {'best': self.best,
+                'best_filename': self.best_filename,
+                'written_filenames': list(self.written_filenames)}
+
+    def set_state(self, state: Dict[str, Any]):
+        self.best = state['best']
+        self.best_filename = state['best_filename']
+        self.written_filenames = list(state['written_filenames'])
+
+    def on_epoch_end(self, epoch, logs=None):
+        logs = logs or {}
+        filename = self.filepath.format(epoch=epoch, **logs)
+        current = logs.get(self.monitor)
+        improved = current is not None and self.monitor_op(current, self.best)
+        if self.save_best_only:
+            if current is None:
+                logger.warning("Can save best model only with %s available, skipping.", self.monitor)
+                return
+            if not improved:
+                return
+        if improved:
+            self.best = current
+            self.best_filename = filename
+        logger.info("Epoch %d: saving model to %s", epoch, filename)
+        snapshot = snapshot_weights(self.model.layers)
+        self.writer.submit(write_weights_file, filename, snapshot)
+        if filename in self.written_filenames:
+            self.written_filenames.remove(filename)
+        self.written_filenames.append(filename)
+        if self.keep_checkpoints is not None:
+            num_to_remove = max(0, len(self.written_filenames) - self.keep_checkpoints)
+            old_filenames = [old_filename for old_filename in self.written_filenames[:num_to_remove]
+                             if old_filename != self.best_filename]
+            if old_filenames:
+                self.written_filenames = [written_filename for written_filename in self.written_filenames
+                                          if written_filename not in old_filenames]
+                # This runs after the newest checkpoint has been written, because the writer runs
+                # things in order.
+                self.writer.submit(remove_files, old_filenames)
+
+    def on_train_end(self, logs=None):
+        self.writer.wait()
+
+
+class ResumableEarlyStopping(EarlyStopping):
+    """
+    Keras' ``EarlyStopping``, with methods to get and set how long we've been waiting for an
+    improvement, so that resuming training doesn't reset our patience.  ``EarlyStopping`` resets
+    its state when training begins, so :func:`set_state` takes effect at the start of the next
+    call to ``fit``.
+    """
+    def __init__(self, *args, **kwargs):
+        super(ResumableEarlyStopping, self).__init__(*args, **kwargs)
+        self.resumed_state = None
+
+    def get_state(self) -> Dict[str, Any]:
+        return {'wait': self.wait, 'best': self.best}
+
+    def set_state(self, state: Dict[str, Any]):
+        self.resumed_state = state
+
+    def on_train_begin(self, logs=None):
+        super(ResumableEarlyStopping, self).on_train_begin(logs)
+        if self.resumed_state is not None:
+            self.wait = self.resumed_state['wait']
+            self.best = self.resumed_state['best']
+            self.resumed_state = None
+
+
+def snapshot_variables() -> Dict[str, numpy.ndarray]:
+    """
+    Copies the current values of every global variable in the graph - the model weights, the
+    optimizer's slots and the global step - into host memory, with a single ``session.run``.
+    """
+    variables = tensorflow.global_variables()
+    values = K.batch_get_value(variables)
+    return {variable.name: value for variable, value in zip(variables, values)}
+
+
+def restore_variables(values: Dict[str, numpy.ndarray]):
+    """
+    Sets every global variable in the graph to its value in ``values`` (as returned by
+    :func:`snapshot_variables`).  The graph has to have been built the same way as the one we took
+    the snapshot from, including the optimizer's slot variables, which TensorFlow only creates when
+    we make the training function.
+    """
+    assignments = []
+    for variable in tensorflow.global_variables():
+        if variable.name not in values:
+            raise ValueError("Variable %s is not in the training checkpoint; was the model built "
+                             "with different parameters?" % variable.name)
+        assignments.append((variable, values[variable.name]))
+    K.batch_set_value(assignments)
+
+
+def get_random_state() -> Dict[str, Any]:
+    return {'python': random.getstate(), 'numpy': numpy.random.get_state()}
+
+
+def set_random_state(state: Dict[str, Any]):
+    random.setstate(state['python'])
+    numpy.random.set_state(state['numpy'])
+
+
+def _get_latest_pointer_filename(prefix: str) -> str:
+    return prefix + "_training_checkpoint"
+
+
+def write_training_checkpoint(prefix: str,
+                              step: int,
+                              variables: Dict[str, numpy.ndarray],
+                              state: Dict[str, Any],
+                              keep_checkpoints: int=2):
+    """
+    Writes a training checkpoint into the directory ``{prefix}_training_checkpoint_{step}``, then
+    points ``{prefix}_training_checkpoint`` at it and deletes all but the last ``keep_checkpoints``
+    checkpoint directories.  The directory is written under a temporary name and renamed into
+    place, and the pointer file is replaced atomically, so the pointer always names a complete
+    checkpoint.
+    """
+    directory = "%s_training_checkpoint_%d" % (prefix, step)
+    temp_directory = directory + ".tmp"
+    shutil.rmtree(temp_directory, ignore_errors=True)
+    os.makedirs(temp_directory)
+    names = sorted(variables)
+    numpy.savez(os.path.join(temp_directory, "variables.npz"), *[variables[name] for name in names])
+    with open(os.path.join(temp_directory, "state.pkl"), "wb") as state_file:
+        pickle.dump(dict(state, variable_names=names), state_file)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(temp_directory, directory)
+
+    pointer_filename = _get_latest_pointer_filename(prefix)
+    with open(pointer_filename + ".tmp", "w") as pointer_file:
+        print(os.path.basename(directory), file=pointer_file)
+    os.replace(pointer_filename + ".tmp", pointer_filename)
+
+    directory_prefix = os.path.basename(prefix) + "_training_checkpoint_"
+    checkpoint_steps = []
+    for name in os.listdir(os.path.dirname(prefix) or "."):
+        if name.startswith(directory_prefix) and name[len(directory_prefix):].isdigit():
+            checkpoint_steps.append(int(name[len(directory_prefix):]))
+    for old_step in sorted(checkpoint_steps)[:-keep_checkpoints]:
+        if old_step != step:
+            shutil.rmtree("%s_training_checkpoint_%d" % (prefix, old_step), ignore_errors=True)
+
+
+def read_latest_training_checkpoint(prefix: str) -> Tuple[Dict[str, numpy.ndarray], Dict[str, Any]]:
+    """
+    Reads the training checkpoint that ``{prefix}_training_checkpoint`` points to, returning the
+    variable values and the rest of the state that were passed to
+    :func:`write_training_checkpoint`.  Returns ``None`` if there is no training checkpoint.
+    """
+    pointer_filename = _get_latest_pointer_filename(prefix)
+    if not os.path.exists(pointer_filename):
+        return None
+    with open(pointer_filename) as pointer_file:
+        directory = os.path.join(os.path.dirname(prefix), pointer_file.read().strip())
+    logger.info("Reading training checkpoint from %s", directory)
+    with open(os.path.join(directory, "state.pkl"), "rb") as state_file:
+        state = pickle.load(state_file)
+    names = state.pop('variable_names')
+    with numpy.load(os.path.join(directory, "variables.npz")) as variables_file:
+        variables = {name: variables_file['arr_%d' % i] for i, name in enumerate(names)}
+    return variables, state
+
+
+class TrainingCheckpointer(Callback):
+    """
+    Writes a training checkpoint (see :func:`write_training_checkpoint`) every ``every_n_steps``
+    training steps, every ``every_n_minutes`` minutes, and at the end of every epoch.
+
+    A checkpoint that is due after the last batch of an epoch is written at the end of the epoch
+    instead, after validation and the other callbacks have run, so that resuming from it starts
+    a new epoch.  This callback should therefore come `last` in the list of callbacks.
+
+    Parameters
+    ----------
+    prefix: str
+        The ``model_serialization_prefix``; checkpoints are written next to the model files.
+    get_data_position: Callable[[int, int], Any]
+        Called with the epoch and the number of batches taken in it when we write a checkpoint;
+        returns whatever the ``Trainer`` needs to reproduce the training batches from there on.
+    stateful_callbacks: Dict[str, Callback]
+        Callbacks with ``get_state`` and ``set_state`` methods, whose state we save and restore.
+    every_n_steps: int, optional (default=None)
+        If given, we write a checkpoint after every this many training steps.
+    every_n_minutes: float, optional (default=None)
+        If given, we write a checkpoint when this many minutes have passed since the last one.
+    keep_checkpoints: int, optional (default=2)
+        The number of training checkpoints to keep on disk.
+    writer: CheckpointWriter, optional (default=None)
+        The writer to use.  If ``None``, we make our own.
+    """
+    def __init__(self,
+                 prefix: str,
+                 get_data_position: Callable[[int, int], Any],
+                 stateful_callbacks: Dict[str, Callback],
+                 every_n_steps: int=None,
+                 every_n_minutes: float=None,
+                 keep_checkpoints: int=2,
+                 writer: CheckpointWriter=None):
+        super(TrainingCheckpointer, self).__init__()
+        self.prefix = prefix
+        self.get_data_position = get_data_position
+        self.stateful_callbacks = stateful_callbacks
+        self.every_n_steps = every_n_steps
+        self.every_n_minutes = every_n_minutes
+        self.keep_checkpoints = keep_checkpoints
+        self.writer = writer or CheckpointWriter()
+
+        # The number of training steps taken, over all of training, and in the current epoch.
+        self.step = 0
+        self.epoch = 0
+        self.batch = 0
+        # The number of batches already taken in the first epoch we see, when resuming.
+        self.initial_batch = 0
+        # The logs of every finished epoch, indexed by epoch, like ``History.history``.
+        self.history = {}
+        self.checkpoint_due = False
+        self.last_checkpoint_time = None
+
+    def set_state(self, state: Dict[str, Any]):
+        """
+        Restores the step count, history and callback states from a checkpoint, so that the next
+        epoch we see continues from the checkpoint's batch.
+        """
+        self.step = state['step']
+        self.epoch = state['epoch']
+        self.initial_batch = state['batch']
+        self.history = {key: list(values) for key, values in state['history'].items()}
+        for name, callback in self.stateful_callbacks.items():
+            callback.set_state(state['callbacks'][name])
+
+    def on_train_begin(self, logs=None):
+        self.last_checkpoint_time = time.time()
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch = epoch
+        self.batch = self.initial_batch
+        self.initial_batch = 0
+
+    def on_batch_begin(self, batch, logs=None):
+        # A checkpoint that became due after the previous batch of this epoch.  Nothing has
+        # changed since then, and now we know that batch wasn't the last one.
+        if self.checkpoint_due:
+            self.write_checkpoint(self.epoch, self.batch)
+
+    def on_batch_end(self, batch, logs=None):
+        self.step += 1
+        self.batch += 1
+        if self.every_n_steps and self.step % self.every_n_steps == 0:
+            self.checkpoint_due = True
+        if self.every_n_minutes and time.time() - self.last_checkpoint_time >= self.every_n_minutes * 60:
+            self.checkpoint_due = True
+
+    def on_epoch_end(self, epoch, logs=None):
+        for key, value in (logs or {}).items():
+            self.history.setdefault(key, []).append(value)
+        self.epoch = epoch + 1
+        self.batch = 0
+        self.write_checkpoint(self.epoch, self.batch)
+
+    def on_train_end(self, logs=None):
+        self.writer.wait()
+
+    def write_checkpoint(self, epoch: int, batch: int):
+        logger.info("Writing training checkpoint at step %d (epoch %d, batch %d)", self.step, epoch, batch)
+        state = {
+                'step': self.step,
+                'epoch': epoch,
+                'batch': batch,
+                'history': {key: list(values) for key, values in self.history.items()},
+                'stop_training': bool(getattr(self.model, 'stop_training', False)),
+                'callbacks': {name: callback.get_state() for name, callback in self.stateful_callbacks.items()},
+                'random_state': get_random_state(),
+                'data_position': self.get_data_position(epoch, batch),
+                }
+        variables = snapshot_variables()
+        self.writer.submit(write_training_checkpoint, self.prefix, self.step, variables, state,
+                           self.keep_checkpoints)
+        self.checkpoint_due = False
+        self.last_checkpoint_time = time.time()
@@ -0,0 +1,96 @@
+"""
+Runs a small TensorFlow cluster - some worker processes and a parameter server process - on this
+machine, so that :func:`~deep_qa.training.multi_gpu.compile_parallel_model` can put its towers in
+separate processes on a CPU-only machine, instead of on separate GPUs.
+
+We use in-graph replication: the ``Trainer`` process builds a single graph, with one copy of the
+model on each worker (``/job:worker/task:N``) and the variables on the parameter server
+(``/job:ps/task:0``), and runs it with a session connected to the first worker.  The gradients
+from each tower are averaged on the parameter server, exactly as they are in the multi-GPU case, so
+training is synchronous.
+"""
+import atexit
+import logging
+import multiprocessing
+import socket
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+def _run_server(cluster: Dict[str, List[str]], job_name: str, task_index: int, num_threads: int):
+    # We import tensorflow here, in the new process, so that the parent process doesn't have to
+    # fork with tensorflow's thread pools already running.
+    import tensorflow
+    config = None
+    if num_threads:
+        config = tensorflow.ConfigProto(intra_op_parallelism_threads=num_threads,
+                                        inter_op_parallelism_threads=num_threads)
+    server = tensorflow.train.Server(tensorflow.train.ClusterSpec(cluster),
+                                     job_name=job_name,
+                                     task_index=task_index,
+                                     config=config)
+    server.join()
+
+
+def _get_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+class LocalCluster:
+    """
+    Starts ``num_workers`` worker processes and one parameter server process on this machine, each
+    listening on a free port on ``localhost``.  The processes are stopped when you call
+    :func:`shutdown`, or when this process exits.
+
+    Parameters
+    ----------
+    num_workers: int
+        The number of worker processes, which is the number of copies of the model we'll train.
+    threads_per_worker: int, optional (default=None)
+        The number of threads each worker uses for TensorFlow's thread pools.  If ``None``, we
+        split the machine's cores evenly between the workers, so that they don't compete for them.
+    """
+    def __init__(self, num_workers: int, threads_per_worker: int=None):
+        if threads_per_worker is None:
+            threads_per_worker = max(1, multiprocessing.cpu_count() // num_workers)
+        self.num_workers = num_workers
+        self.cluster = {
+                'ps': ['localhost:%d' % _get_free_port()],
+                'worker': ['localhost:%d' % _get_free_port() for _ in range(num_workers)],
+                }
+        logger.info("Starting local cluster: %s", self.cluster)
+        # We use "spawn" so that the servers don't inherit any tensorflow state from this process.
+        context = multiprocessing.get_context('spawn')
+        self.processes = []
+        for job_name, addresses in self.cluster.items():
+            for task_index in range(len(addresses)):
+                process = context.Process(target=_run_server,
+                                          args=(self.cluster, job_name, task_index, threads_per_worker),
+                                          daemon=True)
+                process.start()
+                self.processes.append(process)
+        atexit.register(self.shutdown)
+
+    @property
+    def target(self) -> str:
+        """
+        The target to pass to ``tensorflow.Session`` to run graphs on this cluster.
+        """
+        return 'grpc://' + self.cluster['worker'][0]
+
+    def get_tower_devices(self) -> List[str]:
+        return ['/job:worker/task:%d/cpu:0' % task_index for task_index in range(self.num_workers)]
+
+    def get_variable_device(self) -> str:  # pylint: disable=no-self-use
+        return '/job:ps/task:0/cpu:0'
+
+    def shutdown(self):
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes:
+            process.join()
+        self.processes = []
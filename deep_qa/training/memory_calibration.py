@@ -0,0 +1,194 @@
+"""
+Finds a value for the ``DataGenerator``'s ``adaptive_memory_usage_constant`` automatically.
+
+With adaptive batch sizes, a batch is as large as it can be while ``batch_size *
+get_padding_memory_scaling(padding_lengths)`` stays under ``adaptive_memory_usage_constant`` (see
+:func:`~deep_qa.training.TextTrainer.get_padding_memory_scaling`).  Instead of finding that
+constant by trial and error, we can measure it: we take the training instance with the largest
+padding, run training steps on batches of 1, 2, 4, ... copies of it, and record the peak memory
+usage of each step.  Memory usage is (roughly) a fixed cost plus a constant times the batch cost,
+so a straight line through the measurements tells us the largest batch cost that fits under a
+memory limit.  We stop probing before a step is predicted to go over the limit.
+
+We measure the peak resident set size of this process, so this is meant for models that train on
+the CPU.  On Linux we reset the peak before each step, so every measurement is for that step
+alone; elsewhere we have to rely on the peak growing with the batch size.
+"""
+import hashlib
+import json
+import logging
+import os
+import resource
+import sys
+from typing import Any, Dict, List, Tuple
+
+import numpy
+from keras import backend as K
+
+from ..common.checks import ConfigurationError
+from ..data import IndexedDataset
+from .checkpointing import restore_variables, snapshot_variables
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+def reset_peak_memory_usage() -> bool:
+    """
+    Resets the peak resident set size of this process, if the OS lets us (Linux does, through
+    ``/proc/self/clear_refs``).  Returns whether we could.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def get_peak_memory_usage() -> int:
+    """
+    Returns the peak resident set size of this process, in bytes: since the last call to
+    :func:`reset_peak_memory_usage`, if it succeeded, or else since the process started.
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ``ru_maxrss`` is in bytes on OS X, and in kilobytes everywhere else.
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def get_default_memory_limit() -> int:
+    """
+    Returns 80% of the physical memory on this machine, in bytes.
+    """
+    return int(0.8 * os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES'))
+
+
+def fit_memory_usage(probes: List[Tuple[float, int]]) -> Tuple[float, float]:
+    """
+    Fits ``peak_memory = fixed_memory + memory_per_unit_cost * batch_cost`` to a list of ``(batch
+    cost, peak memory)`` measurements, returning ``(fixed_memory, memory_per_unit_cost)``.
+    """
+    costs = numpy.asarray([cost for cost, _ in probes], dtype='float64')
+    peaks = numpy.asarray([peak for _, peak in probes], dtype='float64')
+    memory_per_unit_cost, fixed_memory = numpy.polyfit(costs, peaks, 1)
+    return fixed_memory, memory_per_unit_cost
+
+
+def calibrate_memory_usage_constant(model,
+                                    data_generator,
+                                    dataset: IndexedDataset,
+                                    sorting_keys: List[str],
+                                    get_padding_memory_scaling,
+                                    memory_limit: int,
+                                    maximum_batch_size: int=1000000) -> Dict[str, Any]:
+    """
+    Measures how memory usage grows with the batch cost when training ``model``, and returns the
+    ``adaptive_memory_usage_constant`` that keeps the peak memory usage of a training step under
+    ``memory_limit`` bytes, along with the measurements it's based on.
+
+    The probing steps change the model's weights (and the optimizer's state), so we snapshot every
+    variable in the graph first, and restore them all when we're done.
+
+    Parameters
+    ----------
+    model: DeepQaModel
+        A compiled model, which we call ``train_on_batch`` on.
+    data_generator: DataGenerator
+        We use this to pad the probing batches exactly as training batches will be padded.
+    dataset: IndexedDataset
+        The training data.  We probe with copies of the instance that sorts last by
+        ``sorting_keys``.
+    sorting_keys: List[str]
+        The padding keys that instances are sorted by, from
+        :func:`~deep_qa.training.TextTrainer.get_instance_sorting_keys`.
+    get_padding_memory_scaling: Callable
+        The model's :func:`~deep_qa.training.TextTrainer.get_padding_memory_scaling`.
+    memory_limit: int
+        The peak memory usage (resident set size of the whole process, in bytes) that training
+        steps must stay under.
+    maximum_batch_size: int, optional (default=1000000)
+        We don't probe batches larger than this.
+    """
+    largest_instance = dataset.get_padding_sort_order(sorting_keys)[-1]
+    probes = []
+    variables = snapshot_variables()
+    try:
+        batch_size = 1
+        # The first step builds the training function and allocates the optimizer's state, which
+        # we don't want in our measurements, so we run one before we start measuring.
+        inputs, labels = data_generator.pad_batch(dataset.select([largest_instance]))
+        model.train_on_batch(inputs, labels)
+        while batch_size <= maximum_batch_size:
+            batch = dataset.select([largest_instance] * batch_size)
+            batch_cost = batch_size * get_padding_memory_scaling(data_generator.get_padding_lengths(batch))
+            if len(probes) >= 2:
+                fixed_memory, memory_per_unit_cost = fit_memory_usage(probes)
+                if fixed_memory + memory_per_unit_cost * batch_cost > memory_limit:
+                    break
+            inputs, labels = data_generator.pad_batch(batch)
+            reset_peak_memory_usage()
+            model.train_on_batch(inputs, labels)
+            peak_memory = get_peak_memory_usage()
+            logger.info("Calibration: batch size %d, batch cost %d, peak memory %.1f MB",
+                        batch_size, batch_cost, peak_memory / 2 ** 20)
+            probes.append((float(batch_cost), peak_memory))
+            if peak_memory > memory_limit:
+                break
+            batch_size *= 2
+    finally:
+        restore_variables(variables)
+        # The training function keeps track of the global step itself, so it has to read the
+        # restored value again.
+        train_function = getattr(model, 'train_function', None)
+        if hasattr(train_function, 'reset'):
+            train_function.reset()
+    if len(probes) < 2:
+        raise ConfigurationError("Couldn't calibrate adaptive_memory_usage_constant: a memory "
+                                 "limit of %.1f MB is too low to train on two instances at once"
+                                 % (memory_limit / 2 ** 20))
+    fixed_memory, memory_per_unit_cost = fit_memory_usage(probes)
+    if memory_per_unit_cost <= 0:
+        # Memory usage didn't grow measurably with the batch size, so the largest batch we tried
+        # is the best estimate we have.
+        constant = max(cost for cost, peak in probes if peak <= memory_limit)
+    else:
+        constant = (memory_limit - fixed_memory) / memory_per_unit_cost
+    return {
+            'adaptive_memory_usage_constant': int(constant),
+            'memory_limit': memory_limit,
+            'fixed_memory': float(fixed_memory),
+            'memory_per_unit_cost': float(memory_per_unit_cost),
+            'probes': probes,
+            }
+
+
+def get_model_fingerprint(model) -> str:
+    """
+    A hash of the model's architecture (the type of each layer, and the shapes of its weights), so
+    we know when a saved calibration is for a different model.  We leave out layer names, as Keras
+    numbers those differently depending on what else has been built in the same process.
+    """
+    architecture = [[layer.__class__.__name__, [K.int_shape(weight) for weight in layer.weights]]
+                    for layer in model.layers]
+    return hashlib.sha1(json.dumps(architecture).encode('utf-8')).hexdigest()
+
+
+def save_calibration(filename: str, calibration: Dict[str, Any]):
+    with open(filename, 'w') as calibration_file:
+        json.dump(calibration, calibration_file, indent=2)
+
+
+def load_calibration(filename: str) -> Dict[str, Any]:
+    """
+    Returns the calibration saved in ``filename``, or ``None`` if there isn't one.
+    """
+    if not os.path.exists(filename):
+        return None
+    with open(filename) as calibration_file:
+        return json.load(calibration_file)
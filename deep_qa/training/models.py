@@ -10,7 +10,7 @@ import keras.backend as K
 import tensorflow
 import numpy
 
-from .step import Step
+from .step import AccumulatingStep, Step
 from ..common.params import Params, ConfigurationError
 from .train_utils import slice_batch
 
@@ -67,6 +67,8 @@ class DeepQaModel(Model):
         self.tensorboard_log = params.pop('tensorboard_log', None)
         self.tensorboard_frequency = params.pop('tensorboard_frequency', 0)
         self.gradient_clipping = params.pop("gradient_clipping", None).as_dict()
+        self.gradient_accumulation_steps = params.pop('gradient_accumulation_steps', None)
+        self.gradient_accumulation_tokens = params.pop('gradient_accumulation_tokens', None)
         super(DeepQaModel, self).compile(**params.as_dict())
         self.optimizer = optimizer
 
@@ -157,24 +159,6 @@ class DeepQaModel(Model):
             # Here we override Keras to use tensorflow optimizers directly.
             self.global_step = tensorflow.train.get_or_create_global_step()
             gradients = tensorflow.gradients(self.total_loss, self._collected_trainable_weights)
-            if self.gradient_clipping is not None:
-                # Don't pop from the gradient clipping dict here as
-                # if we call fit more than once we need it to still be there.
-                clip_type = self.gradient_clipping.get("type")
-                clip_value = self.gradient_clipping.get("value")
-                if clip_type == 'clip_by_norm':
-                    gradients, _ = tensorflow.clip_by_global_norm(gradients, clip_value)
-                elif clip_type == 'clip_by_value':
-                    gradients = [tensorflow.clip_by_value(x, -clip_value, clip_value) for x in gradients]
-                else:
-                    raise ConfigurationError("{} is not a supported type of gradient clipping.".format(clip_type))
-
-            zipped_grads_with_weights = zip(gradients, self._collected_trainable_weights)
-            # pylint: disable=no-member
-            training_updates = self.optimizer.apply_gradients(zipped_grads_with_weights,
-                                                              global_step=self.global_step)
-            # pylint: enable=no-member
-            updates = self.updates + [training_updates]
             outputs = [self.total_loss] + self.metrics_tensors
             # Gets loss and metrics. Updates weights at each call.
 
@@ -183,9 +167,103 @@ class DeepQaModel(Model):
             else:
                 train_summary_writer = None
 
+            if self.gradient_accumulation_steps or self.gradient_accumulation_tokens:
+                self.train_function = self._make_accumulating_train_function(inputs, outputs, gradients,
+                                                                             train_summary_writer)
+                return
+
+            gradients = self._clip_gradients(gradients)
+            zipped_grads_with_weights = zip(gradients, self._collected_trainable_weights)
+            # pylint: disable=no-member
+            training_updates = self.optimizer.apply_gradients(zipped_grads_with_weights,
+                                                              global_step=self.global_step)
+            # pylint: enable=no-member
+            updates = self.updates + [training_updates]
             self.train_function = Step(inputs, outputs, self.global_step, train_summary_writer,
                                        self.tensorboard_frequency, updates=updates)
 
+    def _clip_gradients(self, gradients):
+        if self.gradient_clipping is None:
+            return gradients
+        # Don't pop from the gradient clipping dict here as
+        # if we call fit more than once we need it to still be there.
+        clip_type = self.gradient_clipping.get("type")
+        clip_value = self.gradient_clipping.get("value")
+        if clip_type == 'clip_by_norm':
+            gradients, _ = tensorflow.clip_by_global_norm(gradients, clip_value)
+        elif clip_type == 'clip_by_value':
+            gradients = [tensorflow.clip_by_value(x, -clip_value, clip_value) for x in gradients]
+        else:
+            raise ConfigurationError("{} is not a supported type of gradient clipping.".format(clip_type))
+        return gradients
+
+    def _make_accumulating_train_function(self, inputs, outputs, gradients, train_summary_writer):
+        """
+        Builds a training function that sums the gradients of several micro-batches in
+        non-trainable variables, and only updates the weights (and the global step) once enough
+        micro-batches have been accumulated, using their average gradient.  Each micro-batch's
+        gradient is weighted by its number of instances, so the update is the same as the one we
+        would get from a single batch containing all of them, however the micro-batches were sized.
+        Clipping is applied to the averaged gradient.
+        """
+        # The number of non-padding tokens in each micro-batch is computed by the
+        # ``AccumulatingStep`` and fed in here, so that we can keep a running total in the graph.
+        num_tokens = tensorflow.placeholder('float32', shape=(), name="micro_batch_num_tokens")
+        batch_size = tensorflow.cast(tensorflow.shape(self._feed_inputs[0])[0], 'float32')
+        with tensorflow.variable_scope("gradient_accumulation"):
+            accumulators = [tensorflow.Variable(tensorflow.zeros(weight.get_shape().as_list(),
+                                                                 dtype=weight.dtype.base_dtype),
+                                                trainable=False, name="accumulator_%d" % i)
+                            for i, weight in enumerate(self._collected_trainable_weights)]
+            accumulated_instances = tensorflow.Variable(0.0, trainable=False, name="instances")
+            accumulated_batches = tensorflow.Variable(0, trainable=False, name="micro_batches")
+            accumulated_tokens = tensorflow.Variable(0.0, trainable=False, name="tokens")
+
+        accumulate_ops = [tensorflow.assign_add(accumulated_instances, batch_size),
+                          tensorflow.assign_add(accumulated_batches, 1),
+                          tensorflow.assign_add(accumulated_tokens, num_tokens)]
+        for accumulator, gradient in zip(accumulators, gradients):
+            if gradient is None:
+                continue
+            if isinstance(gradient, tensorflow.IndexedSlices):
+                # Sparse gradients (e.g., from embedding lookups) stay sparse while accumulating.
+                accumulate_ops.append(tensorflow.scatter_add(accumulator, gradient.indices,
+                                                             gradient.values * batch_size))
+            else:
+                accumulate_ops.append(tensorflow.assign_add(accumulator, gradient * batch_size))
+        accumulate = tensorflow.group(*accumulate_ops)
+
+        # We read the variables inside the control dependencies, so that the reads (and not just
+        # the division) happen after this micro-batch has been added, even on another device.
+        with tensorflow.control_dependencies([accumulate]):
+            total_instances = accumulated_instances.read_value()
+            averaged_gradients = [None if gradient is None else accumulator.read_value() / total_instances
+                                  for accumulator, gradient in zip(accumulators, gradients)]
+        averaged_gradients = self._clip_gradients(averaged_gradients)
+        # pylint: disable=no-member
+        apply = self.optimizer.apply_gradients(zip(averaged_gradients, self._collected_trainable_weights),
+                                               global_step=self.global_step)
+        # pylint: enable=no-member
+        with tensorflow.control_dependencies([apply]):
+            reset_ops = [tensorflow.assign(accumulator, tensorflow.zeros_like(accumulator))
+                         for accumulator in accumulators]
+            reset_ops += [tensorflow.assign(accumulated_instances, 0.0),
+                          tensorflow.assign(accumulated_batches, 0),
+                          tensorflow.assign(accumulated_tokens, 0.0)]
+            accumulate_and_apply = tensorflow.group(*reset_ops)
+
+        step_inputs = inputs + [num_tokens]
+        accumulate_step = Step(step_inputs, outputs, self.global_step, updates=self.updates + [accumulate])
+        apply_step = Step(step_inputs, outputs, self.global_step, train_summary_writer,
+                          self.tensorboard_frequency, updates=self.updates + [accumulate_and_apply])
+        return AccumulatingStep(accumulate_step,
+                                apply_step,
+                                accumulated_batches,
+                                accumulated_tokens,
+                                num_token_inputs=len(self._feed_inputs),
+                                accumulation_steps=self.gradient_accumulation_steps,
+                                accumulation_tokens=self.gradient_accumulation_tokens)
+
     @overrides
     def _make_test_function(self):
         # pylint: disable=attribute-defined-outside-init
@@ -310,6 +388,8 @@ class DeepQaModel(Model):
                 index_array = _batch_shuffle(index_array, batch_size)
             elif shuffle:
                 numpy.random.shuffle(index_array)
+            # Training checkpoints read this to record the order of the instances in this epoch.
+            self.training_index_array = index_array  # pylint: disable=attribute-defined-outside-init
 
             batches = _make_batches(num_train_samples, batch_size)
             epoch_logs = {}
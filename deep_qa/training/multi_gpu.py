@@ -1,4 +1,4 @@
-from typing import Callable
+from typing import Callable, List
 import os
 from copy import deepcopy
 
@@ -12,7 +12,9 @@ from ..common.params import Params, ConfigurationError
 
 
 def compile_parallel_model(model_builder: Callable[[], DeepQaModel],
-                           compile_arguments: Params) -> DeepQaModel:
+                           compile_arguments: Params,
+                           tower_devices: List[str]=None,
+                           variable_device: str="/cpu:0") -> DeepQaModel:
     """
     This function compiles a multi-gpu version of your model. This is done using data
     parallelism, by making N copies of the model on the different GPUs, all of which
@@ -31,6 +33,10 @@ def compile_parallel_model(model_builder: Callable[[], DeepQaModel],
     for the different GPUs. As such, you should be wary of this function having side
     effects unrelated to building a computation graph.
 
+    The towers don't have to be on GPUs: you can pass any list of ``tower_devices``, such as
+    several CPU devices in this process, or the workers of a
+    :class:`~deep_qa.training.local_cluster.LocalCluster`.
+
     Parameters
     ----------
 
@@ -39,6 +45,12 @@ def compile_parallel_model(model_builder: Callable[[], DeepQaModel],
     compile_arguments: Params, required
         Model parameters which are passed to compile. These should be the same as if you
         were building a single GPU model, with the exception of the ``num_gpus`` field.
+    tower_devices: List[str], optional (default=None)
+        The device to put each copy of the model on.  There must be ``num_gpus`` of these.  By
+        default we use ``/gpu:0`` up to ``/gpu:N``.
+    variable_device: str, optional (default="/cpu:0")
+        The device that holds the variables shared by the towers, where we also average the
+        gradients.
 
     Returns
     -------
@@ -49,16 +61,21 @@ def compile_parallel_model(model_builder: Callable[[], DeepQaModel],
     optimizer = compile_arguments.get("optimizer")
     num_gpus = compile_arguments.get("num_gpus")
     gradient_clipping = compile_arguments.get("gradient_clipping", None)
+    if tower_devices is None:
+        tower_devices = ['/gpu:%d' % gpu_index for gpu_index in range(num_gpus)]
+    if len(tower_devices) != num_gpus:
+        raise ConfigurationError("Got {} tower devices for {} towers".format(len(tower_devices), num_gpus))
     tower_models = []
     tower_gradients = []
-    global_step = tensorflow.train.get_or_create_global_step()
-    train_loss = tensorflow.get_variable('train_loss', [],
-                                         initializer=tensorflow.constant_initializer(0.0),
-                                         trainable=False)
-
-    # Place a copy of the model on each GPU, each getting a slice of the batch.
-    for gpu_index in range(num_gpus):
-        with tensorflow.device(pin_variable_device_scope('/gpu:%d' % gpu_index)):
+    with tensorflow.device(variable_device):
+        global_step = tensorflow.train.get_or_create_global_step()
+        train_loss = tensorflow.get_variable('train_loss', [],
+                                             initializer=tensorflow.constant_initializer(0.0),
+                                             trainable=False)
+
+    # Place a copy of the model on each device, each getting a slice of the batch.
+    for gpu_index, tower_device in enumerate(tower_devices):
+        with tensorflow.device(pin_variable_device_scope(tower_device, variable_device)):
             with tensorflow.name_scope('tower_%d' % gpu_index):
                 # This is a new model object every time.
                 model = model_builder()
@@ -70,20 +87,23 @@ def compile_parallel_model(model_builder: Callable[[], DeepQaModel],
                 tower_gradients.append(grads)
                 train_loss += loss
 
-    grads_and_variables = average_gradients(tower_gradients)
+    # We average the gradients and update the variables where the variables live.
+    with tensorflow.device(variable_device):
+        grads_and_variables = average_gradients(tower_gradients)
+
+        gradients, variables = list(zip(*grads_and_variables))
+        if gradient_clipping is not None:
+            clip_type = gradient_clipping.pop("type")
+            clip_value = gradient_clipping.pop("value")
+            if clip_type == 'clip_by_norm':
+                gradients, _ = tensorflow.clip_by_global_norm(gradients, clip_value)
+            elif clip_type == 'clip_by_value':
+                gradients = [tensorflow.clip_by_value(x, -clip_value, clip_value) for x in gradients]
+            else:
+                raise ConfigurationError("{} is not a supported type of gradient clipping.".format(clip_type))
 
-    gradients, variables = list(zip(*grads_and_variables))
-    if gradient_clipping is not None:
-        clip_type = gradient_clipping.pop("type")
-        clip_value = gradient_clipping.pop("value")
-        if clip_type == 'clip_by_norm':
-            gradients, _ = tensorflow.clip_by_global_norm(gradients, clip_value)
-        elif clip_type == 'clip_by_value':
-            gradients = [tensorflow.clip_by_value(x, -clip_value, clip_value) for x in gradients]
-        else:
-            raise ConfigurationError("{} is not a supported type of gradient clipping.".format(clip_type))
+        train_operation = optimizer.apply_gradients(zip(gradients, variables), global_step=global_step)
 
-    train_operation = optimizer.apply_gradients(zip(gradients, variables), global_step=global_step)
     train_summary = tensorflow.summary.scalar('train_loss', train_loss/ num_gpus)
 
     summary_operations = [train_summary]
@@ -10,11 +10,21 @@ class Step:
     """
     Runs a computation graph.
 
+    To decide when to write summaries, we need the value of the global step before each call.
+    Instead of asking the session for it (an extra ``session.run`` per batch), we read it once, on
+    the first call, and after that fetch its updated value together with the outputs of each call.
+    If summaries are disabled, we don't need the global step at all.
+
+    When none of the inputs are sparse, and the TensorFlow version supports it, we run the graph
+    through a callable made with ``Session.make_callable``, which skips building a ``feed_dict``
+    and looking up the fetches on every call.
+
     Parameters
     ----------
     inputs: Feed placeholders to the computation graph.
     outputs: Output tensors to fetch.
     updates: Additional update ops to be run at function call.
+    use_callable: If ``False``, always use ``session.run`` with a ``feed_dict``.
     """
     def __init__(self,
                  inputs: List,
@@ -22,7 +32,8 @@ class Step:
                  global_step: tensorflow.Variable,
                  summary_writer: tensorflow.summary.FileWriter=None,
                  summary_frequency: int=10,
-                 updates=None):
+                 updates=None,
+                 use_callable: bool=True):
 
         updates = updates or []
         if not isinstance(inputs, (list, tuple)):
@@ -53,15 +64,53 @@ class Step:
                     updates_ops.append(update)
             self.updates_op = tensorflow.group(*updates_ops)
 
-    def __call__(self, inputs):
+        self.summaries_enabled = (self.summary_frequency > 0
+                                  and self.summary_writer is not None
+                                  and self.summary_operation is not None)
+        if self.summaries_enabled:
+            # This reads the global step after this call's updates (including the optimizer's
+            # increment of the global step) have run, which is the step number for the next call.
+            with tensorflow.control_dependencies([self.updates_op]):
+                self.next_global_step = self.global_step.read_value()
+        else:
+            self.next_global_step = None
+        # The value of the global step before the next call, when summaries are enabled.  We set
+        # this on the first call.
+        self.current_step = None
 
-        current_step = K.eval(self.global_step)
-        run_summary = ((self.summary_frequency > 0)
-                       and (current_step % self.summary_frequency == 0)
-                       and (self.summary_writer is not None))
+        self.use_callable = (use_callable
+                             and not any(K.is_sparse(tensor) for tensor in self.inputs)
+                             and hasattr(tensorflow.Session, 'make_callable'))
+        # Callables are tied to a session, so we remember which session we made them for.  We keep
+        # one callable with, and one without, the summary operation.
+        self._callable_session = None
+        self._callables = {}
 
-        if not isinstance(inputs, (list, tuple)):
-            raise TypeError('`inputs` should be a list or tuple.')
+    def reset(self):
+        """
+        Forgets the global step we've been keeping track of, so that we read it from the graph
+        again on the next call.  Call this if you restore the graph's variables.
+        """
+        self.current_step = None
+
+    def _get_fetches(self, run_summary: bool) -> List:
+        fetches = self.outputs + [self.updates_op]
+        if self.summaries_enabled:
+            fetches += [self.next_global_step]
+        if run_summary:
+            fetches += [self.summary_operation]
+        return fetches
+
+    def _get_callable(self, session, run_summary: bool):
+        if session is not self._callable_session:
+            self._callable_session = session
+            self._callables = {}
+        if run_summary not in self._callables:
+            self._callables[run_summary] = session.make_callable(self._get_fetches(run_summary),
+                                                                 feed_list=self.inputs)
+        return self._callables[run_summary]
+
+    def _get_feed_dict(self, inputs) -> dict:
         feed_dict = {}
         for tensor, value in zip(self.inputs, inputs):
             if K.is_sparse(tensor):
@@ -70,15 +119,121 @@ class Step:
                                              numpy.expand_dims(sparse_coo.col, 1)), 1)
                 value = (indices, sparse_coo.data, sparse_coo.shape)
             feed_dict[tensor] = value
+        return feed_dict
 
-        fetches = self.outputs + [self.updates_op]
-        if run_summary:
-            fetches += [self.summary_operation]
+    def __call__(self, inputs):
+        if not isinstance(inputs, (list, tuple)):
+            raise TypeError('`inputs` should be a list or tuple.')
 
         session = K.get_session()
-        returned_fetches = session.run(fetches, feed_dict=feed_dict)
+        run_summary = False
+        if self.summaries_enabled:
+            if self.current_step is None:
+                self.current_step = session.run(self.global_step)
+            run_summary = self.current_step % self.summary_frequency == 0
+
+        if self.use_callable:
+            returned_fetches = self._get_callable(session, run_summary)(*inputs)
+        else:
+            returned_fetches = session.run(self._get_fetches(run_summary),
+                                           feed_dict=self._get_feed_dict(inputs))
+
         if run_summary:
-            self.summary_writer.add_summary(returned_fetches[-1], current_step)
+            self.summary_writer.add_summary(returned_fetches[-1], self.current_step)
             self.summary_writer.flush()
+        if self.summaries_enabled:
+            self.current_step = returned_fetches[len(self.outputs) + 1]
 
         return returned_fetches[:len(self.outputs)]
+
+
+class AccumulatingStep:
+    """
+    Runs a training step that accumulates gradients over several micro-batches (see
+    :func:`DeepQaModel._make_accumulating_train_function`).  For each micro-batch, we run one of
+    two ``Steps``: ``accumulate_step``, which only adds the micro-batch's gradients to the
+    accumulators, or ``apply_step``, which also updates the weights with the accumulated gradients
+    and resets the accumulators.  We run ``apply_step`` once ``accumulation_steps`` micro-batches
+    have been accumulated or, if ``accumulation_tokens`` is given, once the accumulated
+    micro-batches contain at least that many tokens, whichever comes first.  Micro-batches that
+    are left over at the end of an epoch are carried over into the next one.
+
+    We count a micro-batch's tokens as the non-zero (i.e., non-padding) entries in its integer
+    inputs of two or more dimensions - the word (or character) index arrays.  This works well with
+    ``adaptive_batch_sizes``, where the number of instances in a batch varies, but the amount of
+    text in it is roughly constant.
+
+    Like ``Step`` does with the global step, we read the number of accumulated micro-batches and
+    tokens from the graph on the first call only, so that a model restored from a training
+    checkpoint carries on with the same accumulation, and keep track of them ourselves after that.
+
+    Parameters
+    ----------
+    accumulate_step: Step
+        Takes the model inputs followed by the number of tokens in the micro-batch.
+    apply_step: Step
+        Takes the same inputs as ``accumulate_step``.
+    accumulated_batches: tensorflow.Variable
+        The number of micro-batches accumulated so far, which ``apply_step`` resets.
+    accumulated_tokens: tensorflow.Variable
+        The number of tokens accumulated so far, which ``apply_step`` resets.
+    num_token_inputs: int
+        The number of inputs (at the start of the input list) that we count tokens in.  The rest
+        are targets, sample weights and the learning phase.
+    accumulation_steps: int, optional (default=None)
+        Apply the gradients after this many micro-batches.
+    accumulation_tokens: int, optional (default=None)
+        Apply the gradients once the micro-batches contain at least this many tokens.
+    """
+    def __init__(self,
+                 accumulate_step: Step,
+                 apply_step: Step,
+                 accumulated_batches: tensorflow.Variable,
+                 accumulated_tokens: tensorflow.Variable,
+                 num_token_inputs: int,
+                 accumulation_steps: int=None,
+                 accumulation_tokens: int=None):
+        self.accumulate_step = accumulate_step
+        self.apply_step = apply_step
+        self.accumulated_batches = accumulated_batches
+        self.accumulated_tokens = accumulated_tokens
+        self.num_token_inputs = num_token_inputs
+        self.accumulation_steps = accumulation_steps
+        self.accumulation_tokens = accumulation_tokens
+        self.num_batches = None
+        self.num_tokens = None
+
+    def reset(self):
+        """
+        Like :func:`Step.reset`, for the accumulation counters as well as the global step.
+        """
+        self.accumulate_step.reset()
+        self.apply_step.reset()
+        self.num_batches = None
+        self.num_tokens = None
+
+    def count_tokens(self, inputs) -> int:
+        num_tokens = 0
+        for array in inputs[:self.num_token_inputs]:
+            if (isinstance(array, numpy.ndarray) and array.ndim >= 2 and
+                        numpy.issubdtype(array.dtype, numpy.integer)):
+                num_tokens += numpy.count_nonzero(array)
+        return num_tokens
+
+    def __call__(self, inputs):
+        if not isinstance(inputs, (list, tuple)):
+            raise TypeError('`inputs` should be a list or tuple.')
+        if self.num_batches is None:
+            self.num_batches, self.num_tokens = K.get_session().run([self.accumulated_batches,
+                                                                     self.accumulated_tokens])
+        num_tokens = self.count_tokens(inputs)
+        self.num_batches += 1
+        self.num_tokens += num_tokens
+        if ((self.accumulation_steps and self.num_batches >= self.accumulation_steps) or
+                    (self.accumulation_tokens and self.num_tokens >= self.accumulation_tokens)):
+            step = self.apply_step
+            self.num_batches = 0
+            self.num_tokens = 0
+        else:
+            step = self.accumulate_step
+        return step(list(inputs) + [num_tokens])
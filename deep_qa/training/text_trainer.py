@@ -1,6 +1,9 @@
 from copy import deepcopy
 from typing import Any, Dict, List, Tuple
+import json
 import logging
+import os
+import sys
 
 import dill as pickle
 from keras import backend as K
@@ -13,10 +16,13 @@ from ..common.checks import ConfigurationError
 from ..common.params import Params
 from ..common.util import clean_layer_name
 from ..data import tokenizers, DataIndexer, DataGenerator, IndexedDataset, TextDataset
+from ..data.dataset_cache import DatasetCache
 from ..data.embeddings import PretrainedEmbeddings
 from ..data.instances import Instance, TextInstance
-from ..data.datasets import concrete_datasets
+from ..data.datasets import concrete_datasets, LazyIndexedDataset, LazyTextDataset
 from ..layers.encoders import encoders, set_regularization_params, seq2seq_encoders
+from .memory_calibration import calibrate_memory_usage_constant, get_default_memory_limit
+from .memory_calibration import get_model_fingerprint, load_calibration, save_calibration
 from .trainer import Trainer
 
 logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
@@ -55,12 +61,13 @@ class TextTrainer(Trainer):
         ``pretrained_file``, ``fine_tune``, and ``project``.  The value for ``dimension`` is an
         ``int`` specifying the dimensionality of the embedding (default 50 for words, 8 for
         characters); ``dropout`` is a float, specifying the amount of dropout to use on the
-        embedding layer (default ``0.5``); ``pretrained_file`` is a (string) path to a glove-formatted file
-        containing pre-trained embeddings; ``fine_tune`` is a boolean specifying whether the
-        pretrained embeddings should be trainable (default ``False``); and ``project`` is a boolean
-        specifying whether to add a projection layer after the embedding layer (only really useful
-        in conjunction with pre-trained embeddings, to get them into a lower-dimensional space;
-        default ``False``).
+        embedding layer (default ``0.5``); ``pretrained_file`` is a (string) path to a
+        glove-formatted file containing pre-trained embeddings (or a binary ``.npy`` file converted
+        from one with ``scripts/convert_embeddings.py``, which loads much faster); ``fine_tune`` is
+        a boolean specifying whether the pretrained embeddings should be trainable (default
+        ``False``); and ``project`` is a boolean specifying whether to add a projection layer after
+        the embedding layer (only really useful in conjunction with pre-trained embeddings, to get
+        them into a lower-dimensional space; default ``False``).
     data_generator: Dict[str, Any], optional (default=None)
         If not ``None``, we will pass these parameters to a :class:`DataGenerator` object to create
         data batches, instead of creating one big array for all of our training data.  See
@@ -73,6 +80,36 @@ class TextTrainer(Trainer):
         ``DataGenerator`` does can change the behavior of your learning algorithm, so you should
         think carefully about how exactly you want batches to be structured before you choose these
         parameters.
+    columnar_datasets: bool, optional (default=False)
+        If ``True``, we index datasets into a
+        :class:`~deep_qa.data.datasets.columnar_dataset.ColumnarIndexedDataset`, which stores word
+        indices in flat NumPy arrays instead of in Python lists on each instance.  This uses much
+        less memory and makes padding and sorting faster, but only works for instance types that
+        declare :attr:`~deep_qa.data.instances.instance.IndexedInstance.columnar_fields`.
+    num_preprocessing_workers: int, optional (default=1)
+        If greater than one, we tokenize the data (both when fitting the ``DataIndexer`` and when
+        indexing datasets) in this many processes.  The result is identical to using one process.
+    lazy_datasets: bool, optional (default=False)
+        If ``True``, :func:`load_dataset_from_files` returns a
+        :class:`~deep_qa.data.datasets.lazy_dataset.LazyTextDataset`, which reads the data file
+        line by line every time it's needed instead of holding it in memory.  Fitting the
+        ``DataIndexer`` is then a single streaming pass over the file.  If you also use a
+        ``data_generator``, batches are built from one chunk of ``lazy_dataset_chunk_size``
+        instances at a time, so memory use doesn't grow with the size of the data (with
+        ``columnar_datasets``, the indexed data is instead kept in memory, in compact arrays).
+        Without a ``data_generator``, the whole dataset has to be padded into one array anyway, so
+        this doesn't save any memory.
+    lazy_dataset_chunk_size: int, optional (default=10000)
+        Only relevant if ``lazy_datasets`` is ``True``.  How many instances to read into memory at
+        a time.  Sorting by padding length and shuffling in the ``DataGenerator`` only happen
+        within a chunk.
+    dataset_cache_directory: str, optional (default=None)
+        If given, we keep a :class:`~deep_qa.data.dataset_cache.DatasetCache` in this directory,
+        and store every indexed dataset we create there (along with the ``DataIndexer`` fit on the
+        training data), keyed by the contents of the data files, the tokenizer and dataset
+        parameters, and the ``DataIndexer``'s vocabulary.  Later runs on the same data load the
+        indexed data from the cache instead of re-reading and re-tokenizing it.  The cache is not
+        used when the ``debug`` parameter is given, because debugging needs the raw instances.
     num_sentence_words: int, optional (default=None)
         Upper limit on length of word sequences in the training data. Ignored during testing (we
         use the value set at training time, either from this parameter or from a loaded model).  If
@@ -117,6 +154,15 @@ class TextTrainer(Trainer):
             self.data_generator = DataGenerator(self, data_generator_params)
         else:
             self.data_generator = None
+        self.columnar_datasets = params.pop('columnar_datasets', False)
+        self.num_preprocessing_workers = params.pop('num_preprocessing_workers', 1)
+        self.lazy_datasets = params.pop('lazy_datasets', False)
+        self.lazy_dataset_chunk_size = params.pop('lazy_dataset_chunk_size', 10000)
+        dataset_cache_directory = params.pop('dataset_cache_directory', None)
+        if dataset_cache_directory is not None:
+            self.dataset_cache = DatasetCache(dataset_cache_directory)
+        else:
+            self.dataset_cache = None
 
         self.dataset_params = params.pop("dataset", {})
         dataset_type_key = self.dataset_params.pop_choice("type", list(concrete_datasets.keys()),
@@ -126,8 +172,13 @@ class TextTrainer(Trainer):
         self.num_word_characters = params.pop('num_word_characters', None)
 
         tokenizer_params = params.pop('tokenizer', {})
+        # We keep a copy of these (before the tokenizer consumes them) to key the dataset cache on.
+        self._tokenizer_params = deepcopy(tokenizer_params.as_dict())
         tokenizer_choice = tokenizer_params.pop_choice('type', list(tokenizers.keys()),
                                                        default_to_first_choice=True)
+        self._tokenizer_params['type'] = tokenizer_choice
+        # The size of the token cache doesn't change the data.
+        self._tokenizer_params.pop('cache_size', None)
         self.tokenizer = tokenizers[tokenizer_choice](tokenizer_params)
         # Note that the way this works is a little odd - we need each Instance object to do the
         # right thing when we call instance.words() and instance.to_indexed_instance().  So we set
@@ -173,6 +224,71 @@ class TextTrainer(Trainer):
             dataset.pad_instances(self.get_padding_lengths())
             return dataset.as_training_data()
 
+    @overrides
+    def _load_indexed_dataset(self,
+                              data_files: List[str],
+                              max_instances: int=None,
+                              update_model_state: bool=False) -> Tuple[TextDataset, IndexedDataset]:
+        """
+        If we have a ``dataset_cache``, we first try to get the ``DataIndexer`` (when fitting one)
+        and the indexed dataset from the cache, and only read the raw data if one of them is
+        missing.  In that case the raw dataset we return is ``None``.
+
+        When we fit the ``DataIndexer`` on a dataset that isn't lazy, the tokenizer remembers the
+        tokens of every text it sees while fitting, so that indexing the dataset afterwards doesn't
+        tokenize it again (see :class:`~deep_qa.data.tokenizers.tokenizer.Tokenizer`).  Once the
+        dataset is indexed, we clear the cache, so we don't hold on to it during training.
+        """
+        if not update_model_state or self.lazy_datasets:
+            return self.__load_indexed_dataset(data_files, max_instances, update_model_state)
+        cache_size = self.tokenizer.cache_size
+        self.tokenizer.cache_size = sys.maxsize
+        try:
+            return self.__load_indexed_dataset(data_files, max_instances, update_model_state)
+        finally:
+            logger.info("Token cache: %s", str(self.tokenizer.get_cache_info()))
+            self.tokenizer.cache_size = cache_size
+            self.tokenizer.clear_cache()
+
+    def __load_indexed_dataset(self,
+                               data_files: List[str],
+                               max_instances: int,
+                               update_model_state: bool) -> Tuple[TextDataset, IndexedDataset]:
+        # A lazy dataset would have to be read into memory to pickle it, so we only cache lazy
+        # datasets if they're going to be indexed into (compact, in-memory) columnar datasets anyway.
+        if (self.dataset_cache is None or self.debug_params
+                    or (self.lazy_datasets and not self.columnar_datasets)):
+            return super(TextTrainer, self)._load_indexed_dataset(data_files, max_instances, update_model_state)
+        key_components = {
+                'instance_type': self._instance_type(),
+                'dataset_type': self.dataset_type,
+                'dataset_params': self.dataset_params.as_dict(),
+                'tokenizer': self._tokenizer_params,
+                'max_instances': max_instances,
+                }
+        dataset = None
+        if update_model_state:
+            data_indexer_key = self.dataset_cache.get_key(data_files, **key_components)
+            data_indexer = self.dataset_cache.load_data_indexer(data_indexer_key)
+            if data_indexer is not None:
+                self.data_indexer = data_indexer
+            else:
+                dataset = self.__load_and_truncate(data_files, max_instances)
+                self.set_model_state_from_dataset(dataset)
+                self.dataset_cache.save_data_indexer(data_indexer_key, self.data_indexer)
+        key_components['data_indexer'] = self.dataset_cache.data_indexer_fingerprint(self.data_indexer)
+        dataset_key = self.dataset_cache.get_key(data_files, **key_components)
+        indexed_dataset = self.dataset_cache.load_indexed_dataset(dataset_key, self.columnar_datasets)
+        if indexed_dataset is None:
+            if dataset is None:
+                dataset = self.__load_and_truncate(data_files, max_instances)
+            logger.info("Indexing dataset")
+            indexed_dataset = dataset.to_indexed_dataset(**self._dataset_indexing_kwargs())
+            self.dataset_cache.save_indexed_dataset(dataset_key, indexed_dataset)
+        if update_model_state:
+            self.set_model_state_from_indexed_dataset(indexed_dataset)
+        return dataset, indexed_dataset
+
     @overrides
     def load_dataset_from_files(self, files: List[str]):
         """
@@ -182,62 +298,266 @@ class TextTrainer(Trainer):
         rest of the list, for instance).
         """
         dataset_params = deepcopy(self.dataset_params)
+        if self.lazy_datasets:
+            return LazyTextDataset([files[0]], self.dataset_type, self._instance_type(), dataset_params,
+                                   self.lazy_dataset_chunk_size)
         return self.dataset_type.read_from_file(files[0], self._instance_type(), dataset_params)
 
+    def get_tokenizer_key(self) -> str:
+        """
+        Returns a string that is the same for any two models whose tokenizers split text the same
+        way, so they can share tokens (see :func:`tokenize_dataset_files`).
+        """
+        return json.dumps(self._tokenizer_params, sort_keys=True)
+
+    def tokenize_dataset_files(self, files: List[str]) -> Dict[str, Tuple[str, ...]]:
+        """
+        Reads the dataset in ``files`` and tokenizes all of its text, returning each text's tokens
+        (from :func:`Tokenizer.get_cached_tokens`).  Another model with the same
+        :func:`get_tokenizer_key` can load these into its tokenizer with
+        :func:`Tokenizer.add_cached_tokens`, so that indexing the same data doesn't tokenize it
+        again; :func:`~deep_qa.run.score_dataset_with_ensemble` does this.  A lazy dataset would
+        need all of its tokens in memory at once, so for one we return nothing.
+        """
+        dataset = self.load_dataset_from_files(files)
+        if isinstance(dataset, LazyTextDataset):
+            return {}
+        tokenizer_params = deepcopy(self._tokenizer_params)
+        tokenizer_choice = tokenizer_params.pop('type')
+        tokenizer_params['cache_size'] = sys.maxsize
+        tokenizer = tokenizers[tokenizer_choice](Params(tokenizer_params))
+        TextInstance.tokenizer = tokenizer
+        try:
+            for instance in dataset.instances:
+                instance.words()
+        finally:
+            TextInstance.tokenizer = self.tokenizer
+        return tokenizer.get_cached_tokens()
+
     @overrides
     def score_dataset(self, dataset: TextDataset):
         """
-        See the superclass docs (:func:`Trainer.score_dataset`) for usage info.  Just a note here
-        that we `do not` use data generators for this method, even if you've said elsewhere that
-        you want to use them, so that we can easily return the labels for the data.  This means
-        that we'll do whole-dataset padding, and this could be slow.  We could probably fix this,
-        but it's good enough for now.
+        See the superclass docs (:func:`Trainer.score_dataset`) for usage info.
+
+        We stream through the same length-sorted batches that the data generator would make for
+        training (see :func:`DataGenerator.create_scoring_batches`), padding each batch only as
+        much as it needs, and write each batch's predictions and labels straight into their rows
+        of the returned arrays.  If the shape of the model's outputs depends on the padding (e.g.,
+        span begin and end probabilities over a passage), the rows are as wide as the largest
+        instance in the dataset needs, and each batch's outputs are zero-padded to that width.  To
+        score a dataset that's too big for the predictions to fit in memory, use
+        :func:`score_dataset_to_files`.
         """
         # TODO(matt): for some reason the reference to the super class docs above isn't getting
         # linked properly.  I'm guessing it's because of an indexing issue in sphinx, but I
         # couldn't figure it out.  Once that works, it can be changed to "See :func:`the superclass
         # docs <Trainer.score_dataset>` for usage info").
         indexed_dataset = dataset.to_indexed_dataset(self.data_indexer)
-        # Because we're not using data generators here, we need to save and hide
-        # `self.data_generator`.  TODO(matt): it _should_ be as easy as iterating over the data
-        # again to pull out the labels, so we can still use data generators, but I'm waiting on
-        # implementing that.
-        data_generator = self.data_generator
-        self.data_generator = None
-        inputs, labels = self.create_data_arrays(indexed_dataset)
-        predictions = self.model.predict(inputs)
-        self.data_generator = data_generator
+        def allocate(shape, dtype, _):
+            return numpy.zeros(shape, dtype=dtype)
+        return self.__score_into_arrays(indexed_dataset, allocate)
+
+    @overrides
+    def evaluate_model(self, data_files: List[str], max_instances: int=None):
+        """
+        Like :func:`Trainer.evaluate_model`, but we always evaluate in the data generator's
+        length-sorted batches (see :func:`DataGenerator.create_scoring_generator`), padding each
+        batch only as much as it needs, and reading a lazy dataset one chunk at a time, even if
+        we're not configured to train with a data generator.
+        """
+        self.load_model()
+        _, indexed_dataset = self._load_indexed_dataset(data_files, max_instances)
+        logger.info("Evaluating model on the test set.")
+        data_generator = self.__get_scoring_data_generator()
+        batches = data_generator.create_scoring_generator(indexed_dataset)
+        scores = self.model.evaluate_generator(batches, data_generator.last_num_batches)
+        for idx, metric in enumerate(self.model.metrics_names):
+            print("{}: {}".format(metric, scores[idx]))
+
+    def score_dataset_to_files(self, dataset: TextDataset, output_prefix: str):
+        """
+        Like :func:`score_dataset`, but writes the predictions and labels to ``.npy`` files as it
+        goes, instead of keeping them in memory, so that scoring a very large dataset (e.g., a
+        :class:`~deep_qa.data.datasets.lazy_dataset.LazyTextDataset`, which we read and score
+        one chunk at a time) only needs memory for one chunk of instances and one batch of
+        outputs.  Rows are in the same order as the instances in ``dataset``.
+
+        The predictions go in ``{output_prefix}_predictions.npy`` and the labels in
+        ``{output_prefix}_labels.npy`` (or ``{output_prefix}_predictions_{i}.npy`` and so on, if
+        the model has several outputs).  You can open them with ``numpy.load(filename,
+        mmap_mode='r')`` to read them without loading them into memory.  Outputs whose shape
+        depends on the padding are zero-padded, as in :func:`score_dataset`.
+
+        Returns
+        -------
+        predictions: numpy.memmap
+            The predictions, memory-mapped from their file (or a list of these, for several
+            outputs).
+        labels: numpy.memmap
+            The labels, the same way, or ``None`` if the data has no labels.
+        """
+        indexed_dataset = dataset.to_indexed_dataset(self.data_indexer)
+        def allocate(shape, dtype, name):
+            return numpy.lib.format.open_memmap("%s_%s.npy" % (output_prefix, name),
+                                                mode='w+', dtype=dtype, shape=shape)
+        predictions, labels = self.__score_into_arrays(indexed_dataset, allocate)
+        for array in _flatten_arrays(predictions) + _flatten_arrays(labels):
+            array.flush()
         return predictions, labels
 
     @overrides
     def set_model_state_from_dataset(self, dataset: TextDataset):
         logger.info("Fitting data indexer word dictionary.")
-        self.data_indexer.fit_word_dictionary(dataset)
+        self.data_indexer.fit_word_dictionary(dataset, num_workers=self.num_preprocessing_workers)
 
     @overrides
     def set_model_state_from_indexed_dataset(self, dataset: IndexedDataset):
         self._set_padding_lengths(dataset.padding_lengths())
 
+    def __get_calibration_filename(self) -> str:
+        return "%s_memory_calibration.json" % self.model_prefix
+
+    def __get_scoring_data_generator(self) -> DataGenerator:
+        # Without a data generator we still want per-batch padding, just not sorting or adaptive
+        # batch sizes.
+        return self.data_generator or DataGenerator(self, Params({}))
+
+    def __has_fixed_output_shapes(self) -> bool:
+        return all(None not in K.int_shape(output)[1:] for output in self.model.outputs)
+
+    def __score_into_arrays(self, indexed_dataset: IndexedDataset, allocate):
+        """
+        Scores ``indexed_dataset`` in length-sorted batches, writing the predictions and labels for
+        each batch into their rows of arrays that we get from ``allocate(shape, dtype, name)`` when
+        we see the first batch.  A lazy dataset is scored one chunk at a time.
+        """
+        data_generator = self.__get_scoring_data_generator()
+        if isinstance(indexed_dataset, LazyIndexedDataset):
+            chunks = indexed_dataset.iter_chunks()
+        else:
+            chunks = [indexed_dataset]
+        num_instances = len(indexed_dataset)
+        prediction_shapes = None
+        label_shapes = None
+        if num_instances > 0 and not self.__has_fixed_output_shapes():
+            prediction_shapes, label_shapes = self.__get_padded_row_shapes(indexed_dataset, data_generator)
+        predictions = None
+        labels = None
+        chunk_start = 0
+        for chunk in chunks:
+            groups = data_generator.create_scoring_batches(chunk)
+            batches = data_generator.create_generator_from_groups(chunk, groups)
+            for group in groups:
+                inputs, batch_labels = next(batches)
+                batch_predictions = self.model.predict_on_batch(inputs)
+                if predictions is None:
+                    predictions = _allocate_rows(batch_predictions, num_instances, allocate,
+                                                 'predictions', prediction_shapes)
+                    labels = _allocate_rows(batch_labels, num_instances, allocate, 'labels', label_shapes)
+                rows = chunk_start + numpy.asarray(group, dtype='int64')
+                _set_rows(predictions, rows, batch_predictions)
+                _set_rows(labels, rows, batch_labels)
+            batches.close()
+            chunk_start += len(chunk)
+        return predictions, labels
+
+    def __get_padded_row_shapes(self, indexed_dataset: IndexedDataset, data_generator: DataGenerator):
+        """
+        Returns the shape of a row of the model's outputs, and of the labels, when padded to the
+        largest lengths in ``indexed_dataset`` (a lazy dataset takes one extra pass over its
+        chunks), by running the model on one instance padded to those lengths.  Every batch is
+        padded to at most these lengths, so its outputs fit in rows of these shapes.
+        """
+        padding_lengths = data_generator.get_padding_lengths(indexed_dataset)
+        if isinstance(indexed_dataset, LazyIndexedDataset):
+            instance = next(indexed_dataset.iter_chunks()).instances[0]
+        else:
+            instance = indexed_dataset.instances[0]
+        inputs, labels = IndexedDataset([instance]).as_padded_training_data(padding_lengths)
+        outputs = self.model.predict_on_batch(inputs)
+        return _get_row_shapes(outputs), _get_row_shapes(labels)
+
+    def __load_and_truncate(self, data_files: List[str], max_instances: int) -> TextDataset:
+        logger.info("Loading data from %s", str(data_files))
+        dataset = self.load_dataset_from_files(data_files)
+        if max_instances:
+            logger.info("Truncating the dataset to %d instances", max_instances)
+            dataset = dataset.truncate(max_instances)
+        return dataset
+
     def _dataset_indexing_kwargs(self) -> Dict[str, Any]:
-        return {'data_indexer': self.data_indexer}
+        return {
+                'data_indexer': self.data_indexer,
+                'columnar': self.columnar_datasets,
+                'num_workers': self.num_preprocessing_workers,
+                }
 
     @overrides
     def _set_params_from_model(self):
         self._set_padding_lengths_from_model()
 
+    @overrides
+    def _calibrate_memory_usage(self, dataset: IndexedDataset):
+        """
+        If the data generator's ``adaptive_memory_usage_constant`` is ``"calibrate"``, we reuse the
+        calibration saved next to the model config, if there is one for this model and memory
+        limit, and otherwise measure it (see :mod:`~deep_qa.training.memory_calibration`).
+        """
+        if self.data_generator is None or not self.data_generator.needs_calibration():
+            return
+        if self.data_generator.calibration_memory_limit is not None:
+            memory_limit = int(self.data_generator.calibration_memory_limit * 2 ** 20)
+        else:
+            memory_limit = get_default_memory_limit()
+        fingerprint = get_model_fingerprint(self.model)
+        calibration = None
+        if self.model_prefix:
+            calibration = load_calibration(self.__get_calibration_filename())
+        if (calibration is None
+                    or calibration['memory_limit'] != memory_limit
+                    or calibration['model_fingerprint'] != fingerprint):
+            logger.info("Calibrating adaptive_memory_usage_constant for a memory limit of %.1f MB",
+                        memory_limit / 2 ** 20)
+            if isinstance(dataset, LazyIndexedDataset):
+                # We only need the instance with the largest padding, which we find with one pass
+                # over the chunks.
+                dataset = IndexedDataset([dataset.get_largest_instance(self.get_instance_sorting_keys())])
+            calibration = calibrate_memory_usage_constant(self.model,
+                                                          self.data_generator,
+                                                          dataset,
+                                                          self.get_instance_sorting_keys(),
+                                                          self.get_padding_memory_scaling,
+                                                          memory_limit,
+                                                          self.data_generator.maximum_batch_size)
+            calibration['model_fingerprint'] = fingerprint
+            if self.model_prefix:
+                save_calibration(self.__get_calibration_filename(), calibration)
+        else:
+            logger.info("Using the saved memory calibration in %s", self.__get_calibration_filename())
+        constant = calibration['adaptive_memory_usage_constant']
+        logger.info("adaptive_memory_usage_constant: %d", constant)
+        self.data_generator.adaptive_memory_usage_constant = constant
+
     @overrides
     def _save_auxiliary_files(self):
         super(TextTrainer, self)._save_auxiliary_files()
-        data_indexer_file = open("%s_data_indexer.pkl" % self.model_prefix, "wb")
-        pickle.dump(self.data_indexer, data_indexer_file)
-        data_indexer_file.close()
+        self.data_indexer.save("%s_data_indexer.json" % self.model_prefix)
 
     @overrides
     def _load_auxiliary_files(self):
         super(TextTrainer, self)._load_auxiliary_files()
-        data_indexer_file = open("%s_data_indexer.pkl" % self.model_prefix, "rb")
-        self.data_indexer = pickle.load(data_indexer_file)
-        data_indexer_file.close()
+        data_indexer_filename = "%s_data_indexer.json" % self.model_prefix
+        if os.path.exists(data_indexer_filename):
+            self.data_indexer = DataIndexer.load(data_indexer_filename)
+        else:
+            # Models saved by older versions of this code pickled the DataIndexer.
+            data_indexer_file = open("%s_data_indexer.pkl" % self.model_prefix, "rb")
+            self.data_indexer = pickle.load(data_indexer_file)
+            data_indexer_file.close()
+        if self.data_generator is not None and self.data_generator.needs_calibration():
+            calibration = load_calibration(self.__get_calibration_filename())
+            if calibration is not None:
+                self.data_generator.adaptive_memory_usage_constant = calibration['adaptive_memory_usage_constant']
 
     @overrides
     def _overall_debug_output(self, output_dict: Dict[str, numpy.array]) -> str:
@@ -729,3 +1049,63 @@ class TextTrainer(Trainer):
             result += '%s\t%s\n' % (word, word_vector)
         result += '\n'
         return result
+
+
+def _get_row_shapes(batch: Any):
+    """
+    Returns the shape of the rows of ``batch`` (or a list or tuple of them), or ``None`` for labels
+    of data that doesn't have any.
+    """
+    if batch is None:
+        return None
+    if isinstance(batch, (list, tuple)):
+        return type(batch)(_get_row_shapes(array) for array in batch)
+    batch = numpy.asarray(batch)
+    if batch.dtype == object:
+        return None
+    return batch.shape[1:]
+
+
+def _allocate_rows(batch: Any, num_rows: int, allocate, name: str, row_shapes: Any=None):
+    """
+    Allocates arrays with ``num_rows`` rows, shaped like the rows of ``batch`` (an array, or a list
+    or tuple of arrays, for models with several inputs or outputs), or like ``row_shapes``, if
+    given (see :func:`_get_row_shapes`).
+    """
+    if batch is None:
+        return None
+    if isinstance(batch, (list, tuple)):
+        if row_shapes is None:
+            row_shapes = [None] * len(batch)
+        return type(batch)(_allocate_rows(array, num_rows, allocate, "%s_%d" % (name, i), shape)
+                           for i, (array, shape) in enumerate(zip(batch, row_shapes)))
+    batch = numpy.asarray(batch)
+    if batch.dtype == object:
+        # This is what we get for labels when the data doesn't have any.
+        return None
+    if row_shapes is None:
+        row_shapes = batch.shape[1:]
+    return allocate((num_rows,) + tuple(row_shapes), batch.dtype, name)
+
+
+def _set_rows(arrays: Any, rows: numpy.ndarray, batch: Any):
+    """
+    Writes the rows of ``batch`` into ``arrays`` at ``rows``.  The rows of ``arrays`` can be wider
+    than the batch's, in which case the rest of them is left as it was allocated (zeros).
+    """
+    if arrays is None:
+        return
+    if isinstance(arrays, (list, tuple)):
+        for array, batch_array in zip(arrays, batch):
+            _set_rows(array, rows, batch_array)
+        return
+    batch = numpy.asarray(batch)
+    arrays[(rows,) + tuple(slice(0, length) for length in batch.shape[1:])] = batch
+
+
+def _flatten_arrays(arrays: Any) -> List[numpy.ndarray]:
+    if arrays is None:
+        return []
+    if isinstance(arrays, (list, tuple)):
+        return list(arrays)
+    return [arrays]
@@ -3,7 +3,10 @@ import os
 from typing import Any, Dict, List, Tuple
 
 import numpy
-from keras.callbacks import CallbackList, EarlyStopping, LambdaCallback, ModelCheckpoint
+import tensorflow
+from keras import backend as K
+from keras.callbacks import CallbackList, LambdaCallback
+from keras.engine.training import _slice_arrays
 from keras.models import model_from_json
 
 from ..data.datasets import Dataset, IndexedDataset
@@ -13,6 +16,9 @@ from ..data.instances.instance import Instance
 from ..layers.wrappers import OutputMask
 from .models import DeepQaModel
 from .optimizers import optimizer_from_params
+from .checkpointing import AsyncModelCheckpoint, CheckpointWriter, ResumableEarlyStopping, TrainingCheckpointer
+from .checkpointing import link_or_copy, read_latest_training_checkpoint, restore_variables, set_random_state
+from .local_cluster import LocalCluster
 from .multi_gpu import compile_parallel_model
 
 logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
@@ -67,7 +73,23 @@ class Trainer:
         Like ``train_steps_per_epoch``, but for test data.
     save_models: bool, optional (default=True)
         Should we save the models that we train?  If this is True, you are required to also set the
-        model_serialization_prefix parameter, or the code will crash.
+        model_serialization_prefix parameter, or the code will crash.  Weights are saved whenever
+        the ``validation_metric`` improves, on a background thread (see
+        :mod:`deep_qa.training.checkpointing`).
+    keep_checkpoints: int, optional (default=None)
+        If set, we only keep this many of the most recent per-epoch weight files, deleting older
+        ones as we go.  The weights from the best epoch are always kept.
+    checkpoint_every_n_steps: int, optional (default=None)
+        If set (and ``save_models`` is ``True``), we write a training checkpoint every this many
+        training steps, and at the end of every epoch.  Unlike the per-epoch weight files, a
+        training checkpoint has everything needed to continue training exactly where it stopped:
+        all of the variables (including the optimizer's), the position in the training data, the
+        random state, and the early stopping state.  Use :func:`resume` (or
+        :func:`deep_qa.run.resume_model`) to continue from the latest one.  Only the last two are
+        kept.
+    checkpoint_every_n_minutes: float, optional (default=None)
+        Like ``checkpoint_every_n_steps``, but writes a training checkpoint whenever this many
+        minutes have passed since the last one.  You can set both.
     model_serialization_prefix: str, optional (default=None)
         Prefix for saving and loading model files.  Must be set if ``save_models`` is ``True``.
     num_gpus: int, optional (default=1) Number of GPUs to use. In DeepQa we use Data Parallelism,
@@ -77,8 +99,29 @@ class Trainer:
         code which depends on the batch size will be effected - for example, if you are using
         dynamic padding, the batches will be larger and hence more padded, as the dataset is
         chunked into fewer overall batches.
+    tower_device_type: str, optional (default="gpu")
+        Where to put the ``num_gpus`` copies of the model, when ``num_gpus > 1``.  With ``"gpu"``,
+        there is one copy on each GPU.  With ``"cpu"``, we make ``num_gpus`` CPU devices in this
+        process and put one copy on each, which lets a CPU-only machine run the copies in parallel.
+        With ``"worker"``, we start a :class:`~deep_qa.training.local_cluster.LocalCluster` with
+        ``num_gpus`` worker processes and a parameter server process, and put one copy in each
+        worker.  In every case the gradients are averaged synchronously.  Note that ``"cpu"`` and
+        ``"worker"`` replace the Keras session, so any session configuration you set up before
+        training is not kept.
     batch_size: int, optional (default=32)
         Batch size to use when training.
+    gradient_accumulation_steps: int, optional (default=None)
+        If set, each training step only accumulates the gradients of its batch, and we update the
+        weights with the (instance-weighted) average gradient of every this many batches.  This
+        gives you the updates of a batch this many times larger than ``batch_size``, while only
+        needing the memory for ``batch_size`` instances.  Note that the global step (and so
+        tensorboard logging) counts updates, not batches.  Not supported with ``num_gpus > 1``.
+    gradient_accumulation_tokens: int, optional (default=None)
+        Like ``gradient_accumulation_steps``, but we update the weights once the accumulated
+        batches contain at least this many (non-padding) tokens.  This is the one to use with a
+        data generator with ``adaptive_batch_sizes``, where the number of instances per batch
+        varies with their length: the batches fit in memory, and each update sees about the same
+        amount of text.  If you set both, we update when either limit is reached.
     num_epochs: int, optional (default=20)
         Number of training epochs.
     validation_split: float, optional (default=0.1)
@@ -151,14 +194,24 @@ class Trainer:
         # Model serialization parameters.
         self.save_models = params.pop('save_models', True)
         self.model_prefix = params.pop('model_serialization_prefix', None)
+        self.keep_checkpoints = params.pop('keep_checkpoints', None)
+        self.checkpoint_every_n_steps = params.pop('checkpoint_every_n_steps', None)
+        self.checkpoint_every_n_minutes = params.pop('checkpoint_every_n_minutes', None)
         if self.model_prefix:
             parent_directory = os.path.dirname(self.model_prefix)
             os.makedirs(parent_directory, exist_ok=True)
 
         # `model.fit()` parameters.
         self.num_gpus = params.pop("num_gpus", 1)
+        self.tower_device_type = params.pop_choice("tower_device_type", ["gpu", "cpu", "worker"],
+                                                   default_to_first_choice=True)
+        self.local_cluster = None
         self.validation_split = params.pop('validation_split', 0.1)
         self.batch_size = params.pop('batch_size', 32)
+        self.gradient_accumulation_steps = params.pop('gradient_accumulation_steps', None)
+        self.gradient_accumulation_tokens = params.pop('gradient_accumulation_tokens', None)
+        if self.num_gpus > 1 and (self.gradient_accumulation_steps or self.gradient_accumulation_tokens):
+            raise ConfigurationError("Gradient accumulation is not supported with multi-gpu training")
 
         # If you've got more than one gpu, we make a mega batch, which then
         # gets split across the number of gpus you have.
@@ -196,11 +249,20 @@ class Trainer:
 
         # Training-specific member variables that will get set and used later.
         self.best_epoch = -1
+        # The callback that writes weight files, which keeps track of the best one.
+        self.model_checkpoint = None
 
         # We store the datasets used for training and validation, both before processing and after
         # processing, in case a subclass wants to modify it between epochs for whatever reason.
         self.training_dataset = None
         self.training_arrays = None
+        self.indexed_training_dataset = None
+        # If we're using a data generator, this remembers the batches it made for training, so that
+        # training checkpoints can record where we were in the data.
+        self.training_batch_record = None
+        self.__first_generator_epoch = 0
+        # When resuming, the data position from the checkpoint, with the epoch it belongs to.
+        self.__resumed_data_position = None
 
         self.validation_dataset = None
         self.validation_arrays = None
@@ -260,14 +322,7 @@ class Trainer:
         if batch_size is None:
             batch_size = self.batch_size
 
-        logger.info("Loading data from %s", str(data_files))
-        dataset = self.load_dataset_from_files(data_files)
-        if max_instances is not None:
-            logger.info("Truncating the dataset to %d instances", max_instances)
-            dataset = dataset.truncate(max_instances)
-        logger.info("Indexing dataset")
-        indexing_kwargs = self._dataset_indexing_kwargs()
-        indexed_dataset = dataset.to_indexed_dataset(**indexing_kwargs)
+        dataset, indexed_dataset = self._load_indexed_dataset(data_files, max_instances)
         data_arrays = self.create_data_arrays(indexed_dataset, batch_size)
         return (dataset, data_arrays)
 
@@ -279,104 +334,74 @@ class Trainer:
         arguments to this method.
         '''
         logger.info("Running training (%s)", self.name)
-
-        # First we need to prepare the data that we'll use for training.  For the training data, we
-        # might need to update model state based on this dataset, so we handle it differently than
-        # we do the validation and training data.
-        self.training_dataset = self.load_dataset_from_files(self.train_files)
-        if self.max_training_instances:
-            self.training_dataset = self.training_dataset.truncate(self.max_training_instances)
-        if self.update_model_state_with_training_data:
-            self.set_model_state_from_dataset(self.training_dataset)
-        logger.info("Indexing training data")
-        indexing_kwargs = self._dataset_indexing_kwargs()
-        indexed_training_dataset = self.training_dataset.to_indexed_dataset(**indexing_kwargs)
-        if self.update_model_state_with_training_data:
-            self.set_model_state_from_indexed_dataset(indexed_training_dataset)
-        self.training_arrays = self.create_data_arrays(indexed_training_dataset, self.batch_size)
-        if self._uses_data_generators():
-            self.train_steps_per_epoch = self.data_generator.last_num_batches  # pylint: disable=no-member
-
-        if self.validation_files:
-            batch_size_for_validation = self.batch_size / self.num_gpus if self.num_gpus > 1 else None
-            self.validation_dataset, self.validation_arrays = self.load_data_arrays(self.validation_files,
-                                                                                    self.max_validation_instances,
-                                                                                    batch_size_for_validation)
-        if self._uses_data_generators():
-            self.validation_steps = self.data_generator.last_num_batches  # pylint: disable=no-member
-
-        # Then we build the model and compile it.
-        logger.info("Building the model")
-        if self.num_gpus <= 1:
-            self.model = self._build_model()
-            self.model.compile(self.__compile_kwargs())
-        else:
-            if self._uses_data_generators():
-                if self.data_generator.adaptive_batch_sizes:   # pylint: disable=no-member
-                    raise ConfigurationError("Multi-gpu training is currently only supported for "
-                                             "training which does not utilise adaptive batching."
-                                             "Please remove 'adaptive_batch_sizes'from your "
-                                             "configuration file to proceed.")
-            self.model = compile_parallel_model(self._build_model, self.__compile_kwargs())
-
-        self.model.summary(show_masks=self.show_summary_with_masking)
-
-        if self.debug_params:
-            # Get the list of layers whose outputs will be visualized as per the
-            # solver definition and build a debug model.
-            debug_layer_names = self.debug_params['layer_names']
-            debug_masks = self.debug_params.get('masks', [])
-            debug_data = self.debug_params['data']
-            if debug_data == "training":
-                self.debug_dataset = self.training_dataset
-                self.debug_arrays = self.training_arrays
-            elif debug_data == "validation":
-                # NOTE: This currently only works if you've specified specific validation data, not
-                # if you are just splitting the training data for validation.
-                self.debug_dataset = self.validation_dataset
-                self.debug_arrays = self.validation_arrays
-            else:
-                # If the `data` param is not "training" or "validation", we assume it's a list of
-                # file names.
-                self.debug_dataset, self.debug_arrays = self.load_data_arrays(debug_data)
-            self.debug_model = self.__build_debug_model(debug_layer_names, debug_masks)
+        self.__prepare_training()
 
         # Now we actually train the model using various Keras callbacks to control training.
         callbacks = self._get_callbacks()
-        kwargs = {'epochs': self.num_epochs, 'callbacks': [callbacks], 'batch_size': self.batch_size}
-        # We'll check for explicit validation data first; if you provided this, you definitely
-        # wanted to use it for validation.  self.validation_split is non-zero by default,
-        # so you may have left it above zero on accident.
-        if self.validation_arrays is not None:
-            kwargs['validation_data'] = self.validation_arrays
-        elif self.validation_split > 0.0 and not self._uses_data_generators():
-            kwargs['validation_split'] = self.validation_split
-
-        # Add the user-specified arguments to fit.
-        kwargs.update(self.fit_kwargs)
-        # We now pass all the arguments to the model's fit function, which does all of the training.
-
-        if not self._uses_data_generators():
-            history = self.model.fit(self.training_arrays[0], self.training_arrays[1], **kwargs)
-        else:
-            # If the data was produced by a generator, we have a bit more work to do to get the
-            # arguments right.
-            kwargs.pop('batch_size')
-            kwargs['steps_per_epoch'] = self.train_steps_per_epoch
-            if self.validation_arrays is not None and self._uses_data_generators():
-                kwargs['validation_steps'] = self.validation_steps
-            history = self.model.fit_generator(self.training_arrays, **kwargs)
+        history = self.__fit(self.training_arrays, callbacks, initial_epoch=0)
+        self.__finish_training(history.history)
 
-        # After finishing training, we save the best weights and
-        # any auxillary files, such as the model config.
-        self.best_epoch = int(numpy.argmax(history.history[self.validation_metric]))
-        if self.save_models:
-            self.__save_best_model()
-            self._save_auxiliary_files()
+    def resume(self):
+        """
+        Continues training from the latest training checkpoint written under
+        ``model_serialization_prefix`` (see ``checkpoint_every_n_steps``).
+
+        We load the data and build the model exactly as :func:`train` does, then restore all of the
+        variables, the random state and the early stopping and checkpointing state from the
+        checkpoint.  If the checkpoint was written in the middle of an epoch, we finish that epoch
+        with the batches it would have had, and then train for the remaining epochs as though
+        training had never stopped.  For training to continue `exactly` as it would have, the
+        random seeds have to be the same as in the original run (which they are if you use
+        :func:`deep_qa.run.resume_model` with the same parameter file), and the training data has to
+        fit in memory (a lazy dataset can only be resumed from the start of an epoch).  Randomness
+        inside the TensorFlow graph, like dropout masks, is not part of the checkpoint.
+        """
+        checkpoint = read_latest_training_checkpoint(self.model_prefix)
+        if checkpoint is None:
+            raise ConfigurationError("No training checkpoint found for %s" % self.model_prefix)
+        variables, state = checkpoint
+        epoch, batch = state['epoch'], state['batch']
+        logger.info("Resuming training (%s) at epoch %d, batch %d", self.name, epoch, batch)
+        self.__prepare_training()
+        if (self.validation_arrays is None and self.validation_split > 0.0
+                    and not self._uses_data_generators()):
+            # We split the data ourselves, so that the rest of the interrupted epoch is split off
+            # from the same training data as the original run.
+            self.__split_validation_data()
+
+        # TensorFlow only creates the optimizer's variables when we make the training function.
+        self.model._make_train_function()  # pylint: disable=protected-access
+        restore_variables(variables)
 
-        # If there are test files, we evaluate on the test data.
-        if self.test_files:
-            self.evaluate_model(self.test_files, self.max_test_instances)
+        callbacks = self._get_callbacks()
+        checkpointers = [callback for callback in callbacks.callbacks
+                         if isinstance(callback, TrainingCheckpointer)]
+        if not checkpointers:
+            raise ConfigurationError("Resuming training requires save_models and either "
+                                     "checkpoint_every_n_steps or checkpoint_every_n_minutes")
+        checkpointer = checkpointers[0]
+        checkpointer.set_state(state)
+        self.__resumed_data_position = (epoch if batch > 0 else epoch - 1, state['data_position'])
+        stop_training = state['stop_training']
+        if batch > 0 and not stop_training:
+            logger.info("Finishing the interrupted epoch")
+            set_random_state(state['random_state'])
+            remaining_arrays, remaining_steps = self.__get_remaining_training_data(state['data_position'], batch)
+            self.__fit(remaining_arrays, callbacks, initial_epoch=epoch, num_epochs=epoch + 1,
+                       train_steps_per_epoch=remaining_steps, shuffle=False)
+            stop_training = self.model.stop_training
+            epoch += 1
+        if epoch < self.num_epochs and not stop_training:
+            set_random_state(state['random_state'])
+            if self._uses_data_generators():
+                self.training_arrays = self.data_generator.create_generator(  # pylint: disable=no-member
+                        self.indexed_training_dataset,
+                        self.batch_size,
+                        resume_from=self.__resumed_data_position[1])
+                self.training_batch_record = self.data_generator.last_batch_record  # pylint: disable=no-member
+                self.__first_generator_epoch = epoch
+            self.__fit(self.training_arrays, callbacks, initial_epoch=epoch)
+        self.__finish_training(checkpointer.history)
 
     def load_model(self, epoch: int=None):
         """
@@ -407,7 +432,7 @@ class Trainer:
         # We call self.load_model() first, to be sure that we load the best model we have, if we've
         # trained for a while.
         self.load_model()
-        _, arrays = self.load_data_arrays(data_files, max_instances)
+        _, arrays = self.load_data_arrays(data_files, max_instances=max_instances)
         logger.info("Evaluting model on the test set.")
         if not self._uses_data_generators():
             scores = self.model.evaluate(arrays[0], arrays[1])
@@ -502,6 +527,24 @@ class Trainer:
         """
         raise NotImplementedError
 
+    def _get_tower_devices(self) -> Tuple[List[str], str]:
+        """
+        Returns the devices to put the copies of the model on, and the device to put the variables
+        on, for multi-device training, setting up the Keras session to match (see the
+        ``tower_device_type`` parameter).
+        """
+        if self.tower_device_type == "gpu":
+            return ['/gpu:%d' % index for index in range(self.num_gpus)], '/cpu:0'
+        if self.tower_device_type == "cpu":
+            config = tensorflow.ConfigProto(device_count={'CPU': self.num_gpus}, allow_soft_placement=True)
+            K.set_session(tensorflow.Session(config=config))
+            return ['/cpu:%d' % index for index in range(self.num_gpus)], '/cpu:0'
+        if self.local_cluster is None:
+            self.local_cluster = LocalCluster(self.num_gpus)
+        config = tensorflow.ConfigProto(allow_soft_placement=True)
+        K.set_session(tensorflow.Session(self.local_cluster.target, config=config))
+        return self.local_cluster.get_tower_devices(), self.local_cluster.get_variable_device()
+
     def _build_model(self) -> DeepQaModel:
         """Constructs and returns a DeepQaModel (which is a wrapper around a Keras Model) that will
         take the output of self._get_training_data as input, and produce as output a true/false
@@ -535,6 +578,34 @@ class Trainer:
     # Protected methods - you CAN override these, if you want
     ###################
 
+    def _load_indexed_dataset(self,
+                              data_files: List[str],
+                              max_instances: int=None,
+                              update_model_state: bool=False) -> Tuple[Dataset, IndexedDataset]:
+        """
+        Loads a :class:`Dataset` from ``data_files``, optionally truncates it to ``max_instances``,
+        and indexes it.  If ``update_model_state`` is ``True``, we also call
+        :func:`~Trainer.set_model_state_from_dataset` before indexing, and
+        :func:`~Trainer.set_model_state_from_indexed_dataset` after, as we do for training data.
+
+        Returns both the raw dataset and the indexed dataset.  Subclasses that can get the indexed
+        dataset some faster way (e.g., from a cache) may override this, and return ``None`` for the
+        raw dataset when they didn't need to read it.
+        """
+        logger.info("Loading data from %s", str(data_files))
+        dataset = self.load_dataset_from_files(data_files)
+        if max_instances:
+            logger.info("Truncating the dataset to %d instances", max_instances)
+            dataset = dataset.truncate(max_instances)
+        if update_model_state:
+            self.set_model_state_from_dataset(dataset)
+        logger.info("Indexing dataset")
+        indexing_kwargs = self._dataset_indexing_kwargs()
+        indexed_dataset = dataset.to_indexed_dataset(**indexing_kwargs)
+        if update_model_state:
+            self.set_model_state_from_indexed_dataset(indexed_dataset)
+        return dataset, indexed_dataset
+
     def _get_callbacks(self):
         """
          Returns a set of Callbacks which are used to perform various functions within Keras' .fit method.
@@ -545,7 +616,8 @@ class Trainer:
          Additionally, there is also functionality to create Tensorboard log files. These can be visualised
          using 'tensorboard --logdir /path/to/log/files' after training.
         """
-        early_stop = EarlyStopping(monitor=self.validation_metric, patience=self.patience)
+        self.model_checkpoint = None
+        early_stop = ResumableEarlyStopping(monitor=self.validation_metric, patience=self.patience)
         model_callbacks = LambdaCallback(on_epoch_begin=lambda epoch, logs: self._pre_epoch_hook(epoch),
                                          on_epoch_end=lambda epoch, logs: self._post_epoch_hook(epoch))
         callbacks = [early_stop, model_callbacks]
@@ -560,10 +632,27 @@ class Trainer:
         # Some witchcraft is happening here - we don't specify the epoch replacement variable
         # checkpointing string, because Keras does that within the callback if we specify it here.
         if self.save_models:
-            checkpointing = ModelCheckpoint(self.model_prefix + "_weights_epoch={epoch:d}.h5",
-                                            save_best_only=True, save_weights_only=True,
-                                            monitor=self.validation_metric)
+            # The two kinds of checkpoints share a writer, so that a training checkpoint is always
+            # written after the weight file it refers to.
+            writer = CheckpointWriter()
+            checkpointing = AsyncModelCheckpoint(self.model_prefix + "_weights_epoch={epoch:d}.h5",
+                                                 save_best_only=True,
+                                                 monitor=self.validation_metric,
+                                                 keep_checkpoints=self.keep_checkpoints,
+                                                 writer=writer)
             callbacks.append(checkpointing)
+            self.model_checkpoint = checkpointing
+            if self.checkpoint_every_n_steps or self.checkpoint_every_n_minutes:
+                # This has to come last, so that it sees the other callbacks' state at the end of
+                # each epoch.
+                training_checkpointer = TrainingCheckpointer(self.model_prefix,
+                                                             self.__get_data_position,
+                                                             {'early_stopping': early_stop,
+                                                              'model_checkpoint': checkpointing},
+                                                             every_n_steps=self.checkpoint_every_n_steps,
+                                                             every_n_minutes=self.checkpoint_every_n_minutes,
+                                                             writer=writer)
+                callbacks.append(training_checkpointer)
 
         return CallbackList(callbacks)
 
@@ -619,6 +708,14 @@ class Trainer:
         """
         pass
 
+    def _calibrate_memory_usage(self, dataset: IndexedDataset):
+        """
+        Called during training, after the model is built and compiled, but before we make any
+        training batches from ``dataset``.  If your batch sizes depend on how much memory the
+        model uses, you can measure that here.  The default implementation does nothing.
+        """
+        pass
+
     def _load_auxiliary_files(self):
         """
         Called during model loading.  If you have some auxiliary pickled object, such as an object
@@ -661,6 +758,183 @@ class Trainer:
     # consider making them protected instead.
     #################
 
+    def __prepare_training(self):
+        """
+        Loads the training and validation data, and builds and compiles the model (and the debug
+        model, if we have one).
+        """
+        # First we need to prepare the data that we'll use for training.  For the training data, we
+        # might need to update model state based on this dataset, so we handle it differently than
+        # we do the validation and training data.
+        self.training_dataset, indexed_training_dataset = self._load_indexed_dataset(
+                self.train_files,
+                self.max_training_instances,
+                update_model_state=self.update_model_state_with_training_data)
+        self.indexed_training_dataset = indexed_training_dataset
+
+        # Then we build the model and compile it.  Loading the training data has set everything
+        # the model depends on, and we build it before making any batches, so that we can calibrate
+        # the batch sizes with it if we need to.
+        logger.info("Building the model")
+        if self.num_gpus <= 1:
+            self.model = self._build_model()
+            self.model.compile(self.__compile_kwargs())
+        else:
+            if self._uses_data_generators():
+                if self.data_generator.adaptive_batch_sizes:   # pylint: disable=no-member
+                    raise ConfigurationError("Multi-gpu training is currently only supported for "
+                                             "training which does not utilise adaptive batching."
+                                             "Please remove 'adaptive_batch_sizes'from your "
+                                             "configuration file to proceed.")
+            tower_devices, variable_device = self._get_tower_devices()
+            self.model = compile_parallel_model(self._build_model,
+                                                self.__compile_kwargs(),
+                                                tower_devices,
+                                                variable_device)
+
+        self._calibrate_memory_usage(indexed_training_dataset)
+
+        self.training_arrays = self.create_data_arrays(indexed_training_dataset, self.batch_size)
+        if self._uses_data_generators():
+            self.train_steps_per_epoch = self.data_generator.last_num_batches  # pylint: disable=no-member
+            self.training_batch_record = self.data_generator.last_batch_record  # pylint: disable=no-member
+            self.__first_generator_epoch = 0
+
+        if self.validation_files:
+            batch_size_for_validation = self.batch_size / self.num_gpus if self.num_gpus > 1 else None
+            self.validation_dataset, self.validation_arrays = self.load_data_arrays(self.validation_files,
+                                                                                    self.max_validation_instances,
+                                                                                    batch_size_for_validation)
+        if self._uses_data_generators():
+            self.validation_steps = self.data_generator.last_num_batches  # pylint: disable=no-member
+
+        self.model.summary(show_masks=self.show_summary_with_masking)
+
+        if self.debug_params:
+            # Get the list of layers whose outputs will be visualized as per the
+            # solver definition and build a debug model.
+            debug_layer_names = self.debug_params['layer_names']
+            debug_masks = self.debug_params.get('masks', [])
+            debug_data = self.debug_params['data']
+            if debug_data == "training":
+                self.debug_dataset = self.training_dataset
+                self.debug_arrays = self.training_arrays
+            elif debug_data == "validation":
+                # NOTE: This currently only works if you've specified specific validation data, not
+                # if you are just splitting the training data for validation.
+                self.debug_dataset = self.validation_dataset
+                self.debug_arrays = self.validation_arrays
+            else:
+                # If the `data` param is not "training" or "validation", we assume it's a list of
+                # file names.
+                self.debug_dataset, self.debug_arrays = self.load_data_arrays(debug_data)
+            self.debug_model = self.__build_debug_model(debug_layer_names, debug_masks)
+
+    def __fit(self,
+              training_arrays,
+              callbacks: CallbackList,
+              initial_epoch: int,
+              num_epochs: int=None,
+              train_steps_per_epoch: int=None,
+              shuffle: bool=True):
+        if num_epochs is None:
+            num_epochs = self.num_epochs
+        kwargs = {'epochs': num_epochs,
+                  'initial_epoch': initial_epoch,
+                  'callbacks': [callbacks],
+                  'batch_size': self.batch_size}
+        # We'll check for explicit validation data first; if you provided this, you definitely
+        # wanted to use it for validation.  self.validation_split is non-zero by default,
+        # so you may have left it above zero on accident.
+        if self.validation_arrays is not None:
+            kwargs['validation_data'] = self.validation_arrays
+        elif self.validation_split > 0.0 and not self._uses_data_generators():
+            kwargs['validation_split'] = self.validation_split
+
+        # Add the user-specified arguments to fit.
+        kwargs.update(self.fit_kwargs)
+        # We now pass all the arguments to the model's fit function, which does all of the training.
+
+        if not self._uses_data_generators():
+            if not shuffle:
+                kwargs['shuffle'] = False
+            return self.model.fit(training_arrays[0], training_arrays[1], **kwargs)
+        else:
+            # If the data was produced by a generator, we have a bit more work to do to get the
+            # arguments right.
+            kwargs.pop('batch_size')
+            kwargs['steps_per_epoch'] = train_steps_per_epoch or self.train_steps_per_epoch
+            if self.validation_arrays is not None and self._uses_data_generators():
+                kwargs['validation_steps'] = self.validation_steps
+            return self.model.fit_generator(training_arrays, **kwargs)
+
+    def __finish_training(self, history: Dict[str, List[float]]):
+        # After finishing training, we save the best weights and
+        # any auxillary files, such as the model config.
+        if self.model_checkpoint is not None and self.model_checkpoint.monitor_op is numpy.less:
+            self.best_epoch = int(numpy.argmin(history[self.validation_metric]))
+        else:
+            self.best_epoch = int(numpy.argmax(history[self.validation_metric]))
+        if self.save_models:
+            self.__save_best_model()
+            self._save_auxiliary_files()
+
+        # If there are test files, we evaluate on the test data.
+        if self.test_files:
+            self.evaluate_model(self.test_files, self.max_test_instances)
+
+    def __get_data_position(self, epoch: int, batch: int):
+        """
+        Returns what a training checkpoint written at this ``epoch`` and ``batch`` needs to
+        reproduce the training batches from there on.  With arrays, that's the shuffled order of
+        the instances in this epoch (or nothing, at the start of an epoch, as the numpy random
+        state is enough).  With a data generator, it's the generator's pass over the data for this
+        epoch (or the last one, at the start of an epoch).
+        """
+        if not self._uses_data_generators() and batch == 0:
+            return None
+        position_epoch = epoch if batch > 0 else epoch - 1
+        if self.__resumed_data_position is not None and position_epoch == self.__resumed_data_position[0]:
+            return self.__resumed_data_position[1]
+        if not self._uses_data_generators():
+            # We copy this, because Keras shuffles it in place at the start of the next epoch.
+            return numpy.array(self.model.training_index_array)
+        if self.training_batch_record is None:
+            # This is a lazy dataset, which we can only resume from the start of an epoch.
+            return None
+        return self.training_batch_record.get_pass(position_epoch - self.__first_generator_epoch)
+
+    def __get_remaining_training_data(self, data_position, batch: int):
+        """
+        Returns the training data for the rest of an epoch that was interrupted after ``batch``
+        batches, given the data position from the checkpoint, along with the number of steps it
+        takes (if we're using a data generator).
+        """
+        if data_position is None:
+            raise ConfigurationError("The training checkpoint does not record the position in the "
+                                     "training data, which is the case for lazy datasets; we can "
+                                     "only resume those from a checkpoint at the end of an epoch")
+        if not self._uses_data_generators():
+            instance_ids = data_position[batch * self.batch_size:]
+            inputs, labels = self.training_arrays
+            return (_slice_arrays(inputs, instance_ids), _slice_arrays(labels, instance_ids)), None
+        groups, _ = data_position
+        remaining_groups = groups[batch:]
+        generator = self.data_generator.create_generator_from_groups(  # pylint: disable=no-member
+                self.indexed_training_dataset, remaining_groups)
+        return generator, len(remaining_groups)
+
+    def __split_validation_data(self):
+        """
+        Splits ``self.training_arrays`` into training and validation arrays the same way Keras does
+        when we pass it ``validation_split``.
+        """
+        inputs, labels = self.training_arrays
+        num_instances = len(inputs[0]) if isinstance(inputs, list) else len(inputs)
+        split_at = int(num_instances * (1. - self.validation_split))
+        self.validation_arrays = (_slice_arrays(inputs, split_at), _slice_arrays(labels, split_at))
+        self.training_arrays = (_slice_arrays(inputs, 0, split_at), _slice_arrays(labels, 0, split_at))
+
     def __save_best_model(self):
         """
         Copies the weights from the best epoch to a final weight file.
@@ -669,11 +943,17 @@ class Trainer:
         calling this as a subroutine doesn't have to worry about which epoch ended up being the
         best, they can just use the final weight file.  You can still use models from other epochs
         if you really want to.
+
+        We hard link the final weight file to the best epoch's file (falling back to a copy if we
+        can't), so this is fast even for very large models.  The checkpoint callback keeps track of
+        which file that is (and never deletes it, with ``keep_checkpoints``).
         """
-        from shutil import copyfile
-        epoch_weight_file = "%s_weights_epoch=%d.h5" % (self.model_prefix, self.best_epoch)
+        if self.model_checkpoint is not None and self.model_checkpoint.best_filename is not None:
+            epoch_weight_file = self.model_checkpoint.best_filename
+        else:
+            epoch_weight_file = "%s_weights_epoch=%d.h5" % (self.model_prefix, self.best_epoch)
         final_weight_file = "%s_weights.h5" % self.model_prefix
-        copyfile(epoch_weight_file, final_weight_file)
+        link_or_copy(epoch_weight_file, final_weight_file)
         logger.info("Saved the best model to %s", final_weight_file)
 
     def __build_debug_model(self, debug_layer_names: List[str], debug_masks: List[str]):
@@ -740,5 +1020,7 @@ class Trainer:
                 'loss': self.loss,
                 'optimizer': self.optimizer,
                 'metrics': self.metrics,
-                'num_gpus': self.num_gpus
+                'num_gpus': self.num_gpus,
+                'gradient_accumulation_steps': self.gradient_accumulation_steps,
+                'gradient_accumulation_tokens': self.gradient_accumulation_tokens,
                 })
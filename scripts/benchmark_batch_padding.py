@@ -0,0 +1,75 @@
+"""
+Compares the per-instance padding path (``IndexedInstance.pad_word_sequence`` followed by
+``numpy.asarray``) with the vectorized batch padder in :mod:`deep_qa.data.padding`, on random
+batches of word sequences, with and without characters.
+
+Example:
+
+    python scripts/benchmark_batch_padding.py --batch_size 32 --num_batches 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy
+
+# pylint: disable=wrong-import-position
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from deep_qa.data.instances.instance import IndexedInstance
+from deep_qa.data.padding import pad_word_sequences
+
+
+def make_batch(batch_size: int, max_words: int, use_characters: bool):
+    batch = []
+    for _ in range(batch_size):
+        num_words = random.randint(max_words // 4, max_words)
+        if use_characters:
+            batch.append([[random.randint(2, 50000)] +
+                          [random.randint(2, 60) for _ in range(random.randint(1, 12))]
+                          for _ in range(num_words)])
+        else:
+            batch.append([random.randint(2, 50000) for _ in range(num_words)])
+    return batch
+
+
+def pad_one_at_a_time(batch, padding_lengths, truncate_from_right):
+    return numpy.asarray([IndexedInstance.pad_word_sequence(sequence, padding_lengths, truncate_from_right)
+                          for sequence in batch], dtype='int32')
+
+
+def time_padder(padder, batches, padding_lengths, truncate_from_right) -> float:
+    start_time = time.time()
+    for batch in batches:
+        padder(batch, padding_lengths, truncate_from_right)
+    return len(batches) / (time.time() - start_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-instance vs. vectorized batch padding.")
+    parser.add_argument("--num_batches", type=int, default=100)
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--max_words", type=int, default=300)
+    parser.add_argument("--num_word_characters", type=int, default=10)
+    args = parser.parse_args()
+
+    random.seed(13370)
+    for use_characters in [False, True]:
+        batches = [make_batch(args.batch_size, args.max_words, use_characters) for _ in range(args.num_batches)]
+        padding_lengths = {'num_sentence_words': args.max_words}
+        if use_characters:
+            padding_lengths['num_word_characters'] = args.num_word_characters
+        for truncate_from_right in [True, False]:
+            for batch in batches[:5]:
+                assert numpy.array_equal(pad_one_at_a_time(batch, padding_lengths, truncate_from_right),
+                                         pad_word_sequences(batch, padding_lengths, truncate_from_right))
+            baseline = time_padder(pad_one_at_a_time, batches, padding_lengths, truncate_from_right)
+            vectorized = time_padder(pad_word_sequences, batches, padding_lengths, truncate_from_right)
+            print("%s, truncate_from_right=%s: per-instance %.1f batches/sec, vectorized %.1f batches/sec "
+                  "(%.1fx)" % ("words and characters" if use_characters else "words", truncate_from_right,
+                               baseline, vectorized, vectorized / baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Measures how fast a ``DataGenerator`` can produce padded batches, with and without prefetching.
+
+We build a synthetic SQuAD-sized dataset of ``IndexedCharacterSpanInstances`` (so no data files or
+trained models are needed), then time how many batches per second we can pull out of the
+generator.  Because the point of prefetching is to overlap padding with model computation, you can
+pass ``--step_time`` to simulate the time the model spends on each batch; with a realistic step
+time, the prefetching generator should approach ``1 / step_time`` batches per second.
+
+Example:
+
+    python scripts/benchmark_data_generator.py --num_instances 20000 --step_time 0.01 \\
+        --prefetch_batches 8 --prefetch_workers 4
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+from copy import deepcopy
+
+# pylint: disable=wrong-import-position
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from deep_qa.common.params import Params
+from deep_qa.data import DataGenerator, IndexedDataset
+from deep_qa.data.datasets.columnar_dataset import ColumnarIndexedDataset
+from deep_qa.data.instances.reading_comprehension.character_span_instance import IndexedCharacterSpanInstance
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+class BenchmarkTrainer:
+    """
+    Implements just the parts of the ``TextTrainer`` API that the ``DataGenerator`` uses, for a
+    question / passage model like BiDAF.
+    """
+    def __init__(self, batch_size: int, use_characters: bool):
+        self.batch_size = batch_size
+        self.use_characters = use_characters
+
+    def get_instance_sorting_keys(self):  # pylint: disable=no-self-use
+        return ['num_passage_words', 'num_question_words']
+
+    def get_padding_lengths(self):
+        padding_lengths = {'num_question_words': None, 'num_passage_words': None}
+        if self.use_characters:
+            padding_lengths['num_word_characters'] = None
+        return padding_lengths
+
+    def get_padding_memory_scaling(self, padding_lengths):  # pylint: disable=no-self-use
+        return padding_lengths['num_passage_words'] * padding_lengths['num_question_words']
+
+
+def make_word(vocab_size: int, use_characters: bool):
+    word_index = random.randint(2, vocab_size - 1)
+    if not use_characters:
+        return word_index
+    return [word_index] + [random.randint(2, 60) for _ in range(random.randint(1, 12))]
+
+
+def make_dataset(num_instances: int, vocab_size: int, use_characters: bool) -> IndexedDataset:
+    instances = []
+    for _ in range(num_instances):
+        question = [make_word(vocab_size, use_characters) for _ in range(random.randint(5, 25))]
+        passage = [make_word(vocab_size, use_characters) for _ in range(random.randint(50, 300))]
+        span_begin = random.randint(0, len(passage) - 2)
+        label = [span_begin, span_begin + 1]
+        instances.append(IndexedCharacterSpanInstance(question, passage, label))
+    return IndexedDataset(instances)
+
+
+def batches_per_second(generator_params: dict,
+                       trainer: BenchmarkTrainer,
+                       dataset: IndexedDataset,
+                       num_batches: int,
+                       step_time: float) -> float:
+    data_generator = DataGenerator(trainer, Params(deepcopy(generator_params)))
+    batches = data_generator.create_generator(dataset)
+    # We pull one batch before starting the clock, so that worker start-up isn't counted.
+    next(batches)
+    start_time = time.time()
+    for _ in range(num_batches):
+        next(batches)
+        if step_time > 0:
+            time.sleep(step_time)
+    elapsed_time = time.time() - start_time
+    batches.close()
+    return num_batches / elapsed_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DataGenerator batch throughput.")
+    parser.add_argument("--num_instances", type=int, default=5000)
+    parser.add_argument("--num_batches", type=int, default=200)
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--vocab_size", type=int, default=50000)
+    parser.add_argument("--characters", action='store_true',
+                        help="Use word-and-character indices, as with the 'words and characters' tokenizer")
+    parser.add_argument("--step_time", type=float, default=0.0,
+                        help="Seconds to sleep per batch, simulating the model's training step")
+    parser.add_argument("--columnar", action='store_true',
+                        help="Store the dataset in a ColumnarIndexedDataset")
+    parser.add_argument("--no_sort_every_epoch", action='store_true',
+                        help="Keep the same batches every epoch, instead of re-sorting the data")
+    parser.add_argument("--prefetch_batches", type=int, default=8)
+    parser.add_argument("--prefetch_workers", type=int, default=4)
+    parser.add_argument("--prefetch_with_processes", action='store_true')
+    args = parser.parse_args()
+
+    random.seed(13370)
+    logger.info("Building a synthetic dataset with %d instances", args.num_instances)
+    dataset = make_dataset(args.num_instances, args.vocab_size, args.characters)
+    if args.columnar:
+        dataset = ColumnarIndexedDataset.from_instances(dataset.instances)
+    trainer = BenchmarkTrainer(args.batch_size, args.characters)
+    base_params = {'dynamic_padding': True, 'sort_every_epoch': not args.no_sort_every_epoch}
+    prefetch_params = {
+            'dynamic_padding': True,
+            'sort_every_epoch': not args.no_sort_every_epoch,
+            'prefetch_batches': args.prefetch_batches,
+            'prefetch_workers': args.prefetch_workers,
+            'prefetch_with_processes': args.prefetch_with_processes,
+            }
+    for name, generator_params in [('no prefetching', base_params), ('prefetching', prefetch_params)]:
+        rate = batches_per_second(generator_params, trainer, dataset, args.num_batches, args.step_time)
+        print("%s: %.2f batches/sec" % (name, rate))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
+                        level=logging.INFO)
+    main()
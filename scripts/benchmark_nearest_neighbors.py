@@ -0,0 +1,80 @@
+"""
+Compares the nearest neighbor algorithms that ``VectorBasedRetrieval`` can use (see
+:mod:`deep_qa.contrib.background_search.nearest_neighbor_algorithms`) on a synthetic corpus of
+clustered vectors: queries per second, and recall@k against exact search.  Product quantization
+(``pq``) stores one byte per 8 dimensions instead of four bytes per dimension; we run it with and
+without exact re-ranking of its top candidates.  The LSH is only
+included if your version of scikit-learn still has ``LSHForest``.
+
+Example:
+
+    python scripts/benchmark_nearest_neighbors.py --num_vectors 100000 --dimension 100 --nprobe 1 4 16
+"""
+import argparse
+import os
+import sys
+import time
+
+# pylint: disable=wrong-import-position
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import numpy
+
+from deep_qa.common.params import Params
+from deep_qa.contrib.background_search.nearest_neighbor_algorithms import nearest_neighbor_algorithms
+
+
+def make_corpus(num_vectors: int, num_queries: int, dimension: int, num_clusters: int):
+    random = numpy.random.RandomState(1337)
+    centers = random.normal(size=(num_clusters, dimension))
+    vectors = centers[random.randint(num_clusters, size=num_vectors)]
+    vectors += 0.5 * random.normal(size=vectors.shape)
+    queries = vectors[random.randint(num_vectors, size=num_queries)]
+    queries = queries + 0.3 * random.normal(size=queries.shape)
+    return vectors.astype('float32'), queries.astype('float32')
+
+
+def run(name: str, params: dict, vectors, queries, num_neighbors: int):
+    algorithm = nearest_neighbor_algorithms[params.pop('type')](Params(params))
+    start_time = time.time()
+    algorithm.fit(vectors)
+    fit_time = time.time() - start_time
+    start_time = time.time()
+    results = algorithm.get_neighbors(queries, num_neighbors)
+    query_time = time.time() - start_time
+    neighbors = [[index for index, _ in query_results] for query_results in results]
+    return name, fit_time, len(queries) / query_time, neighbors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--num_vectors', type=int, default=50000)
+    parser.add_argument('--num_queries', type=int, default=1000)
+    parser.add_argument('--dimension', type=int, default=100)
+    parser.add_argument('--num_clusters', type=int, default=200)
+    parser.add_argument('--num_neighbors', type=int, default=10)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--rerank', type=int, default=100, help="Candidates for PQ to re-rank exactly")
+    args = parser.parse_args()
+
+    vectors, queries = make_corpus(args.num_vectors, args.num_queries, args.dimension, args.num_clusters)
+    configurations = [('brute_force', {'type': 'brute_force'})]
+    configurations += [('ivf nprobe=%d' % nprobe, {'type': 'ivf', 'nprobe': nprobe}) for nprobe in args.nprobe]
+    configurations += [('pq', {'type': 'pq'}),
+                       ('pq rerank=%d' % args.rerank, {'type': 'pq', 'rerank': args.rerank})]
+    try:
+        from sklearn.neighbors import LSHForest  # pylint: disable=unused-import
+        configurations.append(('lsh', {'type': 'lsh'}))
+    except ImportError:
+        print("Skipping the LSH: this version of scikit-learn doesn't have LSHForest")
+
+    runs = [run(name, params, vectors, queries, args.num_neighbors) for name, params in configurations]
+    exact_neighbors = runs[0][3]
+    print("%-16s %10s %12s %10s" % ("algorithm", "fit (s)", "queries/s", "recall@%d" % args.num_neighbors))
+    for name, fit_time, queries_per_second, neighbors in runs:
+        recall = numpy.mean([len(set(found) & set(exact)) / len(exact)
+                             for found, exact in zip(neighbors, exact_neighbors)])
+        print("%-16s %10.2f %12.1f %10.3f" % (name, fit_time, queries_per_second, recall))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Measures training steps per second through :class:`deep_qa.training.step.Step` on a small
+feed-forward model on the CPU, comparing the ``Session.make_callable`` fast path with plain
+``session.run`` calls with a ``feed_dict``, and showing what an extra ``session.run`` per step to
+read the global step (which ``Step`` used to do before every call) costs.
+
+Example:
+
+    python scripts/benchmark_step.py --num_steps 2000 --batch_size 32
+"""
+import argparse
+import os
+import sys
+import time
+
+# pylint: disable=wrong-import-position
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '')
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import numpy
+import tensorflow
+import keras.backend as K
+
+from deep_qa.training.step import Step
+
+
+def build_step(input_dim: int, hidden_dim: int, summary_directory: str, use_callable: bool):
+    inputs = tensorflow.placeholder('float32', shape=(None, input_dim))
+    labels = tensorflow.placeholder('float32', shape=(None, 1))
+    hidden = tensorflow.layers.dense(inputs, hidden_dim, activation=tensorflow.nn.relu)
+    predictions = tensorflow.layers.dense(hidden, 1)
+    loss = tensorflow.reduce_mean(tensorflow.square(predictions - labels))
+    tensorflow.summary.scalar("loss", loss)
+    global_step = tensorflow.train.get_or_create_global_step()
+    train_operation = tensorflow.train.AdamOptimizer().minimize(loss, global_step=global_step)
+    summary_writer = tensorflow.summary.FileWriter(summary_directory)
+    step = Step([inputs, labels], [loss], global_step, summary_writer=summary_writer,
+                summary_frequency=100, updates=[train_operation], use_callable=use_callable)
+    K.get_session().run(tensorflow.global_variables_initializer())
+    return step
+
+
+def time_steps(step: Step, batch, num_steps: int, evaluate_global_step: bool):
+    step(batch)  # warm-up, which also builds the callable
+    start = time.time()
+    for _ in range(num_steps):
+        if evaluate_global_step:
+            K.eval(step.global_step)
+        step(batch)
+    return num_steps / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark training steps per second.")
+    parser.add_argument("--num_steps", type=int, default=2000)
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--input_dim", type=int, default=100)
+    parser.add_argument("--hidden_dim", type=int, default=100)
+    parser.add_argument("--summary_directory", type=str, default="/tmp/benchmark_step")
+    args = parser.parse_args()
+
+    batch = [numpy.random.rand(args.batch_size, args.input_dim).astype('float32'),
+             numpy.random.rand(args.batch_size, 1).astype('float32')]
+    configurations = [
+            ("feed_dict, K.eval(global_step) per step", False, True),
+            ("feed_dict", False, False),
+            ("make_callable", True, False),
+            ]
+    for name, use_callable, evaluate_global_step in configurations:
+        step = build_step(args.input_dim, args.hidden_dim, args.summary_directory, use_callable)
+        if use_callable and not step.use_callable:
+            print("%-45s not supported by this TensorFlow version" % name)
+        else:
+            steps_per_second = time_steps(step, batch, args.num_steps, evaluate_global_step)
+            print("%-45s %8.1f steps/sec" % (name, steps_per_second))
+        K.clear_session()
+
+
+if __name__ == "__main__":
+    main()
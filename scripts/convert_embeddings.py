@@ -0,0 +1,32 @@
+"""
+Converts a gzipped, GloVe-formatted embeddings file into the binary format read by
+:class:`deep_qa.data.embeddings.PretrainedEmbeddings`: a float32 ``.npy`` matrix, which is
+memory-mapped on load, and a ``.vocab`` file with one word per line.  Do this once per embeddings
+file, and then give the ``.npy`` file as the ``pretrained_file`` (or ``embeddings_file``) in your
+experiment configurations.
+
+Example:
+
+    python scripts/convert_embeddings.py glove.840B.300d.txt.gz glove.840B.300d.npy
+"""
+import argparse
+import logging
+import os
+import sys
+
+# pylint: disable=wrong-import-position
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from deep_qa.data.embeddings import PretrainedEmbeddings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a GloVe-formatted embeddings file to binary.")
+    parser.add_argument("embeddings_file", type=str, help="Gzipped, GloVe-formatted embeddings file")
+    parser.add_argument("output_file", type=str, help="Where to write the embedding matrix (must end in .npy)")
+    args = parser.parse_args()
+    logging.basicConfig(format="%(asctime)s - %(levelname)s - %(name)s - %(message)s", level=logging.INFO)
+    PretrainedEmbeddings.convert_to_binary(args.embeddings_file, args.output_file)
+
+
+if __name__ == '__main__':
+    main()
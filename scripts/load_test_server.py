@@ -0,0 +1,170 @@
+"""
+Load-tests the prediction server (see ``scripts/serve_model.py``): several client threads send
+``POST /predict`` requests as fast as they can, and we report throughput, client-side latency
+percentiles, and the server's own ``/stats`` (including the mean batch size it got from
+batching concurrent requests).
+
+Without ``--url`` or ``--unix_socket``, we train a toy ``ClassificationModel`` on random
+sentences in a temporary directory and serve it from this process, so this runs anywhere:
+
+    python scripts/load_test_server.py --num_clients 16 --num_requests 200 --max_wait_ms 5
+
+To test a server that's already running, pass its address and some data lines to send:
+
+    python scripts/load_test_server.py --url http://localhost:8000 --data_file test.tsv
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+# pylint: disable=wrong-import-position
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import numpy
+
+from deep_qa import load_model, run_model
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str):
+        super(UnixHTTPConnection, self).__init__('localhost')
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+def random_sentence(vocabulary):
+    return " ".join(random.choice(vocabulary) for _ in range(random.randint(3, 30)))
+
+
+def train_toy_model(directory: str) -> str:
+    vocabulary = ["word%d" % i for i in range(500)]
+    for name in ['train', 'validation']:
+        with open(os.path.join(directory, name), 'w') as data_file:
+            for i in range(200):
+                data_file.write("%d\t%s\t%d\n" % (i, random_sentence(vocabulary), random.randint(0, 1)))
+    params = {
+            'model_class': 'ClassificationModel',
+            'model_serialization_prefix': os.path.join(directory, 'model'),
+            'train_files': [os.path.join(directory, 'train')],
+            'validation_files': [os.path.join(directory, 'validation')],
+            'embeddings': {'words': {'dimension': 20}},
+            'encoder': {'default': {'type': 'bow'}},
+            'num_epochs': 1,
+            'save_models': True,
+            }
+    param_path = os.path.join(directory, 'params.json')
+    with open(param_path, 'w') as param_file:
+        json.dump(params, param_file)
+    run_model(param_path)
+    return param_path
+
+
+def run_client(make_connection, lines, num_requests, instances_per_request, latencies, errors):
+    connection = make_connection()
+    for _ in range(num_requests):
+        body = json.dumps({'instances': random.sample(lines, min(instances_per_request, len(lines)))})
+        start_time = time.time()
+        connection.request('POST', '/predict', body, {'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.time() - start_time)
+        if response.status != 200:
+            errors.append(response.status)
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help="The address of a running server")
+    parser.add_argument('--unix_socket', help="The UNIX socket of a running server")
+    parser.add_argument('--data_file', help="Lines to send to a running server")
+    parser.add_argument('--num_clients', type=int, default=8)
+    parser.add_argument('--num_requests', type=int, default=100, help="Requests per client")
+    parser.add_argument('--instances_per_request', type=int, default=1)
+    parser.add_argument('--max_batch_size', type=int, default=32)
+    parser.add_argument('--max_wait_ms', type=float, default=5.0)
+    parser.add_argument('--padding_buckets', help="'powers_of_two', or comma-separated lengths")
+    args = parser.parse_args()
+
+    server = None
+    micro_batcher = None
+    directory = None
+    if args.url or args.unix_socket:
+        if not args.data_file:
+            parser.error("--data_file is required with --url or --unix_socket")
+        with open(args.data_file) as data_file:
+            lines = [line.rstrip("\n") for line in data_file if line.strip()]
+        if args.unix_socket:
+            make_connection = lambda: UnixHTTPConnection(args.unix_socket)
+        else:
+            address = urllib.parse.urlparse(args.url)
+            make_connection = lambda: http.client.HTTPConnection(address.hostname, address.port)
+    else:
+        directory = tempfile.mkdtemp()
+        param_path = train_toy_model(directory)
+        with open(os.path.join(directory, 'validation')) as data_file:
+            lines = [line.rstrip("\n") for line in data_file]
+        padding_buckets = args.padding_buckets
+        if padding_buckets is not None and padding_buckets != 'powers_of_two':
+            padding_buckets = [int(length) for length in padding_buckets.split(',')]
+        model = load_model(param_path)
+        from deep_qa.serving import MicroBatcher, make_server
+        micro_batcher = MicroBatcher(model,
+                                     max_batch_size=args.max_batch_size,
+                                     max_wait_ms=args.max_wait_ms,
+                                     padding_buckets=padding_buckets)
+        server = make_server(micro_batcher, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address[:2]
+        make_connection = lambda: http.client.HTTPConnection(host, port)
+
+    latencies = []
+    errors = []
+    clients = [threading.Thread(target=run_client,
+                                args=(make_connection, lines, args.num_requests,
+                                      args.instances_per_request, latencies, errors))
+               for _ in range(args.num_clients)]
+    start_time = time.time()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.time() - start_time
+
+    connection = make_connection()
+    connection.request('GET', '/stats')
+    server_stats = json.loads(connection.getresponse().read().decode('utf-8'))
+    connection.close()
+
+    latencies_ms = numpy.asarray(latencies) * 1000
+    print("Requests: %d (%d errors) in %.2f seconds" % (len(latencies), len(errors), elapsed))
+    print("Throughput: %.1f requests/second, %.1f instances/second" %
+          (len(latencies) / elapsed, len(latencies) * args.instances_per_request / elapsed))
+    print("Client latency (ms): p50 %.2f, p90 %.2f, p99 %.2f" %
+          tuple(numpy.percentile(latencies_ms, [50, 90, 99])))
+    print("Server stats:", json.dumps(server_stats, indent=2))
+
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+        micro_batcher.stop()
+    if directory is not None:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
+                        level=logging.WARNING)
+    main()
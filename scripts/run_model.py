@@ -4,20 +4,22 @@ import sys
 
 # pylint: disable=wrong-import-position
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
-from deep_qa import run_model, evaluate_model
+from deep_qa import run_model, resume_model, evaluate_model
 from deep_qa.common.checks import ensure_pythonhashseed_set
 
 logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
 
 def main():
-    usage = 'USAGE: run_model.py [param_file] [train|test]'
+    usage = 'USAGE: run_model.py [param_file] [train|resume|test]'
     if len(sys.argv) == 2:
         run_model(sys.argv[1])
     elif len(sys.argv) == 3:
         mode = sys.argv[2]
         if mode == 'train':
             run_model(sys.argv[1])
+        elif mode == 'resume':
+            resume_model(sys.argv[1])
         elif mode == 'test':
             evaluate_model(sys.argv[1])
         else:
@@ -0,0 +1,62 @@
+"""
+Serves predictions from a trained model over HTTP (or a UNIX socket), loading the model once and
+batching concurrent requests together.  See :mod:`deep_qa.serving.server` for the endpoints.
+
+Example:
+
+    python scripts/serve_model.py /path/to/model_params.json --port 8000 --max_wait_ms 5
+    curl -X POST localhost:8000/predict -d '{"instances": ["what is the capital of France?"]}'
+    curl localhost:8000/stats
+"""
+import argparse
+import logging
+import os
+import sys
+
+# pylint: disable=wrong-import-position
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from deep_qa import load_model
+from deep_qa.common.checks import ensure_pythonhashseed_set
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('param_file', help="The parameter file the model was trained with")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--unix_socket', help="Listen on this UNIX socket instead of a TCP port")
+    parser.add_argument('--max_batch_size', type=int, default=32)
+    parser.add_argument('--max_wait_ms', type=float, default=5.0)
+    parser.add_argument('--padding_buckets', help="'powers_of_two', or comma-separated lengths")
+    args = parser.parse_args()
+
+    padding_buckets = args.padding_buckets
+    if padding_buckets is not None and padding_buckets != 'powers_of_two':
+        padding_buckets = [int(length) for length in padding_buckets.split(',')]
+
+    # We load the model before importing the serving code, which imports Keras, so the random
+    # seeds in the parameter file still take effect.
+    model = load_model(args.param_file)
+    from deep_qa.serving import MicroBatcher, make_server
+    micro_batcher = MicroBatcher(model,
+                                 max_batch_size=args.max_batch_size,
+                                 max_wait_ms=args.max_wait_ms,
+                                 padding_buckets=padding_buckets)
+    server = make_server(micro_batcher, host=args.host, port=args.port, unix_socket=args.unix_socket)
+    logger.info("Serving on %s", args.unix_socket or "%s:%d" % server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        micro_batcher.stop()
+
+
+if __name__ == "__main__":
+    ensure_pythonhashseed_set()
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
+                        level=logging.INFO)
+    main()
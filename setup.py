@@ -82,6 +82,7 @@ setup(name='deep_qa',
           'keras==2.0.5',
           'h5py',
           'scikit-learn',
+          'scipy',
           'grpcio',
           'grpcio-tools',
           'pyhocon',
@@ -0,0 +1,196 @@
+# pylint: disable=no-self-use,invalid-name
+from collections import Counter
+import csv
+import gzip
+import json
+import math
+from unittest import mock
+
+import pytest
+
+from deep_qa.common.checks import ConfigurationError
+from deep_qa.common.params import Params
+from deep_qa.contrib.background_search import retrieval_word_overlap, retrieve_background
+from deep_qa.contrib.background_search.lexical_retrieval import InvertedIndex, LexicalRetrieval
+from deep_qa.contrib.background_search.vector_based_retrieval import MappedSentences
+from ...common.test_case import DeepQaTestCase
+
+
+def brute_force_scores(documents, query, scoring, k1=1.2, b=0.75):
+    """
+    Returns ``{document id: score}`` for every document that shares a term with ``query``, scored
+    one document and one query term at a time, straight from the formulas in
+    :func:`InvertedIndex.search`.
+    """
+    num_documents = len(documents)
+    average_length = sum(len(document) for document in documents) / num_documents
+    document_frequencies = Counter(term for document in documents for term in set(document))
+    scores = {}
+    for doc_id, document in enumerate(documents):
+        term_frequencies = Counter(document)
+        if not any(term_frequencies[term] for term in query):
+            continue
+        score = 0.0
+        for term in query:
+            tf = term_frequencies[term]
+            if tf == 0:
+                continue
+            df = document_frequencies[term]
+            if scoring == 'bm25':
+                idf = math.log(1 + (num_documents - df + 0.5) / (df + 0.5))
+                score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(document) / average_length))
+            elif scoring == 'tf_idf':
+                score += tf / len(document) * math.log(num_documents / df)
+            else:
+                score += tf
+        scores[doc_id] = score
+    return scores
+
+
+class TestInvertedIndex(DeepQaTestCase):
+    # The second corpus has no empty document, so "the" occurs in every document.
+    documents_with_empty_document = [['the', 'cat', 'sat', 'on', 'the', 'mat'],
+                                     [],
+                                     ['the', 'dog', 'ate', 'the', 'cat'],
+                                     ['the', 'dog'],
+                                     ['the', 'bird', 'sang', 'the', 'the'],
+                                     ['a', 'dog', 'and', 'a', 'cat', 'and', 'the', 'bird']]
+    documents_sharing_a_term = [document for document in documents_with_empty_document if document]
+    queries = [['cat', 'the'], ['dog', 'dog', 'sang'], ['the'], ['unknown'], [], ['bird', 'unknown', 'mat']]
+
+    def assert_results_match_brute_force(self, documents, results, scoring, num_results):
+        for query, query_results in zip(self.queries, results):
+            expected_scores = brute_force_scores(documents, query, scoring)
+            assert len(query_results) == min(num_results, len(expected_scores))
+            doc_ids = [doc_id for doc_id, _ in query_results]
+            assert len(set(doc_ids)) == len(doc_ids)
+            for doc_id, score in query_results:
+                assert score == pytest.approx(expected_scores[doc_id])
+            # Ties can come back in either order, but the scores have to be the best ones, in
+            # order.
+            expected_top_scores = sorted(expected_scores.values(), reverse=True)[:num_results]
+            assert [score for _, score in query_results] == pytest.approx(expected_top_scores)
+
+    def test_search_matches_brute_force_scoring(self):
+        for documents in [self.documents_with_empty_document, self.documents_sharing_a_term]:
+            index = InvertedIndex.build(documents)
+            for scoring in InvertedIndex.scoring_functions:
+                for num_results in [2, 10]:
+                    results = index.search(self.queries, num_results, scoring)
+                    self.assert_results_match_brute_force(documents, results, scoring, num_results)
+
+    def test_get_postings_decodes_the_compressed_postings(self):
+        documents = self.documents_with_empty_document
+        index = InvertedIndex.build(documents)
+        assert index.doc_id_gaps.dtype == 'uint8'
+        assert index.term_frequencies.dtype == 'uint8'
+        for term in index.terms:
+            doc_ids, term_frequencies = index.get_postings(term)
+            expected_doc_ids = [doc_id for doc_id, document in enumerate(documents) if term in document]
+            assert doc_ids.tolist() == expected_doc_ids
+            assert term_frequencies.tolist() == [documents[doc_id].count(term) for doc_id in expected_doc_ids]
+        doc_ids, term_frequencies = index.get_postings('unknown')
+        assert len(doc_ids) == 0 and len(term_frequencies) == 0
+
+    def test_unknown_scoring_crashes(self):
+        index = InvertedIndex.build(self.documents_sharing_a_term)
+        with pytest.raises(ConfigurationError):
+            index.search(self.queries, 2, 'bm26')
+
+    def test_loaded_index_gives_the_same_results(self):
+        index = InvertedIndex.build(self.documents_with_empty_document)
+        index.save(self.TEST_DIR + 'index')
+        loaded_index = InvertedIndex.load(self.TEST_DIR + 'index')
+        assert loaded_index.terms == index.terms
+        for scoring in InvertedIndex.scoring_functions:
+            assert loaded_index.search(self.queries, 3, scoring) == index.search(self.queries, 3, scoring)
+
+
+class TestLexicalRetrieval(DeepQaTestCase):
+    BACKGROUND_FILE = DeepQaTestCase.TEST_DIR + 'background.gz'
+    SERIALIZATION_PREFIX = DeepQaTestCase.TEST_DIR + 'retrieval/model'
+
+    def setUp(self):
+        super(TestLexicalRetrieval, self).setUp()
+        with gzip.open(self.BACKGROUND_FILE, 'wt') as background_file:
+            background_file.write('Cats chase dogs\n')
+            background_file.write('\n')
+            background_file.write('Dogs bark at cats and cats run\n')
+            background_file.write('Fish swim under trees\n')
+            background_file.write('Zebras gallop past trees\n')
+        self.queries = ['Do cats bark?', 'trees', 'nothing matches this']
+
+    def get_retrieval(self, word_processor=None, scoring='bm25'):
+        params = {'serialization_prefix': self.SERIALIZATION_PREFIX, 'scoring': scoring}
+        if word_processor is not None:
+            params['word_processor'] = word_processor
+        return LexicalRetrieval(Params(params))
+
+    def test_loaded_model_gets_the_same_neighbors_as_the_saved_one(self):
+        retrieval = self.get_retrieval()
+        retrieval.read_background(self.BACKGROUND_FILE)
+        retrieval.fit()
+        retrieval.save_model()
+        for scoring in InvertedIndex.scoring_functions:
+            retrieval.scoring = scoring
+            # The scoring is only used at query time, so it can change when we load.
+            loaded_retrieval = self.get_retrieval(scoring=scoring)
+            loaded_retrieval.load_model()
+            assert isinstance(loaded_retrieval.background_sentences, MappedSentences)
+            assert list(loaded_retrieval.background_sentences) == retrieval.background_sentences
+            neighbors = loaded_retrieval.get_nearest_neighbors(self.queries, 2)
+            assert neighbors == retrieval.get_nearest_neighbors(self.queries, 2)
+            assert neighbors[2] == []
+            assert loaded_retrieval.get_nearest_neighbors(self.queries[1], 2) == neighbors[1]
+        # Lower is better, as with VectorBasedRetrieval.
+        retrieval.scoring = 'bm25'
+        assert retrieval.get_nearest_neighbors('cats', 2)[0][0] == 'Dogs bark at cats and cats run'
+
+    def test_loading_with_different_word_processor_params_crashes(self):
+        retrieval = self.get_retrieval({'word_splitter': 'simple'})
+        retrieval.read_background(self.BACKGROUND_FILE)
+        retrieval.fit()
+        retrieval.save_model()
+        retrieval = self.get_retrieval({'word_splitter': 'simple', 'word_filter': 'stopwords'})
+        with pytest.raises(ConfigurationError):
+            retrieval.load_model()
+
+    def test_retrieve_background_can_use_lexical_retrieval(self):
+        question_file = self.TEST_DIR + 'questions.tsv'
+        output_file = self.TEST_DIR + 'output.tsv'
+        with open(question_file, 'w') as questions:
+            questions.write('1\tWhere do fish swim?\t1\n')
+            questions.write('2\tWhat do zebras do?\t0\n')
+        param_file = self.TEST_DIR + 'params.json'
+        with open(param_file, 'w') as params:
+            json.dump({
+                    'retrieval': {'type': 'lexical', 'serialization_prefix': self.SERIALIZATION_PREFIX},
+                    'corpus': self.BACKGROUND_FILE,
+                    'questions': {'file': question_file},
+                    'num_neighbors': 1,
+                    'output': output_file,
+                    }, params)
+        with mock.patch('sys.argv', ['retrieve_background.py', param_file]):
+            retrieve_background.main()
+        with open(output_file) as output:
+            assert output.read() == "1\tFish swim under trees\n2\tZebras gallop past trees\n"
+
+
+class TestRetrievalWordOverlap(DeepQaTestCase):
+    # We don't need NLTK's data files for these rows and questions.
+    @mock.patch.object(retrieval_word_overlap, 'word_tokenize', str.split)
+    @mock.patch.object(retrieval_word_overlap, 'get_stopwords', lambda: {'the', 'do'})
+    def test_questions_are_tokenized_as_words_and_scored_with_tf_idf(self):
+        table_rows = [['cats', 'chase', 'cats'], ['dogs', 'chase', 'cats'], ['fish', 'swim']]
+        inverse_index = retrieval_word_overlap.get_inverse_index(table_rows)
+        output_file = self.TEST_DIR + 'output.csv'
+        retrieval_word_overlap.get_top_queries(["do the cats chase"], ["dogs"], table_rows, inverse_index,
+                                               3, output_file, tf_idf_flag=1)
+        with open(output_file) as output:
+            rows = list(csv.reader(output))
+        # "cat" is in two of the three rows, as is "chase": tf / length * log(N / df), per term.
+        idf = math.log(3 / 2)
+        assert [(row[1], float(row[3]), row[4]) for row in rows] == [
+                ('cat chase cat', pytest.approx(2 / 3 * idf + 1 / 3 * idf), '0'),
+                ('dog chase cat', pytest.approx(1 / 3 * idf + 1 / 3 * idf), '1'),
+                ]
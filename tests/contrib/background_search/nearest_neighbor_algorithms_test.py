@@ -0,0 +1,131 @@
+# pylint: disable=no-self-use,invalid-name
+import os
+
+import numpy
+from numpy.testing import assert_allclose
+
+from deep_qa.common.params import Params
+from deep_qa.contrib.background_search.nearest_neighbor_algorithms import nearest_neighbor_algorithms
+from ...common.test_case import DeepQaTestCase
+
+
+def exact_neighbors(vectors, queries, metric, num_neighbors):
+    """
+    Returns the indices of the ``num_neighbors`` closest vectors to each query, and their
+    distances, computed in float64 by sorting the distance to every vector.
+    """
+    vectors = numpy.asarray(vectors, dtype='float64')
+    queries = numpy.asarray(queries, dtype='float64')
+    if metric == 'cosine':
+        vectors = vectors / numpy.linalg.norm(vectors, axis=1, keepdims=True)
+        queries = queries / numpy.linalg.norm(queries, axis=1, keepdims=True)
+        distances = 1 - queries.dot(vectors.T)
+    else:
+        distances = -queries.dot(vectors.T)
+    indices = numpy.argsort(distances, axis=1, kind='mergesort')[:, :num_neighbors]
+    return indices, distances[numpy.arange(len(distances))[:, numpy.newaxis], indices]
+
+
+class TestNearestNeighborAlgorithms(DeepQaTestCase):
+    def setUp(self):
+        super(TestNearestNeighborAlgorithms, self).setUp()
+        random = numpy.random.RandomState(1234)
+        self.vectors = random.normal(size=(50, 8)).astype('float32')
+        self.queries = random.normal(size=(7, 8)).astype('float32')
+
+    def get_algorithm(self, params):
+        params = Params(dict(params))
+        return nearest_neighbor_algorithms[params.pop('type')](params)
+
+    def assert_results_match(self, results, expected_indices, expected_distances):
+        assert len(results) == len(expected_indices)
+        for query_results, query_indices, query_distances in zip(results, expected_indices, expected_distances):
+            assert [index for index, _ in query_results] == query_indices.tolist()
+            assert_allclose([distance for _, distance in query_results], query_distances, rtol=1e-5, atol=1e-5)
+
+    def test_brute_force_matches_exact_search_across_blocks(self):
+        for metric in ['cosine', 'dot']:
+            # The blocks are smaller than the data, so we have to merge neighbors across them.
+            brute_force = self.get_algorithm({'type': 'brute_force',
+                                              'metric': metric,
+                                              'query_block_size': 3,
+                                              'corpus_block_size': 16})
+            brute_force.fit(self.vectors)
+            results = brute_force.get_neighbors(self.queries, 5)
+            self.assert_results_match(results, *exact_neighbors(self.vectors, self.queries, metric, 5))
+
+    def test_asking_for_more_neighbors_than_vectors_returns_them_all(self):
+        for params in [{'type': 'brute_force', 'corpus_block_size': 16},
+                       {'type': 'ivf', 'num_lists': 4, 'nprobe': 4, 'random_state': 1}]:
+            algorithm = self.get_algorithm(params)
+            algorithm.fit(self.vectors)
+            results = algorithm.get_neighbors(self.queries, 100)
+            self.assert_results_match(results, *exact_neighbors(self.vectors, self.queries, 'cosine', 100))
+
+    def test_ivf_probing_every_list_matches_brute_force(self):
+        for metric in ['cosine', 'dot']:
+            brute_force = self.get_algorithm({'type': 'brute_force', 'metric': metric})
+            brute_force.fit(self.vectors)
+            ivf = self.get_algorithm({'type': 'ivf', 'metric': metric, 'num_lists': 5, 'nprobe': 5})
+            ivf.fit(self.vectors)
+            expected_results = brute_force.get_neighbors(self.queries, 6)
+            results = ivf.get_neighbors(self.queries, 6)
+            for query_results, expected_query_results in zip(results, expected_results):
+                assert [index for index, _ in query_results] == [index for index, _ in expected_query_results]
+                assert_allclose([distance for _, distance in query_results],
+                                [distance for _, distance in expected_query_results], rtol=1e-5, atol=1e-5)
+
+    def test_a_single_query_gets_a_flat_list(self):
+        for params in [{'type': 'brute_force'}, {'type': 'ivf', 'num_lists': 4, 'nprobe': 4}]:
+            algorithm = self.get_algorithm(params)
+            algorithm.fit(self.vectors)
+            results = algorithm.get_neighbors(self.queries[0], 3)
+            assert len(results) == 3
+            assert all(isinstance(index, int) and isinstance(distance, float) for index, distance in results)
+            assert [index for index, _ in results] == \
+                    [index for index, _ in algorithm.get_neighbors(self.queries[:1], 3)[0]]
+
+    def test_product_quantizer_stores_one_byte_per_subvector(self):
+        pq = self.get_algorithm({'type': 'pq', 'num_subvectors': 4})
+        pq.fit(self.vectors)
+        assert pq.codes.dtype == numpy.uint8
+        assert pq.codes.shape == (50, 4)
+
+    def test_product_quantizer_with_uneven_subvectors_survives_save_and_load(self):
+        params = {'type': 'pq', 'num_subvectors': 3, 'rerank': 10}
+        pq = self.get_algorithm(params)
+        pq.fit(self.vectors)
+        # Eight dimensions don't split evenly into three pieces, so the codebooks are padded when
+        # we save them.
+        assert [end - start for start, end in pq.subvector_bounds] == [2, 3, 3]
+        pq.save(self.TEST_DIR + 'pq')
+        loaded_pq = self.get_algorithm(params)
+        loaded_pq.load(self.TEST_DIR + 'pq')
+        assert loaded_pq.subvector_bounds == pq.subvector_bounds
+        for loaded_codebook, codebook in zip(loaded_pq.codebooks, pq.codebooks):
+            assert loaded_codebook.shape == codebook.shape
+            assert_allclose(loaded_codebook, codebook)
+        assert_allclose(loaded_pq.codes, pq.codes)
+        assert loaded_pq.get_neighbors(self.queries, 5) == pq.get_neighbors(self.queries, 5)
+
+    def test_product_quantizer_reranking_every_vector_matches_brute_force(self):
+        for metric in ['cosine', 'dot']:
+            brute_force = self.get_algorithm({'type': 'brute_force', 'metric': metric})
+            brute_force.fit(self.vectors)
+            pq = self.get_algorithm({'type': 'pq', 'metric': metric, 'num_subvectors': 2, 'rerank': 50})
+            pq.fit(self.vectors)
+            expected_results = brute_force.get_neighbors(self.queries, 5)
+            results = pq.get_neighbors(self.queries, 5)
+            for query_results, expected_query_results in zip(results, expected_results):
+                assert [index for index, _ in query_results] == [index for index, _ in expected_query_results]
+                assert_allclose([distance for _, distance in query_results],
+                                [distance for _, distance in expected_query_results], rtol=1e-5, atol=1e-5)
+
+    def test_product_quantizer_only_saves_vectors_for_reranking(self):
+        for rerank in [0, 10]:
+            prefix = self.TEST_DIR + 'pq_rerank_%d' % rerank
+            pq = self.get_algorithm({'type': 'pq', 'num_subvectors': 2, 'rerank': rerank})
+            pq.fit(self.vectors)
+            pq.save(prefix)
+            assert os.path.exists(prefix + "_codes.npy")
+            assert os.path.exists(prefix + "_vectors.npy") == bool(rerank)
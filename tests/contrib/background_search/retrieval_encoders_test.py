@@ -0,0 +1,76 @@
+# pylint: disable=no-self-use,invalid-name
+import gzip
+import math
+
+import numpy
+from numpy.testing import assert_allclose
+
+from deep_qa.common.params import Params
+from deep_qa.contrib.background_search.retrieval_encoders import BagOfWordsRetrievalEncoder
+from ...common.test_case import DeepQaTestCase
+
+
+class TestBagOfWordsRetrievalEncoder(DeepQaTestCase):
+    def setUp(self):
+        super(TestBagOfWordsRetrievalEncoder, self).setUp()
+        self.word_vectors = {
+                'cats': numpy.asarray([0.9, 0.1, 0.2, 0.0]),
+                'dogs': numpy.asarray([0.8, 0.3, 0.1, 0.1]),
+                'fish': numpy.asarray([0.1, 0.9, 0.0, 0.3]),
+                'trees': numpy.asarray([0.1, 0.1, 0.3, 0.9]),
+                }
+        with gzip.open(self.PRETRAINED_VECTORS_GZIP, 'wt') as vector_file:
+            for word, vector in self.word_vectors.items():
+                vector_file.write("%s %s\n" % (word, " ".join(str(value) for value in vector)))
+
+    def get_encoder(self, use_idf=False):
+        # A batch size smaller than the number of sentences, so we encode several batches.
+        return BagOfWordsRetrievalEncoder(Params({'embeddings_file': self.PRETRAINED_VECTORS_GZIP,
+                                                  'use_idf': use_idf,
+                                                  'batch_size': 2}))
+
+    def test_passage_vectors_are_the_mean_of_their_word_vectors(self):
+        encoder = self.get_encoder()
+        passages = ["cats chase dogs", "fish", "Dogs dogs trees", "cats fish"]
+        vectors = encoder.encode_passages(passages)
+        # "chase" isn't in the embeddings, so it gets a random vector.
+        chase = encoder.unknown_vectors[encoder.unknown_words.index('chase')]
+        expected_vectors = [numpy.mean([self.word_vectors['cats'], chase, self.word_vectors['dogs']], axis=0),
+                            self.word_vectors['fish'],
+                            numpy.mean([self.word_vectors['dogs'], self.word_vectors['dogs'],
+                                        self.word_vectors['trees']], axis=0),
+                            numpy.mean([self.word_vectors['cats'], self.word_vectors['fish']], axis=0)]
+        assert_allclose(vectors, expected_vectors, rtol=1e-5)
+        assert_allclose(encoder.encode_passage("cats fish"), expected_vectors[3], rtol=1e-5)
+
+    def test_unknown_query_words_count_towards_the_length_but_add_nothing(self):
+        encoder = self.get_encoder()
+        encoder.encode_passages(["cats chase dogs"])
+        vectors = encoder.encode_queries(["cats unheardof", "chase", "unheardof"])
+        assert_allclose(vectors[0], self.word_vectors['cats'] / 2, rtol=1e-5)
+        # Passage words that weren't in the embeddings are known to queries.
+        assert_allclose(vectors[1], encoder.unknown_vectors[encoder.unknown_words.index('chase')], rtol=1e-5)
+        assert_allclose(vectors[2], numpy.zeros(4))
+
+    def test_empty_sentences_get_zero_vectors(self):
+        encoder = self.get_encoder()
+        vectors = encoder.encode_passages(["", "cats", ""])
+        assert_allclose(vectors[0], numpy.zeros(4))
+        assert_allclose(vectors[1], self.word_vectors['cats'], rtol=1e-5)
+        assert_allclose(vectors[2], numpy.zeros(4))
+        assert_allclose(encoder.encode_queries([""]), numpy.zeros((1, 4)))
+
+    def test_idf_weights_are_the_log_of_the_inverse_document_frequency(self):
+        encoder = self.get_encoder(use_idf=True)
+        passages = ["cats dogs", "cats fish cats", "fish"]
+        vectors = encoder.encode_passages(passages)
+        idf = {'cats': math.log(3 / 2), 'dogs': math.log(3), 'fish': math.log(3 / 2)}
+        for word, word_idf in idf.items():
+            assert_allclose(encoder.idf[encoder.word_ids[word]], word_idf, rtol=1e-5)
+        weighted_vectors = {word: idf[word] * self.word_vectors[word] for word in idf}
+        expected_vectors = [(weighted_vectors['cats'] + weighted_vectors['dogs']) / 2,
+                            (2 * weighted_vectors['cats'] + weighted_vectors['fish']) / 3,
+                            weighted_vectors['fish']]
+        assert_allclose(vectors, expected_vectors, rtol=1e-5)
+        # Words that weren't in the passages are weighted as if they were in exactly one of them.
+        assert_allclose(encoder.encode_queries(["trees"])[0], math.log(3) * self.word_vectors['trees'], rtol=1e-5)
@@ -0,0 +1,99 @@
+# pylint: disable=no-self-use,invalid-name
+from copy import deepcopy
+import gzip
+
+import numpy
+from numpy.testing import assert_allclose
+import pytest
+
+from deep_qa.common.checks import ConfigurationError
+from deep_qa.common.params import Params
+from deep_qa.contrib.background_search.vector_based_retrieval import MappedSentences, VectorBasedRetrieval
+from ...common.test_case import DeepQaTestCase
+
+
+class TestVectorBasedRetrieval(DeepQaTestCase):
+    BACKGROUND_FILE = DeepQaTestCase.TEST_DIR + 'background.gz'
+    SERIALIZATION_PREFIX = DeepQaTestCase.TEST_DIR + 'retrieval/model'
+
+    def setUp(self):
+        super(TestVectorBasedRetrieval, self).setUp()
+        with gzip.open(self.PRETRAINED_VECTORS_GZIP, 'wt') as vector_file:
+            vector_file.write('cats 0.9 0.1 0.2 0.0\n')
+            vector_file.write('dogs 0.8 0.3 0.1 0.1\n')
+            vector_file.write('fish 0.1 0.9 0.0 0.3\n')
+            vector_file.write('swim 0.0 0.8 0.2 0.4\n')
+            vector_file.write('bark 0.6 0.2 0.7 0.1\n')
+            vector_file.write('trees 0.1 0.1 0.3 0.9\n')
+        # Some of these words aren't in the embeddings, so the encoder makes up vectors for them,
+        # which the saved model has to remember.
+        with gzip.open(self.BACKGROUND_FILE, 'wt') as background_file:
+            background_file.write('cats chase dogs\n')
+            background_file.write('dogs bark at cats\n')
+            background_file.write('fish swim\n')
+            background_file.write('\n')
+            background_file.write('zebras gallop past trees\n')
+            background_file.write('cats climb trees\n')
+            background_file.write('fish swim under trees\n')
+            background_file.write('dogs swim\n')
+            background_file.write('zebras bark\n')
+            background_file.write('trees grow\n')
+        self.queries = ['do cats bark', 'zebras gallop', 'fish and trees', 'dogs never sleep']
+
+    def get_retrieval(self, nearest_neighbors, use_idf=True, serialization_prefix=SERIALIZATION_PREFIX):
+        params = {
+                'serialization_prefix': serialization_prefix,
+                'encoder': {
+                        'type': 'bow',
+                        'embeddings_file': self.PRETRAINED_VECTORS_GZIP,
+                        'use_idf': use_idf,
+                        },
+                'nearest_neighbors': nearest_neighbors,
+                }
+        return VectorBasedRetrieval(Params(deepcopy(params)))
+
+    def fit_and_save(self, nearest_neighbors, serialization_prefix=SERIALIZATION_PREFIX):
+        retrieval = self.get_retrieval(nearest_neighbors, serialization_prefix=serialization_prefix)
+        retrieval.read_background(self.BACKGROUND_FILE)
+        retrieval.fit()
+        retrieval.save_model()
+        return retrieval
+
+    def test_loaded_model_gets_the_same_neighbors_as_the_saved_one(self):
+        all_nearest_neighbors = [{'type': 'brute_force'},
+                                 {'type': 'ivf', 'num_lists': 3, 'nprobe': 2, 'random_state': 1},
+                                 {'type': 'pq', 'num_subvectors': 2, 'rerank': 4, 'random_state': 1},
+                                 {'type': 'pq', 'num_subvectors': 2, 'random_state': 1}]
+        for i, nearest_neighbors in enumerate(all_nearest_neighbors):
+            serialization_prefix = self.SERIALIZATION_PREFIX + str(i)
+            retrieval = self.fit_and_save(nearest_neighbors, serialization_prefix)
+            loaded_retrieval = self.get_retrieval(nearest_neighbors, serialization_prefix=serialization_prefix)
+            loaded_retrieval.load_model()
+            assert isinstance(loaded_retrieval.background_sentences, MappedSentences)
+            assert list(loaded_retrieval.background_sentences) == retrieval.background_sentences
+            assert isinstance(loaded_retrieval.passage_vectors, numpy.memmap)
+            assert_allclose(loaded_retrieval.passage_vectors, retrieval.passage_vectors)
+            expected_neighbors = retrieval.get_nearest_neighbors(self.queries, 3)
+            assert loaded_retrieval.get_nearest_neighbors(self.queries, 3) == expected_neighbors
+            assert loaded_retrieval.get_nearest_neighbors(self.queries[1], 3) == \
+                    retrieval.get_nearest_neighbors(self.queries[1], 3)
+
+    def test_loading_with_new_nearest_neighbor_params_fits_a_new_index(self):
+        retrieval = self.fit_and_save({'type': 'brute_force'})
+        # Probing every list is an exact search, so we should find the same neighbors.
+        loaded_retrieval = self.get_retrieval({'type': 'ivf', 'num_lists': 3, 'nprobe': 3})
+        loaded_retrieval.load_model()
+        assert loaded_retrieval.nearest_neighbors.centroids is not None
+        expected_neighbors = retrieval.get_nearest_neighbors(self.queries, 3)
+        neighbors = loaded_retrieval.get_nearest_neighbors(self.queries, 3)
+        for query_neighbors, expected_query_neighbors in zip(neighbors, expected_neighbors):
+            assert [sentence for sentence, _ in query_neighbors] == \
+                    [sentence for sentence, _ in expected_query_neighbors]
+            assert_allclose([score for _, score in query_neighbors],
+                            [score for _, score in expected_query_neighbors], rtol=1e-5, atol=1e-6)
+
+    def test_loading_with_different_encoder_params_crashes(self):
+        self.fit_and_save({'type': 'brute_force'})
+        retrieval = self.get_retrieval({'type': 'brute_force'}, use_idf=False)
+        with pytest.raises(ConfigurationError):
+            retrieval.load_model()
@@ -0,0 +1,31 @@
+# pylint: disable=no-self-use,invalid-name
+import numpy
+
+from deep_qa.data.batching import bucket_lengths, cut_batches
+from ..common.test_case import DeepQaTestCase
+
+
+class TestBatching(DeepQaTestCase):
+    def test_bucket_lengths_rounds_up_to_powers_of_two(self):
+        bucketed = bucket_lengths([0, 1, 2, 3, 5, 8, 9], 'powers_of_two')
+        assert bucketed.tolist() == [0, 1, 2, 4, 8, 8, 16]
+
+    def test_bucket_lengths_rounds_up_to_given_boundaries(self):
+        bucketed = bucket_lengths([1, 4, 5, 10, 11], [10, 4])
+        assert bucketed.tolist() == [4, 4, 10, 10, 11]
+        assert bucket_lengths([3, 7], None).tolist() == [3, 7]
+
+    def test_cut_batches_matches_greedy_grouping(self):
+        lengths = {
+                'a': numpy.asarray([1, 1, 2, 3, 3, 4, 4, 5, 8, 9]),
+                'b': numpy.asarray([1, 1, 1, 3, 3, 1, 3, 3, 3, 3]),
+                }
+        def cost_function(lengths):
+            return lengths['a'] * lengths['b']
+        assert cut_batches(lengths, cost_function, 30, 1000) == [3, 2, 2, 1, 1, 1]
+        assert cut_batches(lengths, cost_function, 30, 2) == [2, 2, 2, 2, 1, 1]
+
+    def test_cut_batches_always_makes_progress(self):
+        lengths = {'a': numpy.asarray([10, 20, 30])}
+        assert cut_batches(lengths, lambda lengths: lengths['a'], 5, 1000) == [1, 1, 1]
+        assert cut_batches({}, lambda lengths: 1, 5, 1000) == []
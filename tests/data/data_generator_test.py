@@ -1,8 +1,11 @@
 # pylint: disable=no-self-use,invalid-name
+import random
+
 import numpy
 
 from deep_qa.common.params import Params
 from deep_qa.data import DataGenerator, IndexedDataset
+from deep_qa.data.instances import IndexedInstance
 from ..common.test_case import DeepQaTestCase
 
 
@@ -125,13 +128,129 @@ class TestDataGenerator(DeepQaTestCase):
         assert self.as_list(one_epoch_arrays[5][0]) == [7]
         assert self.as_list(one_epoch_arrays[6][0]) == [8, 9]
 
+    def test_prefetching_gives_same_batches_as_synchronous_generation(self):
+        for use_processes in [False, True]:
+            params = Params({
+                    'padding_noise': 0.0,
+                    'sort_every_epoch': False,
+                    'dynamic_padding': True,
+                    'prefetch_batches': 3,
+                    'prefetch_workers': 2,
+                    'prefetch_with_processes': use_processes,
+                    })
+            generator = DataGenerator(self.text_trainer, params)
+            batches = generator.create_generator(IndexedDataset(self.instances))
+            assert generator.last_num_batches == 4
+            # We take more than one epoch here, so the prefetching workers have to cross an epoch
+            # boundary.
+            arrays = [next(batches) for _ in range(8)]
+            first_epoch = sorted([self.as_list(x[0]) for x in arrays[:4]])
+            second_epoch = sorted([self.as_list(x[0]) for x in arrays[4:]])
+            assert first_epoch == [[1, 0, 4], [3], [6, 7, 2], [8, 9, 5]]
+            assert first_epoch == second_epoch
+            batches.close()
+
+    def test_generator_does_not_modify_instances(self):
+        params = Params({
+                'padding_noise': 0.5,
+                'sort_every_epoch': True,
+                'dynamic_padding': True,
+                'adaptive_batch_sizes': True,
+                'adaptive_memory_usage_constant': 130,
+                })
+        generator = DataGenerator(self.text_trainer, params)
+        dataset = IndexedDataset(self.instances)
+        batches = generator.create_generator(dataset)
+        arrays = [next(batches) for _ in range(12)]
+        assert sorted(x for batch in arrays[:4] for x in self.as_list(batch[0])) == list(range(10))
+        assert dataset.instances == self.instances
+        assert not any(instance.padded for instance in self.instances)
+
+    def test_resumed_generator_continues_like_the_original(self):
+        params = Params({
+                'padding_noise': 0.5,
+                'sort_every_epoch': True,
+                'dynamic_padding': True,
+                })
+        generator = DataGenerator(self.text_trainer, params)
+        dataset = IndexedDataset(self.instances)
+        batches = generator.create_generator(dataset)
+        record = generator.last_batch_record
+        for _ in range(4):  # the first epoch
+            next(batches)
+        # We pretend we stopped after the first batch of the second epoch, and resume from there.
+        second_epoch = [self.as_list(next(batches)[0]) for _ in range(4)]
+        third_epoch = [self.as_list(next(batches)[0]) for _ in range(4)]
+        groups, random_state = record.get_pass(1)
+        assert sorted(x for group in groups for x in group) == list(range(10))
+
+        random.seed(1234)
+        numpy.random.seed(1234)
+        rest_of_second_epoch = generator.create_generator_from_groups(dataset, groups[1:])
+        assert generator.last_num_batches == 3
+        assert [self.as_list(next(rest_of_second_epoch)[0]) for _ in range(3)] == second_epoch[1:]
+        resumed_batches = generator.create_generator(dataset, resume_from=(groups, random_state))
+        assert [self.as_list(next(resumed_batches)[0]) for _ in range(4)] == third_epoch
+
+    def test_token_budget_grouping(self):
+        params = Params({
+                'padding_noise': 0.0,
+                'dynamic_padding': True,
+                'token_budget': 20,
+                })
+        generator = DataGenerator(self.text_trainer, params)
+        dataset = IndexedDataset(self.instances)
+        assert generator.create_scoring_batches(dataset) == [[8, 9, 5], [6, 7], [2, 1], [0], [4], [3]]
+        batches = generator.create_generator(dataset)
+        assert generator.last_num_batches == 6
+        one_epoch = sorted(self.as_list(next(batches)[0]) for _ in range(6))
+        assert one_epoch == [[0], [2, 1], [3], [4], [6, 7], [8, 9, 5]]
+
+    def test_padding_buckets_are_used_for_token_budgets(self):
+        params = Params({
+                'padding_noise': 0.0,
+                'dynamic_padding': True,
+                'token_budget': 20,
+                'padding_buckets': 'powers_of_two',
+                })
+        generator = DataGenerator(self.text_trainer, params)
+        batches = generator.create_scoring_batches(IndexedDataset(self.instances))
+        assert batches == [[8, 9], [5, 6], [7], [2, 1], [0], [4], [3]]
+
+    def test_scoring_generator_makes_the_same_batches_every_pass(self):
+        params = Params({
+                'padding_noise': 0.5,
+                'dynamic_padding': True,
+                })
+        generator = DataGenerator(self.text_trainer, params)
+        batches = generator.create_scoring_generator(IndexedDataset(self.instances))
+        assert generator.last_num_batches == 4
+        arrays = [self.as_list(next(batches)[0]) for _ in range(8)]
+        assert arrays[:4] == [[8, 9, 5], [6, 7, 2], [1, 0, 4], [3]]
+        assert arrays[4:] == arrays[:4]
+
+    def test_first_pass_has_last_num_batches_batches(self):
+        for _ in range(5):
+            params = Params({
+                    'padding_noise': 0.5,
+                    'sort_every_epoch': True,
+                    'dynamic_padding': True,
+                    'adaptive_batch_sizes': True,
+                    'adaptive_memory_usage_constant': 130,
+                    })
+            generator = DataGenerator(self.text_trainer, params)
+            batches = generator.create_generator(IndexedDataset(self.instances))
+            arrays = [next(batches) for _ in range(generator.last_num_batches)]
+            assert sorted(x for batch in arrays for x in self.as_list(batch[0])) == list(range(10))
+
     def as_list(self, array):
         return list(numpy.squeeze(array, axis=-1))
 
 
-class FakeInstance:
+class FakeInstance(IndexedInstance):
     def __init__(self, index, a_length, b_length, c_length):
-        self.index = index
+        super(FakeInstance, self).__init__(None, index)
+        self.padded = False
         self.a_length = a_length
         self.b_length = b_length
         self.c_length = c_length
@@ -140,7 +259,7 @@ class FakeInstance:
         return {'a': self.a_length, 'b': self.b_length, 'c': self.c_length}
 
     def pad(self, lengths):
-        pass
+        self.padded = True
 
     def as_training_data(self):
         return numpy.asarray([self.index]), numpy.asarray([self.index])
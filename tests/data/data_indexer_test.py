@@ -1,6 +1,8 @@
 # pylint: disable=no-self-use,invalid-name
 import codecs
 
+import numpy
+
 from deep_qa.data.data_indexer import DataIndexer
 from deep_qa.data.datasets import TextDataset
 from deep_qa.data.instances.text_classification.text_classification_instance import TextClassificationInstance
@@ -99,3 +101,34 @@ class TestDataIndexer(DeepQaTestCase):
         assert data_indexer.get_word_from_index(4) == "a"
         assert data_indexer.get_word_from_index(5) == "word"
         assert data_indexer.get_word_from_index(6) == "another"
+
+    def test_get_word_indices_matches_get_word_index(self):
+        data_indexer = DataIndexer()
+        data_indexer.add_word_to_index("a")
+        data_indexer.add_word_to_index("b", namespace='characters')
+        words = ["a", "b", "unseen", "a"]
+        word_indices = data_indexer.get_word_indices(words)
+        assert word_indices.dtype == numpy.int32
+        assert word_indices.tolist() == [data_indexer.get_word_index(word) for word in words]
+        assert data_indexer.get_word_indices(words, namespace='characters').tolist() == [1, 2, 1, 1]
+        assert data_indexer.get_word_indices([]).tolist() == []
+
+    def test_save_and_load_round_trip(self):
+        # pylint: disable=protected-access
+        vocab_filename = self.TEST_DIR + 'vocab_file'
+        with codecs.open(vocab_filename, 'w', 'utf-8') as vocab_file:
+            vocab_file.write('<UNK>\n')
+            vocab_file.write('word\n')
+        data_indexer = DataIndexer()
+        data_indexer.set_from_file(vocab_filename, oov_token="<UNK>")
+        data_indexer.add_word_to_index("é", namespace='characters')
+        data_indexer.finalize()
+        saved_filename = self.TEST_DIR + 'data_indexer.json'
+        data_indexer.save(saved_filename)
+        loaded = DataIndexer.load(saved_filename)
+        assert loaded.word_indices == data_indexer.word_indices
+        assert loaded.reverse_word_indices == data_indexer.reverse_word_indices
+        assert loaded._oov_token == "<UNK>"
+        assert loaded._finalized
+        assert loaded.get_word_index("unseen") == 1
+        assert loaded.get_word_from_index(2, namespace='characters') == "é"
@@ -0,0 +1,66 @@
+# pylint: disable=no-self-use,invalid-name
+import os
+
+import numpy
+
+from deep_qa.data import DataIndexer, IndexedDataset
+from deep_qa.data.dataset_cache import DatasetCache
+from deep_qa.data.datasets.columnar_dataset import ColumnarIndexedDataset
+from deep_qa.data.instances.multiple_choice_qa.question_answer_instance import IndexedQuestionAnswerInstance
+from deep_qa.data.instances.text_classification.text_classification_instance import \
+        IndexedTextClassificationInstance
+from ..common.test_case import DeepQaTestCase
+
+
+class TestDatasetCache(DeepQaTestCase):
+    def setUp(self):
+        super(TestDatasetCache, self).setUp()
+        self.cache = DatasetCache(os.path.join(self.TEST_DIR, "cache"))
+        self.write_true_false_model_files()
+
+    def test_key_depends_on_file_contents_and_components(self):
+        key = self.cache.get_key([self.TRAIN_FILE], tokenizer={'type': 'words'})
+        assert key == self.cache.get_key([self.TRAIN_FILE], tokenizer={'type': 'words'})
+        assert key != self.cache.get_key([self.TRAIN_FILE], tokenizer={'type': 'characters'})
+        assert key != self.cache.get_key([self.VALIDATION_FILE], tokenizer={'type': 'words'})
+        with open(self.TRAIN_FILE, 'a') as train_file:
+            train_file.write("extra line\t0\n")
+        assert key != self.cache.get_key([self.TRAIN_FILE], tokenizer={'type': 'words'})
+
+    def test_columnar_datasets_round_trip(self):
+        instances = [IndexedTextClassificationInstance([1, 2, 3], True),
+                     IndexedTextClassificationInstance([4], False)]
+        assert self.cache.load_indexed_dataset("key") is None
+        self.cache.save_indexed_dataset("key", IndexedDataset(instances))
+
+        loaded = self.cache.load_indexed_dataset("key")
+        assert type(loaded) == IndexedDataset  # pylint: disable=unidiomatic-typecheck
+        assert [instance.word_indices for instance in loaded.instances] == [[1, 2, 3], [4]]
+        assert [instance.label for instance in loaded.instances] == [True, False]
+
+        columnar = self.cache.load_indexed_dataset("key", columnar=True)
+        assert isinstance(columnar, ColumnarIndexedDataset)
+        inputs, labels = columnar.as_padded_training_data()
+        numpy.testing.assert_array_equal(inputs, [[1, 2, 3], [0, 0, 4]])
+        numpy.testing.assert_array_equal(labels, [[0, 1], [1, 0]])
+
+    def test_other_datasets_are_pickled(self):
+        instances = [IndexedQuestionAnswerInstance([1, 2], [[3], [4, 5]], 1)]
+        self.cache.save_indexed_dataset("key", IndexedDataset(instances))
+        loaded = self.cache.load_indexed_dataset("key", columnar=True)
+        assert type(loaded) == IndexedDataset  # pylint: disable=unidiomatic-typecheck
+        assert loaded.instances[0].question_indices == [1, 2]
+        assert loaded.instances[0].option_indices == [[3], [4, 5]]
+        assert loaded.instances[0].label == 1
+
+    def test_data_indexer_round_trips_and_fingerprint_tracks_vocabulary(self):
+        data_indexer = DataIndexer()
+        data_indexer.add_word_to_index("word")
+        fingerprint = DatasetCache.data_indexer_fingerprint(data_indexer)
+        assert self.cache.load_data_indexer("key") is None
+        self.cache.save_data_indexer("key", data_indexer)
+        loaded = self.cache.load_data_indexer("key")
+        assert loaded.get_word_index("word") == data_indexer.get_word_index("word")
+        assert DatasetCache.data_indexer_fingerprint(loaded) == fingerprint
+        data_indexer.add_word_to_index("another")
+        assert DatasetCache.data_indexer_fingerprint(data_indexer) != fingerprint
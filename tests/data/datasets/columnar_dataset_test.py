@@ -0,0 +1,140 @@
+# pylint: disable=no-self-use,invalid-name
+from copy import deepcopy
+
+import numpy
+import pytest
+
+from deep_qa.common.checks import ConfigurationError
+from deep_qa.common.params import Params
+from deep_qa.data import DataGenerator, DataIndexer, IndexedDataset
+from deep_qa.data.datasets.columnar_dataset import ColumnarIndexedDataset
+from deep_qa.data.datasets.dataset import TextDataset
+from deep_qa.data.instances.instance import TextInstance
+from deep_qa.data.instances.multiple_choice_qa.question_answer_instance import IndexedQuestionAnswerInstance
+from deep_qa.data.instances.reading_comprehension.character_span_instance import IndexedCharacterSpanInstance
+from deep_qa.data.instances.text_classification.text_classification_instance import \
+        IndexedTextClassificationInstance, TextClassificationInstance
+from deep_qa.data.tokenizers import tokenizers
+from tests.common.test_case import DeepQaTestCase
+
+
+class TestColumnarIndexedDataset(DeepQaTestCase):
+    def setUp(self):
+        super(TestColumnarIndexedDataset, self).setUp()
+        self.word_instances = [
+                IndexedCharacterSpanInstance([1, 2, 3], [4, 5, 6, 7, 8], [0, 1]),
+                IndexedCharacterSpanInstance([9], [10, 11], [1, 1]),
+                IndexedCharacterSpanInstance([12, 13], [14, 15, 16], [2, 2]),
+                IndexedCharacterSpanInstance([], [17], [0, 0]),
+                ]
+        self.character_instances = [
+                IndexedCharacterSpanInstance([[1, 2], [3, 4, 5]], [[6], [7, 8, 9, 10], [11]], [0, 1]),
+                IndexedCharacterSpanInstance([[12, 13, 14]], [[15, 16]], [0, 0]),
+                IndexedCharacterSpanInstance([], [[17], [18, 19]], [1, 1]),
+                ]
+
+    def assert_same_training_data(self, actual, expected):
+        actual_inputs, actual_labels = actual
+        expected_inputs, expected_labels = expected
+        if isinstance(expected_inputs, numpy.ndarray):
+            actual_inputs, actual_labels = [actual_inputs], [actual_labels]
+            expected_inputs, expected_labels = [expected_inputs], [expected_labels]
+        assert len(actual_inputs) == len(expected_inputs)
+        for actual_array, expected_array in zip(actual_inputs, expected_inputs):
+            assert actual_array.dtype == expected_array.dtype
+            numpy.testing.assert_array_equal(actual_array, expected_array)
+        for actual_array, expected_array in zip(actual_labels, expected_labels):
+            numpy.testing.assert_array_equal(actual_array, expected_array)
+
+    def test_padding_lengths_match_indexed_dataset(self):
+        for instances in [self.word_instances, self.character_instances]:
+            dataset = IndexedDataset(instances)
+            columnar_dataset = ColumnarIndexedDataset.from_instances(instances)
+            assert len(columnar_dataset) == len(dataset)
+            assert columnar_dataset.padding_lengths() == dataset.padding_lengths()
+        columnar_dataset = ColumnarIndexedDataset.from_instances(self.word_instances)
+        assert columnar_dataset.get_instance_padding_lengths() == \
+                [instance.get_padding_lengths() for instance in self.word_instances]
+
+    def test_as_padded_training_data_matches_indexed_dataset(self):
+        padding_lengths_to_try = [
+                {'num_question_words': None, 'num_passage_words': None},
+                {'num_question_words': 2, 'num_passage_words': 3},
+                {'num_question_words': 4, 'num_passage_words': 7},
+                ]
+        for instances, use_characters in [(self.word_instances, False), (self.character_instances, True)]:
+            for padding_lengths in padding_lengths_to_try:
+                padding_lengths = dict(padding_lengths)
+                if use_characters:
+                    padding_lengths['num_word_characters'] = 3
+                columnar_dataset = ColumnarIndexedDataset.from_instances(instances)
+                expected = IndexedDataset(instances).as_padded_training_data(padding_lengths)
+                actual = columnar_dataset.as_padded_training_data(padding_lengths)
+                self.assert_same_training_data(actual, expected)
+
+    def test_pad_instances_matches_indexed_dataset(self):
+        for instances in [self.word_instances, self.character_instances]:
+            padding_lengths = {'num_question_words': 2, 'num_passage_words': None, 'num_word_characters': 5}
+            dataset = IndexedDataset(deepcopy(instances))
+            dataset.pad_instances(padding_lengths)
+            columnar_dataset = ColumnarIndexedDataset.from_instances(instances)
+            columnar_dataset.pad_instances(padding_lengths)
+            assert columnar_dataset.padding_lengths() == dataset.padding_lengths()
+            self.assert_same_training_data(columnar_dataset.as_training_data(), dataset.as_training_data())
+
+    def test_instances_round_trip(self):
+        for instances in [self.word_instances, self.character_instances]:
+            columnar_dataset = ColumnarIndexedDataset.from_instances(instances)
+            for original, rebuilt in zip(instances, columnar_dataset.instances):
+                assert rebuilt.question_indices == original.question_indices
+                assert rebuilt.passage_indices == original.passage_indices
+                assert rebuilt.label == original.label
+
+    def test_sort_and_select_match_indexed_dataset(self):
+        sorting_keys = ['num_passage_words', 'num_question_words']
+        dataset = IndexedDataset(self.character_instances)
+        columnar_dataset = ColumnarIndexedDataset.from_instances(self.character_instances)
+        sort_order = columnar_dataset.get_padding_sort_order(sorting_keys)
+        assert sort_order == dataset.get_padding_sort_order(sorting_keys)
+        assert sort_order == [1, 2, 0]
+        selected = columnar_dataset.select([2, 0])
+        assert [instance.passage_indices for instance in selected.instances] == \
+                [[[17], [18, 19]], [[6], [7, 8, 9, 10], [11]]]
+        columnar_dataset.sort_by_padding(sorting_keys)
+        assert [instance.label for instance in columnar_dataset.instances] == [[0, 0], [1, 1], [0, 1]]
+        assert len(columnar_dataset.truncate(2)) == 2
+
+    def test_data_generator_gives_same_batches(self):
+        class FakeTextTrainer:
+            batch_size = 2
+            def get_instance_sorting_keys(self):
+                return ['num_passage_words', 'num_question_words']
+            def get_padding_lengths(self):
+                return {'num_question_words': None, 'num_passage_words': None}
+        params = {'dynamic_padding': True, 'padding_noise': 0.0, 'sort_every_epoch': False}
+        list_batches = DataGenerator(FakeTextTrainer(), Params(deepcopy(params))).create_generator(
+                IndexedDataset(self.word_instances))
+        columnar_batches = DataGenerator(FakeTextTrainer(), Params(deepcopy(params))).create_generator(
+                ColumnarIndexedDataset.from_instances(self.word_instances))
+        expected_batches = sorted([next(list_batches) for _ in range(2)], key=lambda x: x[0][1].tolist())
+        actual_batches = sorted([next(columnar_batches) for _ in range(2)], key=lambda x: x[0][1].tolist())
+        for actual, expected in zip(actual_batches, expected_batches):
+            self.assert_same_training_data(actual, expected)
+
+    def test_to_indexed_dataset_can_return_columnar_dataset(self):
+        TextInstance.tokenizer = tokenizers['words and characters'](Params({}))
+        dataset = TextDataset([TextClassificationInstance("a b c", True),
+                               TextClassificationInstance("d e", False)])
+        data_indexer = DataIndexer()
+        data_indexer.fit_word_dictionary(dataset)
+        columnar_dataset = dataset.to_indexed_dataset(data_indexer, columnar=True)
+        assert isinstance(columnar_dataset, ColumnarIndexedDataset)
+        expected = dataset.to_indexed_dataset(data_indexer).as_padded_training_data()
+        self.assert_same_training_data(columnar_dataset.as_padded_training_data(), expected)
+
+    def test_unsupported_instances_raise_configuration_error(self):
+        with pytest.raises(ConfigurationError):
+            ColumnarIndexedDataset.from_instances([IndexedQuestionAnswerInstance([1], [[2]], 0)])
+        with pytest.raises(ConfigurationError):
+            ColumnarIndexedDataset.from_instances([IndexedTextClassificationInstance([1], True),
+                                                   IndexedCharacterSpanInstance([1], [2], [0, 0])])
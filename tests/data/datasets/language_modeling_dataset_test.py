@@ -19,3 +19,15 @@ class TestLanguageModellingDataset(DeepQaTestCase):
         assert instances[0].text == "This is a sentence"
         assert instances[1].text == "for language modelling. Here's"
         assert instances[2].text == "another one for language"
+
+    def test_read_from_file_splits_a_long_line_into_sequences(self):
+        words = ["word%d" % i for i in range(23)]
+        with open(self.TRAIN_FILE, 'w') as train_file:
+            train_file.write(" ".join(words) + "\n")
+            train_file.write("and one more line\n")
+        args = Params({"sequence_length": 4})
+        dataset = LanguageModelingDataset.read_from_file(self.TRAIN_FILE, SentenceInstance, args)
+        words += ["and", "one", "more", "line"]
+        # The last sequence isn't followed by another word, so it's dropped.
+        assert [instance.text for instance in dataset.instances] == \
+                [" ".join(words[start:start + 4]) for start in range(0, 24, 4)]
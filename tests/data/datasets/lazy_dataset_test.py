@@ -0,0 +1,106 @@
+# pylint: disable=no-self-use,invalid-name
+import codecs
+
+from deep_qa.common.params import Params
+from deep_qa.data import DataGenerator, DataIndexer
+from deep_qa.data.datasets import LanguageModelingDataset, LazyIndexedDataset, LazyTextDataset, TextDataset
+from deep_qa.data.datasets.columnar_dataset import ColumnarIndexedDataset
+from deep_qa.data.instances.instance import TextInstance
+from deep_qa.data.instances.language_modeling.sentence_instance import SentenceInstance
+from deep_qa.data.instances.text_classification.text_classification_instance import TextClassificationInstance
+from deep_qa.data.tokenizers import tokenizers
+from tests.common.test_case import DeepQaTestCase
+
+
+class TestLazyTextDataset(DeepQaTestCase):
+    def setUp(self):
+        super(TestLazyTextDataset, self).setUp()
+        TextInstance.tokenizer = tokenizers['words'](Params({}))
+        self.write_true_false_model_files()
+
+    def get_lazy_dataset(self, chunk_size=4):
+        return LazyTextDataset([self.TRAIN_FILE], TextDataset, TextClassificationInstance, chunk_size=chunk_size)
+
+    def test_iterating_matches_read_from_file(self):
+        dataset = TextDataset.read_from_file(self.TRAIN_FILE, TextClassificationInstance)
+        lazy_dataset = self.get_lazy_dataset()
+        expected = [(instance.text, instance.label) for instance in dataset.instances]
+        assert [(instance.text, instance.label) for instance in lazy_dataset] == expected
+        # Iterating again re-reads the file.
+        assert [(instance.text, instance.label) for instance in lazy_dataset] == expected
+        assert len(lazy_dataset) == 6
+        assert [len(chunk) for chunk in lazy_dataset.iter_chunks()] == [4, 2]
+        truncated = lazy_dataset.truncate(3)
+        assert [instance.text for instance in truncated] == [text for text, _ in expected[:3]]
+        assert [len(chunk) for chunk in truncated.iter_chunks()] == [3]
+
+    def test_language_modeling_dataset_streams_the_same_sequences(self):
+        with codecs.open(self.TRAIN_FILE, 'w', 'utf-8') as train_file:
+            train_file.write("one two three\n\nfour five six seven\neight\n")
+        for sequence_length in range(1, 10):
+            params = Params({"sequence_length": sequence_length})
+            expected = LanguageModelingDataset.read_from_file(self.TRAIN_FILE, SentenceInstance, params)
+            lazy_dataset = LazyTextDataset([self.TRAIN_FILE], LanguageModelingDataset, SentenceInstance,
+                                           Params({"sequence_length": sequence_length}))
+            assert [instance.text for instance in lazy_dataset] == \
+                    [instance.text for instance in expected.instances]
+
+    def test_fit_word_dictionary_matches_eager_dataset(self):
+        dataset = TextDataset.read_from_file(self.TRAIN_FILE, TextClassificationInstance)
+        data_indexer = DataIndexer()
+        data_indexer.fit_word_dictionary(dataset)
+        lazy_data_indexer = DataIndexer()
+        lazy_data_indexer.fit_word_dictionary(self.get_lazy_dataset())
+        assert lazy_data_indexer.word_indices == data_indexer.word_indices
+
+    def test_to_indexed_dataset(self):
+        dataset = TextDataset.read_from_file(self.TRAIN_FILE, TextClassificationInstance)
+        data_indexer = DataIndexer()
+        data_indexer.fit_word_dictionary(dataset)
+        indexed_dataset = dataset.to_indexed_dataset(data_indexer)
+        lazy_indexed_dataset = self.get_lazy_dataset().to_indexed_dataset(data_indexer)
+        assert isinstance(lazy_indexed_dataset, LazyIndexedDataset)
+        assert [instance.word_indices for instance in lazy_indexed_dataset] == \
+                [instance.word_indices for instance in indexed_dataset.instances]
+        assert lazy_indexed_dataset.padding_lengths() == indexed_dataset.padding_lengths()
+        columnar_dataset = self.get_lazy_dataset().to_indexed_dataset(data_indexer, columnar=True)
+        assert isinstance(columnar_dataset, ColumnarIndexedDataset)
+        assert len(columnar_dataset) == 6
+
+    def test_get_largest_instance_looks_at_every_chunk(self):
+        with codecs.open(self.TRAIN_FILE, 'w', 'utf-8') as train_file:
+            train_file.write('1\tsentence1 word2\t0\n')
+            train_file.write('2\tsentence2\t1\n')
+            train_file.write('3\tsentence3\t0\n')
+            train_file.write('4\tsentence4 word2 word3 word4\t1\n')
+            train_file.write('5\tsentence5 word2 word3\t0\n')
+        dataset = TextDataset.read_from_file(self.TRAIN_FILE, TextClassificationInstance)
+        data_indexer = DataIndexer()
+        data_indexer.fit_word_dictionary(dataset)
+        indexed_dataset = dataset.to_indexed_dataset(data_indexer)
+        sorting_keys = ['num_sentence_words']
+        expected = indexed_dataset.instances[indexed_dataset.get_padding_sort_order(sorting_keys)[-1]]
+        lazy_indexed_dataset = self.get_lazy_dataset(chunk_size=2).to_indexed_dataset(data_indexer)
+        largest_instance = lazy_indexed_dataset.get_largest_instance(sorting_keys)
+        assert len(largest_instance.word_indices) == 4
+        assert largest_instance.word_indices == expected.word_indices
+
+    def test_data_generator_reads_lazy_datasets_in_chunks(self):
+        class FakeTextTrainer:
+            batch_size = 3
+            def get_instance_sorting_keys(self):
+                return ['num_sentence_words']
+            def get_padding_lengths(self):
+                return {'num_sentence_words': None}
+        data_indexer = DataIndexer()
+        lazy_dataset = self.get_lazy_dataset(chunk_size=4)
+        data_indexer.fit_word_dictionary(lazy_dataset)
+        for params in [{'dynamic_padding': True}, {}]:
+            generator = DataGenerator(FakeTextTrainer(), Params(params))
+            batches = generator.create_generator(lazy_dataset.to_indexed_dataset(data_indexer))
+            # Chunks of 4 and 2 instances, with a batch size of 3.
+            assert generator.last_num_batches == 3
+            for _ in range(2):
+                epoch = [next(batches) for _ in range(generator.last_num_batches)]
+                labels = [label.tolist() for _, batch_labels in epoch for label in batch_labels]
+                assert sorted(labels) == sorted([[1, 0], [0, 1], [1, 0], [0, 1], [1, 0], [1, 0]])
@@ -103,3 +103,38 @@ class TestPretrainedEmbeddings(DeepQaTestCase):
             }
             model = self.get_model(ClassificationModel, args)
             model.train()
+
+    def test_convert_to_binary_round_trips_embeddings(self):
+        embeddings_filename = self.TEST_DIR + "embeddings.gz"
+        with gzip.open(embeddings_filename, 'wb') as embeddings_file:
+            embeddings_file.write("word1 1.0 2.3 -1.0\n".encode('utf-8'))
+            embeddings_file.write("bad 0.1 0.4\n".encode('utf-8'))
+            embeddings_file.write("w\u2028rd 0.1 0.4 -4.0\n".encode('utf-8'))
+        binary_filename = self.TEST_DIR + "embeddings.npy"
+        PretrainedEmbeddings.convert_to_binary(embeddings_filename, binary_filename)
+        words, vectors = PretrainedEmbeddings.read_embeddings(binary_filename)
+        assert words == ["word1", "w\u2028rd"]
+        assert isinstance(vectors, numpy.memmap)
+        assert vectors.dtype == numpy.float32
+        assert numpy.allclose(vectors, numpy.asarray([[1.0, 2.3, -1.0], [0.1, 0.4, -4.0]]))
+        text_words, text_vectors = PretrainedEmbeddings.read_embeddings(embeddings_filename)
+        assert text_words == words
+        assert numpy.allclose(text_vectors, vectors)
+
+    def test_get_embedding_layer_reads_binary_embeddings(self):
+        data_indexer = DataIndexer()
+        data_indexer.add_word_to_index("word2")
+        data_indexer.add_word_to_index("word1")
+        data_indexer.add_word_to_index("unseen")
+        embeddings_filename = self.TEST_DIR + "embeddings.gz"
+        with gzip.open(embeddings_filename, 'wb') as embeddings_file:
+            embeddings_file.write("word1 1.0 2.3 -1.0\n".encode('utf-8'))
+            embeddings_file.write("word2 0.1 0.4 -4.0\n".encode('utf-8'))
+        binary_filename = self.TEST_DIR + "embeddings.npy"
+        PretrainedEmbeddings.convert_to_binary(embeddings_filename, binary_filename)
+        text_layer = PretrainedEmbeddings.get_embedding_layer(embeddings_filename, data_indexer)
+        binary_layer = PretrainedEmbeddings.get_embedding_layer(binary_filename, data_indexer)
+        assert binary_layer.output_dim == 3
+        assert numpy.allclose(binary_layer._initial_weights[0], text_layer._initial_weights[0])
+        word_vector = binary_layer._initial_weights[0][data_indexer.get_word_index("word1")]
+        assert numpy.allclose(word_vector, numpy.asarray([1.0, 2.3, -1.0]))
@@ -128,6 +128,15 @@ class TestIndexedMcQuestionPassageInstance(DeepQaTestCase):
         assert self.instance.option_indices[3] == [0]
         assert len(self.instance.option_indices) == 4
 
+    def test_as_padded_training_data_does_not_modify_instance(self):
+        inputs, _ = self.instance.as_padded_training_data({'num_question_words': 3,
+                                                           'num_passage_words': 4,
+                                                           'num_option_words': 1,
+                                                           'num_options': 4})
+        assert np.all(inputs[2] == np.asarray([[2], [5], [6], [0]]))
+        assert self.instance.question_indices == [1, 2, 3, 5, 6]
+        assert self.instance.option_indices == [[2], [3, 5], [6]]
+
     def test_pad_removes_options_when_necessary(self):
         self.instance.pad({'num_question_words': 3, 'num_passage_words': 4,
                            'num_option_words': 1, 'num_options': 1})
@@ -90,3 +90,10 @@ class TestIndexedTextClassificationInstance(DeepQaTestCase):
         instance.label = False
         _, label = instance.as_training_data()
         assert numpy.all(label == numpy.asarray([1, 0]))
+
+    def test_as_padded_training_data_does_not_modify_instance(self):
+        instance = IndexedTextClassificationInstance([1, 2, 3, 4], True)
+        inputs, label = instance.as_padded_training_data({'num_sentence_words': 6})
+        assert numpy.all(inputs == numpy.asarray([0, 0, 1, 2, 3, 4]))
+        assert numpy.all(label == numpy.asarray([0, 1]))
+        assert instance.word_indices == [1, 2, 3, 4]
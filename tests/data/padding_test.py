@@ -0,0 +1,46 @@
+# pylint: disable=no-self-use,invalid-name
+import random
+
+import numpy
+
+from deep_qa.data.instances.instance import IndexedInstance
+from deep_qa.data.padding import pad_word_sequences
+from ..common.test_case import DeepQaTestCase
+
+
+class TestPadding(DeepQaTestCase):
+    def test_pad_word_sequences_handles_words(self):
+        padded = pad_word_sequences([[1, 2, 3], [4], []], {'num_sentence_words': 2})
+        assert padded.dtype == numpy.int32
+        assert padded.tolist() == [[2, 3], [0, 4], [0, 0]]
+        padded = pad_word_sequences([[1, 2, 3], [4], []], {'num_sentence_words': 2}, truncate_from_right=False)
+        assert padded.tolist() == [[1, 2], [4, 0], [0, 0]]
+
+    def test_pad_word_sequences_handles_characters(self):
+        padded = pad_word_sequences([[[1, 2, 3], [4]], [[5, 6]]],
+                                    {'num_sentence_words': 3, 'num_word_characters': 2})
+        assert padded.tolist() == [[[0, 0], [1, 2], [4, 0]],
+                                   [[0, 0], [0, 0], [5, 6]]]
+
+    def test_pad_word_sequences_matches_pad_word_sequence(self):
+        random.seed(1234)
+        for use_characters in [False, True]:
+            for truncate_from_right in [True, False]:
+                sequences = []
+                for _ in range(20):
+                    num_words = random.randint(0, 8)
+                    if use_characters:
+                        sequences.append([[random.randint(1, 50) for _ in range(random.randint(1, 6))]
+                                          for _ in range(num_words)])
+                    else:
+                        sequences.append([random.randint(1, 50) for _ in range(num_words)])
+                for num_sentence_words in [1, 4, 10]:
+                    padding_lengths = {'num_sentence_words': num_sentence_words}
+                    if use_characters:
+                        padding_lengths['num_word_characters'] = 4
+                    expected = numpy.asarray([IndexedInstance.pad_word_sequence(sequence,
+                                                                                padding_lengths,
+                                                                                truncate_from_right)
+                                              for sequence in sequences], dtype='int32')
+                    actual = pad_word_sequences(sequences, padding_lengths, truncate_from_right)
+                    numpy.testing.assert_array_equal(actual, expected)
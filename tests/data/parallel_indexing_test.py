@@ -0,0 +1,61 @@
+# pylint: disable=no-self-use,invalid-name
+import random
+import sys
+from unittest import mock
+
+from deep_qa.common.params import Params
+from deep_qa.data import DataIndexer
+from deep_qa.data.datasets import TextDataset
+from deep_qa.data.datasets.columnar_dataset import ColumnarIndexedDataset
+from deep_qa.data.instances.instance import TextInstance
+from deep_qa.data.instances.text_classification.text_classification_instance import TextClassificationInstance
+from deep_qa.data.tokenizers import tokenizers
+from ..common.test_case import DeepQaTestCase
+
+
+class TestParallelIndexing(DeepQaTestCase):
+    def setUp(self):
+        super(TestParallelIndexing, self).setUp()
+        TextInstance.tokenizer = tokenizers['words and characters'](Params({}))
+        random.seed(1234)
+        vocabulary = ["word%d" % i for i in range(300)]
+        self.dataset = TextDataset([TextClassificationInstance(" ".join(random.choice(vocabulary)
+                                                                        for _ in range(random.randint(1, 12))),
+                                                               random.random() < 0.5)
+                                    for _ in range(2500)])
+
+    def tearDown(self):
+        super(TestParallelIndexing, self).tearDown()
+        TextInstance.tokenizer = tokenizers['words'](Params({}))
+
+    def test_parallel_fitting_matches_sequential_fitting(self):
+        for min_count in [1, 30]:
+            data_indexer = DataIndexer()
+            data_indexer.fit_word_dictionary(self.dataset, min_count=min_count)
+            parallel_data_indexer = DataIndexer()
+            parallel_data_indexer.fit_word_dictionary(self.dataset, min_count=min_count, num_workers=3)
+            assert parallel_data_indexer.word_indices == data_indexer.word_indices
+            assert parallel_data_indexer.reverse_word_indices == data_indexer.reverse_word_indices
+
+    def test_parallel_indexing_matches_sequential_indexing(self):
+        data_indexer = DataIndexer()
+        data_indexer.fit_word_dictionary(self.dataset, min_count=20)
+        expected = self.dataset.to_indexed_dataset(data_indexer)
+        actual = self.dataset.to_indexed_dataset(data_indexer, num_workers=3)
+        assert [(instance.word_indices, instance.label) for instance in actual.instances] == \
+                [(instance.word_indices, instance.label) for instance in expected.instances]
+        columnar = self.dataset.to_indexed_dataset(data_indexer, columnar=True, num_workers=3)
+        assert isinstance(columnar, ColumnarIndexedDataset)
+        assert [instance.word_indices for instance in columnar.instances] == \
+                [instance.word_indices for instance in expected.instances]
+
+    def test_parallel_fitting_fills_the_token_cache_for_indexing(self):
+        tokenizer = TextInstance.tokenizer
+        tokenizer.cache_size = sys.maxsize
+        data_indexer = DataIndexer()
+        data_indexer.fit_word_dictionary(self.dataset, min_count=20, num_workers=3)
+        texts = {instance.text for instance in self.dataset.instances}
+        assert tokenizer.get_cache_info()['current_size'] == len(texts)
+        with mock.patch.object(tokenizer, '_tokenize') as tokenize:
+            self.dataset.to_indexed_dataset(data_indexer)
+            assert not tokenize.called
@@ -1,5 +1,6 @@
 # pylint: disable=no-self-use,invalid-name
 
+from deep_qa.data.data_indexer import DataIndexer
 from deep_qa.data.tokenizers.word_tokenizer import WordTokenizer
 from deep_qa.common.params import Params
 
@@ -20,3 +21,45 @@ class TestTokenizer:
         # "Lenox Hill Hospital in New York."
         token_span = self.tokenizer.char_span_to_token_span(self.passage, (91, 123))
         assert token_span == (22, 29)
+
+    def test_token_cache_counts_hits_and_evicts_least_recently_used(self):
+        tokenizer = WordTokenizer(Params({'cache_size': 2}))
+        data_indexer = DataIndexer()
+        words = tokenizer.get_words_for_indexer("a b c")
+        for word in words['words']:
+            data_indexer.add_word_to_index(word)
+        assert tokenizer.index_text("a b c", data_indexer) == [2, 3, 4]
+        assert tokenizer.get_cache_info() == {'hits': 1, 'misses': 1, 'cache_size': 2, 'current_size': 1}
+        tokens = tokenizer.tokenize("a b c")
+        tokens.append("d")
+        assert tokenizer.tokenize("a b c") == ["a", "b", "c"]
+        tokenizer.tokenize("d e")
+        tokenizer.tokenize("f g")
+        assert tokenizer.get_cache_info()['current_size'] == 2
+        tokenizer.tokenize("a b c")
+        assert tokenizer.get_cache_info() == {'hits': 3, 'misses': 4, 'cache_size': 2, 'current_size': 2}
+        tokenizer.clear_cache()
+        assert tokenizer.get_cache_info() == {'hits': 0, 'misses': 0, 'cache_size': 2, 'current_size': 0}
+
+    def test_token_cache_is_disabled_by_default(self):
+        tokenizer = WordTokenizer(Params({}))
+        tokenizer.tokenize("a b c")
+        tokenizer.tokenize("a b c")
+        assert tokenizer.get_cache_info() == {'hits': 0, 'misses': 0, 'cache_size': 0, 'current_size': 0}
+
+    def test_cached_tokens_can_be_shared_between_tokenizers(self):
+        tokenizer = WordTokenizer(Params({'cache_size': 10}))
+        tokenizer.tokenize("a b c")
+        other_tokenizer = WordTokenizer(Params({}))
+        other_tokenizer.add_cached_tokens(tokenizer.get_cached_tokens())
+        assert other_tokenizer.tokenize("a b c") == ["a", "b", "c"]
+        assert other_tokenizer.get_cache_info() == {'hits': 1, 'misses': 0, 'cache_size': 1, 'current_size': 1}
+
+    def test_adding_cached_tokens_can_keep_to_the_cache_size(self):
+        tokenizer = WordTokenizer(Params({'cache_size': 10}))
+        for text in ["a b", "c d", "e f"]:
+            tokenizer.tokenize(text)
+        other_tokenizer = WordTokenizer(Params({'cache_size': 2}))
+        other_tokenizer.add_cached_tokens(tokenizer.get_cached_tokens(), grow_cache=False)
+        assert other_tokenizer.get_cached_tokens() == {"c d": ("c", "d"), "e f": ("e", "f")}
+        assert other_tokenizer.get_cache_info()['cache_size'] == 2
@@ -1,5 +1,6 @@
 # pylint: disable=no-self-use,invalid-name
 import numpy
+from numpy.testing import assert_almost_equal
 from flaky import flaky
 
 from deep_qa.models.reading_comprehension import BidirectionalAttentionFlow
@@ -25,6 +26,44 @@ class TestBidirectionalAttentionFlow(DeepQaTestCase):
         else:
             assert False, "couldn't find character embedding layer"
 
+    def test_score_dataset_zero_pads_span_predictions_to_the_longest_passage(self):
+        self.write_span_prediction_files()
+        args = Params({
+                'embeddings': {'words': {'dimension': 8}, 'characters': {'dimension': 4}},
+                'tokenizer': {'type': 'words and characters'},
+                'data_generator': {'dynamic_padding': True},
+                'batch_size': 2,
+                })
+        model = self.get_model(BidirectionalAttentionFlow, args)
+        model.train()
+        # The validation passage is longer than the training passages, so the batches have
+        # different widths.
+        dataset = model.load_dataset_from_files([self.TRAIN_FILE, self.VALIDATION_FILE])
+        (span_begin, span_end), _ = model.score_dataset(dataset)
+        indexed_dataset = dataset.to_indexed_dataset(model.data_indexer)
+        assert span_begin.shape[1] == indexed_dataset.padding_lengths()['num_passage_words']
+        for i in range(len(indexed_dataset)):
+            inputs, _ = model.data_generator.pad_batch(indexed_dataset.select([i]))
+            begin, end = model.model.predict_on_batch(inputs)
+            width = begin.shape[1]
+            assert_almost_equal(span_begin[i, :width], begin[0], decimal=5)
+            assert_almost_equal(span_end[i, :width], end[0], decimal=5)
+            assert not span_begin[i, width:].any()
+            assert not span_end[i, width:].any()
+
+    @flaky
+    def test_trains_and_loads_with_columnar_datasets(self):
+        self.write_span_prediction_files()
+        args = Params({
+                'embeddings': {'words': {'dimension': 8}, 'characters': {'dimension': 4}},
+                'save_models': True,
+                'tokenizer': {'type': 'words and characters'},
+                'columnar_datasets': True,
+                'data_generator': {'dynamic_padding': True},
+                'batch_size': 2,
+                })
+        self.ensure_model_trains_and_loads(BidirectionalAttentionFlow, args)
+
     def test_get_best_span(self):
         # Note that the best span cannot be (1, 0) since even though 0.3 * 0.5 is the greatest
         # value, the end span index is constrained to occur after the begin span index.
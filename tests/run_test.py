@@ -6,7 +6,7 @@ import numpy
 from numpy.testing import assert_almost_equal
 
 from deep_qa.run import run_model, load_model, evaluate_model
-from deep_qa.run import score_dataset, score_dataset_with_ensemble
+from deep_qa.run import score_dataset, score_dataset_to_files, score_dataset_with_ensemble
 from deep_qa.run import compute_accuracy
 
 from .common.test_case import DeepQaTestCase
@@ -47,6 +47,26 @@ class TestRun(DeepQaTestCase):
         ensembled_predictions, _ = score_dataset_with_ensemble([self.param_path], [self.TEST_FILE])
         assert_almost_equal(predictions, ensembled_predictions)
 
+    def test_score_dataset_with_ensemble_averages_models_in_parallel(self):
+        run_model(self.param_path)
+        predictions, labels = score_dataset(self.param_path, [self.TEST_FILE])
+        for num_workers in [1, 2]:
+            # Two copies of the same model share their tokenization, and average to the same
+            # predictions as the single model.
+            ensembled_predictions, ensembled_labels = score_dataset_with_ensemble(
+                    [self.param_path, self.param_path], [self.TEST_FILE], num_workers=num_workers)
+            assert_almost_equal(predictions, ensembled_predictions, decimal=5)
+            assert_almost_equal(labels, ensembled_labels)
+
+    def test_score_dataset_to_files_gives_same_predictions_as_score_dataset(self):
+        run_model(self.param_path)
+        predictions, labels = score_dataset(self.param_path, [self.TEST_FILE])
+        output_prefix = os.path.join(self.TEST_DIR, "scores")
+        streamed_predictions, _ = score_dataset_to_files(self.param_path, [self.TEST_FILE], output_prefix)
+        assert_almost_equal(predictions, streamed_predictions)
+        assert_almost_equal(predictions, numpy.load(output_prefix + "_predictions.npy"))
+        assert_almost_equal(labels, numpy.load(output_prefix + "_labels.npy"))
+
     def test_compute_accuracy_computes_a_correct_metric(self):
         predictions = numpy.asarray([[.5, .5, .6], [.1, .4, .0]])
         labels = numpy.asarray([[1, 0, 0], [0, 1, 0]])
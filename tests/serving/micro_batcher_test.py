@@ -0,0 +1,80 @@
+# pylint: disable=no-self-use,invalid-name
+from concurrent.futures import Future
+import threading
+
+from numpy.testing import assert_almost_equal
+import pytest
+
+from deep_qa.data.datasets import TextDataset
+from deep_qa.models.text_classification import ClassificationModel
+from deep_qa.serving import LatencyTracker, MicroBatcher
+from ..common.test_case import DeepQaTestCase
+
+
+class TestMicroBatcher(DeepQaTestCase):
+    def setUp(self):
+        super(TestMicroBatcher, self).setUp()
+        self.write_true_false_model_files()
+        args = {'save_models': True}
+        self.get_model(ClassificationModel, args).train()
+        self.model = self.get_model(ClassificationModel, args)
+        self.model.load_model()
+        with open(self.TEST_FILE) as test_file:
+            self.lines = [line.rstrip("\n") for line in test_file]
+
+    def test_predictions_match_score_dataset(self):
+        instance_type = self.model._instance_type()  # pylint: disable=protected-access
+        dataset = TextDataset([instance_type.read_from_line(line) for line in self.lines])
+        expected_predictions, _ = self.model.score_dataset(dataset)
+        micro_batcher = MicroBatcher(self.model, max_batch_size=2, padding_buckets='powers_of_two')
+        predictions = micro_batcher.predict(self.lines)
+        micro_batcher.stop()
+        assert_almost_equal(predictions, expected_predictions, decimal=5)
+        # Four instances in batches of at most two.
+        assert micro_batcher.get_stats()['num_batches'] == 2
+
+    def test_concurrent_requests_are_batched_together(self):
+        # A long wait, so that all of the requests make it into the first batch.
+        micro_batcher = MicroBatcher(self.model, max_batch_size=len(self.lines), max_wait_ms=2000)
+        expected_predictions = micro_batcher.predict(self.lines)
+        results = {}
+        def request(index):
+            results[index] = micro_batcher.predict([self.lines[index]])
+        threads = [threading.Thread(target=request, args=(i,)) for i in range(len(self.lines))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        micro_batcher.stop()
+        for i, prediction in enumerate(expected_predictions):
+            assert_almost_equal(results[i], [prediction], decimal=5)
+        stats = micro_batcher.get_stats()
+        assert stats['num_requests'] == len(self.lines) + 1
+        assert stats['num_batches'] == 2
+        assert set(stats['latency_ms'].keys()) == {'p50', 'p90', 'p99', 'mean'}
+
+    def test_requests_after_stopping_get_an_exception(self):
+        micro_batcher = MicroBatcher(self.model)
+        instances = [micro_batcher.index_line(line) for line in self.lines]
+        # A request that ends up behind the batching thread's stop signal is never run, but it
+        # shouldn't wait forever.
+        future = Future()
+        micro_batcher._requests.put(None)  # pylint: disable=protected-access
+        micro_batcher._requests.put((instances, future))  # pylint: disable=protected-access
+        micro_batcher.stop()
+        with pytest.raises(RuntimeError):
+            future.result(timeout=10)
+        with pytest.raises(RuntimeError):
+            micro_batcher.predict(self.lines)
+        # Stopping twice is fine.
+        micro_batcher.stop()
+
+    def test_latency_tracker_reports_percentiles_over_its_window(self):
+        tracker = LatencyTracker(window=100)
+        assert tracker.get_percentiles() == {}
+        for i in range(200):
+            tracker.add(i / 1000)
+        percentiles = tracker.get_percentiles()
+        assert_almost_equal(percentiles['p50'], 149.5)
+        assert_almost_equal(percentiles['mean'], 149.5)
+        assert_almost_equal(percentiles['p99'], 198.01)
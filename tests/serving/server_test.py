@@ -0,0 +1,49 @@
+# pylint: disable=no-self-use,invalid-name
+import http.client
+import json
+import threading
+
+from deep_qa.models.text_classification import ClassificationModel
+from deep_qa.serving import MicroBatcher, make_server
+from ..common.test_case import DeepQaTestCase
+
+
+class TestServer(DeepQaTestCase):
+    def setUp(self):
+        super(TestServer, self).setUp()
+        self.write_true_false_model_files()
+        args = {'save_models': True}
+        self.get_model(ClassificationModel, args).train()
+        model = self.get_model(ClassificationModel, args)
+        model.load_model()
+        self.micro_batcher = MicroBatcher(model)
+        self.server = make_server(self.micro_batcher, port=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.connection = http.client.HTTPConnection(*self.server.server_address[:2])
+
+    def tearDown(self):
+        self.connection.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.micro_batcher.stop()
+        super(TestServer, self).tearDown()
+
+    def request(self, method, path, body=None):
+        self.connection.request(method, path, body and json.dumps(body))
+        response = self.connection.getresponse()
+        return response.status, json.loads(response.read().decode('utf-8'))
+
+    def test_predict_returns_one_prediction_per_instance(self):
+        lines = ['1\ttestsentence1', '2\ttestsentence2 word2 word3']
+        status, response = self.request('POST', '/predict', {'instances': lines})
+        assert status == 200
+        assert response['predictions'] == self.micro_batcher.predict(lines)
+        status, stats = self.request('GET', '/stats')
+        assert status == 200
+        assert stats['num_requests'] == 2
+        assert stats['num_instances'] == 4
+
+    def test_bad_requests_get_errors(self):
+        assert self.request('POST', '/predict', {'lines': []})[0] == 400
+        assert self.request('GET', '/missing')[0] == 404
+        assert self.request('GET', '/health') == (200, {'status': 'ok'})
@@ -0,0 +1,135 @@
+# pylint: disable=no-self-use,invalid-name
+import os
+
+import tensorflow
+from numpy.testing import assert_allclose
+from keras import backend as K
+from keras.layers import Dense, Input
+from keras.models import Model
+
+from deep_qa.common.params import Params
+from deep_qa.models.text_classification import ClassificationModel
+from deep_qa.training.checkpointing import AsyncModelCheckpoint, ResumableEarlyStopping, TrainingCheckpointer
+from deep_qa.training.checkpointing import link_or_copy, read_latest_training_checkpoint, restore_variables
+from deep_qa.training.checkpointing import snapshot_variables, snapshot_weights, write_weights_file
+from ..common.test_case import DeepQaTestCase
+
+
+class TestCheckpointing(DeepQaTestCase):
+    def build_model(self):
+        input_layer = Input(shape=(3,))
+        output = Dense(2, name="dense")(input_layer)
+        return Model(inputs=input_layer, outputs=output)
+
+    def test_written_weights_can_be_loaded_by_keras(self):
+        model = self.build_model()
+        filename = self.TEST_DIR + "weights.h5"
+        write_weights_file(filename, snapshot_weights(model.layers))
+        assert not os.path.exists(filename + ".tmp")
+        loaded_model = self.build_model()
+        loaded_model.load_weights(filename)
+        for weights, loaded_weights in zip(model.get_weights(), loaded_model.get_weights()):
+            assert_allclose(weights, loaded_weights)
+
+    def test_async_checkpoint_keeps_the_best_and_the_last_checkpoints(self):
+        model = self.build_model()
+        checkpoint = AsyncModelCheckpoint(self.TEST_DIR + "weights_epoch={epoch:d}.h5",
+                                          monitor='val_acc',
+                                          keep_checkpoints=2)
+        checkpoint.set_model(model)
+        for epoch, accuracy in enumerate([0.5, 0.9, 0.6, 0.7, 0.8]):
+            checkpoint.on_epoch_end(epoch, {'val_acc': accuracy})
+        checkpoint.on_train_end()
+        assert sorted(os.listdir(self.TEST_DIR)) == ["weights_epoch=1.h5",
+                                                     "weights_epoch=3.h5",
+                                                     "weights_epoch=4.h5"]
+
+    def test_link_or_copy_replaces_the_destination(self):
+        source = self.TEST_DIR + "source"
+        destination = self.TEST_DIR + "destination"
+        with open(source, "w") as source_file:
+            source_file.write("new")
+        with open(destination, "w") as destination_file:
+            destination_file.write("old")
+        link_or_copy(source, destination)
+        with open(destination) as destination_file:
+            assert destination_file.read() == "new"
+        assert sorted(os.listdir(self.TEST_DIR)) == ["destination", "source"]
+
+    def test_restore_variables_undoes_changes_to_variables(self):
+        model = self.build_model()
+        variables = snapshot_variables()
+        original_weights = model.get_weights()
+        model.set_weights([weights + 1 for weights in original_weights])
+        restore_variables(variables)
+        for weights, restored_weights in zip(original_weights, model.get_weights()):
+            assert_allclose(weights, restored_weights)
+
+    def test_training_checkpointer_writes_every_n_steps_and_at_epoch_end(self):
+        model = self.build_model()
+        prefix = self.TEST_DIR + "model"
+        early_stopping = ResumableEarlyStopping(monitor='val_acc')
+        checkpointer = TrainingCheckpointer(prefix,
+                                            lambda epoch, batch: (epoch, batch),
+                                            {'early_stopping': early_stopping},
+                                            every_n_steps=2)
+        checkpointer.set_model(model)
+        early_stopping.set_model(model)
+        early_stopping.on_train_begin()
+        checkpointer.on_train_begin()
+        checkpointer.on_epoch_begin(0)
+        for batch in range(5):
+            checkpointer.on_batch_begin(batch)
+            checkpointer.on_batch_end(batch)
+        early_stopping.on_epoch_end(0, {'val_acc': 0.5})
+        checkpointer.on_epoch_end(0, {'val_acc': 0.5})
+        checkpointer.writer.wait()
+        # The checkpoints due after steps 2 and 4 are written before the next batch starts; the
+        # oldest one has already been deleted.
+        assert sorted(os.listdir(self.TEST_DIR)) == ["model_training_checkpoint",
+                                                     "model_training_checkpoint_4",
+                                                     "model_training_checkpoint_5"]
+        variables, state = read_latest_training_checkpoint(prefix)
+        assert state['step'] == 5
+        assert (state['epoch'], state['batch']) == (1, 0)
+        assert state['data_position'] == (1, 0)
+        assert state['history'] == {'val_acc': [0.5]}
+        assert state['callbacks']['early_stopping'] == {'wait': 0, 'best': 0.5}
+        assert set(variables) == set(variable.name for variable in tensorflow.global_variables())
+
+    def test_resumable_early_stopping_keeps_its_state_across_calls_to_fit(self):
+        early_stopping = ResumableEarlyStopping(monitor='val_acc', patience=2)
+        early_stopping.set_state({'wait': 1, 'best': 0.8})
+        early_stopping.on_train_begin()
+        assert early_stopping.wait == 1
+        assert early_stopping.best == 0.8
+
+    def test_resumed_training_finishes_the_interrupted_epoch(self):
+        self.write_true_false_model_files()
+        for name, data_generator in [("arrays", None), ("generator", {'dynamic_padding': True})]:
+            prefix = self.TEST_DIR + name
+            args = Params({
+                    'save_models': True,
+                    'model_serialization_prefix': prefix,
+                    'batch_size': 2,
+                    'checkpoint_every_n_steps': 1,
+                    'data_generator': data_generator,
+                    })
+            model = self.get_model(ClassificationModel, args)
+            model.train()
+            K.clear_session()
+
+            # There are three batches per epoch.  We pretend training stopped in the middle of the
+            # first epoch, after the second batch, by pointing at that checkpoint.
+            with open(prefix + "_training_checkpoint", "w") as pointer_file:
+                print(name + "_training_checkpoint_2", file=pointer_file)
+            args['num_epochs'] = 2
+            args['patience'] = 2
+            resumed_model = self.get_model(ClassificationModel, args)
+            resumed_model.resume()
+            assert K.get_session().run(resumed_model.model.global_step) == 6
+            _, state = read_latest_training_checkpoint(prefix)
+            assert (state['step'], state['epoch'], state['batch']) == (6, 2, 0)
+            assert len(state['history']['val_acc']) == 2
+            assert os.path.exists(prefix + "_weights.h5")
+            K.clear_session()
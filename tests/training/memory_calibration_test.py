@@ -0,0 +1,72 @@
+# pylint: disable=no-self-use,invalid-name
+import os
+from unittest import mock
+
+from deep_qa.common.params import Params
+from deep_qa.data import DataGenerator, IndexedDataset
+from deep_qa.models.text_classification import ClassificationModel
+from deep_qa.training.memory_calibration import calibrate_memory_usage_constant, fit_memory_usage
+from deep_qa.training.memory_calibration import load_calibration
+from ..common.test_case import DeepQaTestCase
+from ..data.data_generator_test import FakeInstance, FakeTextTrainer
+
+
+class FakeModel:
+    def __init__(self):
+        self.batch_sizes = []
+
+    def train_on_batch(self, inputs, labels):  # pylint: disable=unused-argument
+        self.batch_sizes.append(len(inputs))
+
+
+class TestMemoryCalibration(DeepQaTestCase):
+    def test_fit_memory_usage_recovers_a_line(self):
+        fixed_memory, memory_per_unit_cost = fit_memory_usage([(10, 1100), (20, 1200), (40, 1400)])
+        assert abs(fixed_memory - 1000) < 1e-6
+        assert abs(memory_per_unit_cost - 10) < 1e-6
+
+    def test_calibration_stops_before_the_memory_limit(self):
+        text_trainer = FakeTextTrainer()
+        instances = [FakeInstance(0, 5, 3, 2), FakeInstance(1, 9, 3, 2), FakeInstance(2, 1, 1, 2)]
+        data_generator = DataGenerator(text_trainer, Params({'dynamic_padding': True}))
+        model = FakeModel()
+        # Memory use is 1000 bytes, plus 10 bytes per unit of batch cost.  The largest instance
+        # has a memory scaling of 9 * 3 * 2 = 54.
+        fake_peak_memory = lambda: 1000 + 10 * 54 * model.batch_sizes[-1]
+        with mock.patch('deep_qa.training.memory_calibration.get_peak_memory_usage', fake_peak_memory):
+            calibration = calibrate_memory_usage_constant(model,
+                                                          data_generator,
+                                                          IndexedDataset(instances),
+                                                          text_trainer.get_instance_sorting_keys(),
+                                                          text_trainer.get_padding_memory_scaling,
+                                                          memory_limit=10000)
+        # The first batch is a warm-up step, and a batch of 32 would be predicted to go over the
+        # limit, so we never try it.
+        assert model.batch_sizes == [1, 1, 2, 4, 8, 16]
+        assert abs(calibration['adaptive_memory_usage_constant'] - 900) <= 1
+        assert [cost for cost, _ in calibration['probes']] == [54, 108, 216, 432, 864]
+
+    def test_calibration_is_saved_and_reused(self):
+        self.write_true_false_model_files()
+        args = Params({
+                'data_generator': {
+                        'dynamic_padding': True,
+                        'adaptive_batch_sizes': True,
+                        'adaptive_memory_usage_constant': 'calibrate',
+                        'calibration_memory_limit': 1000000,
+                        'maximum_batch_size': 8,
+                        },
+                })
+        scaling = lambda self, lengths: lengths['num_sentence_words']
+        with mock.patch.object(ClassificationModel, 'get_padding_memory_scaling', scaling):
+            model = self.get_model(ClassificationModel, args)
+            model.train()
+            calibration = load_calibration(self.TEST_DIR + "_memory_calibration.json")
+            assert calibration is not None
+            assert model.data_generator.adaptive_memory_usage_constant == \
+                    calibration['adaptive_memory_usage_constant']
+            with mock.patch('deep_qa.training.text_trainer.calibrate_memory_usage_constant') as calibrate:
+                model = self.get_model(ClassificationModel, args)
+                model.train()
+                assert not calibrate.called
+        assert os.path.exists(self.TEST_DIR + "_memory_calibration.json")
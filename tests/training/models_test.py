@@ -0,0 +1,46 @@
+# pylint: disable=no-self-use,invalid-name
+import numpy
+import tensorflow
+from numpy.testing import assert_allclose
+from keras.layers import Dense, Input
+
+from deep_qa.common.params import Params
+from deep_qa.training.models import DeepQaModel
+from ..common.test_case import DeepQaTestCase
+
+
+class TestDeepQaModel(DeepQaTestCase):
+    def build_model(self, **compile_arguments):
+        input_layer = Input(shape=(3,))
+        output = Dense(2, name="dense")(input_layer)
+        model = DeepQaModel(inputs=input_layer, outputs=output)
+        arguments = {
+                'optimizer': tensorflow.train.GradientDescentOptimizer(0.1),
+                'loss': 'mse',
+                'gradient_clipping': {'type': 'clip_by_norm', 'value': 1000.0},
+                }
+        arguments.update(compile_arguments)
+        model.compile(Params(arguments))
+        return model
+
+    def test_accumulated_gradients_match_a_single_large_batch(self):
+        first_inputs = numpy.random.rand(2, 3)
+        first_labels = numpy.random.rand(2, 2)
+        second_inputs = numpy.random.rand(5, 3)
+        second_labels = numpy.random.rand(5, 2)
+
+        model = self.build_model()
+        initial_weights = model.get_weights()
+        model.train_on_batch(numpy.concatenate([first_inputs, second_inputs]),
+                             numpy.concatenate([first_labels, second_labels]))
+        expected_weights = model.get_weights()
+
+        accumulating_model = self.build_model(gradient_accumulation_steps=2)
+        accumulating_model.set_weights(initial_weights)
+        accumulating_model.train_on_batch(first_inputs, first_labels)
+        # Nothing is updated until we've seen both micro-batches.
+        for weights, initial in zip(accumulating_model.get_weights(), initial_weights):
+            assert_allclose(weights, initial)
+        accumulating_model.train_on_batch(second_inputs, second_labels)
+        for weights, expected in zip(accumulating_model.get_weights(), expected_weights):
+            assert_allclose(weights, expected, rtol=1e-5)
@@ -51,3 +51,24 @@ class TestMultiGpu(DeepQaTestCase):
         single_gpu_variables = ["tower_0/" + x.name for x in single_gpu_model.model.trainable_weights]
 
         assert single_gpu_variables == multi_gpu_variables
+
+    def test_model_can_train_and_load_with_cpu_towers(self):
+        args = self.args
+        args["tower_device_type"] = "cpu"
+        model, _ = self.ensure_model_trains_and_loads(ClassificationModel, args)
+        variable_devices = [variable.device for variable in model.model.trainable_weights]
+        assert all(device in ["/cpu:0", "/device:CPU:0", ""] for device in variable_devices)
+
+    def test_model_can_train_and_load_with_local_worker_processes(self):
+        args = self.args
+        args["tower_device_type"] = "worker"
+        model = self.get_model(ClassificationModel, args)
+        try:
+            model.train()
+            assert model.local_cluster is not None
+            for variable in model.model.trainable_weights:
+                assert variable.device.startswith("/job:ps/task:0")
+        finally:
+            K.clear_session()
+            if model.local_cluster is not None:
+                model.local_cluster.shutdown()
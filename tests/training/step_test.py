@@ -0,0 +1,69 @@
+# pylint: disable=no-self-use,invalid-name
+from unittest import mock
+
+import numpy
+import tensorflow
+import keras.backend as K
+
+from deep_qa.training.step import AccumulatingStep, Step
+from ..common.test_case import DeepQaTestCase
+
+
+class TestStep(DeepQaTestCase):
+    def build_step(self, summary_writer=None, use_callable=True):
+        inputs = tensorflow.placeholder('float32', shape=(None, 3))
+        weights = tensorflow.Variable(numpy.ones((3, 1)), dtype='float32')
+        loss = tensorflow.reduce_mean(tensorflow.matmul(inputs, weights))
+        tensorflow.summary.scalar("loss", loss)
+        global_step = tensorflow.train.get_or_create_global_step()
+        train_operation = tensorflow.train.GradientDescentOptimizer(0.1).minimize(loss, global_step=global_step)
+        step = Step([inputs], [loss], global_step, summary_writer=summary_writer,
+                    summary_frequency=3, updates=[train_operation], use_callable=use_callable)
+        K.get_session().run(tensorflow.global_variables_initializer())
+        return step
+
+    def test_callable_and_feed_dict_paths_give_the_same_outputs(self):
+        batch = numpy.arange(6, dtype='float32').reshape((2, 3))
+        outputs = []
+        for use_callable in [True, False]:
+            step = self.build_step(use_callable=use_callable)
+            assert step.use_callable == use_callable
+            outputs.append([step([batch])[0] for _ in range(4)])
+            K.clear_session()
+        numpy.testing.assert_allclose(outputs[0], outputs[1], rtol=1e-5)
+
+    def test_summaries_are_written_at_the_right_steps_without_reading_the_global_step(self):
+        summary_writer = mock.Mock()
+        step = self.build_step(summary_writer=summary_writer, use_callable=False)
+        batch = numpy.ones((2, 3), dtype='float32')
+        session = K.get_session()
+        with mock.patch.object(session, 'run', wraps=session.run) as run:
+            for _ in range(7):
+                step([batch])
+        # One call to read the initial global step, then one call per step.
+        assert run.call_count == 8
+        written_steps = [call[0][1] for call in summary_writer.add_summary.call_args_list]
+        assert written_steps == [0, 3, 6]
+        assert step.current_step == 7
+        assert session.run(step.global_step) == 7
+
+
+class TestAccumulatingStep(DeepQaTestCase):
+    def test_gradients_are_applied_when_enough_tokens_are_accumulated(self):
+        accumulate_step = mock.Mock(return_value=[0.0])
+        apply_step = mock.Mock(return_value=[0.0])
+        accumulated_batches = tensorflow.Variable(0)
+        accumulated_tokens = tensorflow.Variable(3.0)
+        K.get_session().run(tensorflow.global_variables_initializer())
+        step = AccumulatingStep(accumulate_step, apply_step, accumulated_batches, accumulated_tokens,
+                                num_token_inputs=1, accumulation_tokens=10)
+        # Four tokens each; only the word indices count, not the labels.
+        batch = [numpy.array([[1, 2, 0], [3, 4, 0]]), numpy.ones((2, 2), dtype='int32')]
+        for _ in range(4):
+            step(batch)
+        # We start from the three tokens already accumulated in the graph, so we apply after the
+        # second batch (11 tokens), and the next two batches only get us to 8 tokens.
+        assert apply_step.call_count == 1
+        assert accumulate_step.call_count == 3
+        assert apply_step.call_args[0][0][-1] == 4
+        assert (step.num_batches, step.num_tokens) == (2, 8)
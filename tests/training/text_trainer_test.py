@@ -1,7 +1,10 @@
 # pylint: disable=no-self-use,invalid-name
+from copy import deepcopy
+import os
 from unittest import mock
 
 import numpy
+from numpy.testing import assert_almost_equal
 
 from deep_qa.common.params import Params, pop_choice
 from deep_qa.layers.encoders import encoders
@@ -162,6 +165,101 @@ class TestTextTrainer(DeepQaTestCase):
         self.write_true_false_model_files()
         self.ensure_model_trains_and_loads(ClassificationModel, args)
 
+    def test_score_dataset_with_token_budget_batches_matches_whole_dataset_padding(self):
+        args = Params({
+                'embeddings': {'words': {'dimension': 4}, 'characters': {'dimension': 2}},
+                'data_generator': {
+                        'dynamic_padding': True,
+                        'token_budget': 4,
+                        'padding_buckets': 'powers_of_two',
+                        },
+        })
+        self.write_true_false_model_files()
+        model = self.get_model(ClassificationModel, args)
+        model.train()
+        dataset = model.load_dataset_from_files([self.TEST_FILE])
+        predictions, labels = model.score_dataset(dataset)
+        data_generator = model.data_generator
+        model.data_generator = None
+        expected_predictions, expected_labels = model.score_dataset(dataset)
+        model.data_generator = data_generator
+        assert_almost_equal(predictions, expected_predictions, decimal=5)
+        assert_almost_equal(labels, expected_labels)
+
+    def test_lazy_datasets_work_with_data_generator(self):
+        args = Params({
+                'test_files': [self.TEST_FILE],
+                'embeddings': {'words': {'dimension': 4}, 'characters': {'dimension': 2}},
+                'save_models': True,
+                'tokenizer': {'type': 'words and characters'},
+                'data_generator': {'dynamic_padding': True},
+                'lazy_datasets': True,
+                'lazy_dataset_chunk_size': 4,
+                'batch_size': 2,
+        })
+        self.write_true_false_model_files()
+        self.ensure_model_trains_and_loads(ClassificationModel, args)
+
+    def test_lazy_datasets_are_scored_in_order_one_chunk_at_a_time(self):
+        args = Params({
+                'embeddings': {'words': {'dimension': 4}, 'characters': {'dimension': 2}},
+                'data_generator': {'dynamic_padding': True},
+                'lazy_datasets': True,
+                'lazy_dataset_chunk_size': 3,
+                'batch_size': 2,
+        })
+        self.write_true_false_model_files()
+        model = self.get_model(ClassificationModel, args)
+        model.train()
+        lazy_dataset = model.load_dataset_from_files([self.VALIDATION_FILE])
+        predictions, labels = model.score_dataset_to_files(lazy_dataset, self.TEST_DIR + "scores")
+        model.lazy_datasets = False
+        dataset = model.load_dataset_from_files([self.VALIDATION_FILE])
+        expected_predictions, expected_labels = model.score_dataset(dataset)
+        assert_almost_equal(predictions, expected_predictions, decimal=5)
+        assert_almost_equal(labels, expected_labels)
+
+    def test_dataset_cache_is_reused_across_runs(self):
+        args = Params({
+                'embeddings': {'words': {'dimension': 4}, 'characters': {'dimension': 2}},
+                'tokenizer': {'type': 'words and characters'},
+                'dataset_cache_directory': self.TEST_DIR + 'dataset_cache',
+        })
+        self.write_true_false_model_files()
+        model = self.get_model(ClassificationModel, deepcopy(args))
+        model.train()
+        with mock.patch.object(ClassificationModel, 'load_dataset_from_files') as load_dataset:
+            cached_model = self.get_model(ClassificationModel, deepcopy(args))
+            cached_model.train()
+            assert not load_dataset.called
+        assert cached_model.data_indexer.word_indices == model.data_indexer.word_indices
+
+    def test_training_data_is_tokenized_once_while_fitting_and_indexing(self):
+        self.write_true_false_model_files()
+        model = self.get_model(ClassificationModel)
+        tokenizer = model.tokenizer
+        with mock.patch.object(tokenizer, '_tokenize', wraps=tokenizer._tokenize) as tokenize:
+            dataset, _ = model._load_indexed_dataset([self.TRAIN_FILE], update_model_state=True)
+            assert tokenize.call_count == len({instance.text for instance in dataset.instances})
+        # The cache is only kept for that one pass over the data.
+        assert tokenizer.get_cache_info() == {'hits': 0, 'misses': 0, 'cache_size': 0, 'current_size': 0}
+
+    def test_best_model_is_saved_with_a_loss_metric_and_checkpoint_retention(self):
+        args = Params({
+                'save_models': True,
+                'validation_metric': 'val_loss',
+                'keep_checkpoints': 1,
+                'num_epochs': 3,
+                'patience': 3,
+                })
+        self.write_true_false_model_files()
+        model = self.get_model(ClassificationModel, args)
+        model.train()
+        best_filename = model.model_checkpoint.best_filename
+        assert best_filename == "%s_weights_epoch=%d.h5" % (model.model_prefix, model.best_epoch)
+        assert os.path.exists(best_filename)
+        assert os.path.exists(model.model_prefix + "_weights.h5")
+
     def test_pretrained_embeddings_works_correctly(self):
         self.write_true_false_model_files()
         self.write_pretrained_vector_files()